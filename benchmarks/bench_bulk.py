@@ -0,0 +1,70 @@
+"""
+Benchmark: vectorized column validation/normalization vs. the scalar pipeline per row.
+
+Usage:
+    poetry run python -m benchmarks.bench_bulk [--rows 100000]
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+from src.registration_config import SurveyField
+from src.survey.bulk import normalize_series
+from src.survey.formatters import format_date_db, format_group_db, format_phone_db
+from src.survey.validators import validate_date, validate_group, validate_phone
+
+
+def measure(label: str, func, repeat: int = 5) -> float:
+    best = min(_timed(func) for _ in range(repeat))
+    print(f"{label:<45} {best * 1000:8.2f} ms")
+    return best
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def scalar(field: SurveyField, series: pd.Series) -> list:
+    return [field.pipeline(value) for value in series]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = range(args.rows)
+    columns = [
+        (
+            SurveyField(field_name="phone", label="phone", validator=validate_phone, db_formatter=format_phone_db),
+            pd.Series([f"8 (999) {i % 1000:03d}-{i % 100:02d}-{i % 97:02d}" for i in rows], dtype=object),
+        ),
+        (
+            SurveyField(field_name="birth_date", label="date", validator=validate_date, db_formatter=format_date_db),
+            pd.Series([f"{i % 28 + 1}.{i % 12 + 1}.{1975 + i % 40}" for i in rows], dtype=object),
+        ),
+        (
+            SurveyField(field_name="group", label="group", validator=validate_group, db_formatter=format_group_db),
+            pd.Series([f"рк{i % 9 + 1}-{i % 16 + 1}{i % 9 + 1}б" for i in rows], dtype=object),
+        ),
+    ]
+
+    print(f"Normalizing {args.rows} rows per column")
+    for field, series in columns:
+        batch = normalize_series(field, series)
+        expected = scalar(field, series)
+        assert batch.invalid.tolist() == [not ok for ok, _, _ in expected]
+        assert batch.values.tolist() == [value for _, _, value in expected]
+
+        print()
+        old = measure(f"{field.field_name}: field.pipeline per row", lambda f=field, s=series: scalar(f, s))
+        new = measure(f"{field.field_name}: normalize_series", lambda f=field, s=series: normalize_series(f, s))
+        print(f"{field.field_name}: x{old / new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
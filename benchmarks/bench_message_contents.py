@@ -0,0 +1,128 @@
+"""
+Benchmark: message log of broadcasts, bodies stored inline vs. once in message_contents.
+
+Logs a few broadcasts to every user plus some unique replies, in batches as the
+background writer does, and reports the time, the bytes written to the WAL and the
+final database size. The inline variant is the previous schema: text, caption and
+file_id columns in messages and an FTS5 index over every message.
+
+Usage:
+    poetry run python -m benchmarks.bench_message_contents [--users 3000] [--broadcasts 5] [--batch 200]
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from datetime import UTC, datetime
+
+from sqlalchemy import insert, text
+
+from src.database import Database
+from src.models import Message, content_rows
+
+BROADCAST = (
+    "Дорогие участники! Напоминаем, что выезд в субботу в 9:00 от станции метро. "
+    "С собой нужно взять паспорт, полис ОМС, спальник, кружку и хорошее настроение. "
+    "Если планы изменились, пожалуйста, сообщите организаторам до четверга. "
+) * 3
+
+INLINE_SCHEMA = [
+    "DROP TRIGGER messages_fts_insert",
+    "DROP TRIGGER messages_fts_delete",
+    "DROP TABLE messages_fts",
+    "DROP VIEW message_log",
+    "DROP INDEX idx_message_text_ref",
+    "DROP INDEX idx_message_caption_ref",
+    "ALTER TABLE messages ADD COLUMN text TEXT",
+    "ALTER TABLE messages ADD COLUMN caption TEXT",
+    "ALTER TABLE messages ADD COLUMN file_id VARCHAR(255)",
+    "CREATE VIRTUAL TABLE messages_fts USING fts5(text, caption, content='messages', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts (rowid, text, caption) SELECT new.id, new.text, new.caption "
+    "WHERE new.text IS NOT NULL OR new.caption IS NOT NULL; END",
+]
+INSERT_INLINE = text(
+    "INSERT INTO messages (telegram_id, chat_id, message_id, direction, message_type, text, caption, file_id, "
+    "reply_to_message_id, created_at) VALUES (:telegram_id, :chat_id, :message_id, :direction, :message_type, "
+    ":text, :caption, :file_id, :reply_to_message_id, :created_at)"
+)
+
+
+def make_records(users: int, broadcasts: int) -> list[dict]:
+    records = []
+    for broadcast in range(broadcasts):
+        for user in range(users):
+            records.append(("outgoing", user, f"{BROADCAST} (рассылка {broadcast})"))
+        for user in range(0, users, 3):
+            records.append(("incoming", user, f"Спасибо, буду! Ответ {broadcast}-{user}"))
+    now = datetime.now(UTC)
+    return [
+        {
+            "telegram_id": 1_000_000 + user,
+            "chat_id": 1_000_000 + user,
+            "message_id": i,
+            "direction": direction,
+            "message_type": "text",
+            "text": body,
+            "caption": None,
+            "file_id": None,
+            "reply_to_message_id": None,
+            "created_at": now,
+        }
+        for i, (direction, user, body) in enumerate(records)
+    ]
+
+
+def run(records: list[dict], batch_size: int, inline: bool) -> tuple[float, float, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite")
+        database = Database(path)
+        database.create_tables()
+        with database.engine.connect() as conn:
+            # Keep every written page in the WAL, so its size is the write volume
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.exec_driver_sql("PRAGMA wal_autocheckpoint=0")
+            for statement in INLINE_SCHEMA if inline else []:
+                conn.exec_driver_sql(statement)
+            conn.commit()
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+            start = time.perf_counter()
+            for offset in range(0, len(records), batch_size):
+                batch = records[offset : offset + batch_size]
+                if inline:
+                    conn.execute(INSERT_INLINE, batch)
+                else:
+                    conn.execute(insert(Message), content_rows(conn, batch))
+                conn.commit()
+            elapsed = time.perf_counter() - start
+            wal_mb = os.path.getsize(path + "-wal") / 1024 / 1024
+
+            conn.exec_driver_sql("PRAGMA wal_autocheckpoint=1000")
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        database.dispose()
+    return elapsed, wal_mb, size_mb
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=3000)
+    parser.add_argument("--broadcasts", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    records = make_records(args.users, args.broadcasts)
+    print(f"Logging {args.broadcasts} broadcasts to {args.users} users plus replies ({len(records)} messages)")
+    print(f"{'bodies':<22} {'time':>10} {'WAL written':>13} {'db size':>10}")
+    for label, inline in [("inline in messages", True), ("message_contents", False)]:
+        elapsed, wal_mb, size_mb = run(records, args.batch, inline)
+        print(f"{label:<22} {elapsed * 1000:>8.0f}ms {wal_mb:>10.1f} MB {size_mb:>7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
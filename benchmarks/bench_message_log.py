@@ -0,0 +1,93 @@
+"""
+Benchmark: message logging, one transaction per message vs. the batched background writer.
+
+Measures how long the submitting coroutine is busy (what an update handler waits for)
+and the total time until every record is in the database.
+
+Usage:
+    poetry run python -m benchmarks.bench_message_log [--messages 5000] [--batch 200]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from datetime import UTC, datetime
+
+import src.message_log_writer as message_log_writer_module
+from src.database import Database
+from src.message_log_writer import MessageLogWriter
+from src.models import Message
+
+
+def make_record(message_id: int) -> dict:
+    return {
+        "telegram_id": 1_000_000 + message_id % 500,
+        "chat_id": 1_000_000 + message_id % 500,
+        "message_id": message_id,
+        "direction": "incoming" if message_id % 2 else "outgoing",
+        "message_type": "text",
+        "text": f"Сообщение {message_id}",
+        "caption": None,
+        "file_id": None,
+        "reply_to_message_id": None,
+        "created_at": datetime.now(UTC),
+    }
+
+
+def count_messages(database: Database) -> int:
+    with database.get_session(readonly=True) as session:
+        return session.query(Message).count()
+
+
+def run_sync(messages: int) -> tuple[float, float]:
+    # Writer that is not running: every submit is its own transaction, as before
+    writer = MessageLogWriter()
+    start = time.perf_counter()
+    for message_id in range(messages):
+        writer.submit(make_record(message_id))
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+async def run_batched(messages: int, batch_size: int) -> tuple[float, float]:
+    writer = MessageLogWriter(maxsize=messages, batch_size=batch_size, flush_interval=0.05)
+    writer.start()
+    start = time.perf_counter()
+    for message_id in range(messages):
+        writer.submit(make_record(message_id))
+        if message_id % 50 == 0:
+            # Handlers yield to the loop between updates
+            await asyncio.sleep(0)
+    submitted = time.perf_counter() - start
+    await writer.stop()
+    return submitted, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"Logging {args.messages} messages")
+    print(f"{'mode':<28} {'handler busy':>14} {'all written':>14}")
+    for label, runner in [
+        ("transaction per message", lambda: run_sync(args.messages)),
+        (f"batched ({args.batch}/INSERT)", lambda: asyncio.run(run_batched(args.messages, args.batch))),
+    ]:
+        with tempfile.TemporaryDirectory() as tmp:
+            database = Database(os.path.join(tmp, "bench.sqlite"))
+            database.create_tables()
+            message_log_writer_module.db = database
+            busy, total = runner()
+            assert count_messages(database) == args.messages
+            database.dispose()
+        print(f"{label:<28} {busy * 1000:11.1f} ms {total * 1000:11.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
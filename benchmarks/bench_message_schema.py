@@ -0,0 +1,132 @@
+"""
+Benchmark: insert throughput of the message log, previous schema vs. the current one.
+
+The previous schema indexed telegram_id, chat_id and created_at twice (index=True and
+an explicit Index), had indexes on direction and chat_id no query used, and stored
+direction and message_type as strings. The current one keeps the created_at, the
+(telegram_id, created_at) and the body reference indexes, with small-integer codes.
+
+The table is filled first, so the indexes are as deep as after a season, then more
+messages are logged in batches as the background writer does. Reports the rows per
+second, the bytes written to the WAL and the final database size.
+
+Usage:
+    poetry run python -m benchmarks.bench_message_schema [--existing 200000] [--messages 50000] [--batch 200]
+"""
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, insert, text
+
+from src.database import Database
+from src.models import Message
+
+USERS = 3000
+TYPES = ("text", "text", "text", "photo", "document", "contact")
+
+# The messages table as it was before
+OLD_MESSAGES = Table(
+    "messages",
+    MetaData(),
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("telegram_id", BigInteger, nullable=False, index=True),
+    Column("chat_id", BigInteger, nullable=False, index=True),
+    Column("message_id", BigInteger, nullable=True),
+    Column("direction", String(10), nullable=False),
+    Column("message_type", String(50), nullable=True),
+    Column("text_ref", Integer, nullable=True),
+    Column("caption_ref", Integer, nullable=True),
+    Column("file_ref", Integer, nullable=True),
+    Column("reply_to_message_id", BigInteger, nullable=True),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Index("idx_message_telegram_id", "telegram_id"),
+    Index("idx_message_chat_id", "chat_id"),
+    Index("idx_message_direction", "direction"),
+    Index("idx_message_created_at", "created_at"),
+    Index("idx_message_telegram_id_created_at", "telegram_id", "created_at"),
+    Index("idx_message_text_ref", "text_ref", sqlite_where=text("text_ref IS NOT NULL")),
+    Index("idx_message_caption_ref", "caption_ref", sqlite_where=text("caption_ref IS NOT NULL")),
+)
+
+
+def make_records(count: int, start: datetime, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        user = 1_000_000 + rng.randrange(USERS)
+        records.append(
+            {
+                "telegram_id": user,
+                "chat_id": user,
+                "message_id": i,
+                "direction": "incoming" if i % 2 else "outgoing",
+                "message_type": TYPES[i % len(TYPES)],
+                "text_ref": rng.randrange(1, 5000),
+                "caption_ref": None,
+                "file_ref": None,
+                "reply_to_message_id": None,
+                "created_at": start + timedelta(seconds=i),
+            }
+        )
+    return records
+
+
+def run(existing: list[dict], records: list[dict], batch_size: int, old: bool) -> tuple[float, float, float]:
+    table = OLD_MESSAGES if old else Message.__table__
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite")
+        database = Database(path)
+        database.create_tables()
+        with database.engine.connect() as conn:
+            if old:
+                conn.exec_driver_sql("DROP VIEW message_log")
+                conn.exec_driver_sql("DROP TABLE messages")
+                conn.commit()
+                OLD_MESSAGES.create(conn)
+            for offset in range(0, len(existing), 10_000):
+                conn.execute(insert(table), existing[offset : offset + 10_000])
+            conn.commit()
+            # Keep every written page in the WAL, so its size is the write volume
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.exec_driver_sql("PRAGMA wal_autocheckpoint=0")
+
+            start = time.perf_counter()
+            for offset in range(0, len(records), batch_size):
+                conn.execute(insert(table), records[offset : offset + batch_size])
+                conn.commit()
+            elapsed = time.perf_counter() - start
+            wal_mb = os.path.getsize(path + "-wal") / 1024 / 1024
+
+            conn.exec_driver_sql("PRAGMA wal_autocheckpoint=1000")
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        database.dispose()
+    return len(records) / elapsed, wal_mb, size_mb
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--existing", type=int, default=200_000)
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    now = datetime.now(UTC)
+    existing = make_records(args.existing, now - timedelta(seconds=args.existing), seed=1)
+    records = make_records(args.messages, now, seed=2)
+    print(f"Logging {args.messages} messages in batches of {args.batch} on top of {args.existing}")
+    print(f"{'schema':<30} {'rows/s':>10} {'WAL written':>13} {'db size':>10}")
+    for label, old in [("previous (10 indexes, strings)", True), ("current (4 indexes, codes)", False)]:
+        rate, wal_mb, size_mb = run(existing, records, args.batch, old)
+        print(f"{label:<30} {rate:>10.0f} {wal_mb:>10.1f} MB {size_mb:>7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: concurrent readers with a single writer, StaticPool vs. QueuePool + WAL.
+
+Reader threads run get_user lookups while one writer thread keeps updating users,
+as happens when handlers move database work to executors.
+
+Usage:
+    poetry run python -m benchmarks.bench_pool [--users 5000] [--readers 8] [--reads 2000]
+"""
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+
+from sqlalchemy import select, update
+
+from src.database import POOL_MODE_QUEUE, POOL_MODE_STATIC, Database
+from src.models import get_user_model
+
+
+def populate(database: Database, users: int) -> None:
+    user_model = get_user_model()
+    now = datetime.now(UTC)
+    with database.get_session() as session:
+        session.execute(
+            user_model.__table__.insert(),
+            [
+                {
+                    "telegram_id": 1_000_000 + i,
+                    "state": "registered",
+                    "name": f"Участник {i}",
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for i in range(users)
+            ],
+        )
+
+
+def run(mode: str, path: str, users: int, readers: int, reads: int) -> tuple[float, int]:
+    """Return (reads per second, writes completed) for one pool mode."""
+    database = Database(path, pool_mode=mode, read_pool_size=readers)
+    database.create_tables()
+    user_model = get_user_model()
+    stop = threading.Event()
+    writes = 0
+
+    def writer() -> None:
+        nonlocal writes
+        while not stop.is_set():
+            with database.get_session() as session:
+                session.execute(
+                    update(user_model)
+                    .where(user_model.telegram_id == 1_000_000 + random.randrange(users))
+                    .values(updated_at=datetime.now(UTC))
+                )
+            writes += 1
+
+    def reader(count: int) -> None:
+        for _ in range(count):
+            with database.get_session(readonly=True) as session:
+                session.execute(
+                    select(user_model).where(user_model.telegram_id == 1_000_000 + random.randrange(users))
+                ).first()
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=readers) as executor:
+        list(executor.map(reader, [reads // readers] * readers))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    writer_thread.join()
+    database.dispose()
+    return reads / elapsed, writes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--reads", type=int, default=2_000)
+    args = parser.parse_args()
+
+    # GIL contention makes many statements cross the slow-query threshold, that's noise here
+    logging.getLogger("src.query_metrics.slow").setLevel(logging.ERROR)
+
+    print(f"{args.readers} reader threads, {args.reads} lookups, 1 writer thread, {args.users} users")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for mode in (POOL_MODE_STATIC, POOL_MODE_QUEUE):
+            path = os.path.join(tmp, f"{mode}.sqlite")
+            seed = Database(path, pool_mode=mode)
+            seed.create_tables()
+            populate(seed, args.users)
+            seed.dispose()
+
+            results[mode] = run(mode, path, args.users, args.readers, args.reads)
+            reads_per_second, writes = results[mode]
+            print(f"{mode:<8} {reads_per_second:10.0f} reads/s   {writes:6d} writes during the run")
+
+    print()
+    print(f"read throughput:  x{results[POOL_MODE_QUEUE][0] / results[POOL_MODE_STATIC][0]:.2f}")
+    print(f"writer progress:  x{results[POOL_MODE_QUEUE][1] / max(results[POOL_MODE_STATIC][1], 1):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: compiled row serializer vs. the previous per-column to_dict.
+
+Usage:
+    poetry run python -m benchmarks.bench_serializer [--rows 10000]
+"""
+
+import argparse
+import time
+from datetime import UTC, datetime
+from typing import Any
+
+from src.database import Database
+from src.models import get_serializer, get_user_model
+
+
+def legacy_to_dict(obj: Any) -> dict[str, Any]:
+    """The to_dict implementation used before the compiled serializer."""
+    result = {}
+    for column in obj.__table__.columns:
+        value = getattr(obj, column.name)
+        if isinstance(value, datetime):
+            result[column.name] = value.isoformat()
+        else:
+            result[column.name] = value
+    return result
+
+
+def measure(label: str, func, repeat: int = 5) -> float:
+    best = min(_timed(func) for _ in range(repeat))
+    print(f"{label:<45} {best * 1000:8.2f} ms")
+    return best
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    database = Database(":memory:")
+    database.create_tables()
+    user_model = get_user_model()
+    serializer = get_serializer(user_model)
+
+    now = datetime.now(UTC)
+    with database.get_session() as session:
+        session.execute(
+            user_model.__table__.insert(),
+            [
+                {
+                    "telegram_id": 1_000_000 + i,
+                    "state": "registered",
+                    "name": f"Участник {i}",
+                    "phone": f"7999{i:07d}",
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for i in range(args.rows)
+            ],
+        )
+
+    print(f"Serializing {args.rows} users")
+
+    with database.get_session() as session:
+        users = session.query(user_model).all()
+        legacy = measure("legacy to_dict over ORM objects", lambda: [legacy_to_dict(u) for u in users])
+        compiled = measure("compiled serializer over ORM objects", lambda: [serializer.serialize(u) for u in users])
+
+    def query_orm() -> list[dict[str, Any]]:
+        with database.get_session() as session:
+            return [legacy_to_dict(u) for u in session.query(user_model).all()]
+
+    def query_rows() -> list[dict[str, Any]]:
+        with database.get_session() as session:
+            return serializer.serialize_rows(session.execute(serializer.select()))
+
+    assert query_orm() == query_rows()
+    legacy_query = measure("query + legacy to_dict (ORM instantiation)", query_orm)
+    rows_query = measure("query + serialize_rows (no ORM instantiation)", query_rows)
+
+    print()
+    print(f"to_dict speedup:     x{legacy / compiled:.2f}")
+    print(f"end-to-end speedup:  x{legacy_query / rows_query:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: sequential update processing vs. PerUserUpdateProcessor.
+
+Every simulated handler does a little synchronous work (as the database calls do)
+and awaits a Telegram API round trip. Updates of many users are pushed through the
+processor the same way Application does it with concurrent updates: one task per
+update, created in arrival order. The benchmark also checks that updates of each
+user were handled in the order they arrived.
+
+Usage:
+    poetry run python -m benchmarks.bench_updates [--users 200] [--per-user 5] [--latency-ms 50]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import SimpleUpdateProcessor
+
+from src.update_processor import PerUserUpdateProcessor
+
+
+def make_updates(users: int, per_user: int) -> list[Update]:
+    updates = []
+    for sequence in range(per_user):
+        for user_id in range(1, users + 1):
+            user = User(id=user_id, first_name="u", is_bot=False)
+            chat = Chat(id=user_id, type="private")
+            message = Message(message_id=sequence, date=None, chat=chat, from_user=user, text=str(sequence))
+            updates.append(Update(update_id=len(updates), message=message))
+    # Bursts of taps from the same user arrive back to back
+    random.Random(0).shuffle(updates)
+    return updates
+
+
+async def run(processor, updates: list[Update], latency: float, work: float) -> tuple[float, bool]:
+    """Return (updates per second, per-user order preserved) for one processor."""
+    arrival = {update.update_id: index for index, update in enumerate(updates)}
+    seen: dict[int, list[int]] = defaultdict(list)
+
+    async def handler(update: Update) -> None:
+        deadline = time.perf_counter() + work
+        while time.perf_counter() < deadline:  # synchronous part of the handler
+            pass
+        seen[update.effective_user.id].append(arrival[update.update_id])
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))  # Telegram round trip
+
+    async with processor:
+        start = time.perf_counter()
+        await asyncio.gather(*(processor.process_update(update, handler(update)) for update in updates))
+        elapsed = time.perf_counter() - start
+
+    ordered = all(ids == sorted(ids) for ids in seen.values())
+    return len(updates) / elapsed, ordered
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    updates = make_updates(args.users, args.per_user)
+    latency, work = args.latency_ms / 1000, args.work_ms / 1000
+    print(
+        f"{len(updates)} updates from {args.users} users, {args.latency_ms} ms API latency, {args.work_ms} ms sync work"
+    )
+
+    sequential, _ = await run(SimpleUpdateProcessor(1), updates, latency, work)
+    print(f"sequential  {sequential:10.1f} updates/s")
+    concurrent, ordered = await run(PerUserUpdateProcessor(args.workers), updates, latency, work)
+    print(f"per-user    {concurrent:10.1f} updates/s   ({args.workers} workers, per-user order kept: {ordered})")
+    print()
+    print(f"throughput: x{concurrent / sequential:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--per-user", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--work-ms", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=32)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
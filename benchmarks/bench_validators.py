@@ -0,0 +1,152 @@
+"""
+Benchmark: field input pipeline vs. the previous per-call validators and formatters.
+
+Previously every validate_*/format_* call built a new object through the factory and
+matched an uncompiled pattern string; now the wrappers use module-level instances with
+precompiled patterns and every SurveyField carries a compiled validate -> db_format pipeline.
+
+Usage:
+    poetry run python -m benchmarks.bench_validators [--inputs 100000]
+"""
+
+import argparse
+import re
+import time
+
+from src.survey.formatters import format_date_db, format_group_db, format_phone_db, format_phone_display
+from src.survey.pipeline import compile_pipeline
+from src.survey.validators import validate_date, validate_group, validate_phone
+
+
+class LegacyPhoneValidator:
+    def validate(self, value: str) -> tuple[bool, str | None]:
+        phone = re.sub(r"\D", "", str(value))
+        if phone.startswith("8"):
+            phone = "7" + phone[1:]
+        if not re.match(r"^(7)\d{10}$", phone):
+            return False, "error"
+        return True, None
+
+
+class LegacyDateValidator:
+    def validate(self, value: str) -> tuple[bool, str | None]:
+        match = re.match(r"^(0?[1-9]|[12][0-9]|3[01])\.(0?[1-9]|1[0-2])\.(\d{4})$", value)
+        if not match:
+            return False, "error"
+        year = int(match.group(3))
+        if year < 1980 or year > 2009:
+            return False, "error"
+        return True, None
+
+
+class LegacyGroupValidator:
+    def __init__(self) -> None:
+        self.pattern = r"^[а-яА-Я]{1,5}\d{0,2}[сицСИЦ]?-([1-9]|1[0-6])[1-9]([абмтАБМТ]?[вВ]?)$"
+
+    def validate(self, value: str) -> tuple[bool, str | None]:
+        if not re.match(self.pattern, value):
+            return False, "error"
+        return True, None
+
+
+class LegacyPhoneDbFormatter:
+    def format(self, value: str) -> str:
+        phone = re.sub(r"\D", "", str(value))
+        if phone.startswith("8"):
+            phone = "7" + phone[1:]
+        return phone
+
+
+class LegacyPhoneDisplayFormatter:
+    def format(self, value: str) -> str:
+        if not value:
+            return "Не указан"
+        return "+" + LegacyPhoneDbFormatter().format(value)
+
+
+def legacy_process(validator_cls, formatter, value: str) -> tuple[bool, str | None, str | None]:
+    """Scalar path of process_data_input before the pipeline."""
+    is_valid, error = validator_cls().validate(value)
+    if not is_valid:
+        return False, error, None
+    return True, None, formatter(value)
+
+
+def legacy_format_date(value: str) -> str:
+    day, month, year = value.split(".")
+    return f"{day.zfill(2)}.{month.zfill(2)}.{year}"
+
+
+def measure(label: str, func, repeat: int = 5) -> float:
+    best = min(_timed(func) for _ in range(repeat))
+    print(f"{label:<45} {best * 1000:8.2f} ms")
+    return best
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--inputs", type=int, default=100_000)
+    args = parser.parse_args()
+
+    phones = [f"8 (999) {i % 1000:03d}-{i % 100:02d}-{i % 97:02d}" for i in range(args.inputs)]
+    dates = [f"{i % 28 + 1}.{i % 12 + 1}.{1980 + i % 40}" for i in range(args.inputs)]
+    groups = [f"РК{i % 9 + 1}-{i % 16 + 1}{i % 9 + 1}Б" for i in range(args.inputs)]
+
+    phone_pipeline = compile_pipeline(validate_phone, format_phone_db)
+    date_pipeline = compile_pipeline(validate_date, format_date_db)
+    group_pipeline = compile_pipeline(validate_group, format_group_db)
+
+    cases = [
+        (
+            "phone",
+            lambda: [LegacyPhoneValidator().validate(p) for p in phones],
+            lambda: [validate_phone(p) for p in phones],
+            lambda: [
+                legacy_process(LegacyPhoneValidator, lambda v: LegacyPhoneDbFormatter().format(v), p) for p in phones
+            ],
+            lambda: [phone_pipeline(p) for p in phones],
+        ),
+        (
+            "date",
+            lambda: [LegacyDateValidator().validate(d) for d in dates],
+            lambda: [validate_date(d) for d in dates],
+            lambda: [legacy_process(LegacyDateValidator, legacy_format_date, d) for d in dates],
+            lambda: [date_pipeline(d) for d in dates],
+        ),
+        (
+            "group",
+            lambda: [LegacyGroupValidator().validate(g) for g in groups],
+            lambda: [validate_group(g) for g in groups],
+            lambda: [legacy_process(LegacyGroupValidator, lambda v: v.upper().strip(), g) for g in groups],
+            lambda: [group_pipeline(g) for g in groups],
+        ),
+    ]
+
+    print(f"Processing {args.inputs} inputs per field")
+    for name, legacy_validate, validate, legacy_pipeline, pipeline in cases:
+        assert [r[0] for r in legacy_validate()] == [r[0] for r in validate()]
+        assert [r[2] for r in legacy_pipeline()] == [r[2] for r in pipeline()]
+        print()
+        old = measure(f"{name}: legacy validator per call", legacy_validate)
+        new = measure(f"{name}: singleton, precompiled", validate)
+        old_pipeline = measure(f"{name}: legacy validate + db format", legacy_pipeline)
+        new_pipeline = measure(f"{name}: compiled pipeline", pipeline)
+        print(f"{name}: validator x{old / new:.2f}, pipeline x{old_pipeline / new_pipeline:.2f}")
+
+    print()
+    assert [LegacyPhoneDisplayFormatter().format(p) for p in phones] == [format_phone_display(p) for p in phones]
+    old = measure(
+        "phone display: legacy (nested formatter)", lambda: [LegacyPhoneDisplayFormatter().format(p) for p in phones]
+    )
+    new = measure("phone display: singletons", lambda: [format_phone_display(p) for p in phones])
+    print(f"phone display: x{old / new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
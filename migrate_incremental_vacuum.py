@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Скрипт миграции: включает auto_vacuum=INCREMENTAL для существующей БД.
+
+Новые базы создаются ботом сразу в этом режиме. В старых место, освобождённое
+после удаления и переноса сообщений в месячные разделы (src/message_retention.py),
+остаётся внутри файла. После миграции задача хранения сообщений возвращает
+свободные страницы файловой системе небольшими порциями (PRAGMA incremental_vacuum).
+
+Переключение режима требует полного VACUUM: он переписывает весь файл и на время
+работы блокирует запись, поэтому бота лучше остановить.
+
+Использование:
+    python3 migrate_incremental_vacuum.py [--db data/database.sqlite] [--dry-run]
+"""
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+AUTO_VACUUM_MODES = {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}
+
+
+def migrate_incremental_vacuum(db_path, dry_run=False):
+    """
+    Переводит базу в режим auto_vacuum=INCREMENTAL.
+
+    Args:
+        db_path: Путь к базе данных
+        dry_run: Если True, только показывает что будет сделано без изменений
+    """
+    if not Path(db_path).exists():
+        print(f"❌ База данных не найдена: {db_path}")
+        return False
+
+    try:
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        print(f"\n📊 Режим auto_vacuum: {AUTO_VACUUM_MODES.get(mode, mode)}")
+        print(f"   Размер: {pages * page_size / 1024 / 1024:.1f} МБ, свободно: {free * page_size / 1024 / 1024:.1f} МБ")
+
+        if mode == 2:
+            print("✅ База уже в режиме INCREMENTAL, миграция не требуется")
+            conn.close()
+            return True
+
+        if dry_run:
+            print("🔍 [DRY RUN] Будет включён режим INCREMENTAL и выполнен VACUUM")
+            conn.close()
+            return True
+
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.close()
+
+        if mode != 2:
+            print("❌ Не удалось включить режим INCREMENTAL")
+            return False
+        print(f"✅ Режим INCREMENTAL включён, размер после VACUUM: {pages * page_size / 1024 / 1024:.1f} МБ")
+        return True
+
+    except Exception as e:
+        print(f"\n❌ Ошибка при миграции: {e}")
+        import traceback
+
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """Главная функция скрипта."""
+    parser = argparse.ArgumentParser(description="Включение auto_vacuum=INCREMENTAL")
+    parser.add_argument("--db", default="data/database.sqlite", help="Путь к БД")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, ничего не менять")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔄 МИГРАЦИЯ: AUTO_VACUUM = INCREMENTAL")
+    print("=" * 60)
+
+    if args.dry_run:
+        print("\n⚠️  Режим пробного запуска (dry run) - изменения не будут сохранены")
+    else:
+        print("\n💡 Перед запуском остановите бота и сделайте резервную копию БД")
+
+    print(f"\n📁 База данных: {args.db}")
+
+    success = migrate_incremental_vacuum(args.db, dry_run=args.dry_run)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Скрипт миграции: выносит тексты, подписи и file_id сообщений в таблицу message_contents.
+
+Раньше каждая строка messages хранила текст целиком, и рассылка на 3000 человек
+сохраняла один и тот же текст 3000 раз. Теперь тело хранится один раз (ключ - SHA-256
+тела), а строка messages ссылается на него по id (колонки text_ref, caption_ref,
+file_ref). Читатели получают прежние колонки через представление message_log.
+
+Мигрируются основная база и все месячные разделы (data/messages/messages-YYYY-MM.sqlite).
+Для каждого файла:
+1. Удаляются триггеры и индекс полнотекстового поиска (они ссылаются на старые колонки)
+2. Уникальные тела переносятся в message_contents, строки получают ссылки
+3. Колонки text, caption, file_id удаляются, файл сжимается (VACUUM)
+4. Создаются представление message_log, индексы ссылок и индекс поиска по телам
+
+Бота на время миграции нужно остановить.
+
+Использование:
+    python3 migrate_message_contents.py [--db data/database.sqlite] [--partitions data/messages] [--dry-run]
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from src.message_contents import ensure_content_schema
+from src.message_retention import PARTITION_PATTERN
+from src.message_search import FTS_TABLE, ensure_fts_index
+
+# Тело -> ссылка на него
+CONTENT_COLUMNS = {"text": "text_ref", "caption": "caption_ref", "file_id": "file_ref"}
+FTS_TRIGGERS = ("messages_fts_insert", "messages_fts_delete", "messages_fts_update")
+
+
+def _sha256(body):
+    return hashlib.sha256(body.encode("utf-8")).digest()
+
+
+def _size_mb(path):
+    return Path(path).stat().st_size / 1024 / 1024
+
+
+def migrate_file(db_path, dry_run=False):
+    """
+    Переносит тела сообщений одного файла в message_contents.
+
+    Args:
+        db_path: Путь к основной базе или к файлу раздела
+        dry_run: Если True, только показывает что будет сделано без изменений
+
+    Returns:
+        True при успехе (или если миграция не требуется)
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.create_function("sha256", 1, _sha256, deterministic=True)
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        if not columns:
+            print(f"   ⏭️  {db_path}: таблицы messages нет")
+            return True
+        if "text_ref" in columns:
+            print(f"   ✅ {db_path}: уже мигрирована")
+            return True
+
+        rows, distinct = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM messages), COUNT(*) FROM ("
+            "SELECT text AS body FROM messages WHERE text IS NOT NULL "
+            "UNION SELECT caption FROM messages WHERE caption IS NOT NULL "
+            "UNION SELECT file_id FROM messages WHERE file_id IS NOT NULL)"
+        ).fetchone()
+        size_before = _size_mb(db_path)
+        print(f"   📊 {db_path}: {rows} сообщений, {distinct} уникальных тел, {size_before:.1f} МБ")
+        if dry_run:
+            print("   🔍 [DRY RUN] Тела будут перенесены в message_contents")
+            return True
+
+        conn.execute("BEGIN IMMEDIATE")
+        for trigger in FTS_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        conn.execute("DROP VIEW IF EXISTS message_log")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS message_contents "
+            "(id INTEGER NOT NULL PRIMARY KEY, hash BLOB NOT NULL UNIQUE, body TEXT NOT NULL)"
+        )
+        for body, reference in CONTENT_COLUMNS.items():
+            conn.execute(
+                f"INSERT OR IGNORE INTO message_contents (hash, body) "
+                f"SELECT sha256({body}), {body} FROM messages WHERE {body} IS NOT NULL"
+            )
+            conn.execute(f"ALTER TABLE messages ADD COLUMN {reference} INTEGER")
+            conn.execute(
+                f"UPDATE messages SET {reference} = "
+                f"(SELECT id FROM message_contents WHERE hash = sha256(messages.{body})) WHERE {body} IS NOT NULL"
+            )
+            conn.execute(f"ALTER TABLE messages DROP COLUMN {body}")
+        conn.execute("COMMIT")
+        conn.execute("VACUUM")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    # Представление и индекс поиска создаются тем же кодом, что и у бота
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        with engine.connect() as sa_conn:
+            ensure_content_schema(sa_conn)
+            ensure_fts_index(sa_conn)
+    finally:
+        engine.dispose()
+
+    print(f"   ✅ {db_path}: {size_before:.1f} МБ -> {_size_mb(db_path):.1f} МБ")
+    return True
+
+
+def migrate_message_contents(db_path, partitions_dir, dry_run=False):
+    """
+    Мигрирует основную базу и все месячные разделы.
+
+    Args:
+        db_path: Путь к базе данных
+        partitions_dir: Каталог месячных разделов
+        dry_run: Если True, только показывает что будет сделано без изменений
+    """
+    if not Path(db_path).exists():
+        print(f"❌ База данных не найдена: {db_path}")
+        return False
+
+    files = [db_path]
+    if Path(partitions_dir).is_dir():
+        files += [str(path) for path in sorted(Path(partitions_dir).iterdir()) if PARTITION_PATTERN.match(path.name)]
+
+    try:
+        print(f"\n📋 Файлов для проверки: {len(files)}")
+        return all(migrate_file(path, dry_run=dry_run) for path in files)
+    except Exception as e:
+        print(f"\n❌ Ошибка при миграции: {e}")
+        import traceback
+
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """Главная функция скрипта."""
+    parser = argparse.ArgumentParser(description="Вынос тел сообщений в message_contents")
+    parser.add_argument("--db", default="data/database.sqlite", help="Путь к БД")
+    parser.add_argument(
+        "--partitions", default=None, help="Каталог месячных разделов (по умолчанию messages рядом с БД)"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, ничего не менять")
+    args = parser.parse_args()
+    partitions_dir = args.partitions or str(Path(args.db).parent / "messages")
+
+    print("=" * 60)
+    print("🔄 МИГРАЦИЯ: ТЕЛА СООБЩЕНИЙ В MESSAGE_CONTENTS")
+    print("=" * 60)
+
+    if args.dry_run:
+        print("\n⚠️  Режим пробного запуска (dry run) - изменения не будут сохранены")
+    else:
+        print("\n💡 Перед запуском остановите бота и сделайте резервную копию БД")
+
+    print(f"\n📁 База данных: {args.db}")
+    print(f"📁 Разделы: {partitions_dir}")
+
+    success = migrate_message_contents(args.db, partitions_dir, dry_run=args.dry_run)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Скрипт миграции: схема журнала сообщений, оптимизированная под запись.
+
+1. direction и message_type хранятся как небольшие целые коды (models.MESSAGE_DIRECTIONS,
+   models.MESSAGE_TYPES) вместо строк. Представление message_log расшифровывает их
+   обратно, так что читатели видят прежние строки.
+2. Убраны дублирующиеся и неиспользуемые индексы: раньше telegram_id, chat_id и
+   created_at индексировались дважды (index=True и Index(...)), плюс отдельные индексы
+   по direction и chat_id. Остаются created_at, (telegram_id, created_at) и индексы
+   ссылок на тела.
+
+Тип колонки SQLite поменять нельзя, поэтому таблица messages пересоздаётся: строки
+копируются с перекодированием, индексы строятся заново после копирования.
+Мигрируются основная база и все месячные разделы. Нужна уже выполненная миграция
+migrate_message_contents.py. Бота на время миграции нужно остановить.
+
+Использование:
+    python3 migrate_message_schema.py [--db data/database.sqlite] [--partitions data/messages] [--dry-run]
+"""
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from src.message_contents import LOG_VIEW, ensure_content_schema
+from src.message_retention import PARTITION_INDEXES, PARTITION_PATTERN
+from src.models import MESSAGE_DIRECTIONS, MESSAGE_TYPES, Message
+
+CODED_TYPE = "SMALLINT"
+
+
+def _encode_sql(column, values, default=None):
+    """SQL-выражение: строка -> код (NULL остаётся NULL, неизвестная строка -> default)."""
+    cases = " ".join(f"WHEN '{value}' THEN {code}" for code, value in enumerate(values))
+    fallback = "NULL" if default is None else str(values.index(default))
+    return f'CASE WHEN "{column}" IS NULL THEN NULL ELSE CASE "{column}" {cases} ELSE {fallback} END END'
+
+
+def _size_mb(path):
+    return Path(path).stat().st_size / 1024 / 1024
+
+
+def _main_schema():
+    """Таблица и индексы основной базы - как в модели Message."""
+    dialect = sqlite_dialect.dialect()
+    table_sql = str(CreateTable(Message.__table__).compile(dialect=dialect))
+    index_sql = [str(CreateIndex(index).compile(dialect=dialect)) for index in Message.__table__.indexes]
+    return table_sql, index_sql
+
+
+def _partition_schema(columns):
+    """Таблица и индексы раздела - как их создаёт message_retention, но с целыми кодами."""
+    columns_sql = ", ".join(
+        f'"{name}" {CODED_TYPE if name in ("direction", "message_type") else column_type}'
+        f"{' PRIMARY KEY' if name == 'id' else ''}"
+        for name, column_type in columns.items()
+    )
+    return f"CREATE TABLE messages ({columns_sql})", [sql.format(schema="main") for sql in PARTITION_INDEXES]
+
+
+def migrate_file(db_path, is_partition, dry_run=False):
+    """
+    Пересоздаёт таблицу messages одного файла с новой схемой.
+
+    Args:
+        db_path: Путь к основной базе или к файлу раздела
+        is_partition: True для месячного раздела
+        dry_run: Если True, только показывает что будет сделано без изменений
+
+    Returns:
+        True при успехе (или если миграция не требуется)
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(messages)")}
+        if not columns:
+            print(f"   ⏭️  {db_path}: таблицы messages нет")
+            return True
+        if "text_ref" not in columns:
+            print(f"   ❌ {db_path}: сначала выполните migrate_message_contents.py")
+            return False
+        if columns.get("direction") == CODED_TYPE:
+            print(f"   ✅ {db_path}: уже мигрирована")
+            return True
+
+        rows = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        placeholders = ", ".join("?" * len(MESSAGE_DIRECTIONS))
+        bad_directions = conn.execute(
+            f"SELECT COUNT(*) FROM messages WHERE direction NOT IN ({placeholders})", MESSAGE_DIRECTIONS
+        ).fetchone()[0]
+        placeholders = ", ".join("?" * len(MESSAGE_TYPES))
+        unknown_types = conn.execute(
+            f"SELECT message_type, COUNT(*) FROM messages WHERE message_type NOT IN ({placeholders}) "
+            "GROUP BY message_type",
+            MESSAGE_TYPES,
+        ).fetchall()
+        indexes = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = 'messages' AND sql IS NOT NULL"
+        ).fetchone()[0]
+        size_before = _size_mb(db_path)
+        print(f"   📊 {db_path}: {rows} сообщений, индексов: {indexes}, {size_before:.1f} МБ")
+        if bad_directions:
+            print(f"   ❌ {db_path}: {bad_directions} сообщений с неизвестным direction")
+            return False
+        for message_type, count in unknown_types:
+            print(f"   ⚠️  Тип {message_type!r} ({count} сообщений) будет сохранён как 'other'")
+        if dry_run:
+            print("   🔍 [DRY RUN] Таблица messages будет пересоздана")
+            return True
+
+        table_sql, index_sql = _partition_schema(columns) if is_partition else _main_schema()
+        encoded = {
+            "direction": _encode_sql("direction", MESSAGE_DIRECTIONS),
+            "message_type": _encode_sql("message_type", MESSAGE_TYPES, default="other"),
+        }
+        names_sql = ", ".join(f'"{name}"' for name in columns)
+        sources_sql = ", ".join(encoded.get(name, f'"{name}"') for name in columns)
+        conn.execute("BEGIN IMMEDIATE")
+        # Представление ссылается на messages и мешает переименованию
+        conn.execute(f"DROP VIEW IF EXISTS {LOG_VIEW}")
+        conn.execute("ALTER TABLE messages RENAME TO messages_old")
+        conn.execute(table_sql)
+        conn.execute(f"INSERT INTO messages ({names_sql}) SELECT {sources_sql} FROM messages_old")
+        # Вместе со старой таблицей удаляются и все её индексы; новые строятся по готовым данным
+        conn.execute("DROP TABLE messages_old")
+        for statement in index_sql:
+            conn.execute(statement)
+        conn.execute("COMMIT")
+        conn.execute("VACUUM")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    # Представление (с расшифровкой кодов) и индексы ссылок создаются тем же кодом, что и у бота
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        with engine.connect() as sa_conn:
+            ensure_content_schema(sa_conn)
+    finally:
+        engine.dispose()
+
+    print(f"   ✅ {db_path}: {size_before:.1f} МБ -> {_size_mb(db_path):.1f} МБ")
+    return True
+
+
+def migrate_message_schema(db_path, partitions_dir, dry_run=False):
+    """
+    Мигрирует основную базу и все месячные разделы.
+
+    Args:
+        db_path: Путь к базе данных
+        partitions_dir: Каталог месячных разделов
+        dry_run: Если True, только показывает что будет сделано без изменений
+    """
+    if not Path(db_path).exists():
+        print(f"❌ База данных не найдена: {db_path}")
+        return False
+
+    partitions = []
+    if Path(partitions_dir).is_dir():
+        partitions = [
+            str(path) for path in sorted(Path(partitions_dir).iterdir()) if PARTITION_PATTERN.match(path.name)
+        ]
+
+    try:
+        print(f"\n📋 Файлов для проверки: {1 + len(partitions)}")
+        success = migrate_file(db_path, is_partition=False, dry_run=dry_run)
+        return all([success, *(migrate_file(path, is_partition=True, dry_run=dry_run) for path in partitions)])
+    except Exception as e:
+        print(f"\n❌ Ошибка при миграции: {e}")
+        import traceback
+
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """Главная функция скрипта."""
+    parser = argparse.ArgumentParser(description="Схема журнала сообщений: целые коды и индексы без дублей")
+    parser.add_argument("--db", default="data/database.sqlite", help="Путь к БД")
+    parser.add_argument(
+        "--partitions", default=None, help="Каталог месячных разделов (по умолчанию messages рядом с БД)"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, ничего не менять")
+    args = parser.parse_args()
+    partitions_dir = args.partitions or str(Path(args.db).parent / "messages")
+
+    print("=" * 60)
+    print("🔄 МИГРАЦИЯ: СХЕМА ЖУРНАЛА СООБЩЕНИЙ")
+    print("=" * 60)
+
+    if args.dry_run:
+        print("\n⚠️  Режим пробного запуска (dry run) - изменения не будут сохранены")
+    else:
+        print("\n💡 Перед запуском остановите бота и сделайте резервную копию БД")
+
+    print(f"\n📁 База данных: {args.db}")
+    print(f"📁 Разделы: {partitions_dir}")
+
+    success = migrate_message_schema(args.db, partitions_dir, dry_run=args.dry_run)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Скрипт миграции ответов с множественным выбором в битовые маски.
+
+Раньше выбранные варианты хранились в TEXT-колонке строкой "вариант1, вариант2".
+Теперь поле с multi_select=True хранится в колонке INTEGER: бит i установлен,
+если выбран i-й вариант из options. Скрипт пересоздаёт такие колонки с типом
+INTEGER, переводит значения в маски и добавляет индекс для выборок по варианту.
+
+Использование:
+    python3 migrate_multi_select_bitmask.py [--dry-run]
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+from src.registration_config import RegistrationSurveyConfig
+from src.survey.multi_select import multi_select_fields, to_mask
+
+
+def convert_column(cursor, field_name, options):
+    """
+    Переводит значения колонки в маски.
+
+    Returns:
+        tuple: (список (id, маска), список ошибок)
+    """
+    converted = []
+    errors = []
+    cursor.execute(f'SELECT id, "{field_name}" FROM users')
+    for user_id, value in cursor.fetchall():
+        try:
+            converted.append((user_id, to_mask(options, value) if value is not None else None))
+        except ValueError as e:
+            errors.append(f"id={user_id}: {e}")
+    return converted, errors
+
+
+def migrate_multi_select_bitmask(db_path, dry_run=False):
+    """
+    Переводит все поля с множественным выбором в битовые маски.
+
+    Args:
+        db_path: Путь к базе данных
+        dry_run: Если True, только показывает что будет сделано без изменений
+    """
+    if not Path(db_path).exists():
+        print(f"❌ База данных не найдена: {db_path}")
+        return False
+
+    fields = multi_select_fields(RegistrationSurveyConfig().fields)
+    if not fields:
+        print("⚠️  В конфигурации опроса нет полей с множественным выбором")
+        print("   Миграция не требуется")
+        return True
+
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("PRAGMA table_info(users)")
+        column_types = {column[1]: column[2].upper() for column in cursor.fetchall()}
+
+        migrated = 0
+        for field_name, options in fields.items():
+            if field_name not in column_types:
+                print(f"⚠️  Колонки '{field_name}' нет в таблице users, она будет создана ботом")
+                continue
+            if column_types[field_name] == "INTEGER":
+                print(f"✅ Колонка '{field_name}' уже хранит маски")
+                continue
+
+            converted, errors = convert_column(cursor, field_name, options)
+            print(f"\n📊 Поле '{field_name}': {len(converted)} значений, {len(errors)} ошибок")
+            if errors:
+                for error in errors:
+                    print(f"   ❌ {error}")
+                print("   Исправьте значения вручную и запустите миграцию снова")
+                conn.close()
+                return False
+
+            if dry_run:
+                print(f"🔍 [DRY RUN] Колонка '{field_name}' будет пересоздана с типом INTEGER")
+                continue
+
+            # SQLite не умеет менять тип колонки - создаём новую и переименовываем
+            tmp_name = f"{field_name}__mask"
+            cursor.execute(f'ALTER TABLE users ADD COLUMN "{tmp_name}" INTEGER')
+            cursor.executemany(f'UPDATE users SET "{tmp_name}" = ? WHERE id = ?', [(m, i) for i, m in converted])
+            cursor.execute(f'ALTER TABLE users DROP COLUMN "{field_name}"')
+            cursor.execute(f'ALTER TABLE users RENAME COLUMN "{tmp_name}" TO "{field_name}"')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "idx_user_{field_name}_mask" ON users ("{field_name}", telegram_id)'
+            )
+            migrated += 1
+            print(f"✅ Колонка '{field_name}' переведена в маски")
+
+        if not dry_run:
+            conn.commit()
+            print("\n💾 Изменения сохранены в базу данных")
+        conn.close()
+
+        print("\n" + "=" * 60)
+        print("📊 ИТОГИ МИГРАЦИИ:")
+        print(f"   Полей с множественным выбором: {len(fields)}")
+        print(f"   Переведено в маски: {migrated}")
+        print("=" * 60)
+
+        if dry_run:
+            print("\n⚠️  Это был пробный запуск (dry run).")
+            print("   Для реальной миграции запустите без параметра --dry-run")
+        else:
+            print("\n✅ Миграция завершена успешно!")
+        return True
+
+    except Exception as e:
+        print(f"\n❌ Ошибка при миграции: {e}")
+        import traceback
+
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """Главная функция скрипта."""
+    print("=" * 60)
+    print("🔄 МИГРАЦИЯ: МНОЖЕСТВЕННЫЙ ВЫБОР -> БИТОВЫЕ МАСКИ")
+    print("=" * 60)
+
+    db_path = "data/database.sqlite"
+    dry_run = "--dry-run" in sys.argv
+
+    if dry_run:
+        print("\n⚠️  Режим пробного запуска (dry run) - изменения не будут сохранены")
+
+    print(f"\n📁 База данных: {db_path}")
+
+    success = migrate_multi_select_bitmask(db_path, dry_run=dry_run)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,6 @@
     python3 migrate_users.py
 """
 
-import re
 import sqlite3
 import sys
 from datetime import datetime, UTC
@@ -44,25 +43,14 @@ def parse_timestamp(timestamp_str):
     return datetime.now(UTC)
 
 
-def format_phone_db(value: str) -> str:
-    """
-    Форматирует телефон для сохранения в БД.
-    Удаляет все символы кроме цифр и заменяет 8 на 7 в начале.
+def migrate_users(old_db_path, new_db_path, dry_run=False):
     """
-    # Удаляем все символы кроме цифр
-    phone = re.sub(r"\D", "", str(value))
-    
-    # Заменяем 8 на 7 в начале
-    if phone.startswith("8"):
-        phone = "7" + phone[1:]
-    
-    return phone
+    Мигрирует пользователей из старой базы данных в новую.
 
+    Записи пишутся через UserStorage.bulk_upsert: форматтеры полей
+    (телефон, дата, группа) берутся из конфигурации опроса, вставка идёт
+    пачками через executemany с коммитом на каждую пачку.
 
-def migrate_users(old_db_path, new_db_path, dry_run=False):
-    """
-    Мигрирует пользователей из старой БД в новую.
-    
     Args:
         old_db_path: Путь к старой БД (users.db)
         new_db_path: Путь к новой БД (database.sqlite)
@@ -79,17 +67,17 @@ def migrate_users(old_db_path, new_db_path, dry_run=False):
         return False
     
     try:
-        # Подключаемся к обеим БД
+        from src.user_storage import UserStorage
+
+        storage = UserStorage(new_db_path)
+
+        # Получаем всех пользователей из старой БД
         old_conn = sqlite3.connect(old_db_path)
         old_conn.row_factory = sqlite3.Row
-        old_cursor = old_conn.cursor()
-        
-        new_conn = sqlite3.connect(new_db_path)
-        new_cursor = new_conn.cursor()
-        
-        # Получаем всех пользователей из старой БД
-        old_cursor.execute("SELECT * FROM users")
-        old_users = old_cursor.fetchall()
+        try:
+            old_users = old_conn.execute("SELECT * FROM users").fetchall()
+        finally:
+            old_conn.close()
         
         print(f"\n📊 Найдено пользователей в старой БД: {len(old_users)}")
         
@@ -98,14 +86,12 @@ def migrate_users(old_db_path, new_db_path, dry_run=False):
             return True
         
         # Проверяем, какие пользователи уже есть в новой БД
-        new_cursor.execute("SELECT telegram_id FROM users")
-        existing_telegram_ids = {row[0] for row in new_cursor.fetchall()}
+        existing_telegram_ids = set(storage.get_all_users())
         
         print(f"📊 Пользователей уже в новой БД: {len(existing_telegram_ids)}")
         
-        migrated_count = 0
+        records = []
         skipped_count = 0
-        error_count = 0
         
         for old_user in old_users:
             telegram_id = old_user['user_id']
@@ -116,70 +102,36 @@ def migrate_users(old_db_path, new_db_path, dry_run=False):
                 skipped_count += 1
                 continue
             
-            try:
-                # Парсим timestamp
-                created_at = parse_timestamp(old_user['timestamp'])
-                
-                # Подготавливаем данные для вставки
-                new_user_data = {
-                    'telegram_id': telegram_id,
-                    'state': 'registered',  # Все старые пользователи считаются зарегистрированными
-                    'is_blocked': 0,
-                    'created_at': created_at,
-                    'updated_at': created_at,
-                    'username': old_user['username'],
-                    'telegram_sername': None,  # Новое поле, оставляем пустым
-                    'name': old_user['full_name'],
-                    'birth_date': old_user['birth_date'],
-                    'group': old_user['study_group'],
-                    'phone': format_phone_db(old_user['phone_number']),
-                    'expectations': old_user['expectations'],
-                }
-                
-                if dry_run:
-                    print(f"\n🔍 [DRY RUN] Будет мигрирован пользователь {telegram_id}:")
-                    print(f"   Username: {new_user_data['username']}")
-                    print(f"   Full name: {new_user_data['telegram_sername']}")
-                    print(f"   Birth date: {new_user_data['birth_date']}")
-                    print(f"   Group: {new_user_data['group']}")
-                    print(f"   Phone: {new_user_data['phone']}")
-                else:
-                    # Вставляем пользователя в новую БД
-                    new_cursor.execute("""
-                        INSERT INTO users (
-                            telegram_id, state, is_blocked, created_at, updated_at,
-                            username, telegram_sername, name, birth_date, "group", phone, expectations
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        new_user_data['telegram_id'],
-                        new_user_data['state'],
-                        new_user_data['is_blocked'],
-                        new_user_data['created_at'],
-                        new_user_data['updated_at'],
-                        new_user_data['username'],
-                        new_user_data['telegram_sername'],
-                        new_user_data['name'],
-                        new_user_data['birth_date'],
-                        new_user_data['group'],
-                        new_user_data['phone'],
-                        new_user_data['expectations'],
-                    ))
-                    
-                    print(f"✅ Мигрирован пользователь {telegram_id} (@{new_user_data['username']})")
-                
-                migrated_count += 1
-                
-            except Exception as e:
-                print(f"❌ Ошибка при миграции пользователя {telegram_id}: {e}")
-                error_count += 1
-                continue
-        
-        if not dry_run:
-            new_conn.commit()
+            created_at = parse_timestamp(old_user['timestamp'])
+            records.append({
+                'telegram_id': telegram_id,
+                'state': 'registered',  # Все старые пользователи считаются зарегистрированными
+                'created_at': created_at,
+                'updated_at': created_at,
+                'username': old_user['username'],
+                'name': old_user['full_name'],
+                'birth_date': old_user['birth_date'],
+                'group': old_user['study_group'],
+                'phone': old_user['phone_number'],
+                'expectations': old_user['expectations'],
+            })
         
-        # Закрываем соединения
-        old_conn.close()
-        new_conn.close()
+        if dry_run:
+            for record in records:
+                print(f"\n🔍 [DRY RUN] Будет мигрирован пользователь {record['telegram_id']}:")
+                print(f"   Username: {record['username']}")
+                print(f"   Name: {record['name']}")
+                print(f"   Birth date: {record['birth_date']}")
+                print(f"   Group: {record['group']}")
+                print(f"   Phone: {record['phone']}")
+            migrated_count = len(records)
+            errors = []
+        else:
+            result = storage.bulk_upsert(records)
+            migrated_count = result.upserted
+            errors = result.errors
+            for error in errors:
+                print(f"❌ Ошибка при миграции пользователя {error.telegram_id}: {error.error}")
         
         # Выводим итоги
         print("\n" + "="*60)
@@ -187,7 +139,7 @@ def migrate_users(old_db_path, new_db_path, dry_run=False):
         print(f"   Всего пользователей в старой БД: {len(old_users)}")
         print(f"   Мигрировано: {migrated_count}")
         print(f"   Пропущено (уже существуют): {skipped_count}")
-        print(f"   Ошибок: {error_count}")
+        print(f"   Ошибок: {len(errors)}")
         print("="*60)
         
         if dry_run:
@@ -196,7 +148,7 @@ def migrate_users(old_db_path, new_db_path, dry_run=False):
         else:
             print("\n✅ Миграция завершена успешно!")
         
-        return error_count == 0
+        return len(errors) == 0
         
     except Exception as e:
         print(f"\n❌ Критическая ошибка при миграции: {e}")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Скрипт смены сезона: переносит данные завершённого сезона в архив.
+
+Что делает:
+- копирует пользователей, не обновлявшихся с даты отсечки, в архивную БД
+  (data/archive.sqlite) с пометкой сезона;
+- зарегистрированных и не заблокировавших бота оставляет в рабочей таблице
+  со сброшенными сезонными ответами и will_drive = "Жду ответа по этому году ❗";
+- остальных удаляет из рабочей таблицы;
+- переносит сообщения старше даты отсечки в архив, из рабочей таблицы и из месячных
+  файлов data/messages/messages-ГГГГ-ММ.sqlite; опустевшие месячные файлы удаляет.
+
+Перенос идёт пачками, каждая пачка - отдельная транзакция, поэтому бота можно
+не останавливать. Архив остаётся доступным для выгрузок (src/utils.get_archive_table).
+Если перенос прервался (ошибка, остановка), запустите скрипт ещё раз с тем же
+--season и --cutoff: он продолжит с места остановки.
+
+Использование:
+    python3 rollover_season.py --season 2025 [--cutoff 2025-11-03] [--batch-size 500] [--dry-run]
+"""
+
+import argparse
+import sys
+from datetime import UTC, datetime
+
+
+def main():
+    """Главная функция скрипта."""
+    parser = argparse.ArgumentParser(description="Перенос завершённого сезона в архив")
+    parser.add_argument("--season", required=True, help="Метка сезона, например 2025")
+    parser.add_argument("--cutoff", help="Дата отсечки ГГГГ-ММ-ДД (по умолчанию - сейчас)")
+    parser.add_argument("--db", default="data/database.sqlite", help="Путь к рабочей БД")
+    parser.add_argument("--archive", default="data/archive.sqlite", help="Путь к архивной БД")
+    parser.add_argument("--batch-size", type=int, default=500, help="Строк в одной транзакции")
+    parser.add_argument("--dry-run", action="store_true", help="Только посчитать, ничего не менять")
+    args = parser.parse_args()
+
+    cutoff = datetime.strptime(args.cutoff, "%Y-%m-%d").replace(tzinfo=UTC) if args.cutoff else None
+
+    print("=" * 60)
+    print(f"🗄️  СМЕНА СЕЗОНА: {args.season}")
+    print("=" * 60)
+
+    if args.dry_run:
+        print("\n⚠️  Режим пробного запуска (dry run) - изменения не будут сохранены")
+    else:
+        print("\n💡 Перед запуском рекомендуется сделать резервную копию БД")
+
+    from src.database import Database
+    from src.season_archive import SeasonArchiver
+
+    archiver = SeasonArchiver(Database(args.db), archive_path=args.archive)
+
+    try:
+        stats = archiver.rollover(args.season, cutoff=cutoff, batch_size=args.batch_size, dry_run=args.dry_run)
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print("📊 ИТОГИ:")
+    print(f"   Пользователей в архиве: {stats.archived_users}")
+    print(f"   Перенесено в новый сезон: {stats.carried_forward}")
+    print(f"   Удалено из рабочей таблицы: {stats.removed_users}")
+    print(f"   Сообщений в архиве: {stats.archived_messages}")
+    print(f"   Удалено сохранённых состояний: {stats.dropped_persistence}")
+    print("=" * 60)
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -84,7 +84,7 @@ if [ $? -eq 0 ]; then
     echo "Резервные копии будут создаваться каждый час и сохраняться в директорию:"
     echo "$SCRIPT_DIR/dumps"
     echo ""
-    echo "Старые резервные копии (старше 7 дней) будут автоматически удаляться."
+    echo "Старые резервные копии прореживаются: по одной за час (24), день (7) и неделю (4)."
 else
     echo -e "${RED}❌ Ошибка при добавлении задачи cron${NC}"
     exit 1
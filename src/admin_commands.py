@@ -3,13 +3,21 @@ Admin commands for managing users and permissions.
 Only accessible to root and users with ADMIN permission.
 """
 
+import asyncio
 import logging
+import os
+from datetime import UTC, datetime, timedelta
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from .cache import cache_stats
 from .chat_tracker import chat_tracker
+from .message_log_writer import message_log_writer
+from .message_search import message_search
 from .permissions import Permission, permission_manager
+from .query_metrics import query_metrics
+from .transcript_export import TranscriptFormat, export_transcript
 from .user_storage import user_storage
 
 logger = logging.getLogger(__name__)
@@ -37,6 +45,9 @@ class AdminCommands:
         /sync_staff_chat - Sync all staff chat members
         /sync_counselor_chat - Sync all counselor chat members
         /my_permissions - Show your own permissions
+        /stats - Show cache hit rates, query and message log statistics
+        /search_messages <phrase> [user=<id>] [from=<date>] [to=<date>] - Full-text search in the message log
+        /export_messages [user_id] [text|html|jsonl] - Export a transcript of the message log
         """
         user_id = update.effective_user.id
 
@@ -64,6 +75,9 @@ class AdminCommands:
             "/sync_staff_chat": self._sync_staff_chat,
             "/sync_counselor_chat": self._sync_counselor_chat,
             "/my_permissions": self._my_permissions,
+            "/stats": self._stats,
+            "/search_messages": self._search_messages,
+            "/export_messages": self._export_messages,
         }
 
         handler = handlers.get(command)
@@ -376,6 +390,125 @@ class AdminCommands:
 
         await update.message.reply_text(message)
 
+    async def _stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show cache hit rates, SQL query and message log statistics."""
+        message = "📊 Кэши:\n"
+        stats = cache_stats()
+        if not stats:
+            message += "Кэши ещё не использовались\n"
+        for cache in stats:
+            message += (
+                f"• {cache.name}: {cache.hit_rate:.0%} попаданий "
+                f"({cache.hits}/{cache.hits + cache.misses}), "
+                f"размер {cache.size}/{cache.maxsize}, вытеснено {cache.evictions}\n"
+            )
+
+        queries = query_metrics.snapshot()
+        message += f"\n🗄 Запросы к БД: {queries['total_queries']} (медленных: {queries['slow_queries']})\n"
+        handlers = sorted(queries["handlers"].items(), key=lambda item: item[1].queries, reverse=True)
+        for name, handler_stats in handlers[:10]:
+            average = handler_stats.queries / handler_stats.updates if handler_stats.updates else 0
+            message += f"• {name}: {average:.1f} запросов/апдейт (макс. {handler_stats.max_queries})\n"
+
+        log = message_log_writer.stats
+        message += (
+            f"\n📝 Журнал сообщений: записано {log.written} за {log.batches} пачек "
+            f"(синхронно {log.sync_writes}), в очереди {log.queue_depth} (макс. {log.max_queue_depth}), "
+            f"отброшено {log.dropped}, ошибок {log.failed}\n"
+        )
+
+        await update.message.reply_text(message)
+
+    async def _search_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Full-text search in the message log, newest first, one page per command."""
+        words = []
+        filters = {}
+        for arg in context.args or []:
+            key, sep, value = arg.partition("=")
+            if sep and key in ("user", "from", "to", "before"):
+                filters[key] = value
+            else:
+                words.append(arg)
+
+        if not words:
+            await update.message.reply_text(
+                "❌ Использование: /search_messages <фраза> [user=<user_id>] [from=ГГГГ-ММ-ДД] [to=ГГГГ-ММ-ДД]"
+            )
+            return
+
+        try:
+            telegram_id = int(filters["user"]) if "user" in filters else None
+            before = int(filters["before"]) if "before" in filters else None
+            since = datetime.strptime(filters["from"], "%Y-%m-%d").replace(tzinfo=UTC) if "from" in filters else None
+            # Дата "to" включается целиком
+            until = (
+                datetime.strptime(filters["to"], "%Y-%m-%d").replace(tzinfo=UTC) + timedelta(days=1)
+                if "to" in filters
+                else None
+            )
+        except ValueError:
+            await update.message.reply_text("❌ Неверный формат user_id или даты (нужно ГГГГ-ММ-ДД)")
+            return
+
+        try:
+            # Сообщения, ещё ждущие в очереди журнала, тоже должны находиться
+            await message_log_writer.flush()
+            page = message_search.search(
+                " ".join(words), telegram_id=telegram_id, since=since, until=until, before=before
+            )
+        except Exception as e:
+            logger.error(f"Error searching messages: {e}")
+            await update.message.reply_text(f"❌ Ошибка поиска: {e}")
+            return
+
+        if not page.hits:
+            await update.message.reply_text("🔍 Ничего не найдено" if before is None else "🔍 Больше результатов нет")
+            return
+
+        message = f"🔍 Найдено по запросу «{' '.join(words)}»:\n\n"
+        for hit in page.hits:
+            arrow = "⬅️" if hit.direction == "incoming" else "➡️"
+            message += f"{arrow} {hit.created_at:%Y-%m-%d %H:%M} · {hit.telegram_id}\n{hit.snippet}\n\n"
+
+        if page.next_before is not None:
+            args = [*words, *(f"{key}={value}" for key, value in filters.items() if key != "before")]
+            message += f"Ещё: /search_messages {' '.join(args)} before={page.next_before}"
+
+        await update.message.reply_text(message)
+
+    async def _export_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Send a transcript of one user's conversation (or of the whole log) as a file."""
+        telegram_id = None
+        fmt = TranscriptFormat.TEXT
+        try:
+            for arg in context.args or []:
+                if arg.isdigit():
+                    telegram_id = int(arg)
+                else:
+                    fmt = TranscriptFormat(arg.lower())
+        except ValueError:
+            await update.message.reply_text(
+                "❌ Использование: /export_messages [user_id] [text|html|jsonl]\n"
+                "Без user_id выгружается переписка со всеми пользователями"
+            )
+            return
+
+        try:
+            await message_log_writer.flush()
+            # Выгрузка длинная - не блокируем event loop
+            file_path = await asyncio.to_thread(export_transcript, fmt, telegram_id)
+        except Exception as e:
+            logger.error(f"Error exporting messages: {e}")
+            await update.message.reply_text(f"❌ Ошибка выгрузки: {e}")
+            return
+
+        try:
+            with open(file_path, "rb") as document:
+                await context.bot.send_document(chat_id=update.effective_chat.id, document=document)
+        finally:
+            # Переписка - персональные данные, на диске её не оставляем
+            os.remove(file_path)
+
     async def _show_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show help for admin commands."""
         help_text = """
@@ -388,6 +521,11 @@ class AdminCommands:
 /list_users <permission> - Показать пользователей с правом
 /my_permissions - Показать ваши права
 
+📊 Диагностика:
+/stats - Попадания в кэши, статистика запросов к БД и журнала сообщений
+/search_messages <фраза> [user=<user_id>] [from=ГГГГ-ММ-ДД] [to=ГГГГ-ММ-ДД] - Поиск по переписке
+/export_messages [user_id] [text|html|jsonl] - Выгрузить переписку файлом
+
 💬 Управление чатами (только ROOT):
 /register_staff_chat - Зарегистрировать чат организаторов
 /register_counselor_chat - Зарегистрировать чат вожатых
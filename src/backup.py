@@ -0,0 +1,367 @@
+"""
+Online database backups with the SQLite backup API.
+
+A backup is taken page by page from a read-only connection, sleeping between steps so
+the bot's writers are never blocked for long. The copy is checked with
+PRAGMA integrity_check, stream-compressed (zstd if the zstandard package is installed,
+gzip otherwise) and old backups are thinned by an hourly/daily/weekly retention policy.
+
+Messages moved out of the main database live in other files: the monthly partitions
+of the message log and the season archive. Each backup copies them the same way, as
+companion files dump_<timestamp>.<name>.sqlite.* next to the main one; retention
+keeps or deletes them together with it, and restore_all puts the whole set back in place.
+
+The bot runs DatabaseBackup.create_backup from the JobQueue (see main.py), and the
+module can also be run once from cron: python -m src.backup
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import IO
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = "dump_"
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+COMPRESSED_SUFFIXES = {"gzip": ".sqlite.gz", "zstd": ".sqlite.zst"}
+COPY_CHUNK_SIZE = 1024 * 1024
+# Monthly partition files of the message log (see message_retention.PARTITION_PATTERN)
+PARTITION_GLOB = "messages-*.sqlite"
+ARCHIVE_NAME = "archive"
+
+# Интервал фоновых бэкапов в минутах (0 - отключить)
+BACKUP_INTERVAL_MINUTES = int(os.getenv("BACKUP_INTERVAL_MINUTES", "60"))
+
+
+class BackupError(Exception):
+    """Backup could not be created or did not pass the integrity check."""
+
+
+class _BackupRestartedError(Exception):
+    """Stepped backup kept restarting because of concurrent writes."""
+
+
+@dataclass
+class RetentionPolicy:
+    """How many backups to keep: newest one per hour, per day and per ISO week."""
+
+    hourly: int = 24
+    daily: int = 7
+    weekly: int = 4
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            hourly=int(os.getenv("BACKUP_KEEP_HOURLY", cls.hourly)),
+            daily=int(os.getenv("BACKUP_KEEP_DAILY", cls.daily)),
+            weekly=int(os.getenv("BACKUP_KEEP_WEEKLY", cls.weekly)),
+        )
+
+    def select(self, timestamps: Iterable[datetime]) -> set[datetime]:
+        """
+        Choose the backups to keep.
+
+        For each granularity the newest backup of each of the last N buckets is kept
+        (hour, day, ISO week). The newest backup overall is always kept.
+        """
+        ordered = sorted(set(timestamps), reverse=True)
+        keep = set(ordered[:1])
+        buckets = (
+            (self.hourly, lambda ts: (ts.date(), ts.hour)),
+            (self.daily, lambda ts: ts.date()),
+            (self.weekly, lambda ts: ts.isocalendar()[:2]),
+        )
+        for limit, bucket_of in buckets:
+            seen = set()
+            for ts in ordered:
+                if len(seen) >= limit:
+                    break
+                bucket = bucket_of(ts)
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(ts)
+        return keep
+
+
+class DatabaseBackup:
+    """Creates compressed, verified backups of the SQLite database and applies retention."""
+
+    def __init__(
+        self,
+        db_path: str = "data/database.sqlite",
+        backup_dir: str | None = None,
+        retention: RetentionPolicy | None = None,
+        compression: str | None = None,
+        pages_per_step: int = 256,
+        step_sleep: float = 0.005,
+        max_restarts: int = 3,
+        partition_dir: str | None = None,
+        archive_path: str | None = None,
+    ) -> None:
+        """
+        Args:
+            db_path: Path to the database file
+            backup_dir: Directory for backups (BACKUP_DIR, default "dumps")
+            retention: Retention policy (BACKUP_KEEP_HOURLY/DAILY/WEEKLY)
+            compression: "zstd" or "gzip". Defaults to zstd when zstandard is installed.
+            pages_per_step: Pages copied per backup step; the source is only locked during a step
+            step_sleep: Pause between steps (seconds) to let writers through
+            max_restarts: Restarts caused by concurrent writes before copying in one step
+            partition_dir: Directory of the message log partitions (MESSAGE_PARTITION_DIR,
+                default "messages" next to the database file)
+            archive_path: Season archive file (default archive.sqlite next to the database file)
+        """
+        if compression is None:
+            compression = "zstd" if zstandard is not None else "gzip"
+        if compression not in COMPRESSED_SUFFIXES:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+
+        self.db_path = db_path
+        self.backup_dir = Path(backup_dir or os.getenv("BACKUP_DIR", "dumps"))
+        self.retention = retention or RetentionPolicy.from_env()
+        self.compression = compression
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.max_restarts = max_restarts
+        data_dir = os.path.dirname(db_path) or "data"
+        self.partition_dir = Path(
+            partition_dir or os.getenv("MESSAGE_PARTITION_DIR") or os.path.join(data_dir, "messages")
+        )
+        self.archive_path = Path(archive_path or os.path.join(data_dir, f"{ARCHIVE_NAME}.sqlite"))
+
+    def create_backup(self, now: datetime | None = None) -> Path:
+        """
+        Take a verified, compressed backup of the database and its companion files, then
+        thin out old ones.
+
+        Returns:
+            Path to the new backup file of the main database
+
+        Raises:
+            FileNotFoundError: If the database file does not exist
+            BackupError: If the copy fails the integrity check
+        """
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f"Database not found: {self.db_path}")
+
+        now = now or datetime.now()
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{BACKUP_PREFIX}{now.strftime(TIMESTAMP_FORMAT)}"
+        target = self.backup_dir / f"{name}{self.suffix}"
+
+        started = time.perf_counter()
+        self._backup_file(self.db_path, target)
+        companions = self.companion_sources()
+        for label, source in companions.items():
+            self._backup_file(str(source), self.backup_dir / f"{name}.{label}{self.suffix}")
+
+        logger.info(
+            f"Backup created: {target} ({target.stat().st_size / 1024:.1f} KiB, {len(companions)} companion files, "
+            f"{time.perf_counter() - started:.2f} s)"
+        )
+        self.apply_retention()
+        return target
+
+    def companion_sources(self) -> dict[str, Path]:
+        """Partition files and the season archive that exist now, keyed by their backup label."""
+        sources = {}
+        if self.partition_dir.is_dir():
+            for path in sorted(self.partition_dir.glob(PARTITION_GLOB)):
+                sources[path.stem] = path
+        if self.archive_path.exists():
+            sources[ARCHIVE_NAME] = self.archive_path
+        return sources
+
+    def companions(self, backup_path: str | Path) -> dict[str, Path]:
+        """Companion files taken together with a backup of the main database, keyed by label."""
+        backup_path = Path(backup_path)
+        timestamp = self._parse_timestamp(backup_path.name)
+        if timestamp is None:
+            return {}
+        prefix = f"{BACKUP_PREFIX}{timestamp.strftime(TIMESTAMP_FORMAT)}."
+        companions = {}
+        for path in backup_path.parent.glob(f"{prefix}*"):
+            for suffix in COMPRESSED_SUFFIXES.values():
+                label = path.name[len(prefix) : -len(suffix)]
+                if path.name.endswith(suffix) and label and "." not in label:
+                    companions[label] = path
+        return companions
+
+    @property
+    def suffix(self) -> str:
+        return COMPRESSED_SUFFIXES[self.compression]
+
+    def list_backups(self) -> dict[datetime, Path]:
+        """Return existing backups (of any compression) keyed by their timestamp."""
+        backups = {}
+        if not self.backup_dir.exists():
+            return backups
+        for path in self.backup_dir.iterdir():
+            timestamp = self._parse_timestamp(path.name)
+            if timestamp is not None:
+                backups[timestamp] = path
+        return backups
+
+    def apply_retention(self) -> list[Path]:
+        """Delete backups not selected by the retention policy. Returns deleted paths."""
+        backups = self.list_backups()
+        keep = self.retention.select(backups)
+        removed = []
+        for timestamp, path in sorted(backups.items()):
+            if timestamp not in keep:
+                for companion in self.companions(path).values():
+                    companion.unlink()
+                    removed.append(companion)
+                path.unlink()
+                removed.append(path)
+        if removed:
+            logger.info(f"Retention removed {len(removed)} old backups, {len(keep)} kept")
+        return removed
+
+    def restore(self, backup_path: str | Path, target_path: str) -> None:
+        """Decompress a backup into target_path (the bot must be stopped)."""
+        with self._open_compressed(Path(backup_path), "rb") as src, open(target_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        self._check_integrity(target_path)
+
+    def restore_all(self, backup_path: str | Path) -> list[Path]:
+        """
+        Restore a backup with its partitions and season archive over db_path, partition_dir
+        and archive_path (the bot must be stopped).
+
+        Returns:
+            Paths of the restored files
+        """
+        restored = [Path(self.db_path)]
+        self.restore(backup_path, self.db_path)
+        for label, companion in sorted(self.companions(backup_path).items()):
+            if label == ARCHIVE_NAME:
+                target = self.archive_path
+            else:
+                target = self.partition_dir / f"{label}.sqlite"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            self.restore(companion, str(target))
+            restored.append(target)
+        return restored
+
+    def _backup_file(self, source: str, target: Path) -> None:
+        """Copy one database file online, check it and compress it to target."""
+        fd, raw_path = tempfile.mkstemp(prefix=".backup_", suffix=".sqlite", dir=self.backup_dir)
+        os.close(fd)
+        try:
+            self._copy_online(source, raw_path)
+            self._check_integrity(raw_path)
+            self._compress(raw_path, target)
+        finally:
+            os.unlink(raw_path)
+
+    def _copy_online(self, source_path: str, raw_path: str) -> None:
+        """
+        Copy the database page by page.
+
+        SQLite restarts a stepped backup whenever another connection writes to the source,
+        so under steady write load it might never finish. After max_restarts restarts we
+        copy the rest in a single step: in WAL mode that only holds a read snapshot and
+        still does not block writers.
+        """
+        restarts = 0
+        last_remaining = None
+
+        def pause(status: int, remaining: int, total: int) -> None:
+            nonlocal restarts, last_remaining
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                if restarts > self.max_restarts:
+                    raise _BackupRestartedError
+            last_remaining = remaining
+            if remaining:
+                time.sleep(self.step_sleep)
+
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+        destination = sqlite3.connect(raw_path)
+        try:
+            try:
+                source.backup(destination, pages=self.pages_per_step, progress=pause)
+            except _BackupRestartedError:
+                logger.info(f"Backup restarted {restarts} times due to concurrent writes, copying in one step")
+                source.backup(destination, pages=-1)
+            # The copy inherits WAL mode from the source; a standalone backup should be a single file
+            destination.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            destination.close()
+            source.close()
+
+    @staticmethod
+    def _check_integrity(path: str) -> None:
+        conn = sqlite3.connect(path)
+        try:
+            result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        finally:
+            conn.close()
+        if result != ["ok"]:
+            raise BackupError(f"Integrity check failed for {path}: {'; '.join(result[:5])}")
+
+    def _compress(self, raw_path: str, target: Path) -> None:
+        partial = target.with_name(target.name + ".part")
+        try:
+            with open(raw_path, "rb") as src, self._open_compressed(partial, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+            os.replace(partial, target)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+
+    def _open_compressed(self, path: Path, mode: str) -> IO[bytes]:
+        compression = "zstd" if path.name.removesuffix(".part").endswith(".zst") else "gzip"
+        if compression == "gzip":
+            return gzip.open(path, mode)
+        if zstandard is None:
+            raise BackupError(f"Cannot read {path}: zstandard is not installed")
+        return zstandard.open(path, mode)
+
+    @staticmethod
+    def _parse_timestamp(name: str) -> datetime | None:
+        if not name.startswith(BACKUP_PREFIX):
+            return None
+        for suffix in COMPRESSED_SUFFIXES.values():
+            if name.endswith(suffix):
+                try:
+                    return datetime.strptime(name[len(BACKUP_PREFIX) : -len(suffix)], TIMESTAMP_FORMAT)
+                except ValueError:
+                    return None
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Create one backup of the database, its message partitions and season archive, apply retention"
+    )
+    parser.add_argument("--db", default="data/database.sqlite", help="Path to the database file")
+    parser.add_argument("--dir", default=None, help="Backup directory (default: BACKUP_DIR or dumps)")
+    parser.add_argument("--compression", choices=sorted(COMPRESSED_SUFFIXES), default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    path = DatabaseBackup(args.db, backup_dir=args.dir, compression=args.compression).create_backup()
+    print(f"✅ База данных сохранена как {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,9 @@ SKIP_IF = "skip_if"
 LABEL = "label"
 EDITABLE = "editable"
 
+# Значение поля, вопрос которого был пропущен по skip_if
+SKIPPED = "skipped"
+
 # Состояния
 REGISTERED = "registered"
 EDIT = "edit"
@@ -1,87 +1,331 @@
 """
 Database configuration and session management for SQLAlchemy ORM.
+
+File databases use two engines in WAL mode:
+- a write engine whose pool holds exactly one connection (single writer); a write
+  waiting for it longer than DB_WRITER_TIMEOUT fails with WriterBusyError;
+- a read engine with a QueuePool of connections marked query_only, so readers
+  run in parallel with the writer and with each other.
+
+In-memory databases (tests) keep a single shared connection via StaticPool.
+
+Exports and analytics use read_snapshot(): a dedicated read-only connection holding
+one WAL read transaction, so a long report sees a consistent state and never blocks writers.
 """
 
 import logging
 import os
+import sqlite3
+import threading
 from collections.abc import Generator
-from contextlib import contextmanager
+from contextlib import AbstractContextManager, contextmanager
 
 from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from .query_metrics import query_metrics
 
 logger = logging.getLogger(__name__)
 
+POOL_MODE_QUEUE = "queue"
+POOL_MODE_STATIC = "static"
+POOL_MODES = (POOL_MODE_QUEUE, POOL_MODE_STATIC)
+
+DEFAULT_READ_POOL_SIZE = 5
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+# How long a write waits for the single writer connection, in seconds
+DEFAULT_WRITER_TIMEOUT_S = 5.0
+
+
+class WriterBusyError(PoolTimeoutError):
+    """The single writer connection could not be checked out."""
+
+
+class OutdatedSchemaError(RuntimeError):
+    """The database was created by an older version of the bot and has to be migrated first."""
+
+
+MESSAGE_COLUMNS_SQL = "PRAGMA table_info(messages)"
+
+
+def _message_schema_migration(rows) -> str | None:
+    """Migration script a messages table (PRAGMA table_info rows) still needs, if any."""
+    columns = {row[1]: row[2] for row in rows}
+    if not columns:
+        return None
+    if "text_ref" not in columns:
+        # Message bodies are stored inline
+        return "migrate_message_contents.py"
+    if columns.get("direction") != "SMALLINT":
+        # direction and message_type are stored as strings
+        return "migrate_message_schema.py"
+    return None
+
+
+class SingleWriterPool(QueuePool):
+    """
+    QueuePool of the one writer connection that fails fast with a clear error.
+
+    A thread asking for the writer while it already holds it (a write session opened
+    inside another one) would wait for itself until the timeout, so it fails at once.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._holder: int | None = None
+
+    def _do_get(self):
+        if self._holder == threading.get_ident():
+            raise WriterBusyError(
+                "Nested write: this thread already holds the writer connection "
+                "(a write session opened inside another one)"
+            )
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError as e:
+            raise WriterBusyError(
+                f"The writer connection was busy for more than {self._timeout:g} s "
+                "(a long write in another thread, or a blocking write on the event loop)"
+            ) from e
+        self._holder = threading.get_ident()
+        return connection
+
+    def _do_return_conn(self, record) -> None:
+        self._holder = None
+        super()._do_return_conn(record)
+
+
+@contextmanager
+def read_snapshot(db_path: str) -> Generator[sqlite3.Connection, None, None]:
+    """
+    Open a consistent read snapshot of a database file.
+
+    The connection is read-only and stays inside one read transaction until the block
+    exits: every query in the block sees the database as of the first read, while the
+    bot keeps committing writes to the WAL.
+
+    Args:
+        db_path: Path to SQLite database file
+
+    Yields:
+        sqlite3.Connection: Read-only connection inside an open transaction
+
+    Example:
+        with read_snapshot("data/database.sqlite") as conn:
+            users = pd.read_sql("SELECT * FROM users", conn)
+            messages = pd.read_sql("SELECT * FROM messages", conn)
+    """
+    # isolation_level=None: transactions are controlled explicitly below
+    conn = sqlite3.connect(
+        f"file:{db_path}?mode=ro", uri=True, isolation_level=None, timeout=DEFAULT_BUSY_TIMEOUT_MS / 1000
+    )
+    try:
+        conn.execute("BEGIN")
+        # The WAL snapshot is taken by the first read, so take it right away
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        yield conn
+    finally:
+        try:
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
 
 class Database:
     """Database manager for SQLAlchemy ORM."""
 
-    def __init__(self, db_path: str = "data/database.sqlite"):
+    def __init__(
+        self,
+        db_path: str = "data/database.sqlite",
+        pool_mode: str | None = None,
+        read_pool_size: int | None = None,
+        writer_timeout: float | None = None,
+    ):
         """
         Initialize database connection.
 
         Args:
             db_path: Path to SQLite database file or ":memory:" for in-memory database
+            pool_mode: "queue" (WAL, single writer + pool of readers) or "static" (one shared
+                connection). Defaults to the DB_POOL_MODE environment variable, or "queue".
+                In-memory databases always use "static".
+            read_pool_size: Number of pooled reader connections (DB_READ_POOL_SIZE, default 5)
+            writer_timeout: Seconds a write waits for the writer connection before
+                WriterBusyError (DB_WRITER_TIMEOUT, default 5)
         """
         # Create data directory if it doesn't exist (but not for in-memory database)
         if db_path != ":memory:":
-            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
 
         self.db_path = db_path
         self.db_url = f"sqlite:///{db_path}" if db_path != ":memory:" else "sqlite://"
 
-        # Create engine with appropriate settings for SQLite
-        self.engine = create_engine(
-            self.db_url,
-            connect_args={"check_same_thread": False},
-            poolclass=StaticPool,  # Use StaticPool for SQLite
-            echo=False,  # Set to True for SQL query logging
-        )
+        pool_mode = pool_mode or os.getenv("DB_POOL_MODE", POOL_MODE_QUEUE)
+        if pool_mode not in POOL_MODES:
+            raise ValueError(f"Unknown pool mode: {pool_mode} (expected one of {', '.join(POOL_MODES)})")
+        # In-memory database exists only inside its connection, so it can't be pooled
+        self.pool_mode = POOL_MODE_STATIC if db_path == ":memory:" else pool_mode
 
-        # Enable foreign keys for SQLite
-        @event.listens_for(self.engine, "connect")
-        def set_sqlite_pragma(dbapi_conn, connection_record):
-            cursor = dbapi_conn.cursor()
-            cursor.execute("PRAGMA foreign_keys=ON")
-            cursor.close()
+        if self.pool_mode == POOL_MODE_STATIC:
+            self.engine = create_engine(
+                self.db_url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,  # Use StaticPool for SQLite
+                echo=False,  # Set to True for SQL query logging
+            )
+            self.read_engine = self.engine
+            event.listen(self.engine, "connect", self._set_static_pragmas)
+        else:
+            read_pool_size = read_pool_size or int(os.getenv("DB_READ_POOL_SIZE", DEFAULT_READ_POOL_SIZE))
+            if writer_timeout is None:
+                writer_timeout = float(os.getenv("DB_WRITER_TIMEOUT", DEFAULT_WRITER_TIMEOUT_S))
+            # Connections are handed between threads by the pool, never used by two threads at once
+            connect_args = {"check_same_thread": False, "timeout": DEFAULT_BUSY_TIMEOUT_MS / 1000}
+            self.engine = create_engine(
+                self.db_url,
+                connect_args=connect_args,
+                poolclass=SingleWriterPool,
+                pool_size=1,  # Single writer: concurrent writers wait for the pool, not for SQLITE_BUSY
+                max_overflow=0,
+                pool_timeout=writer_timeout,
+                echo=False,
+            )
+            self.read_engine = create_engine(
+                self.db_url,
+                connect_args=connect_args,
+                poolclass=QueuePool,
+                pool_size=read_pool_size,
+                max_overflow=read_pool_size,
+                echo=False,
+            )
+            event.listen(self.engine, "connect", self._set_writer_pragmas)
+            event.listen(self.read_engine, "connect", self._set_reader_pragmas)
+
+            # Switch the file to WAL before the first reader connects
+            with self.engine.connect():
+                pass
+
+        # Record statement timings, per-update query counts and slow queries
+        query_metrics.instrument(self.engine)
+        query_metrics.instrument(self.read_engine)
 
-        # Create session factory
+        # Create session factories
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.read_engine)
+
+        logger.info(f"Database initialized at {db_path} (pool mode: {self.pool_mode})")
+
+    @staticmethod
+    def _set_static_pragmas(dbapi_conn, connection_record):
+        # Enable foreign keys for SQLite
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 
-        logger.info(f"Database initialized at {db_path}")
+    @staticmethod
+    def _set_writer_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        # Takes effect only for a new file (before the first table is created): pages freed by
+        # message retention are then returned with incremental_vacuum instead of a full VACUUM
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={DEFAULT_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    @staticmethod
+    def _set_reader_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute(f"PRAGMA busy_timeout={DEFAULT_BUSY_TIMEOUT_MS}")
+        # Readers must never write: writes go through the single writer connection
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
 
     def create_tables(self):
         """Create all tables defined in models."""
-        from .models import DynamicBase, get_user_model
+        from .message_contents import ensure_content_schema
+        from .message_search import ensure_fts_index
+        from .models import DynamicBase, Message, get_user_model
+
+        # create_all does not change existing tables: an outdated message log is refused here,
+        # otherwise every log write would fail at runtime
+        self._check_message_schema()
 
         # Ensure User model is initialized
-        get_user_model()
+        user_model = get_user_model()
 
         # Create all tables (including Message table)
         DynamicBase.metadata.create_all(bind=self.engine)
+        # create_all does not add new indexes to existing tables
+        for index in [*user_model.__table__.indexes, *Message.__table__.indexes]:
+            try:
+                index.create(bind=self.engine, checkfirst=True)
+            except OperationalError as e:
+                logger.warning(f"Could not create index {index.name}: {e}")
+        # Message log with its bodies joined back, and its full-text index kept in sync by triggers
+        with self.engine.connect() as conn:
+            ensure_content_schema(conn)
+            ensure_fts_index(conn)
         logger.info("Database tables created successfully (including messages table)")
 
+    def _check_message_schema(self) -> None:
+        """
+        Raise OutdatedSchemaError if the messages table of the database or of any of its
+        monthly partitions still has an older schema.
+
+        Raises:
+            OutdatedSchemaError: If the database has to be migrated before the bot starts
+        """
+        from .message_retention import MessagePartitions
+
+        with self.engine.connect() as conn:
+            outdated = {self.db_path: _message_schema_migration(conn.exec_driver_sql(MESSAGE_COLUMNS_SQL))}
+        if self.db_path != ":memory:":
+            for partition in MessagePartitions(self).list_partitions():
+                conn = sqlite3.connect(f"file:{partition.path}?mode=ro", uri=True)
+                try:
+                    outdated[partition.path] = _message_schema_migration(conn.execute(MESSAGE_COLUMNS_SQL))
+                finally:
+                    conn.close()
+
+        outdated = {path: script for path, script in outdated.items() if script}
+        if outdated:
+            files = ", ".join(f"{path} ({script})" for path, script in outdated.items())
+            raise OutdatedSchemaError(f"The message log has to be migrated before the bot starts: {files}")
+
     def drop_tables(self):
         """Drop all tables (use with caution!)."""
         from .models import DynamicBase
 
         DynamicBase.metadata.drop_all(bind=self.engine)
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql("DROP TABLE IF EXISTS messages_fts")
+            conn.exec_driver_sql("DROP VIEW IF EXISTS message_log")
+            conn.commit()
         logger.warning("All database tables dropped")
 
     @contextmanager
-    def get_session(self) -> Generator[Session, None, None]:
+    def get_session(self, readonly: bool = False) -> Generator[Session, None, None]:
         """
         Context manager for database sessions.
 
+        Args:
+            readonly: Use a pooled reader connection. Read-only sessions run in parallel
+                with the writer; any write attempt in them fails.
+
         Yields:
             Session: SQLAlchemy session
 
         Example:
-            with db.get_session() as session:
+            with db.get_session(readonly=True) as session:
                 user = session.query(User).first()
         """
-        session = self.SessionLocal()
+        session = self.ReadSessionLocal() if readonly else self.SessionLocal()
         try:
             yield session
             session.commit()
@@ -109,6 +353,30 @@ class Database:
         """
         return self.SessionLocal()
 
+    def read_snapshot(self) -> AbstractContextManager[sqlite3.Connection]:
+        """
+        Consistent read snapshot for exports and analytics, see read_snapshot().
+
+        In-memory databases have no file to open, there the shared connection is used.
+        """
+        if self.db_path == ":memory:":
+            return self._memory_snapshot()
+        return read_snapshot(self.db_path)
+
+    @contextmanager
+    def _memory_snapshot(self) -> Generator[sqlite3.Connection, None, None]:
+        raw = self.read_engine.raw_connection()
+        try:
+            yield raw.driver_connection
+        finally:
+            raw.close()
+
+    def dispose(self) -> None:
+        """Close all pooled connections."""
+        self.engine.dispose()
+        if self.read_engine is not self.engine:
+            self.read_engine.dispose()
+
 
 # Global database instance
 db = Database()
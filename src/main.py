@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from telegram import Update
@@ -12,11 +13,17 @@ from telegram.ext import (
 )
 
 from .admin_commands import admin_commands
+from .backup import BACKUP_INTERVAL_MINUTES, DatabaseBackup
 from .chat_tracker import chat_tracker
 from .error_notifier import error_notifier
+from .message_log_writer import message_log_writer
 from .message_logger import message_logger
+from .message_retention import MESSAGE_PRUNE_INTERVAL_MINUTES, message_retention
+from .persistence import SQLitePersistence
+from .query_metrics import query_metrics
 from .registration_handler import RegistrationFlow
 from .settings import BOT_TOKEN
+from .update_processor import UPDATE_CONCURRENCY, PerUserUpdateProcessor
 from .user_storage import user_storage
 
 # Enable logging
@@ -25,6 +32,7 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 registration_flow = RegistrationFlow(user_storage)
+database_backup = DatabaseBackup()
 
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -36,19 +44,22 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         await error_notifier.notify_error(context, context.error, update if isinstance(update, Update) else None)
 
 
+@query_metrics.tracked
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает команду /start."""
     await registration_flow.handle_command(update, context)
 
 
+@query_metrics.tracked
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает сообщения пользователя."""
     # Log incoming message
-    message_logger.log_incoming_message(update)
+    await message_logger.log_incoming_message(update)
 
     await registration_flow.handle_input(update, context)
 
 
+@query_metrics.tracked
 async def track_chat_member_updates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Отслеживает изменения статуса бота в чате с пользователем.
@@ -90,11 +101,30 @@ async def track_chat_member_updates(update: Update, context: ContextTypes.DEFAUL
         user_storage.update_user(user_id, "is_blocked", 0)
 
 
+@query_metrics.tracked
 async def handle_admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle admin commands in both private and group chats."""
     await admin_commands.handle_admin_command(update, context)
 
 
+async def backup_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Делает онлайн-бэкап БД (в отдельном потоке, чтобы не блокировать обработку апдейтов)."""
+    try:
+        await asyncio.to_thread(database_backup.create_backup)
+    except Exception as e:
+        logger.error(f"Database backup failed: {e}")
+        await error_notifier.notify_error(context, e, additional_info="Резервное копирование БД")
+
+
+async def message_retention_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Переносит старые сообщения в месячные разделы и удаляет просроченные (в отдельном потоке)."""
+    try:
+        await asyncio.to_thread(message_retention.run)
+    except Exception as e:
+        logger.error(f"Message retention failed: {e}")
+        await error_notifier.notify_error(context, e, additional_info="Хранение журнала сообщений")
+
+
 async def post_init(application: Application) -> None:  # type: ignore[type-arg]
     """Initialize bot after startup - grant ROOT user admin permissions."""
     from .config import config
@@ -115,12 +145,32 @@ async def post_init(application: Application) -> None:  # type: ignore[type-arg]
 
     logger.info("ROOT user initialization complete")
 
+    # Message log records are written in batches by a background task
+    message_log_writer.start()
+
+
+async def post_stop(application: Application) -> None:  # type: ignore[type-arg]
+    """Write multi-select toggles still waiting for their quiet period, then the queued message log."""
+    flushed = await registration_flow.toggle_coalescer.flush_all()
+    if flushed:
+        logger.info(f"Flushed {flushed} pending multi-select selections")
+    await message_log_writer.stop()
+
 
 def main() -> None:
     if not BOT_TOKEN:
         raise ValueError("BOT_TOKEN is not set")
 
-    application = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
+    # Updates of different users run concurrently, updates of one user stay in order
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .persistence(SQLitePersistence())
+        .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY))
+        .build()
+    )
 
     # Admin commands - work in both private and group chats
     admin_command_list = [
@@ -134,6 +184,9 @@ def main() -> None:
         "sync_staff_chat",
         "sync_counselor_chat",
         "my_permissions",
+        "stats",
+        "search_messages",
+        "export_messages",
         "help",
     ]
     for cmd in admin_command_list:
@@ -156,17 +209,40 @@ def main() -> None:
     application.add_handler(MessageHandler(filters.LOCATION & filters.ChatType.PRIVATE, handle_message))
     application.add_handler(MessageHandler(filters.POLL & filters.ChatType.PRIVATE, handle_message))
 
-    application.add_handler(CallbackQueryHandler(registration_flow.handle_inline_query))
+    application.add_handler(CallbackQueryHandler(query_metrics.tracked(registration_flow.handle_inline_query)))
 
     # Track when users block/unblock the bot
     application.add_handler(ChatMemberHandler(track_chat_member_updates, ChatMemberHandler.MY_CHAT_MEMBER))
 
     # Track chat member updates for staff chat
-    application.add_handler(ChatMemberHandler(chat_tracker.handle_chat_member_update, ChatMemberHandler.CHAT_MEMBER))
+    application.add_handler(
+        ChatMemberHandler(
+            query_metrics.tracked(chat_tracker.handle_chat_member_update),
+            ChatMemberHandler.CHAT_MEMBER,
+        )
+    )
 
     # Error handler
     application.add_error_handler(error_handler)
 
+    # Online database backups
+    if BACKUP_INTERVAL_MINUTES <= 0:
+        logger.info("Database backups are disabled (BACKUP_INTERVAL_MINUTES=0)")
+    elif application.job_queue is None:
+        logger.warning("JobQueue is unavailable (install python-telegram-bot[job-queue]), backups are disabled")
+    else:
+        application.job_queue.run_repeating(
+            backup_job, interval=BACKUP_INTERVAL_MINUTES * 60, first=60, name="database_backup"
+        )
+
+    # Message log retention: monthly partitions and chunked pruning
+    if MESSAGE_PRUNE_INTERVAL_MINUTES <= 0:
+        logger.info("Message retention is disabled (MESSAGE_PRUNE_INTERVAL_MINUTES=0)")
+    elif application.job_queue is not None:
+        application.job_queue.run_repeating(
+            message_retention_job, interval=MESSAGE_PRUNE_INTERVAL_MINUTES * 60, first=300, name="message_retention"
+        )
+
     # Run the bot until the user presses Ctrl-C
     logger.info("Bot started successfully!")
     application.run_polling(allowed_updates=["message", "callback_query", "my_chat_member", "chat_member"])
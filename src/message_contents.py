@@ -0,0 +1,104 @@
+"""
+Deduplicated storage of message bodies.
+
+Texts, captions and file_ids of the message log live in message_contents, one row per
+distinct body keyed by its SHA-256 (see models.MessageContent); messages rows only keep
+their ids. A broadcast to 3,000 users costs one body plus 3,000 rows of integers.
+
+The message_log view joins the bodies back and decodes direction and message_type from
+their small-integer codes, so it has the columns messages had before; readers (history,
+export, season archive) select from it. The full-text index covers message_contents
+too, so each body is indexed once (see message_search). Every partition file has its own
+message_contents table and view, so partitions stay self-contained.
+
+Bodies nobody references any more (after retention moved or deleted their messages)
+are removed by sweep_orphan_contents.
+"""
+
+import logging
+
+from sqlalchemy.engine import Connection
+
+from .models import MESSAGE_DIRECTIONS, MESSAGE_TYPES
+
+logger = logging.getLogger(__name__)
+
+CONTENTS_TABLE = "message_contents"
+LOG_VIEW = "message_log"
+
+
+def decode_sql(column: str, values: tuple[str, ...]) -> str:
+    """SQL expression turning the code stored in a CodedString column back into its string."""
+    cases = " ".join(f"WHEN {code} THEN '{value}'" for code, value in enumerate(values))
+    return f"CASE {column} {cases} END"
+
+
+_LOG_VIEW_SQL = (
+    "SELECT m.id AS id, m.telegram_id AS telegram_id, m.chat_id AS chat_id, m.message_id AS message_id, "
+    f"{decode_sql('m.direction', MESSAGE_DIRECTIONS)} AS direction, "
+    f"{decode_sql('m.message_type', MESSAGE_TYPES)} AS message_type, "
+    "t.body AS text, c.body AS caption, f.body AS file_id, "
+    "m.reply_to_message_id AS reply_to_message_id, m.created_at AS created_at "
+    "FROM messages m "
+    f"LEFT JOIN {CONTENTS_TABLE} t ON t.id = m.text_ref "
+    f"LEFT JOIN {CONTENTS_TABLE} c ON c.id = m.caption_ref "
+    f"LEFT JOIN {CONTENTS_TABLE} f ON f.id = m.file_ref"
+)
+
+_CONTENT_SCHEMA_SQL = (
+    f"CREATE TABLE IF NOT EXISTS {{schema}}.{CONTENTS_TABLE} "
+    "(id INTEGER NOT NULL PRIMARY KEY, hash BLOB NOT NULL UNIQUE, body TEXT NOT NULL)",
+    # Search and the orphan sweep look messages up by body; rows without one are not indexed
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_message_text_ref ON messages (text_ref) WHERE text_ref IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_message_caption_ref ON messages (caption_ref) "
+    "WHERE caption_ref IS NOT NULL",
+)
+
+
+def ensure_content_schema(conn: Connection, schema: str = "main") -> bool:
+    """
+    Create message_contents, the reference indexes and the message_log view of a schema.
+
+    The view is replaced if its definition changed. It lives next to the tables it
+    reads, so a view in an attached partition reads the partition's tables.
+
+    Returns:
+        True if the view was (re)created
+    """
+    for statement in _CONTENT_SCHEMA_SQL:
+        conn.exec_driver_sql(statement.format(schema=schema))
+    create_sql = f"CREATE VIEW {LOG_VIEW} AS {_LOG_VIEW_SQL}"
+    existing = conn.exec_driver_sql(
+        f"SELECT sql FROM {schema}.sqlite_master WHERE type = 'view' AND name = ?", (LOG_VIEW,)
+    ).scalar()
+    if existing == create_sql:
+        conn.commit()
+        return False
+
+    conn.exec_driver_sql(f"DROP VIEW IF EXISTS {schema}.{LOG_VIEW}")
+    conn.exec_driver_sql(f"CREATE VIEW {schema}.{LOG_VIEW} AS {_LOG_VIEW_SQL}")
+    conn.commit()
+    logger.info(f"View {schema}.{LOG_VIEW} created")
+    return True
+
+
+def sweep_orphan_contents(conn: Connection, schema: str = "main") -> int:
+    """
+    Delete bodies no message of the hot table (or of an attached partition) references.
+
+    One statement: the referenced ids are collected once into a temporary index, so the
+    cost is one pass over messages and one over message_contents.
+
+    Returns:
+        Number of bodies deleted
+    """
+    deleted = conn.exec_driver_sql(
+        f"DELETE FROM {schema}.{CONTENTS_TABLE} WHERE id NOT IN ("
+        f"SELECT text_ref FROM {schema}.messages WHERE text_ref IS NOT NULL "
+        f"UNION ALL SELECT caption_ref FROM {schema}.messages WHERE caption_ref IS NOT NULL "
+        f"UNION ALL SELECT file_ref FROM {schema}.messages WHERE file_ref IS NOT NULL)"
+    ).rowcount
+    conn.commit()
+    if deleted:
+        logger.debug(f"Deleted {deleted} unreferenced message bodies")
+    return deleted
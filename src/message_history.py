@@ -0,0 +1,230 @@
+"""
+Keyset-paginated reading of the message log.
+
+Pages are ordered by (created_at, id) and continue from a cursor - the (created_at, id)
+of the last record of the previous page - so every page costs one index range scan,
+however far back it is, and concurrent inserts never shift or repeat rows. Records are
+plain immutable MessageRecord objects built straight from result rows of the message_log
+view (bodies joined from message_contents), not ORM entities.
+
+The hot messages table and the monthly partitions (see message_retention) are read as
+one log: newest first the hot table comes first, oldest first the partitions do.
+"""
+
+import logging
+import os
+import sqlite3
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import text
+
+from .database import Database, db
+from .message_contents import LOG_VIEW
+from .message_retention import MessagePartition, MessagePartitions, db_datetime, message_partitions, naive_utc
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PAGE_SIZE = 50
+RECORD_COLUMNS = (
+    "id",
+    "telegram_id",
+    "chat_id",
+    "message_id",
+    "direction",
+    "message_type",
+    "text",
+    "caption",
+    "file_id",
+    "reply_to_message_id",
+    "created_at",
+)
+
+Cursor = tuple[datetime, int]
+
+
+@dataclass(frozen=True, slots=True)
+class MessageRecord:
+    """One row of the message log."""
+
+    id: int
+    telegram_id: int
+    chat_id: int
+    message_id: int | None
+    direction: str
+    message_type: str | None
+    text: str | None
+    caption: str | None
+    file_id: str | None
+    reply_to_message_id: int | None
+    created_at: datetime
+
+    @classmethod
+    def from_row(cls, row: Any) -> "MessageRecord":
+        values = list(row)
+        values[-1] = datetime.fromisoformat(values[-1])
+        return cls(*values)
+
+    @property
+    def cursor(self) -> Cursor:
+        return self.created_at, self.id
+
+    def to_dict(self) -> dict[str, Any]:
+        result = asdict(self)
+        result["created_at"] = self.created_at.isoformat()
+        return result
+
+
+@dataclass(frozen=True)
+class HistoryPage:
+    """One page of records; next_cursor is None on the last page."""
+
+    records: list[MessageRecord]
+    next_cursor: Cursor | None
+
+
+class MessageHistory:
+    """Reads the message log page by page, across the hot table and the partitions."""
+
+    def __init__(self, database: Database | None = None, partitions: MessagePartitions | None = None) -> None:
+        self.db = database or db
+        self.partitions = partitions or message_partitions
+
+    def page(
+        self,
+        telegram_id: int | None = None,
+        direction: str | None = None,
+        cursor: Cursor | None = None,
+        limit: int = HISTORY_PAGE_SIZE,
+        newest_first: bool = True,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> HistoryPage:
+        """
+        Read one page of the log.
+
+        Args:
+            telegram_id: Only messages of this user
+            direction: Only 'incoming' or 'outgoing' messages
+            cursor: next_cursor of the previous page (None for the first page)
+            limit: Page size
+            newest_first: Order of the records
+            since: Only messages created at or after this time
+            until: Only messages created before this time
+
+        Returns:
+            HistoryPage
+        """
+        sql, params = self._build_query(telegram_id, direction, cursor, newest_first, since, until, limit + 1)
+
+        records: list[MessageRecord] = []
+        for source in self._sources(newest_first, cursor, since, until):
+            params["limit"] = limit + 1 - len(records)
+            records.extend(MessageRecord.from_row(row) for row in self._read(source, sql, params))
+            if len(records) > limit:
+                break
+
+        page = records[:limit]
+        return HistoryPage(page, page[-1].cursor if len(records) > limit else None)
+
+    def iter_records(
+        self,
+        telegram_id: int | None = None,
+        direction: str | None = None,
+        newest_first: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        batch_size: int = 500,
+    ) -> Iterator[MessageRecord]:
+        """All matching records, read page by page (memory use is bounded by batch_size)."""
+        cursor = None
+        while True:
+            page = self.page(telegram_id, direction, cursor, batch_size, newest_first, since, until)
+            yield from page.records
+            if page.next_cursor is None:
+                return
+            cursor = page.next_cursor
+
+    def _sources(
+        self,
+        newest_first: bool,
+        cursor: Cursor | None,
+        since: datetime | None,
+        until: datetime | None,
+    ) -> Iterator[MessagePartition | None]:
+        """The hot table (None) and the partitions that may hold matching rows, in read order."""
+        # Rows past the cursor are already read, so the cursor narrows the range like since/until
+        lower = naive_utc(since) if since else None
+        upper = naive_utc(until) if until else None
+        if cursor is not None:
+            if newest_first:
+                upper = min(upper, cursor[0]) if upper else cursor[0]
+            else:
+                lower = max(lower, cursor[0]) if lower else cursor[0]
+
+        partitions = [
+            partition
+            for partition in self.partitions.list_partitions()
+            if (lower is None or partition.end > lower) and (upper is None or partition.start <= upper)
+        ]
+        if newest_first:
+            yield None
+            yield from reversed(partitions)
+        else:
+            yield from partitions
+            yield None
+
+    @staticmethod
+    def _build_query(
+        telegram_id: int | None,
+        direction: str | None,
+        cursor: Cursor | None,
+        newest_first: bool,
+        since: datetime | None,
+        until: datetime | None,
+        limit: int,
+    ) -> tuple[str, dict]:
+        conditions = []
+        params: dict = {"limit": limit}
+        if telegram_id is not None:
+            conditions.append("telegram_id = :telegram_id")
+            params["telegram_id"] = telegram_id
+        if direction:
+            conditions.append("direction = :direction")
+            params["direction"] = direction
+        if since is not None:
+            conditions.append("created_at >= :since")
+            params["since"] = db_datetime(since)
+        if until is not None:
+            conditions.append("created_at < :until")
+            params["until"] = db_datetime(until)
+        if cursor is not None:
+            conditions.append(f"(created_at, id) {'<' if newest_first else '>'} (:cursor_at, :cursor_id)")
+            params["cursor_at"] = db_datetime(cursor[0])
+            params["cursor_id"] = cursor[1]
+
+        order = "DESC" if newest_first else "ASC"
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        sql = (
+            f"SELECT {', '.join(RECORD_COLUMNS)} FROM {LOG_VIEW} {where}"
+            f"ORDER BY created_at {order}, id {order} LIMIT :limit"
+        )
+        return sql, params
+
+    def _read(self, source: MessagePartition | None, sql: str, params: dict) -> list[Any]:
+        if source is None:
+            with self.db.get_session(readonly=True) as session:
+                return session.execute(text(sql), params).all()
+        if not os.path.exists(source.path):
+            return []
+        conn = sqlite3.connect(f"file:{source.path}?mode=ro", uri=True)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+# Global message history instance
+message_history = MessageHistory()
@@ -0,0 +1,242 @@
+"""
+Background writer for the message log.
+
+Handlers used to write every incoming and outgoing message to the messages table
+synchronously, one transaction per message, before doing any business logic.
+Now they only build a plain dict and put it on a bounded asyncio queue; a flusher
+task writes the queued records in batches (one executemany per batch) when the
+batch is full or the flush interval has passed. On shutdown the queue is drained.
+Texts, captions and file_ids of a batch are stored once each in message_contents, so
+a broadcast batch writes one body and many small rows.
+
+When the writer is not running (scripts, tests, before post_init) records are
+written synchronously, as before. With the write-through policy a handler whose
+record finds the queue full waits for room in it, so producers are slowed down to
+the writer's pace instead of piling records up in memory. While the writer
+connection is busy a batch is retried with backoff, on shutdown too; a batch that
+fails otherwise is retried record by record, so one bad record does not lose the rest.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any
+
+from sqlalchemy import insert
+
+from .database import WriterBusyError, db
+from .models import Message, content_rows
+
+logger = logging.getLogger(__name__)
+
+# Records waiting to be written
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Records per INSERT batch; a full batch is flushed without waiting for the interval
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))
+# Maximum delay before queued records are written, in seconds
+LOG_FLUSH_INTERVAL_SECONDS = int(os.getenv("LOG_FLUSH_INTERVAL_MS", "500")) / 1000
+# Backoff while the writer connection is busy, in seconds
+LOG_BUSY_RETRY_DELAY = 0.1
+LOG_BUSY_RETRY_MAX_DELAY = 5.0
+
+
+class OverflowPolicy(Enum):
+    """What to do with a record when the queue is full."""
+
+    WRITE_THROUGH = "write_through"  # Wait for room in the queue (nothing is lost)
+    DROP_OLDEST = "drop_oldest"  # Evict the oldest queued record
+    DROP_NEWEST = "drop_newest"  # Discard the new record
+
+
+LOG_OVERFLOW_POLICY = OverflowPolicy(os.getenv("LOG_OVERFLOW_POLICY", OverflowPolicy.WRITE_THROUGH.value))
+
+
+@dataclass
+class LogWriterStats:
+    """Counters of the log writer."""
+
+    enqueued: int = 0
+    written: int = 0
+    batches: int = 0
+    sync_writes: int = 0
+    dropped: int = 0
+    failed: int = 0
+    max_queue_depth: int = 0
+    queue_depth: int = 0
+
+
+class MessageLogWriter:
+    """Bounded queue of message records with a batching flusher task."""
+
+    def __init__(
+        self,
+        maxsize: int = LOG_QUEUE_SIZE,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL_SECONDS,
+        overflow_policy: OverflowPolicy = LOG_OVERFLOW_POLICY,
+    ) -> None:
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.stats = LogWriterStats()
+        self._queue: asyncio.Queue[dict[str, Any]] | None = None
+        self._batch_ready: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the flusher task in the running event loop."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.maxsize)
+        self._batch_ready = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="message-log-writer")
+        logger.info(
+            f"Message log writer started: batch {self.batch_size}, interval {self.flush_interval * 1000:.0f} ms, "
+            f"queue {self.maxsize}, overflow {self.overflow_policy.value}"
+        )
+
+    async def stop(self) -> None:
+        """Stop the flusher and write everything still queued."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._batch_ready.set()
+        # Waits for the writer connection as long as it takes: queued records are not discarded
+        await self._task
+        self._task = None
+        self._queue = None
+        self._batch_ready = None
+        self._loop = None
+        logger.info(f"Message log writer stopped: {self.stats.written} records written, {self.stats.dropped} dropped")
+
+    async def flush(self) -> None:
+        """Write everything queued so far (e.g. before reading a transcript)."""
+        await self._drain()
+
+    async def submit(self, record: dict[str, Any]) -> bool:
+        """
+        Queue a record (a dict of Message columns).
+
+        Never blocks on the database unless the writer is not running. With the
+        write-through policy and a full queue, waits until the flusher makes room.
+
+        Returns:
+            False if the record was dropped or could not be written
+        """
+        if not self.running or self._queue is None or not self._in_writer_loop():
+            return self._write_sync([record])
+
+        self.stats.enqueued += 1
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            if not await self._overflow(record):
+                return False
+        finally:
+            self._update_depth()
+
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    def _in_writer_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def _overflow(self, record: dict[str, Any]) -> bool:
+        if self.overflow_policy is OverflowPolicy.DROP_NEWEST:
+            self.stats.dropped += 1
+            logger.warning("Message log queue is full, dropping the new record")
+            return False
+        if self.overflow_policy is OverflowPolicy.DROP_OLDEST:
+            self._queue.get_nowait()
+            self._queue.put_nowait(record)
+            self.stats.dropped += 1
+            logger.warning("Message log queue is full, dropping the oldest record")
+            return True
+        # Back-pressure: flush now and wait until the flusher takes records off the queue
+        self._batch_ready.set()
+        await self._queue.put(record)
+        return True
+
+    def _update_depth(self) -> None:
+        depth = self._queue.qsize() if self._queue is not None else 0
+        self.stats.queue_depth = depth
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, depth)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self._drain()
+        # Records queued while the last batch was being written
+        await self._drain()
+
+    async def _drain(self) -> None:
+        """Write queued records in batches until the queue is empty."""
+        while self._queue is not None and not self._queue.empty():
+            batch = [self._queue.get_nowait() for _ in range(min(self.batch_size, self._queue.qsize()))]
+            self._update_depth()
+            # The write runs in a thread, so update processing is not blocked
+            await asyncio.to_thread(self._write_batch, batch)
+
+    def _write_sync(self, records: list[dict[str, Any]]) -> bool:
+        self.stats.sync_writes += len(records)
+        # The caller may hold the writer connection itself (a nested write): waiting would never end
+        return self._write_batch(records, retry_busy=False)
+
+    def _write_batch(self, records: list[dict[str, Any]], retry_busy: bool = True) -> bool:
+        try:
+            self._insert(records, retry_busy)
+        except WriterBusyError as e:
+            self.stats.failed += len(records)
+            logger.error(f"Failed to write {len(records)} message log records: {e}")
+            return False
+        except Exception as e:
+            if len(records) > 1:
+                logger.warning(f"Failed to write {len(records)} message log records, retrying one by one: {e}")
+                written = [self._write_batch([record], retry_busy) for record in records]
+                return all(written)
+            self.stats.failed += 1
+            logger.error(f"Failed to write message log record: {e}", exc_info=True)
+            return False
+        self.stats.written += len(records)
+        self.stats.batches += 1
+        logger.debug(f"Wrote {len(records)} message log records")
+        return True
+
+    def _insert(self, records: list[dict[str, Any]], retry_busy: bool) -> None:
+        """Insert the records in one statement; while the writer connection is busy, wait and try again."""
+        delay = LOG_BUSY_RETRY_DELAY
+        while True:
+            try:
+                with db.get_session() as session:
+                    session.execute(insert(Message), content_rows(session, records))
+                return
+            except WriterBusyError as e:
+                if not retry_busy:
+                    raise
+                logger.warning(f"Writer busy, retrying {len(records)} message log records in {delay:g} s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, LOG_BUSY_RETRY_MAX_DELAY)
+
+
+# Global message log writer instance
+message_log_writer = MessageLogWriter()
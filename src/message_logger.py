@@ -4,20 +4,29 @@ Message logger for tracking all messages exchanged between users and the bot.
 
 import logging
 from datetime import UTC, datetime
+from typing import Any
 
 from telegram import Message as TelegramMessage
 from telegram import Update
 
-from .database import db
-from .models import Message
+from .message_history import HISTORY_PAGE_SIZE, Cursor, HistoryPage, MessageRecord, message_history
+from .message_log_writer import MessageLogWriter, message_log_writer
 
 logger = logging.getLogger(__name__)
 
 
 class MessageLogger:
-    """Handles logging of all messages to the database."""
+    """
+    Handles logging of all messages to the database.
 
-    def log_incoming_message(self, update: Update) -> int | None:
+    Records are handed to the background message_log_writer, which writes them in
+    batches; the handlers never wait for the database, only for room in its queue.
+    """
+
+    def __init__(self, writer: MessageLogWriter | None = None) -> None:
+        self.writer = writer or message_log_writer
+
+    async def log_incoming_message(self, update: Update) -> bool:
         """
         Log an incoming message from a user.
 
@@ -25,84 +34,77 @@ class MessageLogger:
             update: Telegram Update object containing the message
 
         Returns:
-            Message ID in database, or None if logging failed
+            True if the record was accepted for writing
         """
         if not update.message and not update.callback_query:
-            return None
+            return False
 
         message = update.message or (update.callback_query.message if update.callback_query else None)
         if not message:
-            return None
+            return False
 
         try:
-            with db.get_session() as session:
-                # Determine message type
-                message_type = self._get_message_type(message)
-
-                # Extract text content
-                text = None
-                caption = None
-                file_id = None
-
-                if message.text:
-                    text = message.text
-                elif message.caption:
-                    caption = message.caption
-
-                # Get file_id for media messages
-                if message.photo:
-                    file_id = message.photo[-1].file_id if message.photo else None
-                elif message.document:
-                    file_id = message.document.file_id
-                elif message.video:
-                    file_id = message.video.file_id
-                elif message.audio:
-                    file_id = message.audio.file_id
-                elif message.voice:
-                    file_id = message.voice.file_id
-                elif message.sticker:
-                    file_id = message.sticker.file_id
-                elif message.video_note:
-                    file_id = message.video_note.file_id
-                elif message.animation:
-                    file_id = message.animation.file_id
-
-                # Create message record
-                msg_record = Message(
-                    telegram_id=message.from_user.id,
-                    chat_id=message.chat_id,
-                    message_id=message.message_id,
-                    direction="incoming",
-                    message_type=message_type,
-                    text=text,
-                    caption=caption,
-                    file_id=file_id,
-                    reply_to_message_id=message.reply_to_message.message_id if message.reply_to_message else None,
-                    created_at=datetime.now(UTC),
-                )
-
-                session.add(msg_record)
-                session.flush()
-
-                logger.debug(
-                    f"Logged incoming message: user_id={message.from_user.id}, "
-                    f"type={message_type}, msg_id={message.message_id}"
-                )
-
-                return msg_record.id
-
+            record = self._build_incoming_record(message)
         except Exception as e:
             logger.error(f"Failed to log incoming message: {e}", exc_info=True)
-            return None
-
-    def log_outgoing_message(
+            return False
+
+        logger.debug(
+            f"Logging incoming message: user_id={record['telegram_id']}, "
+            f"type={record['message_type']}, msg_id={record['message_id']}"
+        )
+        return await self.writer.submit(record)
+
+    def _build_incoming_record(self, message: TelegramMessage) -> dict[str, Any]:
+        """Message columns for an incoming message."""
+        # Extract text content
+        text = None
+        caption = None
+        if message.text:
+            text = message.text
+        elif message.caption:
+            caption = message.caption
+
+        # Get file_id for media messages
+        file_id = None
+        if message.photo:
+            file_id = message.photo[-1].file_id if message.photo else None
+        elif message.document:
+            file_id = message.document.file_id
+        elif message.video:
+            file_id = message.video.file_id
+        elif message.audio:
+            file_id = message.audio.file_id
+        elif message.voice:
+            file_id = message.voice.file_id
+        elif message.sticker:
+            file_id = message.sticker.file_id
+        elif message.video_note:
+            file_id = message.video_note.file_id
+        elif message.animation:
+            file_id = message.animation.file_id
+
+        return {
+            "telegram_id": message.from_user.id,
+            "chat_id": message.chat_id,
+            "message_id": message.message_id,
+            "direction": "incoming",
+            "message_type": self._get_message_type(message),
+            "text": text,
+            "caption": caption,
+            "file_id": file_id,
+            "reply_to_message_id": message.reply_to_message.message_id if message.reply_to_message else None,
+            "created_at": datetime.now(UTC),
+        }
+
+    async def log_outgoing_message(
         self,
         telegram_id: int,
         chat_id: int,
         sent_message: TelegramMessage,
         message_type: str = "text",
         reply_to_message_id: int | None = None,
-    ) -> int | None:
+    ) -> bool:
         """
         Log an outgoing message sent by the bot.
 
@@ -114,60 +116,63 @@ class MessageLogger:
             reply_to_message_id: ID of message being replied to
 
         Returns:
-            Message ID in database, or None if logging failed
+            True if the record was accepted for writing
         """
         try:
-            with db.get_session() as session:
-                # Extract content from sent message
-                text = sent_message.text if hasattr(sent_message, "text") else None
-                caption = sent_message.caption if hasattr(sent_message, "caption") else None
-
-                # Get file_id for media messages
-                file_id = None
-                if hasattr(sent_message, "photo") and sent_message.photo:
-                    file_id = sent_message.photo[-1].file_id
-                elif hasattr(sent_message, "document") and sent_message.document:
-                    file_id = sent_message.document.file_id
-                elif hasattr(sent_message, "video") and sent_message.video:
-                    file_id = sent_message.video.file_id
-                elif hasattr(sent_message, "audio") and sent_message.audio:
-                    file_id = sent_message.audio.file_id
-                elif hasattr(sent_message, "voice") and sent_message.voice:
-                    file_id = sent_message.voice.file_id
-                elif hasattr(sent_message, "sticker") and sent_message.sticker:
-                    file_id = sent_message.sticker.file_id
-                elif hasattr(sent_message, "video_note") and sent_message.video_note:
-                    file_id = sent_message.video_note.file_id
-                elif hasattr(sent_message, "animation") and sent_message.animation:
-                    file_id = sent_message.animation.file_id
-
-                # Create message record
-                msg_record = Message(
-                    telegram_id=telegram_id,
-                    chat_id=chat_id,
-                    message_id=sent_message.message_id,
-                    direction="outgoing",
-                    message_type=message_type,
-                    text=text,
-                    caption=caption,
-                    file_id=file_id,
-                    reply_to_message_id=reply_to_message_id,
-                    created_at=datetime.now(UTC),
-                )
-
-                session.add(msg_record)
-                session.flush()
-
-                logger.debug(
-                    f"Logged outgoing message: user_id={telegram_id}, "
-                    f"type={message_type}, msg_id={sent_message.message_id}"
-                )
-
-                return msg_record.id
-
+            record = self._build_outgoing_record(telegram_id, chat_id, sent_message, message_type, reply_to_message_id)
         except Exception as e:
             logger.error(f"Failed to log outgoing message: {e}", exc_info=True)
-            return None
+            return False
+
+        logger.debug(
+            f"Logging outgoing message: user_id={telegram_id}, type={message_type}, msg_id={record['message_id']}"
+        )
+        return await self.writer.submit(record)
+
+    def _build_outgoing_record(
+        self,
+        telegram_id: int,
+        chat_id: int,
+        sent_message: TelegramMessage,
+        message_type: str,
+        reply_to_message_id: int | None,
+    ) -> dict[str, Any]:
+        """Message columns for an outgoing message."""
+        # Extract content from sent message
+        text = sent_message.text if hasattr(sent_message, "text") else None
+        caption = sent_message.caption if hasattr(sent_message, "caption") else None
+
+        # Get file_id for media messages
+        file_id = None
+        if hasattr(sent_message, "photo") and sent_message.photo:
+            file_id = sent_message.photo[-1].file_id
+        elif hasattr(sent_message, "document") and sent_message.document:
+            file_id = sent_message.document.file_id
+        elif hasattr(sent_message, "video") and sent_message.video:
+            file_id = sent_message.video.file_id
+        elif hasattr(sent_message, "audio") and sent_message.audio:
+            file_id = sent_message.audio.file_id
+        elif hasattr(sent_message, "voice") and sent_message.voice:
+            file_id = sent_message.voice.file_id
+        elif hasattr(sent_message, "sticker") and sent_message.sticker:
+            file_id = sent_message.sticker.file_id
+        elif hasattr(sent_message, "video_note") and sent_message.video_note:
+            file_id = sent_message.video_note.file_id
+        elif hasattr(sent_message, "animation") and sent_message.animation:
+            file_id = sent_message.animation.file_id
+
+        return {
+            "telegram_id": telegram_id,
+            "chat_id": chat_id,
+            "message_id": sent_message.message_id,
+            "direction": "outgoing",
+            "message_type": message_type,
+            "text": text,
+            "caption": caption,
+            "file_id": file_id,
+            "reply_to_message_id": reply_to_message_id,
+            "created_at": datetime.now(UTC),
+        }
 
     def _get_message_type(self, message: TelegramMessage) -> str:
         """
@@ -211,9 +216,12 @@ class MessageLogger:
         telegram_id: int,
         limit: int = 100,
         direction: str | None = None,
-    ) -> list[Message]:
+    ) -> list[MessageRecord]:
         """
-        Retrieve messages for a specific user.
+        Retrieve the latest messages of a user, newest first.
+
+        Messages already moved to monthly partitions are included. For older pages
+        use get_user_history with the cursor of the previous page.
 
         Args:
             telegram_id: User's Telegram ID
@@ -221,25 +229,34 @@ class MessageLogger:
             direction: Filter by direction ('incoming' or 'outgoing'), or None for all
 
         Returns:
-            List of Message objects
+            List of MessageRecord objects
         """
-        try:
-            with db.get_session() as session:
-                query = session.query(Message).filter(Message.telegram_id == telegram_id)
+        return self.get_user_history(telegram_id, limit=limit, direction=direction).records
 
-                if direction:
-                    query = query.filter(Message.direction == direction)
-
-                messages = query.order_by(Message.created_at.desc()).limit(limit).all()
-
-                # Detach from session to avoid issues
-                session.expunge_all()
+    def get_user_history(
+        self,
+        telegram_id: int,
+        cursor: Cursor | None = None,
+        limit: int = HISTORY_PAGE_SIZE,
+        direction: str | None = None,
+    ) -> HistoryPage:
+        """
+        One page of a user's conversation, newest first.
 
-                return messages
+        Args:
+            telegram_id: User's Telegram ID
+            cursor: next_cursor of the previous page, or None for the latest messages
+            limit: Page size
+            direction: Filter by direction ('incoming' or 'outgoing'), or None for all
 
+        Returns:
+            HistoryPage (empty if the log could not be read)
+        """
+        try:
+            return message_history.page(telegram_id, direction=direction, cursor=cursor, limit=limit)
         except Exception as e:
             logger.error(f"Failed to retrieve user messages: {e}", exc_info=True)
-            return []
+            return HistoryPage([], None)
 
 
 # Global message logger instance
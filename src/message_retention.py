@@ -0,0 +1,347 @@
+"""
+Retention of the message log: monthly partitions and chunked pruning.
+
+The hot `messages` table only keeps the last MESSAGE_HOT_DAYS days. Older rows are
+moved, in small batches, to per-month SQLite files (data/messages/messages-YYYY-MM.sqlite
+next to the main database) with the same columns and their own message_contents, so
+a partition holds the bodies its messages reference. Messages older than
+MESSAGE_RETENTION_DAYS are deleted: from the hot table in batches, and from the
+partitions by removing whole month files once the entire month has expired.
+
+Every batch is a separate short transaction on the writer connection, so the bot keeps
+writing while the job runs. Bodies no hot message references any more are swept after
+the batches (see message_contents). Pages freed by deletes are returned to the filesystem with
+`PRAGMA incremental_vacuum` (new databases are created with auto_vacuum=INCREMENTAL,
+existing ones are converted by migrate_incremental_vacuum.py).
+
+The size of the hot table and its indexes, and therefore the cost of every insert,
+no longer grows with the number of seasons. message_history reads the hot table and the
+partitions together.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import DateTime, TextClause, bindparam, text
+from sqlalchemy.engine import Connection
+
+from .database import Database, db
+from .message_contents import CONTENTS_TABLE, ensure_content_schema, sweep_orphan_contents
+from .models import CONTENT_REFERENCES
+
+logger = logging.getLogger(__name__)
+
+# Messages older than this stay in the hot table no longer (0 - never move)
+MESSAGE_HOT_DAYS = int(os.getenv("MESSAGE_HOT_DAYS", "90"))
+# Messages older than this are deleted (0 - keep forever)
+MESSAGE_RETENTION_DAYS = int(os.getenv("MESSAGE_RETENTION_DAYS", "0"))
+# Rows moved or deleted per transaction
+MESSAGE_PRUNE_BATCH = int(os.getenv("MESSAGE_PRUNE_BATCH", "500"))
+# How often the retention job runs, in minutes (0 - disabled)
+MESSAGE_PRUNE_INTERVAL_MINUTES = int(os.getenv("MESSAGE_PRUNE_INTERVAL_MINUTES", "60"))
+# Free pages returned to the filesystem per incremental_vacuum step
+MESSAGE_VACUUM_PAGES = int(os.getenv("MESSAGE_VACUUM_PAGES", "1000"))
+
+PARTITION_SCHEMA = "partition"
+PARTITION_PATTERN = re.compile(r"^messages-(\d{4}-\d{2})\.sqlite$")
+# A partition is read by user and by time, like the hot table
+PARTITION_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_partition_telegram_id ON messages (telegram_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_partition_created_at ON messages (created_at)",
+)
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Naive UTC datetime, as stored in DateTime columns."""
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+
+def db_datetime(value: datetime) -> str:
+    """Datetime in the format SQLAlchemy stores DateTime columns in SQLite."""
+    return naive_utc(value).isoformat(sep=" ", timespec="microseconds")
+
+
+@dataclass(frozen=True)
+class MessagePartition:
+    """One month of archived messages."""
+
+    month: str  # "YYYY-MM"
+    path: str
+
+    @property
+    def start(self) -> datetime:
+        return datetime.strptime(self.month, "%Y-%m")
+
+    @property
+    def end(self) -> datetime:
+        return _next_month(self.start)
+
+
+@dataclass
+class RetentionStats:
+    """Result of one retention run."""
+
+    moved: int = 0
+    deleted: int = 0
+    dropped_partitions: int = 0
+    swept_contents: int = 0
+    vacuumed_pages: int = 0
+
+
+class MessagePartitions:
+    """Monthly partition files of the message log."""
+
+    def __init__(self, database: Database | None = None, directory: str | None = None) -> None:
+        """
+        Args:
+            database: Database with the hot messages table. If None, uses the global db instance.
+            directory: Directory of the partition files (MESSAGE_PARTITION_DIR, default
+                "messages" next to the database file)
+        """
+        self.db = database or db
+        self.directory = (
+            directory
+            or os.getenv("MESSAGE_PARTITION_DIR")
+            or os.path.join(os.path.dirname(self.db.db_path) or "data", "messages")
+        )
+
+    def path(self, month: str) -> str:
+        return os.path.join(self.directory, f"messages-{month}.sqlite")
+
+    def list_partitions(self) -> list[MessagePartition]:
+        """Existing partitions, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        partitions = []
+        for name in sorted(os.listdir(self.directory)):
+            match = PARTITION_PATTERN.match(name)
+            if match:
+                partitions.append(MessagePartition(match.group(1), os.path.join(self.directory, name)))
+        return partitions
+
+
+class MessageRetention:
+    """Moves old messages to monthly partitions and deletes expired ones, in small batches."""
+
+    def __init__(
+        self,
+        partitions: MessagePartitions | None = None,
+        hot_days: int = MESSAGE_HOT_DAYS,
+        retention_days: int = MESSAGE_RETENTION_DAYS,
+        batch_size: int = MESSAGE_PRUNE_BATCH,
+        vacuum_pages: int = MESSAGE_VACUUM_PAGES,
+    ) -> None:
+        self.partitions = partitions or MessagePartitions()
+        self.hot_days = hot_days
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+
+    @property
+    def db(self) -> Database:
+        return self.partitions.db
+
+    def run(self, now: datetime | None = None) -> RetentionStats:
+        """
+        Apply the retention settings once.
+
+        Args:
+            now: Current time (for tests)
+
+        Returns:
+            RetentionStats
+        """
+        now = now or datetime.now(UTC)
+        stats = RetentionStats()
+
+        if self.retention_days > 0:
+            retention_cutoff = now - timedelta(days=self.retention_days)
+            stats.deleted = self._delete_expired(retention_cutoff)
+            stats.dropped_partitions = self._drop_expired_partitions(retention_cutoff)
+        if self.hot_days > 0:
+            stats.moved = self._move_to_partitions(now - timedelta(days=self.hot_days))
+        if stats.moved or stats.deleted:
+            with self.db.engine.connect() as conn:
+                stats.swept_contents = sweep_orphan_contents(conn)
+            stats.vacuumed_pages = self.incremental_vacuum()
+
+        if stats.moved or stats.deleted or stats.dropped_partitions:
+            logger.info(
+                f"Message retention: moved {stats.moved} to partitions, deleted {stats.deleted}, "
+                f"dropped {stats.dropped_partitions} partitions, swept {stats.swept_contents} bodies, "
+                f"vacuumed {stats.vacuumed_pages} pages"
+            )
+        return stats
+
+    def _delete_expired(self, cutoff: datetime) -> int:
+        select_batch = text(
+            "SELECT id FROM messages WHERE created_at < :cutoff ORDER BY created_at LIMIT :limit"
+        ).bindparams(bindparam("cutoff", type_=DateTime))
+        delete_rows = text("DELETE FROM messages WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+
+        deleted = 0
+        while True:
+            # The writer connection is released after every batch, so the bot is never blocked for long
+            with self.db.engine.connect() as conn:
+                ids = [row[0] for row in conn.execute(select_batch, {"cutoff": cutoff, "limit": self.batch_size})]
+                if not ids:
+                    return deleted
+                conn.execute(delete_rows, {"ids": ids})
+                conn.commit()
+            deleted += len(ids)
+
+    def _drop_expired_partitions(self, cutoff: datetime) -> int:
+        """Remove partition files whose whole month is older than the cutoff."""
+        cutoff = naive_utc(cutoff)
+        dropped = 0
+        for partition in self.partitions.list_partitions():
+            if partition.end <= cutoff:
+                os.remove(partition.path)
+                dropped += 1
+                logger.info(f"Dropped expired message partition {partition.month}")
+        return dropped
+
+    def _move_to_partitions(self, cutoff: datetime) -> int:
+        cutoff = naive_utc(cutoff)
+        moved = 0
+        while True:
+            with self.db.engine.connect() as conn:
+                oldest = conn.execute(text("SELECT MIN(created_at) FROM messages")).scalar()
+            if oldest is None:
+                return moved
+            month = _month_start(datetime.fromisoformat(oldest))
+            if month >= cutoff:
+                return moved
+            end = min(_next_month(month), cutoff)
+            batch = self._move_batch(month.strftime("%Y-%m"), end)
+            if not batch:
+                return moved
+            moved += batch
+
+    def _move_batch(self, month: str, end: datetime) -> int:
+        """Move one batch of rows created before `end` (all in the same month) to its partition."""
+        os.makedirs(self.partitions.directory, exist_ok=True)
+        select_batch = text(
+            "SELECT id FROM main.messages WHERE created_at < :end ORDER BY created_at LIMIT :limit"
+        ).bindparams(bindparam("end", type_=DateTime))
+        delete_rows = text("DELETE FROM main.messages WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+
+        with self.db.engine.connect() as conn:
+            conn.exec_driver_sql(f"ATTACH DATABASE ? AS {PARTITION_SCHEMA}", (self.partitions.path(month),))
+            conn.commit()
+            try:
+                columns = self._ensure_partition_table(conn)
+                copy_contents, copy_rows = self._copy_statements(columns)
+
+                ids = [row[0] for row in conn.execute(select_batch, {"end": end, "limit": self.batch_size})]
+                if ids:
+                    conn.execute(copy_contents, {"ids": ids})
+                    conn.execute(copy_rows, {"ids": ids})
+                    conn.execute(delete_rows, {"ids": ids})
+                    conn.commit()
+            finally:
+                conn.rollback()
+                conn.exec_driver_sql(f"DETACH DATABASE {PARTITION_SCHEMA}")
+        logger.debug(f"Moved {len(ids)} messages to partition {month}")
+        return len(ids)
+
+    @staticmethod
+    def _copy_statements(columns: list[str]) -> tuple[TextClause, TextClause]:
+        """Statements copying the bodies and then the rows of a batch to the attached partition."""
+        references = CONTENT_REFERENCES.values()
+        # The partition has its own message_contents: references are remapped through the hash
+        copy_contents = text(
+            f"INSERT OR IGNORE INTO {PARTITION_SCHEMA}.{CONTENTS_TABLE} (hash, body) "
+            f"SELECT hash, body FROM main.{CONTENTS_TABLE} WHERE id IN ("
+            + " UNION ".join(f"SELECT {reference} FROM main.messages WHERE id IN :ids" for reference in references)
+            + ")"
+        ).bindparams(bindparam("ids", expanding=True))
+
+        def source(name: str) -> str:
+            if name not in references:
+                return f'm."{name}"'
+            return (
+                f"(SELECT p.id FROM {PARTITION_SCHEMA}.{CONTENTS_TABLE} p WHERE p.hash = "
+                f"(SELECT hash FROM main.{CONTENTS_TABLE} WHERE id = m.{name}))"
+            )
+
+        columns_sql = ", ".join(f'"{name}"' for name in columns)
+        sources_sql = ", ".join(source(name) for name in columns)
+        # OR IGNORE: a batch copied before a crash (but not deleted from the hot table) is moved again
+        copy_rows = text(
+            f"INSERT OR IGNORE INTO {PARTITION_SCHEMA}.messages ({columns_sql}) "
+            f"SELECT {sources_sql} FROM main.messages m WHERE m.id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True))
+        return copy_contents, copy_rows
+
+    @staticmethod
+    def _ensure_partition_table(conn: Connection) -> list[str]:
+        """Create (or extend) the partition tables and the search index, return the hot table columns."""
+        from .message_search import ensure_fts_index
+
+        hot_columns = conn.exec_driver_sql("PRAGMA main.table_info(messages)").fetchall()
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA {PARTITION_SCHEMA}.table_info(messages)")}
+
+        if not existing:
+            columns_sql = ", ".join(
+                f'"{row[1]}" {row[2]}{" PRIMARY KEY" if row[1] == "id" else ""}' for row in hot_columns
+            )
+            conn.exec_driver_sql(f"CREATE TABLE {PARTITION_SCHEMA}.messages ({columns_sql})")
+            for statement in PARTITION_INDEXES:
+                conn.exec_driver_sql(statement.format(schema=PARTITION_SCHEMA))
+        else:
+            for row in hot_columns:
+                if row[1] not in existing:
+                    conn.exec_driver_sql(f'ALTER TABLE {PARTITION_SCHEMA}.messages ADD COLUMN "{row[1]}" {row[2]}')
+        conn.commit()
+        ensure_content_schema(conn, PARTITION_SCHEMA)
+        ensure_fts_index(conn, PARTITION_SCHEMA)
+        return [row[1] for row in hot_columns]
+
+    def incremental_vacuum(self) -> int:
+        """
+        Return free pages to the filesystem, a few at a time.
+
+        Does nothing unless the database uses auto_vacuum=INCREMENTAL.
+
+        Returns:
+            Number of pages freed
+        """
+        with self.db.engine.connect() as conn:
+            mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode != AUTO_VACUUM_INCREMENTAL:
+                logger.debug("auto_vacuum is not INCREMENTAL, run migrate_incremental_vacuum.py to shrink the file")
+                return 0
+            before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+        remaining = before
+        while remaining:
+            with self.db.engine.connect() as conn:
+                # Every step of the statement frees one page, so it has to be run to completion;
+                # SQLAlchemy closes results without columns after the first step
+                conn.connection.driver_connection.execute(f"PRAGMA incremental_vacuum({self.vacuum_pages})").fetchall()
+                conn.commit()
+                left = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            if left >= remaining:
+                break
+            remaining = left
+        return before - remaining
+
+
+# Global instances
+message_partitions = MessagePartitions()
+message_retention = MessageRetention(message_partitions)
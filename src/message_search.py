@@ -0,0 +1,275 @@
+"""
+Full-text search over the message log (SQLite FTS5).
+
+messages_fts is an external-content FTS5 index over message_contents: every distinct
+body (text, caption or file_id) is indexed once, however many messages reference it,
+so a broadcast adds one document to the index, not one per recipient. Triggers on
+message_contents keep it in sync, so every writer (the batched log writer, retention,
+season rollover) is covered without changes. Monthly partition files get the same index
+when they are created.
+
+A search collects the ids of the matching bodies once. When few messages reference
+them, those are looked up through the text_ref / caption_ref indexes; when many do (or
+the search is limited to one user), messages are walked newest first (or by the
+telegram_id index) and checked against the ids, so the page fills up quickly. Results
+are ordered newest first and paginated by keyset on the message id; snippets are built
+only for the page returned.
+"""
+
+import logging
+import os
+import sqlite3
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .database import Database, db
+from .message_contents import CONTENTS_TABLE
+from .message_retention import MessagePartitions, db_datetime, message_partitions, naive_utc
+from .models import MESSAGE_DIRECTIONS
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "messages_fts"
+SEARCH_PAGE_SIZE = 10
+SNIPPET_TOKENS = 12
+# Below this many matching bodies and messages referencing them, messages are looked up by reference
+LOOKUP_LIMIT = 2000
+# The ids of the bodies containing the phrase, computed once per statement
+_MATCHES = f"WITH matches AS MATERIALIZED (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :phrase)"
+
+# Bodies never change: only inserts and deletes (by the orphan sweep) are indexed
+_FTS_TRIGGERS = {
+    "messages_fts_insert": (
+        f"AFTER INSERT ON {CONTENTS_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE} (rowid, body) VALUES (new.id, new.body); END"
+    ),
+    "messages_fts_delete": (
+        f"AFTER DELETE ON {CONTENTS_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); END"
+    ),
+}
+# Triggers of the previous index over messages.text/caption, dropped on upgrade
+_STALE_TRIGGERS = ("messages_fts_update",)
+# unicode61 folds case of Cyrillic letters too; remove_diacritics makes "е" match "ё"
+_FTS_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(body, content='{CONTENTS_TABLE}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+
+
+def ensure_fts_index(conn: Connection, schema: str = "main") -> bool:
+    """
+    Create the FTS index over message_contents of a schema, with its triggers.
+
+    If the index or any trigger is missing or out of date (first start, tables
+    recreated, schema migrated), the index is rebuilt from message_contents.
+
+    Returns:
+        True if the index was (re)built
+    """
+    existing = dict(
+        conn.exec_driver_sql(
+            f"SELECT name, sql FROM {schema}.sqlite_master WHERE name = ? OR type = 'trigger'", (FTS_TABLE,)
+        ).all()
+    )
+    expected = {FTS_TABLE: _FTS_TABLE_SQL}
+    expected.update({name: f"CREATE TRIGGER {name} {body}" for name, body in _FTS_TRIGGERS.items()})
+    if all(existing.get(name) == sql for name, sql in expected.items()) and not any(
+        name in existing for name in _STALE_TRIGGERS
+    ):
+        conn.commit()
+        return False
+
+    for name in (*_FTS_TRIGGERS, *_STALE_TRIGGERS):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {schema}.{name}")
+    if existing.get(FTS_TABLE) != _FTS_TABLE_SQL:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {schema}.{FTS_TABLE}")
+        conn.exec_driver_sql(_FTS_TABLE_SQL.replace(f"TABLE {FTS_TABLE}", f"TABLE {schema}.{FTS_TABLE}", 1))
+    for name, body in _FTS_TRIGGERS.items():
+        conn.exec_driver_sql(f"CREATE TRIGGER {schema}.{name} {body}")
+    conn.exec_driver_sql(f"INSERT INTO {schema}.{FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+    conn.commit()
+    logger.info(f"Full-text index of {schema}.{CONTENTS_TABLE} built")
+    return True
+
+
+def to_phrase(query: str) -> str:
+    """Quote user input as one FTS5 phrase (no operators, no syntax errors)."""
+    return '"' + " ".join(query.split()).replace('"', '""') + '"'
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """A message matching the search."""
+
+    id: int
+    telegram_id: int
+    direction: str
+    created_at: datetime
+    snippet: str
+
+
+@dataclass(frozen=True)
+class SearchPage:
+    """One page of results; next_before is the cursor of the next page (None on the last one)."""
+
+    hits: list[SearchHit]
+    next_before: int | None
+
+
+class MessageSearch:
+    """Phrase search over the hot messages table and its monthly partitions."""
+
+    def __init__(self, database: Database | None = None, partitions: MessagePartitions | None = None) -> None:
+        self.db = database or db
+        self.partitions = partitions or message_partitions
+
+    def search(
+        self,
+        query: str,
+        telegram_id: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        before: int | None = None,
+        limit: int = SEARCH_PAGE_SIZE,
+    ) -> SearchPage:
+        """
+        Find messages containing the phrase, newest first.
+
+        Args:
+            query: Phrase to search for (words in this order)
+            telegram_id: Only messages of this user
+            since: Only messages created at or after this time
+            until: Only messages created before this time
+            before: Cursor: only messages with id below this (next_before of the previous page)
+            limit: Page size
+
+        Returns:
+            SearchPage
+        """
+        phrase = to_phrase(query)
+        if phrase == '""':
+            return SearchPage([], None)
+
+        filters = {"telegram_id": telegram_id, "since": since, "until": until, "before": before}
+        with self.db.get_session(readonly=True) as session:
+            rows = self._search_source(
+                lambda sql, params: session.execute(text(sql), params).all(), phrase, filters, limit + 1
+            )
+
+        if len(rows) <= limit:
+            # Older messages live in the partitions (newest month first)
+            since_naive = naive_utc(since) if since else None
+            until_naive = naive_utc(until) if until else None
+            for partition in reversed(self.partitions.list_partitions()):
+                if len(rows) > limit or (since_naive is not None and partition.end <= since_naive):
+                    break
+                if until_naive is not None and partition.start >= until_naive:
+                    continue
+                rows.extend(self._search_partition(partition.path, phrase, filters, limit + 1 - len(rows)))
+
+        hits = [
+            SearchHit(
+                id=row[0],
+                telegram_id=row[1],
+                direction=MESSAGE_DIRECTIONS[row[2]],
+                created_at=datetime.fromisoformat(row[3]),
+                snippet=row[4],
+            )
+            for row in rows[:limit]
+        ]
+        return SearchPage(hits, hits[-1].id if len(rows) > limit else None)
+
+    @classmethod
+    def _search_source(cls, execute: Callable[[str, dict], Any], phrase: str, filters: dict, limit: int) -> list[tuple]:
+        """One page of hits from one database file (the hot one or a partition)."""
+        # Few messages reference the matching bodies: look them up by reference and sort them.
+        # Many do: walk the messages newest first, the page fills up quickly. Both counts are
+        # capped, so they cost little however common the phrase is
+        walk = filters["telegram_id"] is not None
+        if not walk:
+            (bodies,) = execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :phrase LIMIT :limit)",
+                {"phrase": phrase, "limit": LOOKUP_LIMIT},
+            )[0]
+            if not bodies:
+                return []
+            walk = bodies >= LOOKUP_LIMIT
+        if not walk:
+            (referencing,) = execute(
+                f"{_MATCHES} SELECT COUNT(*) FROM (SELECT 1 FROM messages WHERE text_ref IN matches "
+                "UNION ALL SELECT 1 FROM messages WHERE caption_ref IN matches LIMIT :limit)",
+                {"phrase": phrase, "limit": LOOKUP_LIMIT},
+            )[0]
+            walk = referencing >= LOOKUP_LIMIT
+
+        sql, params = cls._build_query(phrase, walk, limit=limit, **filters)
+        rows = execute(sql, params)
+        references = {reference for row in rows for reference in row[4:] if reference is not None}
+        if not references:
+            return []
+        # Snippets only for the page, from the body that matched (the text, else the caption)
+        snippets = dict(
+            execute(
+                f"SELECT rowid, snippet({FTS_TABLE}, 0, '«', '»', '…', {SNIPPET_TOKENS}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH :phrase AND rowid IN ({', '.join(str(int(i)) for i in references)})",
+                {"phrase": phrase},
+            )
+        )
+        return [(*row[:4], snippets[row[4]] if row[4] in snippets else snippets[row[5]]) for row in rows]
+
+    @staticmethod
+    def _build_query(
+        phrase: str,
+        walk: bool,
+        telegram_id: int | None,
+        since: datetime | None,
+        until: datetime | None,
+        before: int | None,
+        limit: int,
+    ) -> tuple[str, dict]:
+        # Unary +: the reference indexes must not be chosen over the id order (or the telegram_id index)
+        unary = "+" if walk else ""
+        conditions = [f"({unary}m.text_ref IN matches OR {unary}m.caption_ref IN matches)"]
+        params: dict = {"phrase": phrase, "limit": limit}
+        if before is not None:
+            conditions.append("m.id < :before")
+            params["before"] = before
+        if telegram_id is not None:
+            conditions.append("m.telegram_id = :telegram_id")
+            params["telegram_id"] = telegram_id
+        if since is not None:
+            conditions.append("m.created_at >= :since")
+            params["since"] = db_datetime(since)
+        if until is not None:
+            conditions.append("m.created_at < :until")
+            params["until"] = db_datetime(until)
+
+        sql = (
+            f"{_MATCHES} SELECT m.id, m.telegram_id, m.direction, m.created_at, m.text_ref, m.caption_ref "
+            f"FROM messages m WHERE {' AND '.join(conditions)} ORDER BY m.id DESC LIMIT :limit"
+        )
+        return sql, params
+
+    @classmethod
+    def _search_partition(cls, path: str, phrase: str, filters: dict, limit: int) -> list[tuple]:
+        if not os.path.exists(path):
+            return []
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return cls._search_source(lambda sql, params: conn.execute(sql, params).fetchall(), phrase, filters, limit)
+        except sqlite3.OperationalError as e:
+            # Partition created before the index existed and never written since
+            logger.debug(f"Partition {path} is not searchable: {e}")
+            return []
+        finally:
+            conn.close()
+
+
+# Global message search instance
+message_search = MessageSearch()
@@ -68,7 +68,7 @@ class MessageSender:
                 logger.debug(f"Сообщение успешно отправлено пользователю {chat_id}")
 
                 # Log outgoing message
-                message_logger.log_outgoing_message(
+                await message_logger.log_outgoing_message(
                     telegram_id=chat_id,
                     chat_id=chat_id,
                     sent_message=sent_message,
@@ -151,7 +151,7 @@ class MessageSender:
                 logger.debug(f"Фото успешно отправлено пользователю {chat_id}")
 
                 # Log outgoing message
-                message_logger.log_outgoing_message(
+                await message_logger.log_outgoing_message(
                     telegram_id=chat_id,
                     chat_id=chat_id,
                     sent_message=sent_message,
@@ -234,7 +234,7 @@ class MessageSender:
                 logger.debug(f"Видео успешно отправлено пользователю {chat_id}")
 
                 # Log outgoing message
-                message_logger.log_outgoing_message(
+                await message_logger.log_outgoing_message(
                     telegram_id=chat_id,
                     chat_id=chat_id,
                     sent_message=sent_message,
@@ -317,7 +317,7 @@ class MessageSender:
                 logger.debug(f"Документ успешно отправлен пользователю {chat_id}")
 
                 # Log outgoing message
-                message_logger.log_outgoing_message(
+                await message_logger.log_outgoing_message(
                     telegram_id=chat_id,
                     chat_id=chat_id,
                     sent_message=sent_message,
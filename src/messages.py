@@ -51,6 +51,9 @@ WILL_DRIVE_OPTIONS = [
     OPTION_WILL_DRIVE_NO,
 ]
 
+# Значение, с которым участники прошлого сезона переносятся в новый (не вариант ответа)
+OPTION_WILL_DRIVE_PENDING = "Жду ответа по этому году ❗"
+
 # ============================================================================
 # СООБЩЕНИЯ-ПОДТВЕРЖДЕНИЯ (ACKNOWLEDGMENTS)
 # ============================================================================
@@ -107,6 +110,8 @@ ERROR_FIELD_NOT_EDITABLE = "Это поле нельзя редактирова
 
 ERROR_SELECT_SOMETHING = "Нужно что-то выбрать!"
 
+ERROR_STALE_KEYBOARD = "Эти кнопки устарели, воспользуйся последним сообщением бота."
+
 # ============================================================================
 # СООБЩЕНИЯ ДЛЯ АДМИНОВ
 # ============================================================================
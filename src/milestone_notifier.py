@@ -3,6 +3,7 @@
 Отправляет уведомления в чат staff при достижении 25, 50, 75, 100 и т.д. участников.
 """
 
+import asyncio
 import logging
 
 from telegram import Bot
@@ -34,6 +35,9 @@ class MilestoneNotifier:
         """Инициализация уведомителя вех."""
         self.User = get_user_model()
         self._sent_milestones = set()  # Хранит уже отправленные вехи
+        # Апдейты разных пользователей обрабатываются параллельно - проверка и отправка
+        # должны быть атомарными, иначе одна веха может уйти дважды
+        self._lock = asyncio.Lock()
 
     def _get_participant_count(self) -> int:
         """
@@ -47,7 +51,7 @@ class MilestoneNotifier:
             int: Количество участников
         """
         try:
-            with db.get_session() as session:
+            with db.get_session(readonly=True) as session:
                 count = (
                     session.query(self.User)
                     .filter(self.User.will_drive == OPTION_WILL_DRIVE_YES, self.User.is_staff == 0)
@@ -111,6 +115,10 @@ class MilestoneNotifier:
         Returns:
             bool: True если уведомление было отправлено, False в противном случае
         """
+        async with self._lock:
+            return await self._check_and_notify(bot)
+
+    async def _check_and_notify(self, bot: Bot) -> bool:
         try:
             # Получаем текущее количество участников
             current_count = self._get_participant_count()
@@ -3,12 +3,34 @@ SQLAlchemy ORM models for the registration bot.
 Models are created dynamically based on SURVEY_CONFIG.
 """
 
+import hashlib
 import logging
+from collections.abc import Iterable
 from datetime import UTC, datetime
+from operator import attrgetter
 from typing import Any
 
-from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    LargeBinary,
+    Select,
+    SmallInteger,
+    String,
+    Text,
+    TypeDecorator,
+    event,
+    inspect,
+    select,
+)
+from sqlalchemy import text as sql_text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, column_property, declarative_base
+
+from .survey.skip_conditions import is_sql_compatible
 
 logger = logging.getLogger(__name__)
 
@@ -16,45 +38,292 @@ logger = logging.getLogger(__name__)
 DynamicBase = declarative_base()
 
 
+class ModelSerializer:
+    """
+    Serializer compiled once per model.
+
+    Column names, the attribute getter and the positions of DateTime columns are
+    computed up front, so serializing a row is a single tuple fetch plus a pass over
+    the (usually two) datetime columns instead of a getattr/isinstance per column.
+    """
+
+    def __init__(self, model: Any) -> None:
+        # Mapped column attributes: table columns plus SQL-expression ones (Message.text)
+        attributes = inspect(model).column_attrs
+        self.model = model
+        self.columns = tuple(attribute.expression for attribute in attributes)
+        self.column_names = tuple(attribute.key for attribute in attributes)
+        self.datetime_columns = tuple(
+            attribute.key for attribute in attributes if isinstance(attribute.columns[0].type, DateTime)
+        )
+        self._getter = attrgetter(*self.column_names)
+
+    def select(self) -> Select:
+        """SELECT over all model columns, returning plain rows instead of ORM objects."""
+        return select(*self.columns)
+
+    def serialize(self, obj: Any) -> dict[str, Any]:
+        """Convert an ORM instance to a dictionary."""
+        return self._finish(dict(zip(self.column_names, self._getter(obj), strict=True)))
+
+    def serialize_row(self, row: Any) -> dict[str, Any]:
+        """Convert a Row produced by select() to a dictionary."""
+        return self._finish(dict(zip(self.column_names, row, strict=True)))
+
+    def serialize_rows(self, rows: Any) -> list[dict[str, Any]]:
+        """Convert an iterable of Rows produced by select() to dictionaries."""
+        return [self.serialize_row(row) for row in rows]
+
+    def _finish(self, result: dict[str, Any]) -> dict[str, Any]:
+        for name in self.datetime_columns:
+            value = result[name]
+            if value is not None:
+                result[name] = value.isoformat()
+        return result
+
+
+_serializers: dict[Any, ModelSerializer] = {}
+
+
+def get_serializer(model: Any) -> ModelSerializer:
+    """
+    Get the compiled serializer for a model, creating it on first use.
+
+    Args:
+        model: ORM model class
+
+    Returns:
+        ModelSerializer bound to the model
+    """
+    serializer = _serializers.get(model)
+    if serializer is None:
+        serializer = _serializers[model] = ModelSerializer(model)
+    return serializer
+
+
+class MessageContent(DynamicBase):
+    """
+    Body of a message (text, caption or file_id), stored once.
+
+    Rows are addressed by the SHA-256 of the body, so a broadcast to thousands of users
+    stores its text once and every messages row only references it by id.
+    """
+
+    __tablename__ = "message_contents"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash = Column(LargeBinary(32), nullable=False, unique=True)  # sha256(body)
+    body = Column(Text, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<MessageContent(id={self.id}, length={len(self.body or '')})>"
+
+
+def content_hash(body: str) -> bytes:
+    """Key of a body in message_contents."""
+    return hashlib.sha256(body.encode("utf-8")).digest()
+
+
+CONTENT_LOOKUP_CHUNK = 500
+
+
+def store_contents(conn: Any, bodies: Iterable[str | None]) -> dict[str, int]:
+    """
+    Store message bodies that are not stored yet and return the ids of all of them.
+
+    Args:
+        conn: Connection or Session of the writer (the same transaction as the messages insert)
+        bodies: Bodies to store; None values are skipped, duplicates are stored once
+
+    Returns:
+        Mapping of body to message_contents.id
+    """
+    hashes = {body: content_hash(body) for body in bodies if body is not None}
+    if not hashes:
+        return {}
+
+    conn.execute(
+        sqlite_insert(MessageContent).on_conflict_do_nothing(index_elements=["hash"]),
+        [{"hash": digest, "body": body} for body, digest in hashes.items()],
+    )
+    ids_by_hash = {}
+    digests = list(hashes.values())
+    for start in range(0, len(digests), CONTENT_LOOKUP_CHUNK):
+        chunk = digests[start : start + CONTENT_LOOKUP_CHUNK]
+        rows = conn.execute(select(MessageContent.hash, MessageContent.id).where(MessageContent.hash.in_(chunk)))
+        ids_by_hash.update(rows.all())
+    return {body: ids_by_hash[digest] for body, digest in hashes.items()}
+
+
+# Stored as their position in the tuple: append new values, never reorder or remove
+MESSAGE_DIRECTIONS = ("incoming", "outgoing")
+MESSAGE_TYPES = (
+    "other",
+    "text",
+    "photo",
+    "document",
+    "video",
+    "audio",
+    "voice",
+    "sticker",
+    "contact",
+    "location",
+    "poll",
+    "video_note",
+    "animation",
+)
+
+
+class CodedString(TypeDecorator):
+    """
+    String from a fixed set of values, stored as its small-integer code.
+
+    Python code (and queries like Message.direction == "incoming") keep using the strings;
+    the table stores 1-byte integers and the message_log view decodes them back.
+    """
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, values: tuple[str, ...]) -> None:
+        super().__init__()
+        self.values = values
+        self._codes = {value: code for code, value in enumerate(values)}
+
+    def process_bind_param(self, value: str | None, dialect: Any) -> int | None:
+        if value is None:
+            return None
+        try:
+            return self._codes[value]
+        except KeyError:
+            raise ValueError(f"Unknown value {value!r}, expected one of {', '.join(self.values)}") from None
+
+    def process_result_value(self, value: int | None, dialect: Any) -> str | None:
+        return None if value is None else self.values[value]
+
+
+def _content_body(reference: Column) -> Any:
+    return select(MessageContent.body).where(MessageContent.id == reference).scalar_subquery()
+
+
 class Message(DynamicBase):
     """
     Model for storing all messages exchanged between users and the bot.
     Tracks both incoming messages from users and outgoing messages from the bot.
+
+    text, caption and file_id live in message_contents (see MessageContent): the row
+    stores their ids, the attributes read the bodies through subqueries and are resolved
+    to ids when new messages are flushed. Core inserts go through content_rows.
+    direction and message_type are stored as small-integer codes (see CodedString).
     """
 
     __tablename__ = "messages"
+    # Every index is written on each insert, so only the ones queries use. No index on
+    # direction or chat_id: nothing looks messages up by them alone
     __table_args__ = (
-        Index("idx_message_telegram_id", "telegram_id"),
-        Index("idx_message_chat_id", "chat_id"),
-        Index("idx_message_direction", "direction"),
+        # Whole log by time (history without a user, retention moving the oldest month)
         Index("idx_message_created_at", "created_at"),
+        # Keyset pages of one user's conversation: WHERE telegram_id = ? AND (created_at, id) < (?, ?).
+        # Also serves telegram_id alone, so there is no separate index on it
+        Index("idx_message_telegram_id_created_at", "telegram_id", "created_at"),
+        # Messages referencing a body (search, orphan sweep); rows without one are not indexed
+        Index("idx_message_text_ref", "text_ref", sqlite_where=sql_text("text_ref IS NOT NULL")),
+        Index("idx_message_caption_ref", "caption_ref", sqlite_where=sql_text("caption_ref IS NOT NULL")),
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    telegram_id = Column(BigInteger, nullable=False, index=True)  # User's Telegram ID
-    chat_id = Column(BigInteger, nullable=False, index=True)  # Chat ID (usually same as telegram_id for private chats)
+    telegram_id = Column(BigInteger, nullable=False)  # User's Telegram ID
+    chat_id = Column(BigInteger, nullable=False)  # Chat ID (usually same as telegram_id for private chats)
     message_id = Column(BigInteger, nullable=True)  # Telegram message ID
-    direction = Column(String(10), nullable=False)  # 'incoming' or 'outgoing'
-    message_type = Column(String(50), nullable=True)  # 'text', 'photo', 'document', 'contact', etc.
-    text = Column(Text, nullable=True)  # Message text content
-    caption = Column(Text, nullable=True)  # Caption for media messages
-    file_id = Column(String(255), nullable=True)  # Telegram file_id for media
+    direction = Column(CodedString(MESSAGE_DIRECTIONS), nullable=False)  # 'incoming' or 'outgoing'
+    message_type = Column(CodedString(MESSAGE_TYPES), nullable=True)  # 'text', 'photo', 'document', 'contact', etc.
+    # message_contents ids. No foreign keys: with them every deleted body would scan messages
+    text_ref = Column(Integer, nullable=True)  # Message text content
+    caption_ref = Column(Integer, nullable=True)  # Caption for media messages
+    file_ref = Column(Integer, nullable=True)  # Telegram file_id for media
     reply_to_message_id = Column(BigInteger, nullable=True)  # ID of message being replied to
-    created_at = Column(DateTime, default=lambda: datetime.now(UTC), nullable=False, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC), nullable=False)
+
+    text = column_property(_content_body(text_ref))
+    caption = column_property(_content_body(caption_ref))
+    file_id = column_property(_content_body(file_ref))
 
     def __repr__(self) -> str:
         return f"<Message(id={self.id}, telegram_id={self.telegram_id}, direction='{self.direction}', type='{self.message_type}')>"
 
     def to_dict(self) -> dict[str, Any]:
         """Convert message object to dictionary."""
-        result = {}
-        for column in self.__table__.columns:
-            value = getattr(self, column.name)
-            if isinstance(value, datetime):
-                result[column.name] = value.isoformat()
-            else:
-                result[column.name] = value
-        return result
+        return get_serializer(type(self)).serialize(self)
+
+
+# Body attribute -> reference column
+CONTENT_REFERENCES = {"text": "text_ref", "caption": "caption_ref", "file_id": "file_ref"}
+
+
+def content_rows(conn: Any, records: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Turn message records with text/caption/file_id into messages rows with references.
+
+    Args:
+        conn: Connection or Session of the writer (the same transaction as the insert)
+        records: Dicts of Message columns, with bodies instead of references
+
+    Returns:
+        New dicts, ready for insert(Message)
+    """
+    ids = store_contents(conn, (record.get(name) for record in records for name in CONTENT_REFERENCES))
+    rows = []
+    for record in records:
+        row = {key: value for key, value in record.items() if key not in CONTENT_REFERENCES}
+        for name, reference in CONTENT_REFERENCES.items():
+            body = record.get(name)
+            row[reference] = ids[body] if body is not None else None
+        rows.append(row)
+    return rows
+
+
+@event.listens_for(Session, "before_flush")
+def _store_message_contents(session: Session, flush_context: Any, instances: Any) -> None:
+    """Resolve text/caption/file_id of new messages to message_contents ids."""
+    pending = [obj for obj in session.new if isinstance(obj, Message)]
+    if not pending:
+        return
+    ids = store_contents(
+        session.connection(), (getattr(message, name) for message in pending for name in CONTENT_REFERENCES)
+    )
+    for message in pending:
+        for name, reference in CONTENT_REFERENCES.items():
+            body = getattr(message, name)
+            if body is not None and getattr(message, reference) is None:
+                setattr(message, reference, ids[body])
+
+
+class PersistenceEntry(DynamicBase):
+    """
+    Model for data persisted by the bot's PTB persistence (user_data, bot_data, conversations).
+
+    Values are JSON documents addressed by (kind, key), e.g. ("user_data", "<telegram id>").
+    """
+
+    __tablename__ = "bot_persistence"
+
+    kind = Column(String(64), primary_key=True)  # 'user_data', 'chat_data', 'bot_data' or 'conversation:<name>'
+    key = Column(String(255), primary_key=True)  # Telegram ID, chat ID or JSON-encoded conversation key
+    data = Column(Text, nullable=False)  # JSON
+    updated_at = Column(DateTime, default=lambda: datetime.now(UTC), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<PersistenceEntry(kind='{self.kind}', key='{self.key}')>"
+
+
+def _skip_condition_fields(fields: Any) -> set[str]:
+    """Поля, от которых зависят условия пропуска, переводимые в SQL."""
+    return {
+        name
+        for field in fields
+        if field.skip_if is not None and is_sql_compatible(field.skip_if)
+        for name in field.skip_if.fields
+    }
 
 
 def create_user_model(survey_config):
@@ -103,22 +372,26 @@ def create_user_model(survey_config):
             col_type = Text
 
         attrs[field_name] = Column(col_type, nullable=True)
+        if field.multi_select:
+            # Покрывающий индекс для выборок "все, кто выбрал вариант X" по битовой маске
+            attrs["__table_args__"] += (Index(f"idx_user_{field_name}_mask", field_name, "telegram_id"),)
+
         logger.debug(f"Added field '{field_name}' with type {col_type.__name__} to User model")
 
+    # Индексы по полям, от которых зависят условия пропуска: выборки "кому будет задан вопрос"
+    # выполняются SQL-запросом (см. UserStorage.get_users_to_ask)
+    field_names = {field.field_name for field in survey_config.fields}
+    for field_name in sorted(_skip_condition_fields(survey_config.fields) & field_names):
+        if not any(field.field_name == field_name and field.multi_select for field in survey_config.fields):
+            attrs["__table_args__"] += (Index(f"idx_user_{field_name}", field_name),)
+
     # Add methods to the class
     def __repr__(self) -> str:
         return f"<User(telegram_id={self.telegram_id}, state='{self.state}')>"
 
     def to_dict(self) -> dict[str, Any]:
         """Convert user object to dictionary."""
-        result = {}
-        for column in self.__table__.columns:
-            value = getattr(self, column.name)
-            if isinstance(value, datetime):
-                result[column.name] = value.isoformat()
-            else:
-                result[column.name] = value
-        return result
+        return get_serializer(type(self)).serialize(self)
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]):
@@ -111,7 +111,7 @@ class PermissionManager:
             return True
 
         # Check database for permission
-        with self.db.get_session() as session:
+        with self.db.get_session(readonly=True) as session:
             perm = session.query(UserPermission).filter_by(telegram_id=user_id, permission=permission.value).first()
             return perm is not None
 
@@ -182,7 +182,7 @@ class PermissionManager:
         if self.is_root(user_id):
             return {perm.value for perm in Permission}
 
-        with self.db.get_session() as session:
+        with self.db.get_session(readonly=True) as session:
             perms = session.query(UserPermission).filter_by(telegram_id=user_id).all()
             return {perm.permission for perm in perms}
 
@@ -196,7 +196,7 @@ class PermissionManager:
         Returns:
             List of telegram user IDs
         """
-        with self.db.get_session() as session:
+        with self.db.get_session(readonly=True) as session:
             perms = session.query(UserPermission).filter_by(permission=permission.value).all()
             user_ids = [perm.telegram_id for perm in perms]
 
@@ -256,7 +256,7 @@ class PermissionManager:
         Returns:
             Chat ID or None if not found
         """
-        with self.db.get_session() as session:
+        with self.db.get_session(readonly=True) as session:
             chat = session.query(BotChat).filter_by(chat_type=chat_type, is_active=True).first()
             return chat.chat_id if chat else None
 
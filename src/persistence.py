@@ -0,0 +1,235 @@
+"""
+PTB persistence backed by the bot's SQLite database.
+
+Application keeps user_data (and bot_data) in memory and calls update_* for the
+entries changed since the previous run every `update_interval` seconds and once
+more on shutdown. Those calls only mark entries dirty; all dirty entries of a run
+are written in one transaction. On startup everything is loaded back, so the
+registration state cached in context.user_data survives restarts.
+
+Code that changes or deletes users directly in the database (season rollover, bulk
+upserts) invalidates their cached state: drop_cached_user_data deletes the persisted
+entries, and mark_user_data_stale makes the persistences of this process drop the
+state from context.user_data on the user's next update, without querying the database.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import weakref
+from collections import defaultdict
+from collections.abc import Collection
+from datetime import UTC, datetime
+from typing import Any
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from telegram.ext import BasePersistence, PersistenceInput
+
+from .constants import STATE
+from .database import Database, db
+from .models import PersistenceEntry
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = "user_data"
+CHAT_DATA = "chat_data"
+BOT_DATA = "bot_data"
+CONVERSATION_PREFIX = "conversation:"
+BOT_DATA_KEY = "bot"
+
+ConversationKey = tuple[int | str, ...]
+ConversationDict = dict[ConversationKey, object]
+
+# How often Application hands changed data to the persistence, in seconds
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "30"))
+
+# Persistences of this process, notified by mark_user_data_stale
+_live_persistences: "weakref.WeakSet[SQLitePersistence]" = weakref.WeakSet()
+
+
+class SQLitePersistence(BasePersistence[dict[Any, Any], dict[Any, Any], dict[Any, Any]]):
+    """
+    BasePersistence storing JSON documents in the bot_persistence table.
+
+    Values must be JSON-serializable; entries that are not are logged and skipped.
+    Callback data is not persisted (inline buttons carry their own compact data).
+    """
+
+    def __init__(
+        self,
+        database: Database | None = None,
+        store_data: PersistenceInput | None = None,
+        update_interval: float = PERSISTENCE_UPDATE_INTERVAL,
+    ) -> None:
+        """
+        Args:
+            database: Database to store data in. If None, uses the global db instance.
+            store_data: Which kinds of data to persist (default: everything but callback data)
+            update_interval: Seconds between persistence runs of the Application
+        """
+        super().__init__(
+            store_data=store_data or PersistenceInput(callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db = database or db
+        self._dirty: dict[tuple[str, str], Any] = {}  # (kind, key) -> data, None = delete
+        self._write_lock = asyncio.Lock()
+        self._stale_users: set[int] = set()
+        _live_persistences.add(self)
+
+    # Loading
+
+    def _load(self, kind: str) -> dict[str, Any]:
+        with self.db.get_session(readonly=True) as session:
+            rows = session.query(PersistenceEntry.key, PersistenceEntry.data).filter_by(kind=kind).all()
+        return {key: json.loads(data) for key, data in rows}
+
+    def _load_conversations(self) -> dict[str, ConversationDict]:
+        conversations: dict[str, ConversationDict] = defaultdict(dict)
+        with self.db.get_session(readonly=True) as session:
+            rows = (
+                session.query(PersistenceEntry.kind, PersistenceEntry.key, PersistenceEntry.data)
+                .filter(PersistenceEntry.kind.startswith(CONVERSATION_PREFIX))
+                .all()
+            )
+        for kind, key, data in rows:
+            conversations[kind.removeprefix(CONVERSATION_PREFIX)][tuple(json.loads(key))] = json.loads(data)
+        return conversations
+
+    async def get_user_data(self) -> dict[int, dict[Any, Any]]:
+        return {int(key): data for key, data in self._load(USER_DATA).items()}
+
+    async def get_chat_data(self) -> dict[int, dict[Any, Any]]:
+        return {int(key): data for key, data in self._load(CHAT_DATA).items()}
+
+    async def get_bot_data(self) -> dict[Any, Any]:
+        return self._load(BOT_DATA).get(BOT_DATA_KEY, {})
+
+    async def get_callback_data(self) -> Any:
+        return None
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        return self._load_conversations().get(name, {})
+
+    # Updates: only mark entries dirty, the batch is written by _write_dirty
+
+    async def update_user_data(self, user_id: int, data: dict[Any, Any]) -> None:
+        await self._mark(USER_DATA, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict[Any, Any]) -> None:
+        await self._mark(CHAT_DATA, str(chat_id), data)
+
+    async def update_bot_data(self, data: dict[Any, Any]) -> None:
+        await self._mark(BOT_DATA, BOT_DATA_KEY, data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: object | None) -> None:
+        await self._mark(f"{CONVERSATION_PREFIX}{name}", json.dumps(list(key)), new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._mark(USER_DATA, str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._mark(CHAT_DATA, str(chat_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict[Any, Any]) -> None:
+        # Only users whose rows were changed behind the cache (mark_user_data_stale) are refreshed:
+        # without a cached state the handlers read it from the users table
+        if user_id in self._stale_users:
+            self._stale_users.discard(user_id)
+            user_data.pop(STATE, None)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict[Any, Any]) -> None:
+        pass
+
+    def mark_stale(self, user_ids: Collection[int]) -> None:
+        """Forget the cached state of these users on their next update, and do not write it back."""
+        self._stale_users.update(user_ids)
+        for user_id in user_ids:
+            self._dirty.pop((USER_DATA, str(user_id)), None)
+
+    async def flush(self) -> None:
+        """Write everything still dirty (called by Application on shutdown)."""
+        await self._write_dirty()
+
+    async def _mark(self, kind: str, key: str, data: Any) -> None:
+        self._dirty[(kind, key)] = data
+        # Application passes all changed entries of a run concurrently (asyncio.gather);
+        # yielding once lets all of them get marked before the first one writes the batch
+        await asyncio.sleep(0)
+        await self._write_dirty()
+
+    async def _write_dirty(self) -> None:
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            self.write_batch(batch)
+
+    def write_batch(self, batch: dict[tuple[str, str], Any]) -> None:
+        """Upsert (or delete, for None values) a batch of entries in one transaction."""
+        now = datetime.now(UTC)
+        rows = []
+        deleted = []
+        for (kind, key), data in batch.items():
+            if data is None:
+                deleted.append((kind, key))
+                continue
+            try:
+                rows.append({"kind": kind, "key": key, "data": json.dumps(data, ensure_ascii=False), "updated_at": now})
+            except (TypeError, ValueError) as e:
+                logger.error(f"Cannot persist {kind}[{key}]: {e}")
+
+        with self.db.get_session() as session:
+            if rows:
+                stmt = sqlite_insert(PersistenceEntry)
+                session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["kind", "key"],
+                        set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+                    ),
+                    rows,
+                )
+            for kind, key in deleted:
+                session.execute(
+                    delete(PersistenceEntry).where(PersistenceEntry.kind == kind, PersistenceEntry.key == key)
+                )
+        logger.debug(f"Persisted {len(rows)} entries, dropped {len(deleted)}")
+
+
+def drop_cached_user_data(session: Any, user_ids: Collection[int]) -> int:
+    """
+    Invalidate the cached registration state of users whose rows were changed or deleted.
+
+    Deletes their persisted user_data entries in the caller's transaction and marks them
+    stale in every SQLitePersistence of this process.
+
+    Args:
+        session: Session or connection of the transaction that changed the users
+        user_ids: Telegram IDs of the changed users
+
+    Returns:
+        Number of deleted persisted entries
+    """
+    if not user_ids:
+        return 0
+    dropped = session.execute(
+        delete(PersistenceEntry).where(
+            PersistenceEntry.kind == USER_DATA, PersistenceEntry.key.in_([str(user_id) for user_id in user_ids])
+        )
+    ).rowcount
+    mark_user_data_stale(user_ids)
+    return dropped
+
+
+def mark_user_data_stale(user_ids: Collection[int]) -> None:
+    """Make every SQLitePersistence of this process drop the cached state of these users."""
+    for persistence in list(_live_persistences):
+        persistence.mark_stale(user_ids)
@@ -0,0 +1,199 @@
+"""
+SQL instrumentation for SQLAlchemy engines.
+
+Every statement executed through an instrumented engine is timed and counted:
+- globally, per normalized SQL statement;
+- per tracked scope (one Telegram update handled by one handler), so we can see how many
+  queries a single /start or answer costs;
+- statements slower than the threshold go to the "src.query_metrics.slow" logger.
+
+Scopes live in a ContextVar, so concurrently processed updates do not mix their counts.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(f"{__name__}.slow")
+
+DEFAULT_SLOW_QUERY_MS = 100.0
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Normalize a SQL statement for aggregation: literals become "?", placeholder lists
+    collapse to "(?)" and whitespace is squeezed.
+    """
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+@dataclass
+class StatementStats:
+    """Aggregated timings of one normalized statement."""
+
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+
+@dataclass
+class HandlerStats:
+    """Aggregated query counts of one handler over all updates it processed."""
+
+    updates: int = 0
+    queries: int = 0
+    total_ms: float = 0.0
+    max_queries: int = 0
+
+
+@dataclass
+class QueryScope:
+    """Queries executed while handling one update (or inside one test step)."""
+
+    handler: str
+    update_id: int | None = None
+    count: int = 0
+    total_ms: float = 0.0
+    statements: list[str] = field(default_factory=list)
+
+
+class QueryMetrics:
+    """Collects statement timings and counts from instrumented engines."""
+
+    def __init__(self, slow_query_ms: float | None = None) -> None:
+        """
+        Args:
+            slow_query_ms: Threshold for the slow-query log. Defaults to the SLOW_QUERY_MS
+                environment variable, or 100 ms.
+        """
+        if slow_query_ms is None:
+            slow_query_ms = float(os.getenv("SLOW_QUERY_MS", DEFAULT_SLOW_QUERY_MS))
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self.statements: dict[str, StatementStats] = {}
+        self.handlers: dict[str, HandlerStats] = {}
+        self.total_queries = 0
+        self.slow_queries = 0
+        self._engines: weakref.WeakSet[Engine] = weakref.WeakSet()
+        self._active_scopes: ContextVar[tuple[QueryScope, ...]] = ContextVar(
+            f"query_metrics_scopes_{id(self)}", default=()
+        )
+
+    def instrument(self, engine: Engine) -> None:
+        """Attach cursor execution hooks to an engine."""
+        if engine in self._engines:
+            return
+        self._engines.add(engine)
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+        normalized = normalize_sql(statement)
+        scopes = self._active_scopes.get()
+
+        with self._lock:
+            self.total_queries += 1
+            stats = self.statements.get(normalized)
+            if stats is None:
+                stats = self.statements[normalized] = StatementStats()
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            if elapsed_ms >= self.slow_query_ms:
+                self.slow_queries += 1
+
+        for scope in scopes:
+            scope.count += 1
+            scope.total_ms += elapsed_ms
+            scope.statements.append(normalized)
+
+        if elapsed_ms >= self.slow_query_ms:
+            handler = scopes[-1].handler if scopes else "-"
+            update_id = scopes[-1].update_id if scopes else None
+            slow_query_logger.warning(
+                f"Slow query ({elapsed_ms:.1f} ms, handler={handler}, update={update_id}): {normalized}"
+            )
+
+    @contextmanager
+    def track(self, handler: str, update_id: int | None = None) -> Iterator[QueryScope]:
+        """
+        Attribute all queries executed inside the block to a handler/update.
+
+        Example:
+            with query_metrics.track("answer") as scope:
+                await registration_flow.handle_input(update, context)
+            assert scope.count <= 6
+        """
+        scope = QueryScope(handler=handler, update_id=update_id)
+        token = self._active_scopes.set((*self._active_scopes.get(), scope))
+        try:
+            yield scope
+        finally:
+            self._active_scopes.reset(token)
+            with self._lock:
+                stats = self.handlers.get(handler)
+                if stats is None:
+                    stats = self.handlers[handler] = HandlerStats()
+                stats.updates += 1
+                stats.queries += scope.count
+                stats.total_ms += scope.total_ms
+                stats.max_queries = max(stats.max_queries, scope.count)
+            logger.debug(f"Update {update_id} handled by {handler}: {scope.count} queries in {scope.total_ms:.1f} ms")
+
+    def tracked(self, handler: Callable[..., Awaitable[Any]], name: str | None = None) -> Callable[..., Awaitable[Any]]:
+        """Wrap an async PTB handler (update, context) so its queries are tracked per update."""
+        handler_name = name or handler.__qualname__
+
+        @wraps(handler)
+        async def wrapper(update: Any, context: Any, *args: Any, **kwargs: Any) -> Any:
+            with self.track(handler_name, getattr(update, "update_id", None)):
+                return await handler(update, context, *args, **kwargs)
+
+        return wrapper
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return a copy of the aggregates."""
+        with self._lock:
+            return {
+                "total_queries": self.total_queries,
+                "slow_queries": self.slow_queries,
+                "handlers": {name: HandlerStats(**vars(stats)) for name, stats in self.handlers.items()},
+                "statements": {sql: StatementStats(**vars(stats)) for sql, stats in self.statements.items()},
+            }
+
+    def reset(self) -> None:
+        """Drop all aggregates."""
+        with self._lock:
+            self.statements.clear()
+            self.handlers.clear()
+            self.total_queries = 0
+            self.slow_queries = 0
+
+
+# Global instance, engines are instrumented by Database
+query_metrics = QueryMetrics()
@@ -12,6 +12,7 @@
 
 from collections.abc import Callable
 from dataclasses import dataclass
+from dataclasses import field as dataclass_field
 from typing import Any
 
 from .constants import ABOUT_TRIP, ADMIN_SEND_MESSAGE, CANCEL, CHANGE_DATA, EDIT, REGISTERED, WHAT_TO_BRING
@@ -55,6 +56,9 @@ from .survey.formatters import (
     format_text_db,
     format_username_db,
 )
+from .survey.multi_select import format_mask
+from .survey.pipeline import Pipeline, compile_pipeline
+from .survey.state_graph import SurveyStateGraph
 from .survey.validators import (
     validate_date,
     validate_group,
@@ -112,6 +116,9 @@ class SurveyField:
     # Настройки отображения
     hidden: bool = False  # Скрыть поле от отображения пользователю
 
+    # Сезонность
+    seasonal: bool = False  # Ответ относится к одному сезону и сбрасывается при смене сезона
+
     # Сообщения после ввода
     acknowledgment_message: str | None = None  # Сообщение после успешного ввода данных
     option_acknowledgments: dict[str, str] | None = None  # Сообщения для каждого варианта ответа
@@ -119,6 +126,21 @@ class SurveyField:
     # Тип поля в БД
     db_type: str = "TEXT"  # Тип поля в БД
 
+    # Валидация + форматирование для БД, собирается из validator и db_formatter
+    pipeline: Pipeline = dataclass_field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Множественный выбор хранится битовой маской индексов вариантов
+        if self.multi_select and self.db_type == "TEXT":
+            self.db_type = "INTEGER"
+        self.pipeline = compile_pipeline(self.validator, self.db_formatter)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        # Конвейер пересобирается, если валидатор или форматтер заменили после создания
+        if name in ("validator", "db_formatter") and "pipeline" in self.__dict__:
+            super().__setattr__("pipeline", compile_pipeline(self.validator, self.db_formatter))
+
 
 class RegistrationSurveyConfig:
     """Конфигурация регистрационного опроса."""
@@ -127,6 +149,8 @@ class RegistrationSurveyConfig:
         self._fields = self._create_fields()
         self._post_registration_states = self._create_post_registration_states()
         self._admin_states = self._create_admin_states()
+        self._fields_view: tuple[SurveyField, ...] = tuple(self._fields)
+        self._state_graph: SurveyStateGraph | None = None
 
     def _create_fields(self) -> list[SurveyField]:
         """Создает список полей опроса."""
@@ -189,6 +213,7 @@ class RegistrationSurveyConfig:
                 validator=validate_non_empty,
                 acknowledgment_message=ACK_EXPECTATIONS,
                 editable=True,
+                seasonal=True,
             ),
             SurveyField(
                 field_name="will_drive",
@@ -200,6 +225,7 @@ class RegistrationSurveyConfig:
                 display_formatter=format_default_display,
                 option_acknowledgments=WILL_DRIVE_ACKNOWLEDGMENTS,
                 editable=True,
+                seasonal=True,
             ),
             SurveyField(
                 field_name="trip_attendance",
@@ -211,6 +237,7 @@ class RegistrationSurveyConfig:
                 display_formatter=format_default_display,
                 option_acknowledgments=TRIP_POLL_ACKNOWLEDGMENTS,
                 editable=True,
+                seasonal=True,
             ),
         ]
 
@@ -248,7 +275,10 @@ class RegistrationSurveyConfig:
             if field.hidden:
                 continue
 
-            value = user_data.get(field.field_name, DEFAULT_NOT_SPECIFIED)
+            if field.multi_select and field.options:
+                value = format_mask(field.options, user_data.get(field.field_name)) or DEFAULT_NOT_SPECIFIED
+            else:
+                value = user_data.get(field.field_name, DEFAULT_NOT_SPECIFIED)
             if field.display_formatter:
                 value = field.display_formatter(value)
             message += f"{field.label}: `{value}`\n"
@@ -258,9 +288,16 @@ class RegistrationSurveyConfig:
     # Публичные методы для доступа к конфигурации
 
     @property
-    def fields(self) -> list[SurveyField]:
-        """Возвращает список всех полей."""
-        return self._fields.copy()
+    def fields(self) -> tuple[SurveyField, ...]:
+        """Возвращает все поля (неизменяемый кортеж, без копирования на каждый вызов)."""
+        return self._fields_view
+
+    @property
+    def state_graph(self) -> SurveyStateGraph:
+        """Граф состояний опроса, компилируется один раз и пересобирается при изменении полей."""
+        if self._state_graph is None:
+            self._state_graph = SurveyStateGraph(self)
+        return self._state_graph
 
     @property
     def post_registration_states(self) -> list[dict[str, Any]]:
@@ -274,11 +311,11 @@ class RegistrationSurveyConfig:
 
     def get_field_by_name(self, field_name: str) -> SurveyField | None:
         """Получает поле по имени."""
-        return next((field for field in self._fields if field.field_name == field_name), None)
+        return self.state_graph.get_field(field_name)
 
     def get_field_by_label(self, label: str) -> SurveyField | None:
         """Получает поле по метке."""
-        return next((field for field in self._fields if field.label == label), None)
+        return self.state_graph.get_field_by_label(label)
 
     def get_editable_fields(self) -> list[SurveyField]:
         """Возвращает список редактируемых полей."""
@@ -291,13 +328,20 @@ class RegistrationSurveyConfig:
     def add_field(self, field: SurveyField) -> None:
         """Добавляет новое поле в конфигурацию."""
         self._fields.append(field)
+        self._invalidate()
 
     def remove_field(self, field_name: str) -> bool:
         """Удаляет поле из конфигурации."""
         original_length = len(self._fields)
         self._fields = [field for field in self._fields if field.field_name != field_name]
+        self._invalidate()
         return len(self._fields) < original_length
 
+    def _invalidate(self) -> None:
+        """Сбрасывает скомпилированные представления после изменения списка полей."""
+        self._fields_view = tuple(self._fields)
+        self._state_graph = None
+
 
 # Глобальный экземпляр конфигурации
 registration_survey = RegistrationSurveyConfig()
@@ -1,3 +1,5 @@
+import asyncio
+import functools
 import logging
 from typing import Any
 
@@ -33,6 +35,7 @@ from .messages import (
     ERROR_FIELD_NOT_EDITABLE,
     ERROR_SELECT_SOMETHING,
     ERROR_SOMETHING_WRONG,
+    ERROR_STALE_KEYBOARD,
     ERROR_UNKNOWN_FIELD,
     ERROR_USE_BUTTONS,
     ERROR_USER_NOT_FOUND,
@@ -48,9 +51,12 @@ from .messages import (
 from .milestone_notifier import milestone_notifier
 from .permissions import permission_manager
 from .settings import ADMIN_IDS, SURVEY_CONFIG, TABLE_GETTERS
-from .state_handler import StateHandler
+from .state_handler import StateHandler, cached_user_data
+from .survey import callback_data, multi_select
 from .survey.auto_collectors import auto_collect_counselor_status, auto_collect_staff_status
-from .user_storage import UserStorage, user_storage
+from .survey.state_graph import edit_state
+from .toggle_coalescer import ToggleCoalescer
+from .user_storage import UserNotFoundError, UserStorage, user_storage
 from .utils import get_actual_table
 
 logger = logging.getLogger(__name__)
@@ -60,7 +66,7 @@ class RegistrationFlow:
     def __init__(self, user_storage: UserStorage):
         self.user_storage = user_storage
         self.state_handler = StateHandler(user_storage)
-        self.steps = [field.field_name for field in SURVEY_CONFIG.fields]
+        self.toggle_coalescer = ToggleCoalescer()
 
     async def handle_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обрабатывает команды, такие как /start."""
@@ -92,7 +98,7 @@ class RegistrationFlow:
                 user_id,
                 GREETING_MESSAGE,
             )
-            await self.state_handler.transition_state(update, context, self.steps[0])
+            await self.state_handler.transition_state(update, context, SURVEY_CONFIG.state_graph.first_state)
         else:
             logger.info(f"User {user_id} already exists in state '{user[STATE]}'")
 
@@ -106,18 +112,38 @@ class RegistrationFlow:
     async def handle_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обрабатывает пользовательский ввод для всех состояний."""
         user_id = update.message.from_user.id
-        user = self.user_storage.get_user(user_id)
-        if user is None:
-            await message_sender.send_message(
-                context.bot,
-                user_id,
-                ERROR_USER_NOT_FOUND,
-            )
-            await self.handle_command(update, context)
-            return
-        state = user[STATE]
+
+        # Состояние берётся из context.user_data (в памяти), из БД - только если его там нет
+        cache = cached_user_data(context)
+        state = cache.get(STATE) if cache is not None else None
+        if state is None:
+            user = self.user_storage.get_user(user_id)
+            if user is None:
+                await message_sender.send_message(
+                    context.bot,
+                    user_id,
+                    ERROR_USER_NOT_FOUND,
+                )
+                await self.handle_command(update, context)
+                return
+            state = user[STATE]
+            if cache is not None:
+                cache[STATE] = state
         logger.info(f"User {user_id} is in state '{state}'")
 
+        try:
+            await self._route_input(update, context, state)
+        except UserNotFoundError:
+            # Пользователь удалён из БД (например, при смене сезона), а состояние в памяти осталось
+            logger.info(f"User {user_id} was removed from the database, restarting registration")
+            if cache is not None:
+                cache.pop(STATE, None)
+            await message_sender.send_message(context.bot, user_id, ERROR_USER_NOT_FOUND)
+            await self.handle_command(update, context)
+
+    async def _route_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> None:
+        user_id = update.message.from_user.id
+
         if user_id in ADMIN_IDS:
             if await self.handle_admin_input(update, context, state):
                 return
@@ -275,8 +301,10 @@ class RegistrationFlow:
                 # Create inline keyboard with Yes/No buttons
                 keyboard = [
                     [
-                        InlineKeyboardButton(TRIP_POLL_OPTIONS[0], callback_data=f"trip_poll|{TRIP_POLL_OPTIONS[0]}"),
-                        InlineKeyboardButton(TRIP_POLL_OPTIONS[1], callback_data=f"trip_poll|{TRIP_POLL_OPTIONS[1]}"),
+                        InlineKeyboardButton(
+                            option, callback_data=callback_data.encode_trip_poll(TRIP_POLL_OPTIONS, option)
+                        )
+                        for option in TRIP_POLL_OPTIONS
                     ]
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
@@ -305,7 +333,8 @@ class RegistrationFlow:
                     str(amount_of_users),
                 )
             elif user_id in TABLE_GETTERS and user_input == GET_ACTUAL_TABLE:
-                file_path = get_actual_table()
+                # Выгрузка тяжёлая - не блокируем event loop
+                file_path = await asyncio.to_thread(get_actual_table)
                 try:
                     await context.bot.send_document(chat_id=user_id, document=open(file_path, "rb"))
                     await update.message.reply_text(ADMIN_FILE_SENT_SUCCESS)
@@ -334,22 +363,16 @@ class RegistrationFlow:
                 await message_sender.send_message(context.bot, user_id, ERROR_FIELD_NOT_EDITABLE)
                 return
 
-            await self.state_handler.transition_state(update, context, f"edit_{field_config.field_name}")
-
-    def apply_db_formatter(self, field_name: str, value: str) -> str:
-        """Применяет форматтер для базы данных, если он указан в конфиге."""
-        field_config = SURVEY_CONFIG.get_field_by_name(field_name)
-        if field_config and field_config.db_formatter:
-            return field_config.db_formatter(value)
-        return value
+            await self.state_handler.transition_state(update, context, edit_state(field_config.field_name))
 
     async def process_data_input(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE, state: str, user_input: str
     ) -> None:
         """Обрабатывает пользовательский ввод, проверяет и форматирует перед сохранением."""
         user_id = update.effective_user.id
-        actual_state = state.replace("edit_", "")
-        field_config = SURVEY_CONFIG.get_field_by_name(actual_state)
+        node = self.state_handler.get_node(state)
+        actual_state = node.field_name if node else None
+        field_config = node.config if actual_state else None
 
         if not field_config:
             logger.error(f"Field '{actual_state}' not found for user {user_id}")
@@ -364,13 +387,11 @@ class RegistrationFlow:
         if field_config.request_contact and update.message.contact:
             user_input = update.message.contact.phone_number
 
-        if field_config.validator:
-            is_valid, error_message = field_config.validator(user_input)
-            if not is_valid:
-                await message_sender.send_message(context.bot, user_id, error_message)
-                return
+        is_valid, error_message, formatted_db_value = field_config.pipeline(user_input)
+        if not is_valid:
+            await message_sender.send_message(context.bot, user_id, error_message)
+            return
 
-        formatted_db_value = self.apply_db_formatter(actual_state, user_input)
         self.user_storage.update_user(user_id, actual_state, formatted_db_value)
 
         # Отправляем сообщение-подтверждение
@@ -397,27 +418,52 @@ class RegistrationFlow:
         if update.callback_query:
             await update.callback_query.edit_message_reply_markup(reply_markup=None)
 
+    async def _update_options_keyboard(self, query: Any, field_name: str, selected_options: list[str]) -> None:
+        """Отмечает выбранные варианты на клавиатуре сообщения (если она изменилась)."""
+        reply_markup = self.state_handler.create_inline_keyboard(field_name, selected_options=selected_options)
+        if query.message.reply_markup != reply_markup:
+            await query.edit_message_reply_markup(reply_markup=reply_markup)
+        else:
+            logger.debug("Reply markup is not modified, skipping edit_message_reply_markup call")
+
+    async def _flush_toggles(self, query: Any, user_id: int, field_name: str, node: Any, mask: int) -> None:
+        """Записывает накопленный множественный выбор одним UPDATE и одной правкой клавиатуры."""
+        self.user_storage.update_user(user_id, field_name, mask)
+        await self._update_options_keyboard(query, field_name, multi_select.selected_options(node.options, mask))
+
     async def handle_inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обрабатывает нажатия на инлайн-кнопки."""
         query = update.callback_query
+        user_id = query.from_user.id
+
+        try:
+            pressed = callback_data.decode(query.data, SURVEY_CONFIG.state_graph, TRIP_POLL_OPTIONS)
+        except callback_data.StaleCallbackError as e:
+            # Клавиатура отправлена до изменения опроса - убираем её, ничего не записывая
+            logger.info(f"Rejected callback from user {user_id}: {e}")
+            await query.answer(ERROR_STALE_KEYBOARD)
+            await self.clear_inline_keyboard(update)
+            return
         await query.answer()
 
-        callback_data = query.data.split("|")
-        action = callback_data[0]
-        option = callback_data[1] if len(callback_data) > 1 else None
+        action = pressed.action
+        option = pressed.option
+
+        # "Готово", отмена и прочие действия должны видеть последний выбор пользователя
+        if action != callback_data.SELECT:
+            await self.toggle_coalescer.flush_user(user_id)
 
-        user_id = query.from_user.id
         user = self.user_storage.get_user(user_id)
         state = user[STATE] if user else None
 
         # Handle cancel actions first, as they don't need field config
-        if action == "cancel" or action == "cancel_edit":
+        if action in (callback_data.CANCEL, callback_data.CANCEL_EDIT):
             await self.clear_inline_keyboard(update)
             await self.state_handler.transition_state(update, context, REGISTERED)
             return
 
         # Special handling for trip poll (no state change)
-        if action == "trip_poll" and option:
+        if action == callback_data.TRIP_POLL:
             await self.clear_inline_keyboard(update)
 
             # Save the response to trip_attendance field
@@ -439,36 +485,40 @@ class RegistrationFlow:
             logger.warning("No state found for user %s", user_id)
             return
 
-        actual_field_name = state.replace("edit_", "")
-        field_config = self.state_handler.get_config_by_state(actual_field_name)
+        node = self.state_handler.get_node(state)
 
         # If no field config, we can't handle select or done actions
-        if not field_config:
+        if node is None or node.field_name is None:
             logger.warning("No field config found for state %s", state)
             return
 
-        is_multi_select = field_config.multi_select if hasattr(field_config, "multi_select") else False
-        selected_options = user.get(actual_field_name, "").split(", ") if user.get(actual_field_name) else []
+        actual_field_name = node.field_name
+        field_config = node.config
 
-        if action == "select":
-            if is_multi_select:
-                if option in selected_options:
-                    selected_options.remove(option)
-                else:
-                    selected_options.append(option)
-            else:
-                selected_options = [option]
+        # Кнопка от вопроса, на который пользователь уже ответил
+        if action == callback_data.SELECT and pressed.field_name != actual_field_name:
+            logger.info(f"User {user_id} pressed option of '{pressed.field_name}' while in state '{state}'")
+            await self.clear_inline_keyboard(update)
+            return
 
-            self.user_storage.update_user(user_id, actual_field_name, ", ".join(selected_options))
-            reply_markup = self.state_handler.create_inline_keyboard(
-                field_config.options, selected_options=selected_options
+        selected_options = self.state_handler.get_selected_options(node, user)
+
+        if action == callback_data.SELECT and node.multi_select:
+            # Переключение копится в памяти, запись и правка клавиатуры - после паузы
+            key = (user_id, query.message.message_id)
+            current = self.toggle_coalescer.pending_value(key)
+            if current is None:
+                current = multi_select.to_mask(node.options, user.get(actual_field_name))
+            value = multi_select.toggle(current, pressed.option_index)
+            self.toggle_coalescer.schedule(
+                key, value, functools.partial(self._flush_toggles, query, user_id, actual_field_name, node)
             )
-            if query.message.reply_markup != reply_markup:
-                await query.edit_message_reply_markup(reply_markup=reply_markup)
-            else:
-                logger.debug("Reply markup is not modified, skipping edit_message_reply_markup call")
 
-        elif action == "done":
+        elif action == callback_data.SELECT:
+            self.user_storage.update_user(user_id, actual_field_name, option)
+            await self._update_options_keyboard(query, actual_field_name, [option])
+
+        elif action == callback_data.DONE:
             if not selected_options:
                 await message_sender.send_message(context.bot, user_id, ERROR_SELECT_SOMETHING)
                 return
@@ -0,0 +1,426 @@
+"""
+Season rollover: moves rows of a finished season out of the hot tables.
+
+Archived rows live in a separate SQLite file (data/archive.sqlite by default) in
+tables with the same columns as the hot ones plus a "season" column. Messages are
+archived with their bodies inline (the columns of the message_log view). Registered,
+non-blocked users (also those editing their answers) stay in the hot table as a
+compact carry-forward record: their seasonal answers are reset and will_drive is set
+to OPTION_WILL_DRIVE_PENDING.
+
+Most messages of a season have usually been moved to the monthly partitions already
+(see message_retention): the rollover archives them from the partitions as well, and
+removes partition files it emptied.
+
+A season counts as archived once its rollover finished (the "seasons" table of the
+archive). An interrupted rollover is resumed by running it again with the same season:
+committed batches are not selected again, and users already archived for the season
+are skipped.
+"""
+
+import logging
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+import pandas as pd
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Connection
+
+from .constants import EDIT, REGISTERED
+from .database import Database, db
+from .message_contents import LOG_VIEW, sweep_orphan_contents
+from .message_retention import PARTITION_SCHEMA, MessagePartition, MessagePartitions, db_datetime, naive_utc
+from .messages import OPTION_WILL_DRIVE_PENDING
+from .persistence import USER_DATA, mark_user_data_stale
+from .survey.state_graph import EDIT_PREFIX
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = "archive"
+# Seasons whose rollover completed
+SEASONS_TABLE = "seasons"
+
+# Registered users stay registered while editing their answers (edit, edit_<field>)
+REGISTERED_SQL = "(state IN (:registered, :edit) OR state LIKE :edit_pattern ESCAPE '\\')"
+REGISTERED_PARAMS = {"registered": REGISTERED, "edit": EDIT, "edit_pattern": EDIT_PREFIX.replace("_", "\\_") + "%"}
+
+# Значения, с которыми сезонные поля переносятся в новый сезон (остальные сбрасываются в NULL)
+CARRY_FORWARD_VALUES = {"will_drive": OPTION_WILL_DRIVE_PENDING}
+
+
+@dataclass
+class RolloverStats:
+    """Result of a season rollover."""
+
+    season: str
+    archived_users: int = 0
+    carried_forward: int = 0
+    removed_users: int = 0
+    archived_messages: int = 0
+    dropped_persistence: int = 0
+
+
+class SeasonArchiver:
+    """Archives users and messages of a finished season into a separate database file."""
+
+    def __init__(
+        self,
+        database: Database | None = None,
+        archive_path: str = "data/archive.sqlite",
+        partitions: MessagePartitions | None = None,
+    ) -> None:
+        """
+        Args:
+            database: Database with the hot tables. If None, uses the global db instance.
+            archive_path: Path to the archive SQLite file (created on first rollover)
+            partitions: Message log partitions of the database (default: the ones next to it)
+        """
+        self.db = database or db
+        self.archive_path = archive_path
+        self.partitions = partitions or MessagePartitions(self.db)
+
+    def rollover(
+        self,
+        season: str,
+        cutoff: datetime | None = None,
+        batch_size: int = 500,
+        dry_run: bool = False,
+    ) -> RolloverStats:
+        """
+        Archive the given season.
+
+        Users last updated before the cutoff are copied to the archive. Registered and
+        non-blocked users are carried forward with their seasonal fields reset, all others
+        are removed from the hot table. Messages created before the cutoff are moved to the
+        archive, from the hot table and from the partitions. Every batch is committed on its
+        own, so the bot can keep working; a rollover that failed halfway is resumed by calling
+        it again.
+
+        Args:
+            season: Season label, e.g. "2025"
+            cutoff: Rows older than this belong to the season (default: now)
+            batch_size: Number of rows moved per transaction
+            dry_run: Only count affected rows without changing anything
+
+        Returns:
+            RolloverStats
+
+        Raises:
+            ValueError: If the rollover of the season already completed
+        """
+        cutoff = cutoff or datetime.now(UTC)
+        stats = RolloverStats(season=season)
+
+        if dry_run:
+            return self._count(season, cutoff)
+
+        if season in self.completed_seasons():
+            raise ValueError(f"Season {season} is already archived in {self.archive_path}")
+
+        os.makedirs(os.path.dirname(self.archive_path) or ".", exist_ok=True)
+
+        with self.db.engine.connect() as conn:
+            conn.exec_driver_sql(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_path,))
+            conn.commit()
+            try:
+                self._ensure_seasons_table(conn)
+                user_columns = self._ensure_archive_table(conn, "users")
+                message_columns = self._ensure_archive_table(conn, "messages", source=LOG_VIEW)
+                self._archive_users(conn, season, cutoff, batch_size, user_columns, stats)
+                self._drop_orphan_persistence(conn, stats)
+                self._archive_messages(conn, season, cutoff, batch_size, message_columns, stats)
+                for partition in self._season_partitions(cutoff):
+                    self._archive_partition(conn, partition, season, cutoff, batch_size, message_columns, stats)
+                conn.execute(
+                    text(f"INSERT INTO {ARCHIVE_SCHEMA}.{SEASONS_TABLE} (season, completed_at) VALUES (:season, :now)"),
+                    {"season": season, "now": datetime.now(UTC).isoformat()},
+                )
+                conn.commit()
+            finally:
+                conn.rollback()
+                conn.exec_driver_sql(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+        logger.info(
+            f"Season {season} archived: users={stats.archived_users} "
+            f"(carried forward {stats.carried_forward}, removed {stats.removed_users}), "
+            f"messages={stats.archived_messages}"
+        )
+        return stats
+
+    def list_seasons(self) -> list[str]:
+        """Return the seasons present in the archive."""
+        if not os.path.exists(self.archive_path):
+            return []
+        conn = self._connect_archive()
+        try:
+            if not self._archive_has_table(conn, "users"):
+                return []
+            rows = conn.execute("SELECT DISTINCT season FROM users ORDER BY season").fetchall()
+            return [row[0] for row in rows]
+        finally:
+            conn.close()
+
+    def completed_seasons(self) -> list[str]:
+        """Return the seasons whose rollover completed."""
+        if not os.path.exists(self.archive_path):
+            return []
+        conn = self._connect_archive()
+        try:
+            if not self._archive_has_table(conn, SEASONS_TABLE):
+                # Archive written before completion was recorded: its seasons are complete
+                return self.list_seasons()
+            rows = conn.execute(f"SELECT season FROM {SEASONS_TABLE} ORDER BY season").fetchall()
+            return [row[0] for row in rows]
+        finally:
+            conn.close()
+
+    def read_users(self, season: str | None = None) -> pd.DataFrame:
+        """
+        Read archived users, e.g. for an Excel export.
+
+        Args:
+            season: Season to read, or None for all seasons
+
+        Returns:
+            DataFrame with archived users
+        """
+        return self._read_table("users", season)
+
+    def read_messages(self, season: str | None = None) -> pd.DataFrame:
+        """Read archived messages of a season (or of all seasons)."""
+        return self._read_table("messages", season)
+
+    def _read_table(self, table: str, season: str | None) -> pd.DataFrame:
+        if not os.path.exists(self.archive_path):
+            raise FileNotFoundError(f"Archive not found: {self.archive_path}")
+        conn = self._connect_archive()
+        try:
+            if season is None:
+                return pd.read_sql(f"SELECT * FROM {table}", conn)
+            return pd.read_sql(f"SELECT * FROM {table} WHERE season = ?", conn, params=(season,))
+        finally:
+            conn.close()
+
+    def _connect_archive(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.archive_path}?mode=ro", uri=True)
+
+    @staticmethod
+    def _archive_has_table(conn: sqlite3.Connection, table: str) -> bool:
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _ensure_seasons_table(conn: Connection) -> None:
+        exists = conn.exec_driver_sql(
+            f"SELECT 1 FROM {ARCHIVE_SCHEMA}.sqlite_master WHERE type = 'table' AND name = ?", (SEASONS_TABLE,)
+        ).fetchone()
+        if exists is not None:
+            return
+        conn.exec_driver_sql(
+            f"CREATE TABLE {ARCHIVE_SCHEMA}.{SEASONS_TABLE} (season TEXT PRIMARY KEY, completed_at TEXT NOT NULL)"
+        )
+        # Seasons archived before completion was recorded
+        users = conn.exec_driver_sql(
+            f"SELECT 1 FROM {ARCHIVE_SCHEMA}.sqlite_master WHERE type = 'table' AND name = 'users'"
+        ).fetchone()
+        if users is not None:
+            conn.exec_driver_sql(
+                f"INSERT INTO {ARCHIVE_SCHEMA}.{SEASONS_TABLE} (season, completed_at) "
+                f"SELECT DISTINCT season, '' FROM {ARCHIVE_SCHEMA}.users"
+            )
+        conn.commit()
+
+    def _ensure_archive_table(self, conn: Connection, table: str, source: str | None = None) -> list[str]:
+        """
+        Create (or extend) the archive copy of a hot table and return the hot table columns.
+
+        source is the table or view rows are copied from, if not the table itself.
+        """
+        hot_columns = conn.exec_driver_sql(f"PRAGMA main.table_info({source or table})").fetchall()
+        archived = {row[1] for row in conn.exec_driver_sql(f"PRAGMA {ARCHIVE_SCHEMA}.table_info({table})")}
+
+        if not archived:
+            columns_sql = ", ".join(f'"{row[1]}" {row[2]}' for row in hot_columns)
+            conn.exec_driver_sql(f'CREATE TABLE {ARCHIVE_SCHEMA}."{table}" (season TEXT NOT NULL, {columns_sql})')
+            conn.exec_driver_sql(
+                f'CREATE INDEX {ARCHIVE_SCHEMA}.idx_{table}_archive_season ON "{table}" (season, telegram_id)'
+            )
+        else:
+            # Схема горячей таблицы могла вырасти (новые поля опроса) - добавляем недостающие колонки
+            for row in hot_columns:
+                if row[1] not in archived:
+                    conn.exec_driver_sql(f'ALTER TABLE {ARCHIVE_SCHEMA}."{table}" ADD COLUMN "{row[1]}" {row[2]}')
+        conn.commit()
+        return [row[1] for row in hot_columns]
+
+    def _archive_users(
+        self,
+        conn: Connection,
+        season: str,
+        cutoff: datetime,
+        batch_size: int,
+        columns: list[str],
+        stats: RolloverStats,
+    ) -> None:
+        from .settings import SURVEY_CONFIG
+
+        columns_sql = ", ".join(f'"{name}"' for name in columns)
+        seasonal = [field.field_name for field in SURVEY_CONFIG.fields if field.seasonal]
+        reset_sql = ", ".join(f'"{name}" = :reset_{name}' for name in seasonal)
+        reset_params = {f"reset_{name}": CARRY_FORWARD_VALUES.get(name) for name in seasonal}
+
+        # Users archived by an interrupted run of this rollover are not archived twice
+        select_batch = text(
+            "SELECT id FROM main.users WHERE id > :last_id AND updated_at < :cutoff "
+            f"AND telegram_id NOT IN (SELECT telegram_id FROM {ARCHIVE_SCHEMA}.users WHERE season = :season) "
+            "ORDER BY id LIMIT :limit"
+        ).bindparams(bindparam("cutoff", type_=DateTime))
+        copy_rows = text(
+            f"INSERT INTO {ARCHIVE_SCHEMA}.users (season, {columns_sql}) "
+            f"SELECT :season, {columns_sql} FROM main.users WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True))
+        remove_rows = text(
+            f"DELETE FROM main.users WHERE id IN :ids AND (NOT {REGISTERED_SQL} OR is_blocked = 1) "
+            "RETURNING telegram_id"
+        ).bindparams(bindparam("ids", expanding=True))
+        carry_rows = text(
+            f"UPDATE main.users SET {reset_sql + ', ' if reset_sql else ''}updated_at = :now WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True), bindparam("now", type_=DateTime))
+
+        last_id = 0
+        while True:
+            ids = [
+                row[0]
+                for row in conn.execute(
+                    select_batch, {"last_id": last_id, "cutoff": cutoff, "season": season, "limit": batch_size}
+                )
+            ]
+            if not ids:
+                break
+
+            conn.execute(copy_rows, {"season": season, "ids": ids})
+            removed = conn.execute(remove_rows, {"ids": ids, **REGISTERED_PARAMS}).scalars().all()
+            carried = conn.execute(carry_rows, {"ids": ids, "now": datetime.now(UTC), **reset_params}).rowcount
+            conn.commit()
+            # The bot may be running in this process: its cached state of removed users is dropped
+            mark_user_data_stale(removed)
+
+            stats.archived_users += len(ids)
+            stats.removed_users += len(removed)
+            stats.carried_forward += carried
+            last_id = ids[-1]
+            logger.debug(f"Archived users batch up to id {last_id}")
+
+    def _drop_orphan_persistence(self, conn: Connection, stats: RolloverStats) -> None:
+        """Drop persisted user_data (cached registration state) of users removed from the hot table."""
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'bot_persistence'"
+        ).fetchone()
+        if exists is None:
+            return
+        stats.dropped_persistence = conn.execute(
+            text(
+                "DELETE FROM main.bot_persistence WHERE kind = :kind "
+                "AND key NOT IN (SELECT CAST(telegram_id AS TEXT) FROM main.users)"
+            ),
+            {"kind": USER_DATA},
+        ).rowcount
+        conn.commit()
+
+    def _archive_messages(
+        self,
+        conn: Connection,
+        season: str,
+        cutoff: datetime,
+        batch_size: int,
+        columns: list[str],
+        stats: RolloverStats,
+        schema: str = "main",
+    ) -> None:
+        columns_sql = ", ".join(f'"{name}"' for name in columns)
+        select_batch = text(
+            f"SELECT id FROM {schema}.messages WHERE created_at < :cutoff ORDER BY id LIMIT :limit"
+        ).bindparams(bindparam("cutoff", type_=DateTime))
+        move_rows = text(
+            f"INSERT INTO {ARCHIVE_SCHEMA}.messages (season, {columns_sql}) "
+            f"SELECT :season, {columns_sql} FROM {schema}.{LOG_VIEW} WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True))
+        delete_rows = text(f"DELETE FROM {schema}.messages WHERE id IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        )
+
+        while True:
+            ids = [row[0] for row in conn.execute(select_batch, {"cutoff": cutoff, "limit": batch_size})]
+            if not ids:
+                break
+
+            conn.execute(move_rows, {"season": season, "ids": ids})
+            conn.execute(delete_rows, {"ids": ids})
+            conn.commit()
+            stats.archived_messages += len(ids)
+        sweep_orphan_contents(conn, schema)
+
+    def _season_partitions(self, cutoff: datetime) -> list[MessagePartition]:
+        """Partitions that may hold messages created before the cutoff."""
+        cutoff = naive_utc(cutoff)
+        return [partition for partition in self.partitions.list_partitions() if partition.start < cutoff]
+
+    def _archive_partition(
+        self,
+        conn: Connection,
+        partition: MessagePartition,
+        season: str,
+        cutoff: datetime,
+        batch_size: int,
+        columns: list[str],
+        stats: RolloverStats,
+    ) -> None:
+        """Archive the season's messages of one partition and remove the file once it is empty."""
+        conn.exec_driver_sql(f"ATTACH DATABASE ? AS {PARTITION_SCHEMA}", (partition.path,))
+        conn.commit()
+        try:
+            self._archive_messages(conn, season, cutoff, batch_size, columns, stats, schema=PARTITION_SCHEMA)
+            empty = conn.exec_driver_sql(f"SELECT NOT EXISTS (SELECT 1 FROM {PARTITION_SCHEMA}.messages)").scalar()
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql(f"DETACH DATABASE {PARTITION_SCHEMA}")
+        if empty:
+            os.remove(partition.path)
+            logger.info(f"Removed message partition {partition.month}: all its messages are archived")
+
+    def _count(self, season: str, cutoff: datetime) -> RolloverStats:
+        """Count rows a rollover would touch."""
+        cutoff_param = bindparam("cutoff", type_=DateTime)
+        with self.db.engine.connect() as conn:
+            users = conn.execute(
+                text(
+                    f"SELECT COUNT(*), COALESCE(SUM({REGISTERED_SQL} AND is_blocked = 0), 0) "
+                    "FROM users WHERE updated_at < :cutoff"
+                ).bindparams(cutoff_param),
+                {"cutoff": cutoff, **REGISTERED_PARAMS},
+            ).one()
+            messages = conn.execute(
+                text("SELECT COUNT(*) FROM messages WHERE created_at < :cutoff").bindparams(cutoff_param),
+                {"cutoff": cutoff},
+            ).scalar_one()
+        for partition in self._season_partitions(cutoff):
+            messages += self._count_partition(partition, cutoff)
+        return RolloverStats(
+            season=season,
+            archived_users=users[0],
+            carried_forward=users[1],
+            removed_users=users[0] - users[1],
+            archived_messages=messages,
+        )
+
+    @staticmethod
+    def _count_partition(partition: MessagePartition, cutoff: datetime) -> int:
+        conn = sqlite3.connect(f"file:{partition.path}?mode=ro", uri=True)
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE created_at < ?", (db_datetime(cutoff),)
+            ).fetchone()[0]
+        finally:
+            conn.close()
@@ -15,36 +15,55 @@ from telegram.ext import ContextTypes
 
 from src.user_storage import UserStorage
 
+from .cache import get_cache
 from .constants import (
     ADMIN_SEND_MESSAGE,
     AMOUNT_OF_USERS,
-    AUTO_COLLECT,
     BUTTONS,
     CANCEL,
     DONE,
     EDIT,
     GET_ACTUAL_TABLE,
     MESSAGE,
-    OPTIONS,
     REGISTERED,
-    REQUEST_CONTACT,
     SEND_MESSAGE_ALL_USERS,
     SEND_TRIP_POLL,
-    SKIP_IF,
+    SKIPPED,
     STATE,
 )
 from .message_sender import message_sender
 from .settings import ADMIN_IDS, SURVEY_CONFIG, TABLE_GETTERS
+from .survey import callback_data, multi_select
+from .survey.state_graph import StateNode, SurveyStateGraph
 
 logger = logging.getLogger(__name__)
 
+# Готовые клавиатуры (объекты PTB неизменяемы, их можно отдавать повторно)
+reply_markup_cache = get_cache("reply_markup", maxsize=64)
+inline_keyboard_cache = get_cache("inline_keyboard", maxsize=256)
+# Сводка данных в состоянии registered по (пользователь, версия его данных)
+registered_message_cache = get_cache("registered_message", maxsize=1024)
+
+
+def cached_user_data(context: Any) -> dict[Any, Any] | None:
+    """
+    context.user_data, в котором хранится состояние пользователя между апдейтами.
+
+    Данные живут в памяти и сохраняются в БД через SQLitePersistence; для апдейтов
+    без пользователя (и вне Application) возвращается None.
+    """
+    data = getattr(context, "user_data", None)
+    return data if isinstance(data, dict) else None
+
 
 class StateHandler:
     def __init__(self, user_storage: UserStorage):
         self.user_storage = user_storage
-        self.steps = [field.field_name for field in SURVEY_CONFIG.fields]
-        self.states_config = {state[STATE]: state for state in SURVEY_CONFIG.post_registration_states}
-        self.admin_states_config = {state[STATE]: state for state in SURVEY_CONFIG.admin_states}
+
+    @property
+    def graph(self) -> SurveyStateGraph:
+        """Скомпилированный граф состояний опроса."""
+        return SURVEY_CONFIG.state_graph
 
     async def transition_state(self, update: Update, context: ContextTypes.DEFAULT_TYPE, state: str) -> None:
         if update.callback_query:
@@ -55,43 +74,52 @@ class StateHandler:
         user_data = self.user_storage.get_user(user_id)
         logger.info(f"Transitioning user {user_id} to state '{state}'")
 
-        config = self.get_config_by_state(state)
-        if not config:
-            if user_id in ADMIN_IDS:
-                config = self.get_admin_config_by_state(state)
+        # Auto-collect and skip-if chain is evaluated in memory against one user snapshot;
+        # collected/skipped values are written together with the final state below
+        pending: dict[str, Any] = {}
+        snapshot = dict(user_data) if user_data else {}
+        visited = set()
+        while True:
+            node = self.graph.node(state)
+            # Админские состояния доступны только администраторам
+            if node is not None and node.is_admin and user_id not in ADMIN_IDS:
+                node = None
+            if node is None or state in visited:
+                break
+            visited.add(state)
+
+            # Use actual field name (without "edit_" prefix) for database operations
+            actual_field_name = node.field_name or node.state
+            if node.auto_collect:
+                value = node.auto_collect(update)
+            elif node.skip_if and node.skip_if(snapshot):
+                # Колонка множественного выбора - INTEGER-маска, пропуск хранится как NULL
+                value = None if node.multi_select else SKIPPED
             else:
-                logger.error(f"Configuration for state '{state}' not found for user {user_id}")
-                await message_sender.send_message(
-                    context.bot,
-                    user_id,
-                    "Что-то пошло не так 😢\nПопробуй перезапустить меня командой `/start` (все введённые данные я помню), если это не поможет, обратись, пожалуйста, к людям, отвечающим за регистрацию",
-                    parse_mode=ParseMode.MARKDOWN,
-                )
-                return
-
-        # Generic handling for auto-collect and skip-if
-        # Use actual field name (without "edit_" prefix) for database operations
-        actual_field_name = state.replace("edit_", "")
-
-        # Для SurveyField используем атрибуты, для словарей - ключи
-        auto_collect = config.auto_collect if hasattr(config, "auto_collect") else config.get(AUTO_COLLECT)
-        if auto_collect:
-            value = auto_collect(update)
-            self.user_storage.update_user(user_id, actual_field_name, value)
-            next_state = self.get_next_state(state)
-            await self.transition_state(update, context, next_state)
-            return
+                break
+            pending[actual_field_name] = value
+            snapshot[actual_field_name] = value
+            state = node.next_state
 
-        # Для SurveyField используем атрибуты, для словарей - ключи
-        skip_if = config.skip_if if hasattr(config, "skip_if") else config.get(SKIP_IF)
-        if skip_if and skip_if(user_data):
-            self.user_storage.update_user(user_id, actual_field_name, "skipped")
-            next_state = self.get_next_state(state)
-            await self.transition_state(update, context, next_state)
+        if node is None:
+            self.user_storage.update_user_fields(user_id, pending)
+            logger.error(f"Configuration for state '{state}' not found for user {user_id}")
+            await message_sender.send_message(
+                context.bot,
+                user_id,
+                "Что-то пошло не так 😢\nПопробуй перезапустить меня командой `/start` (все введённые данные я помню), если это не поможет, обратись, пожалуйста, к людям, отвечающим за регистрацию",
+                parse_mode=ParseMode.MARKDOWN,
+            )
             return
 
-        self.user_storage.update_state(user_id, state)
-        message = self.get_state_message(config, user_id)
+        config = node.config
+        self.user_storage.update_user_fields(user_id, {**pending, STATE: state})
+        # Состояние для маршрутизации следующих апдейтов без чтения из БД
+        cache = cached_user_data(context)
+        if cache is not None:
+            cache[STATE] = state
+        user_data = snapshot
+        message = self.get_state_message(config, user_id, user_data if user_data else None)
         reply_markup = self.get_reply_markup(config, user_id, state, user_data)
 
         logger.info(f"Sending message to user {user_id}: {message}")
@@ -102,20 +130,36 @@ class StateHandler:
     def get_reply_markup(
         self, config: Any, user_id: int, state: str, user_data: dict[str, Any]
     ) -> ReplyKeyboardMarkup | InlineKeyboardMarkup | ReplyKeyboardRemove:
-        actual_field_name = state.replace("edit_", "")
-        # Для SurveyField используем атрибуты, для словарей - ключи
-        if hasattr(config, "options"):
-            options = config.options
-        else:
-            options = config.get(OPTIONS) if isinstance(config, dict) else None
+        """
+        Клавиатура для состояния.
+
+        Разметка неизменяема, поэтому готовые клавиатуры берутся из кэша: инлайн-клавиатуры
+        по (граф, поле, выбранные варианты), остальные - по (граф, состояние, роль).
+        Граф входит в ключ, чтобы изменение конфигурации опроса не отдавало старые клавиатуры.
+        """
+        node = self.graph.node(state)
+        if node is None or node.config is not config or node.options:
+            return self._build_reply_markup(config, user_id, state, user_data)
+
+        # Набор кнопок зависит от роли только в состоянии registered
+        role = (user_id in ADMIN_IDS, user_id in TABLE_GETTERS) if state == REGISTERED else None
+        return reply_markup_cache.get_or_create(
+            (self.graph, state, role), lambda: self._build_reply_markup(config, user_id, state, user_data)
+        )
+
+    def _build_reply_markup(
+        self, config: Any, user_id: int, state: str, user_data: dict[str, Any]
+    ) -> ReplyKeyboardMarkup | InlineKeyboardMarkup | ReplyKeyboardRemove:
+        node = self.graph.node(state) or StateNode(state=state, config=config)
+        actual_field_name = node.field_name or node.state
+        options = node.options
 
         if options:
-            selected_options = user_data.get(actual_field_name, "")
-            selected_options = selected_options.split(", ") if selected_options else []
-            return self.create_inline_keyboard(options, selected_options=selected_options)
+            selected_options = self.get_selected_options(node, user_data)
+            return self.create_inline_keyboard(actual_field_name, selected_options=selected_options)
         # Для состояний редактирования без options добавляем кнопку "Отмена"
-        elif state.startswith("edit_"):
-            keyboard = [[InlineKeyboardButton(CANCEL, callback_data="cancel_edit")]]
+        elif node.is_edit:
+            keyboard = [[InlineKeyboardButton(CANCEL, callback_data=callback_data.CANCEL_EDIT)]]
             return InlineKeyboardMarkup(keyboard)
         # Для словарей используем ключи (SurveyField не имеет buttons)
         elif isinstance(config, dict) and BUTTONS in config:
@@ -140,13 +184,10 @@ class StateHandler:
                 buttons = [field.label for field in SURVEY_CONFIG.get_editable_fields()] + [CANCEL]
             elif state == ADMIN_SEND_MESSAGE:
                 # For admin_send_message state, we want to show a cancel button as an inline keyboard
-                keyboard = [[InlineKeyboardButton(CANCEL, callback_data="cancel")]]
+                keyboard = [[InlineKeyboardButton(CANCEL, callback_data=callback_data.CANCEL)]]
                 return InlineKeyboardMarkup(keyboard)
             return ReplyKeyboardMarkup([[button] for button in buttons], resize_keyboard=True, one_time_keyboard=True)
-        # Для SurveyField используем атрибуты, для словарей - get
-        elif (hasattr(config, "request_contact") and config.request_contact) or (
-            isinstance(config, dict) and config.get(REQUEST_CONTACT)
-        ):
+        elif node.request_contact:
             return ReplyKeyboardMarkup(
                 [[KeyboardButton(text="Поделиться номером из Telegram", request_contact=True)]],
                 resize_keyboard=True,
@@ -155,60 +196,74 @@ class StateHandler:
         else:
             return ReplyKeyboardRemove()
 
+    @staticmethod
+    def get_selected_options(node: StateNode, user_data: dict[str, Any] | None) -> list[str]:
+        """Выбранные пользователем варианты поля с вариантами ответа."""
+        value = (user_data or {}).get(node.field_name or node.state)
+        if node.multi_select:
+            return multi_select.selected_options(node.options, value)
+        return [value] if value else []
+
     def get_next_state(self, state: str) -> str:
-        actual_state = state.replace("edit_", "")
-        if state.startswith("edit_"):
-            return REGISTERED
-        if actual_state in self.steps:
-            current_index = self.steps.index(actual_state)
-            if current_index < len(self.steps) - 1:
-                return self.steps[current_index + 1]
-        return REGISTERED
+        return self.graph.next_state(state)
+
+    def get_node(self, state: str | None) -> StateNode | None:
+        """Узел графа для состояния пользователя (включая edit_*)."""
+        return self.graph.node(state)
 
     def get_config_by_state(self, state: str) -> Any:
         logger.debug(f"Searching for configuration for state '{state}'")
-        if state.startswith("edit_"):
-            original_field_name = state.replace("edit_", "")
-            config = SURVEY_CONFIG.get_field_by_name(original_field_name)
-            if config:
-                logger.debug(f"Generated configuration for edit state: {config}")
-            else:
-                logger.error(f"Configuration for edit state '{state}' not found")
-            return config
-        config = SURVEY_CONFIG.get_field_by_name(state) or self.states_config.get(state)
-        if config:
-            logger.debug(f"Found configuration for state '{state}': {config}")
-        else:
+        node = self.graph.node(state)
+        if node is None or node.is_admin:
             logger.error(f"Configuration for state '{state}' not found")
-        return config
+            return None
+        return node.config
 
     def get_admin_config_by_state(self, state: str) -> dict[str, Any] | None:
         logger.debug(f"Searching for admin configuration for state '{state}'")
-        config = self.admin_states_config.get(state)
-        if config:
-            logger.debug(f"Found admin configuration for state '{state}': {config}")
-        else:
+        node = self.graph.node(state)
+        if node is None or not node.is_admin:
             logger.error(f"Admin configuration for state '{state}' not found")
-        return config
+            return None
+        return node.config
 
-    def get_state_message(self, config: Any, user_id: int) -> str:
+    def get_state_message(self, config: Any, user_id: int, user_data: dict[str, Any] | None = None) -> str:
         # Для SurveyField используем field_name, для словарей - STATE
         state_name = config.field_name if hasattr(config, "field_name") else config[STATE]
         logger.debug(f"Formatting message for state '{state_name}'")
         if state_name == REGISTERED:
-            return self.get_registered_message(config, user_id)
+            return self.get_registered_message(config, user_id, user_data)
         # Для SurveyField используем message, для словарей - MESSAGE
         return config.message if hasattr(config, "message") else config[MESSAGE]
 
-    def get_registered_message(self, config: Any, user_id: int) -> str:
+    def get_registered_message(self, config: Any, user_id: int, user_data: dict[str, Any] | None = None) -> str:
+        """
+        Сводка данных пользователя для состояния registered.
+
+        user_data - уже загруженные данные пользователя (если None, читаются из БД).
+        Готовый текст кэшируется по версии данных - значениям полей опроса, поэтому
+        переходы registered <-> edit без изменений не форматируют сводку заново.
+        """
         state_name = config.field_name if hasattr(config, "field_name") else config[STATE]
         if state_name != REGISTERED:
             logger.error(
                 f"get_registered_message should only be used for the 'registered' state, current state = {state_name}"
             )
-        user = self.user_storage.get_user(user_id)
+        user = user_data if user_data is not None else self.user_storage.get_user(user_id)
         logger.debug(f"User data from database: {user}")
 
+        graph = self.graph
+        node = graph.node(REGISTERED)
+        if node is None or node.config is not config:
+            return self._render_registered_message(config, user)
+
+        version = tuple(user.get(field_name) for field_name in graph.steps)
+        return registered_message_cache.get_or_create(
+            (graph, user_id, version), lambda: self._render_registered_message(config, user)
+        )
+
+    @staticmethod
+    def _render_registered_message(config: Any, user: dict[str, Any]) -> str:
         # Получаем message из конфига
         message = config.message if hasattr(config, "message") else config[MESSAGE]
 
@@ -218,26 +273,40 @@ class StateHandler:
             return message(user)
         else:
             # Старая система - форматируем строку
-            user_data = {
-                field.field_name: (
-                    field.display_formatter(user.get(field.field_name, "Не указано"))
-                    if field.display_formatter and callable(field.display_formatter)
-                    else user.get(field.field_name, "Не указано")
-                )
-                for field in SURVEY_CONFIG.fields
-            }
+            user_data = {}
+            for field in SURVEY_CONFIG.fields:
+                value = user.get(field.field_name, "Не указано")
+                if field.multi_select and field.options:
+                    value = multi_select.format_mask(field.options, user.get(field.field_name)) or "Не указано"
+                if field.display_formatter and callable(field.display_formatter):
+                    value = field.display_formatter(value)
+                user_data[field.field_name] = value
             logger.debug(f"Prepared data for substitution: {user_data}")
             return message.format(**user_data)
 
     def create_inline_keyboard(
-        self, options: list[str], selected_options: list[str] | None = None
+        self, field_name: str, selected_options: list[str] | None = None
     ) -> InlineKeyboardMarkup:
+        """Инлайн-клавиатура вариантов поля field_name с отмеченными selected_options."""
         selected_options = selected_options or []
+        graph = self.graph
+        key = (graph, field_name, frozenset(selected_options))
+        return inline_keyboard_cache.get_or_create(
+            key, lambda: self._build_inline_keyboard(graph, field_name, selected_options)
+        )
+
+    @staticmethod
+    def _build_inline_keyboard(
+        graph: SurveyStateGraph, field_name: str, selected_options: list[str]
+    ) -> InlineKeyboardMarkup:
         buttons = [
-            InlineKeyboardButton(f"✅ {opt}" if opt in selected_options else opt, callback_data=f"select|{opt}")
-            for opt in options
+            InlineKeyboardButton(
+                f"✅ {opt}" if opt in selected_options else opt,
+                callback_data=callback_data.encode_select(graph, field_name, opt),
+            )
+            for opt in graph.node(field_name).options
         ]
         keyboard = [buttons[i : i + 2] for i in range(0, len(buttons), 2)]
         if selected_options:
-            keyboard.append([InlineKeyboardButton(DONE, callback_data="done")])
+            keyboard.append([InlineKeyboardButton(DONE, callback_data=callback_data.DONE)])
         return InlineKeyboardMarkup(keyboard)
@@ -0,0 +1,99 @@
+"""
+Компактное кодирование callback_data инлайн-кнопок.
+
+Вместо полного текста варианта кнопка хранит индексы и версию опроса:
+
+    s|<индекс поля>|<индекс варианта>|<версия опроса>    - выбор варианта поля опроса
+    t|<индекс варианта>|<версия опроса о выезде>         - ответ на опрос о выезде
+
+Так callback_data всегда укладывается в лимит Telegram в 64 байта, а кнопки,
+отправленные до изменения конфигурации, распознаются как устаревшие и не
+записывают в БД чужой или переименованный вариант.
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from .state_graph import SurveyStateGraph, survey_version
+
+SELECT = "s"
+TRIP_POLL = "t"
+
+# Служебные кнопки без параметров
+DONE = "done"
+CANCEL = "cancel"
+CANCEL_EDIT = "cancel_edit"
+
+SEPARATOR = "|"
+MAX_CALLBACK_DATA_BYTES = 64
+
+
+class StaleCallbackError(ValueError):
+    """callback_data от клавиатуры прежней версии опроса или в неизвестном формате."""
+
+
+@dataclass(frozen=True)
+class CallbackAction:
+    """Разобранное нажатие инлайн-кнопки."""
+
+    action: str
+    field_name: str | None = None
+    option: str | None = None
+    option_index: int | None = None
+
+
+def _encode(*parts: object) -> str:
+    data = SEPARATOR.join(str(part) for part in parts)
+    if len(data.encode()) > MAX_CALLBACK_DATA_BYTES:
+        raise ValueError(f"callback_data is longer than {MAX_CALLBACK_DATA_BYTES} bytes: {data!r}")
+    return data
+
+
+def encode_select(graph: SurveyStateGraph, field_name: str, option: str) -> str:
+    """callback_data кнопки варианта option поля field_name."""
+    node = graph.node(field_name)
+    if field_name not in graph.field_index or not node.options or option not in node.options:
+        raise ValueError(f"Unknown option {option!r} for field {field_name!r}")
+    return _encode(SELECT, graph.field_index[field_name], node.options.index(option), graph.version)
+
+
+def encode_trip_poll(options: Sequence[str], option: str) -> str:
+    """callback_data кнопки опроса о выезде."""
+    return _encode(TRIP_POLL, list(options).index(option), survey_version(options))
+
+
+def decode(data: str, graph: SurveyStateGraph, trip_poll_options: Sequence[str] = ()) -> CallbackAction:
+    """
+    Разбирает callback_data.
+
+    Варианты ответа берутся по индексам из скомпилированного графа за O(1).
+    Raises StaleCallbackError, если версия не совпадает или формат неизвестен
+    (в том числе старый формат select|<текст варианта>).
+    """
+    parts = (data or "").split(SEPARATOR)
+    action = parts[0]
+
+    try:
+        if action == SELECT and len(parts) == 4:
+            field_index, option_index, version = int(parts[1]), int(parts[2]), parts[3]
+            if version != graph.version:
+                raise StaleCallbackError(f"Survey version {version} is not current ({graph.version})")
+            if field_index < 0 or option_index < 0:
+                raise IndexError(field_index)
+            field_name = graph.steps[field_index]
+            return CallbackAction(SELECT, field_name, graph.node(field_name).options[option_index], option_index)
+
+        if action == TRIP_POLL and len(parts) == 3:
+            option_index, version = int(parts[1]), parts[2]
+            if version != survey_version(trip_poll_options) or option_index < 0:
+                raise StaleCallbackError(f"Trip poll version {version} is not current")
+            return CallbackAction(TRIP_POLL, option=trip_poll_options[option_index], option_index=option_index)
+    except (ValueError, IndexError, TypeError) as e:
+        if isinstance(e, StaleCallbackError):
+            raise
+        raise StaleCallbackError(f"Malformed callback_data {data!r}") from e
+
+    if action in (DONE, CANCEL, CANCEL_EDIT) and len(parts) == 1:
+        return CallbackAction(action)
+
+    raise StaleCallbackError(f"Unknown callback_data {data!r}")
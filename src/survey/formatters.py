@@ -1,11 +1,16 @@
 """
 Форматтеры для полей опроса.
 Следует принципу Single Responsibility - каждый форматтер отвечает за одну задачу.
+
+Форматтеры не хранят состояния, поэтому функции-обертки используют готовые
+экземпляры, созданные при импорте модуля.
 """
 
 import re
 from abc import ABC, abstractmethod
 
+NON_DIGITS_RE = re.compile(r"\D")
+
 
 class Formatter(ABC):
     """Базовый класс для всех форматтеров."""
@@ -28,7 +33,7 @@ class PhoneDbFormatter(Formatter):
 
     def format(self, value: str) -> str:
         # Удаляем все символы кроме цифр
-        phone = re.sub(r"\D", "", str(value))
+        phone = NON_DIGITS_RE.sub("", str(value))
 
         # Заменяем 8 на 7 в начале
         if phone.startswith("8"):
@@ -45,9 +50,7 @@ class PhoneDisplayFormatter(Formatter):
             return "Не указан"
 
         # Сначала форматируем для БД, затем добавляем +
-        db_formatter = PhoneDbFormatter()
-        phone = db_formatter.format(value)
-        return "+" + phone
+        return "+" + PHONE_DB_FORMATTER.format(value)
 
 
 class DateDbFormatter(Formatter):
@@ -134,34 +137,45 @@ class FormatterFactory:
         return GroupDbFormatter()
 
 
+# Готовые экземпляры
+TEXT_FORMATTER = TextFormatter()
+PHONE_DB_FORMATTER = PhoneDbFormatter()
+PHONE_DISPLAY_FORMATTER = PhoneDisplayFormatter()
+DATE_DB_FORMATTER = DateDbFormatter()
+USERNAME_DB_FORMATTER = UsernameDbFormatter()
+USERNAME_DISPLAY_FORMATTER = UsernameDisplayFormatter()
+DEFAULT_DISPLAY_FORMATTER = DefaultDisplayFormatter()
+GROUP_DB_FORMATTER = GroupDbFormatter()
+
+
 # Функции-обертки для обратной совместимости
 def format_text_db(value: str) -> str:
-    return FormatterFactory.create_text().format(value)
+    return TEXT_FORMATTER.format(value)
 
 
 def format_phone_db(value: str) -> str:
-    return FormatterFactory.create_phone_db().format(value)
+    return PHONE_DB_FORMATTER.format(value)
 
 
 def format_phone_display(value: str) -> str:
-    return FormatterFactory.create_phone_display().format(value)
+    return PHONE_DISPLAY_FORMATTER.format(value)
 
 
 def format_date_db(value: str) -> str:
-    return FormatterFactory.create_date_db().format(value)
+    return DATE_DB_FORMATTER.format(value)
 
 
 def format_username_db(value: str) -> str | None:
-    return FormatterFactory.create_username_db().format(value)
+    return USERNAME_DB_FORMATTER.format(value)
 
 
 def format_username_display(value: str) -> str:
-    return FormatterFactory.create_username_display().format(value)
+    return USERNAME_DISPLAY_FORMATTER.format(value)
 
 
 def format_default_display(value: str) -> str:
-    return FormatterFactory.create_default_display().format(value)
+    return DEFAULT_DISPLAY_FORMATTER.format(value)
 
 
 def format_group_db(value: str) -> str:
-    return FormatterFactory.create_group_db().format(value)
+    return GROUP_DB_FORMATTER.format(value)
@@ -0,0 +1,102 @@
+"""
+Хранение ответов на вопросы с множественным выбором.
+
+Выбранные варианты хранятся в колонке INTEGER как битовая маска индексов
+вариантов: бит i установлен, если выбран options[i]. Переключение варианта -
+один XOR, выборка "все, кто выбрал X" - условие `column & (1 << i) != 0`, а
+варианты с ", " внутри больше не ломают данные. Человекочитаемый текст
+собирается только при выводе (сводка, выгрузка в Excel).
+"""
+
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from sqlalchemy import ColumnElement
+
+from ..constants import SKIPPED
+
+# Разделитель, которым раньше склеивались варианты в TEXT-колонке
+LEGACY_SEPARATOR = ", "
+
+
+def bit(index: int) -> int:
+    """Бит варианта с индексом index."""
+    return 1 << index
+
+
+def to_mask(options: Sequence[str], value: Any) -> int:
+    """
+    Приводит значение к маске.
+
+    Принимает маску (int или строку из цифр), последовательность выбранных вариантов
+    или текст старого формата "вариант1, вариант2". Отметка пропуска SKIPPED,
+    записанная в колонку раньше, считается пустым выбором.
+
+    Raises:
+        ValueError: Если среди выбранных есть неизвестный вариант
+    """
+    if value is None or value == "" or value == SKIPPED:
+        return 0
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        if value.isdigit():
+            return int(value)
+        value = parse_legacy(options, value)
+
+    mask = 0
+    for option in value:
+        try:
+            mask |= bit(options.index(option))
+        except ValueError:
+            raise ValueError(f"Unknown option: {option!r}") from None
+    return mask
+
+
+def parse_legacy(options: Sequence[str], text: str) -> list[str]:
+    """
+    Разбирает текст "вариант1, вариант2" в список вариантов.
+
+    Части склеиваются обратно, пока не совпадут с известным вариантом, поэтому
+    варианты, содержащие ", ", разбираются правильно.
+    """
+    known = set(options)
+    selected: list[str] = []
+    current: list[str] = []
+    for part in text.split(LEGACY_SEPARATOR):
+        current.append(part)
+        candidate = LEGACY_SEPARATOR.join(current)
+        if candidate in known:
+            selected.append(candidate)
+            current = []
+    if current:
+        raise ValueError(f"Unknown option: {LEGACY_SEPARATOR.join(current)!r}")
+    return selected
+
+
+def selected_options(options: Sequence[str], mask: Any) -> list[str]:
+    """Выбранные варианты в порядке их следования в options."""
+    mask = to_mask(options, mask)
+    return [option for index, option in enumerate(options) if mask & bit(index)]
+
+
+def toggle(mask: Any, index: int) -> int:
+    """Переключает вариант с индексом index."""
+    return (int(mask) if mask else 0) ^ bit(index)
+
+
+def format_mask(options: Sequence[str], mask: Any) -> str | None:
+    """Человекочитаемое значение: выбранные варианты через запятую (None, если ничего не выбрано)."""
+    if mask is None:
+        return None
+    return LEGACY_SEPARATOR.join(selected_options(options, mask)) or None
+
+
+def has_option(column: Any, options: Sequence[str], option: str) -> ColumnElement[bool]:
+    """SQL-условие "выбран вариант option" для колонки-маски."""
+    return column.op("&")(bit(options.index(option))) != 0
+
+
+def multi_select_fields(fields: Iterable[Any]) -> dict[str, Sequence[str]]:
+    """Поля с множественным выбором: имя -> варианты."""
+    return {field.field_name: field.options for field in fields if field.multi_select and field.options}
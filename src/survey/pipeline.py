@@ -0,0 +1,54 @@
+"""
+Конвейер обработки ввода для поля опроса: валидация -> форматирование для БД.
+
+Конвейер собирается один раз при создании SurveyField: под каждое сочетание
+"есть валидатор / есть форматтер" выбирается своя функция, поэтому при обработке
+ввода не нужно проверять конфигурацию поля и искать его по имени.
+"""
+
+from collections.abc import Callable
+from typing import Any
+
+Validator = Callable[[str], tuple[bool, str | None]]
+DbFormatter = Callable[[str], Any]
+
+# (прошло ли валидацию, сообщение об ошибке, значение для БД)
+PipelineResult = tuple[bool, str | None, Any]
+Pipeline = Callable[[str], PipelineResult]
+
+
+def compile_pipeline(validator: Validator | None, db_formatter: DbFormatter | None) -> Pipeline:
+    """
+    Собирает функцию value -> (is_valid, error_message, db_value).
+
+    Если значение не прошло валидацию, форматтер не вызывается и db_value равно None.
+    """
+    if validator is None and db_formatter is None:
+
+        def passthrough(value: str) -> PipelineResult:
+            return True, None, value
+
+        return passthrough
+
+    if validator is None:
+
+        def format_only(value: str) -> PipelineResult:
+            return True, None, db_formatter(value)
+
+        return format_only
+
+    if db_formatter is None:
+
+        def validate_only(value: str) -> PipelineResult:
+            is_valid, error_message = validator(value)
+            return is_valid, error_message, value if is_valid else None
+
+        return validate_only
+
+    def validate_and_format(value: str) -> PipelineResult:
+        is_valid, error_message = validator(value)
+        if not is_valid:
+            return False, error_message, None
+        return True, None, db_formatter(value)
+
+    return validate_and_format
@@ -1,10 +1,26 @@
 """
 Условия пропуска вопросов для опроса.
 Следует принципу Single Responsibility - каждое условие отвечает за одну проверку.
+
+Условия образуют небольшое дерево выражений (значение поля, отрицание, И, ИЛИ).
+Дерево компилируется дважды:
+- в Python-замыкание, которое вызывается при переходах состояний (условие само
+  является вызываемым объектом и подходит для SurveyField.skip_if);
+- в SQL-условие SQLAlchemy, чтобы вопросы "кому будет задан вопрос X" решались
+  одним запросом по индексу, а не перебором всех пользователей в Python.
+
+SQL-условия учитывают NULL так же, как Python учитывает отсутствующее поле
+(None): результат сравнения с NULL никогда не остаётся "неизвестным".
 """
 
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable
 from typing import Any, Protocol
 
+from sqlalchemy import ColumnElement, and_, false, not_, or_, true
+
+UserPredicate = Callable[[dict[str, Any]], bool]
+
 
 class SkipCondition(Protocol):
     """Протокол для условий пропуска."""
@@ -14,48 +30,201 @@ class SkipCondition(Protocol):
         ...
 
 
-class FieldValueSkipCondition:
+class SkipExpression(ABC):
+    """
+    Узел дерева условий пропуска.
+
+    Узлы неизменяемы после создания: замыкание компилируется при первом вызове и кэшируется.
+    Узлы комбинируются операторами & (И), | (ИЛИ) и ~ (НЕ).
+    """
+
+    _compiled: UserPredicate | None = None
+
+    @abstractmethod
+    def _compile(self) -> UserPredicate:
+        """Собирает Python-замыкание user_data -> bool."""
+
+    @abstractmethod
+    def to_sql(self, model: Any) -> ColumnElement[bool]:
+        """SQL-условие "вопрос будет пропущен" для колонок модели пользователя."""
+
+    @property
+    @abstractmethod
+    def fields(self) -> frozenset[str]:
+        """Поля, от которых зависит условие."""
+
+    def compile(self) -> UserPredicate:
+        """Скомпилированное замыкание (создаётся один раз)."""
+        if self._compiled is None:
+            self._compiled = self._compile()
+        return self._compiled
+
+    def should_skip(self, user_data: dict[str, Any]) -> bool:
+        return self.compile()(user_data)
+
+    def __call__(self, user_data: dict[str, Any]) -> bool:
+        return self.compile()(user_data)
+
+    def __and__(self, other: "SkipExpression") -> "MultipleFieldsSkipCondition":
+        return MultipleFieldsSkipCondition([self, other])
+
+    def __or__(self, other: "SkipExpression") -> "AnyFieldSkipCondition":
+        return AnyFieldSkipCondition([self, other])
+
+    def __invert__(self) -> "NotSkipCondition":
+        return NotSkipCondition(self)
+
+
+def _column(model: Any, field_name: str) -> Any:
+    column = getattr(model, field_name, None)
+    if column is None:
+        raise ValueError(f"Unknown column in skip condition: {field_name}")
+    return column
+
+
+class FieldValueSkipCondition(SkipExpression):
     """Условие пропуска на основе значения другого поля."""
 
     def __init__(self, field_name: str, skip_values: list):
         self.field_name = field_name
         self.skip_values = skip_values if isinstance(skip_values, list) else [skip_values]
 
-    def should_skip(self, user_data: dict[str, Any]) -> bool:
-        field_value = user_data.get(self.field_name)
-        return field_value in self.skip_values
-
-
-class FieldNotValueSkipCondition:
+    def _compile(self) -> UserPredicate:
+        field_name = self.field_name
+        # Кортеж, а не множество: сравнение как у list.__contains__, в том числе для нехешируемых значений
+        values = tuple(self.skip_values)
+        return lambda user_data: user_data.get(field_name) in values
+
+    def to_sql(self, model: Any) -> ColumnElement[bool]:
+        column = _column(model, self.field_name)
+        values = [value for value in self.skip_values if value is not None]
+        # IN по колонке с NULL дал бы NULL, поэтому отсутствующее значение проверяется явно
+        conditions = []
+        if values:
+            conditions.append(and_(column.is_not(None), column.in_(values)))
+        if len(values) != len(self.skip_values):
+            conditions.append(column.is_(None))
+        return or_(false(), *conditions)
+
+    @property
+    def fields(self) -> frozenset[str]:
+        return frozenset((self.field_name,))
+
+
+class FieldNotValueSkipCondition(SkipExpression):
     """Условие пропуска, если поле НЕ равно определенному значению."""
 
     def __init__(self, field_name: str, required_value: str):
         self.field_name = field_name
         self.required_value = required_value
 
-    def should_skip(self, user_data: dict[str, Any]) -> bool:
-        field_value = user_data.get(self.field_name)
-        return field_value != self.required_value
+    def _compile(self) -> UserPredicate:
+        field_name = self.field_name
+        required_value = self.required_value
+        return lambda user_data: user_data.get(field_name) != required_value
 
+    def to_sql(self, model: Any) -> ColumnElement[bool]:
+        # IS NOT: отсутствующее значение тоже "не равно"
+        return _column(model, self.field_name).is_distinct_from(self.required_value)
 
-class MultipleFieldsSkipCondition:
+    @property
+    def fields(self) -> frozenset[str]:
+        return frozenset((self.field_name,))
+
+
+class MultipleFieldsSkipCondition(SkipExpression):
     """Условие пропуска на основе нескольких полей (И)."""
 
     def __init__(self, conditions: list):
         self.conditions = conditions
 
-    def should_skip(self, user_data: dict[str, Any]) -> bool:
-        return all(condition.should_skip(user_data) for condition in self.conditions)
+    def _compile(self) -> UserPredicate:
+        predicates = tuple(_predicate(condition) for condition in self.conditions)
 
+        def check_all(user_data: dict[str, Any]) -> bool:
+            for predicate in predicates:
+                if not predicate(user_data):
+                    return False
+            return True
 
-class AnyFieldSkipCondition:
+        return check_all
+
+    def to_sql(self, model: Any) -> ColumnElement[bool]:
+        return and_(true(), *(_expression(condition).to_sql(model) for condition in self.conditions))
+
+    @property
+    def fields(self) -> frozenset[str]:
+        return _fields(self.conditions)
+
+
+class AnyFieldSkipCondition(SkipExpression):
     """Условие пропуска на основе нескольких полей (ИЛИ)."""
 
     def __init__(self, conditions: list):
         self.conditions = conditions
 
-    def should_skip(self, user_data: dict[str, Any]) -> bool:
-        return any(condition.should_skip(user_data) for condition in self.conditions)
+    def _compile(self) -> UserPredicate:
+        predicates = tuple(_predicate(condition) for condition in self.conditions)
+
+        def check_any(user_data: dict[str, Any]) -> bool:
+            for predicate in predicates:
+                if predicate(user_data):
+                    return True
+            return False
+
+        return check_any
+
+    def to_sql(self, model: Any) -> ColumnElement[bool]:
+        return or_(false(), *(_expression(condition).to_sql(model) for condition in self.conditions))
+
+    @property
+    def fields(self) -> frozenset[str]:
+        return _fields(self.conditions)
+
+
+class NotSkipCondition(SkipExpression):
+    """Отрицание условия пропуска."""
+
+    def __init__(self, condition: SkipExpression):
+        self.condition = condition
+
+    def _compile(self) -> UserPredicate:
+        predicate = _predicate(self.condition)
+        return lambda user_data: not predicate(user_data)
+
+    def to_sql(self, model: Any) -> ColumnElement[bool]:
+        # Дочерние условия никогда не дают NULL, поэтому NOT безопасен
+        return not_(_expression(self.condition).to_sql(model))
+
+    @property
+    def fields(self) -> frozenset[str]:
+        return self.condition.fields
+
+
+def _predicate(condition: Any) -> UserPredicate:
+    """Замыкание для узла дерева или любого объекта с should_skip."""
+    if isinstance(condition, SkipExpression):
+        return condition.compile()
+    return condition.should_skip
+
+
+def _expression(condition: Any) -> SkipExpression:
+    if not isinstance(condition, SkipExpression):
+        raise TypeError(f"Condition {condition!r} cannot be translated to SQL")
+    return condition
+
+
+def _fields(conditions: Iterable[Any]) -> frozenset[str]:
+    return frozenset().union(*(condition.fields for condition in conditions if isinstance(condition, SkipExpression)))
+
+
+def is_sql_compatible(condition: Any) -> bool:
+    """Можно ли перевести условие в SQL (все узлы дерева - SkipExpression)."""
+    if isinstance(condition, MultipleFieldsSkipCondition | AnyFieldSkipCondition):
+        return all(is_sql_compatible(child) for child in condition.conditions)
+    if isinstance(condition, NotSkipCondition):
+        return is_sql_compatible(condition.condition)
+    return isinstance(condition, SkipExpression)
 
 
 # Фабрика условий пропуска
@@ -78,33 +247,25 @@ class SkipConditionFactory:
     def create_multiple_or(conditions: list) -> AnyFieldSkipCondition:
         return AnyFieldSkipCondition(conditions)
 
+    @staticmethod
+    def create_not(condition: SkipExpression) -> NotSkipCondition:
+        return NotSkipCondition(condition)
 
-# Предопределенные условия для удобства
-def skip_if_other_education(user_data: dict[str, Any]) -> bool:
-    """Пропустить, если выбрано не 'Другое учебное заведение'."""
-    condition = SkipConditionFactory.create_field_not_value("education_choice", "Другое учебное заведение")
-    return condition.should_skip(user_data)
-
-
-def skip_if_finished_or_not_studying(user_data: dict[str, Any]) -> bool:
-    """Пропустить, если закончил учебу или не учится."""
-    condition = SkipConditionFactory.create_field_value("education_choice", ["Закончил(а)", "Не учусь"])
-    return condition.should_skip(user_data)
 
+# Предопределенные условия для удобства. Это готовые узлы дерева: их можно передавать
+# в skip_if как функции и переводить в SQL
 
-def skip_if_not_working(user_data: dict[str, Any]) -> bool:
-    """Пропустить, если не работает."""
-    condition = SkipConditionFactory.create_field_value("work", "Нет")
-    return condition.should_skip(user_data)
+# Пропустить, если выбрано не 'Другое учебное заведение'
+skip_if_other_education = FieldNotValueSkipCondition("education_choice", "Другое учебное заведение")
 
+# Пропустить, если закончил учебу или не учится
+skip_if_finished_or_not_studying = FieldValueSkipCondition("education_choice", ["Закончил(а)", "Не учусь"])
 
-def skip_if_no_diploma(user_data: dict[str, Any]) -> bool:
-    """Пропустить, если нет диплома."""
-    condition = SkipConditionFactory.create_field_value("diplom", "Нет")
-    return condition.should_skip(user_data)
+# Пропустить, если не работает
+skip_if_not_working = FieldValueSkipCondition("work", "Нет")
 
+# Пропустить, если нет диплома
+skip_if_no_diploma = FieldValueSkipCondition("diplom", "Нет")
 
-def skip_if_bmstu_student(user_data: dict[str, Any]) -> bool:
-    """Пропустить, если студент МГТУ."""
-    condition = SkipConditionFactory.create_field_value("education_choice", "МГТУ им. Баумана")
-    return condition.should_skip(user_data)
+# Пропустить, если студент МГТУ
+skip_if_bmstu_student = FieldValueSkipCondition("education_choice", "МГТУ им. Баумана")
@@ -0,0 +1,141 @@
+"""
+Скомпилированный граф состояний опроса.
+
+Конфигурация опроса один раз превращается в неизменяемый граф: словарь
+состояние -> узел с заранее вычисленными переходами, чтобы обработчики не искали
+поля линейным поиском и не разбирали строки состояний на каждом апдейте.
+"""
+
+import hashlib
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any
+
+from ..constants import AUTO_COLLECT, OPTIONS, REGISTERED, REQUEST_CONTACT, SKIP_IF, STATE
+
+EDIT_PREFIX = "edit_"
+
+
+def edit_state(field_name: str) -> str:
+    """Возвращает состояние редактирования поля."""
+    return f"{EDIT_PREFIX}{field_name}"
+
+
+def survey_version(parts: Any) -> str:
+    """Короткий стабильный хэш (8 hex-символов) от repr частей конфигурации."""
+    return hashlib.blake2b(repr(tuple(parts)).encode(), digest_size=4).hexdigest()
+
+
+@dataclass(frozen=True)
+class StateNode:
+    """
+    Узел графа состояний.
+
+    Для полей опроса field_name - имя колонки в БД (без префикса edit_),
+    для остальных состояний (registered, edit, админские) - None.
+    """
+
+    state: str
+    config: Any  # SurveyField или словарь состояния
+    field_name: str | None = None
+    is_edit: bool = False
+    is_admin: bool = False
+
+    # Переходы
+    next_state: str = REGISTERED  # После ответа, автосбора или пропуска
+    edit_state: str | None = None  # Состояние редактирования этого поля
+
+    # Свойства конфигурации, вынесенные из SurveyField/словаря
+    auto_collect: Callable[[Any], str | None] | None = None
+    skip_if: Callable[[dict[str, Any]], bool] | None = None
+    options: tuple[str, ...] | None = None
+    multi_select: bool = False
+    request_contact: bool = False
+
+
+class SurveyStateGraph:
+    """Граф состояний, скомпилированный из RegistrationSurveyConfig."""
+
+    def __init__(self, survey_config: Any) -> None:
+        fields = tuple(survey_config.fields)
+        self.steps: tuple[str, ...] = tuple(field.field_name for field in fields)
+        self.first_state: str = self.steps[0] if self.steps else REGISTERED
+        self.field_index: Mapping[str, int] = MappingProxyType({name: index for index, name in enumerate(self.steps)})
+        # Версия опроса: меняется при изменении набора полей или их вариантов ответа
+        self.version: str = survey_version(
+            (field.field_name, tuple(field.options) if field.options else ()) for field in fields
+        )
+
+        nodes: dict[str, StateNode] = {}
+        for index, field in enumerate(fields):
+            next_state = self.steps[index + 1] if index + 1 < len(self.steps) else REGISTERED
+            nodes[field.field_name] = self._field_node(field, field.field_name, next_state, is_edit=False)
+            # После редактирования всегда возвращаемся в registered
+            nodes[edit_state(field.field_name)] = self._field_node(
+                field, edit_state(field.field_name), REGISTERED, is_edit=True
+            )
+
+        for state_config in survey_config.post_registration_states:
+            nodes.setdefault(state_config[STATE], self._dict_node(state_config, is_admin=False))
+        for state_config in survey_config.admin_states:
+            nodes.setdefault(state_config[STATE], self._dict_node(state_config, is_admin=True))
+
+        self.nodes: Mapping[str, StateNode] = MappingProxyType(nodes)
+        self.fields_by_name: Mapping[str, Any] = MappingProxyType({field.field_name: field for field in fields})
+        # При совпадении меток побеждает первое поле, как при линейном поиске
+        labels: dict[str, Any] = {}
+        for field in fields:
+            labels.setdefault(field.label, field)
+        self.fields_by_label: Mapping[str, Any] = MappingProxyType(labels)
+
+    @staticmethod
+    def _field_node(field: Any, state: str, next_state: str, is_edit: bool) -> StateNode:
+        return StateNode(
+            state=state,
+            config=field,
+            field_name=field.field_name,
+            is_edit=is_edit,
+            next_state=next_state,
+            edit_state=edit_state(field.field_name),
+            auto_collect=field.auto_collect,
+            skip_if=field.skip_if,
+            options=tuple(field.options) if field.options else None,
+            multi_select=field.multi_select,
+            request_contact=field.request_contact,
+        )
+
+    @staticmethod
+    def _dict_node(state_config: dict[str, Any], is_admin: bool) -> StateNode:
+        options = state_config.get(OPTIONS)
+        return StateNode(
+            state=state_config[STATE],
+            config=state_config,
+            is_admin=is_admin,
+            auto_collect=state_config.get(AUTO_COLLECT),
+            skip_if=state_config.get(SKIP_IF),
+            options=tuple(options) if options else None,
+            request_contact=bool(state_config.get(REQUEST_CONTACT)),
+        )
+
+    def node(self, state: str | None) -> StateNode | None:
+        """Возвращает узел состояния или None."""
+        return self.nodes.get(state) if state is not None else None
+
+    def next_state(self, state: str) -> str:
+        """Следующее состояние после ответа в состоянии state (registered для неизвестных)."""
+        node = self.nodes.get(state)
+        return node.next_state if node else REGISTERED
+
+    def field_name(self, state: str) -> str | None:
+        """Имя поля в БД для состояния опроса (в том числе edit_*)."""
+        node = self.nodes.get(state)
+        return node.field_name if node else None
+
+    def get_field(self, field_name: str) -> Any:
+        """Поле опроса по имени или None."""
+        return self.fields_by_name.get(field_name)
+
+    def get_field_by_label(self, label: str) -> Any:
+        """Поле опроса по метке или None."""
+        return self.fields_by_label.get(label)
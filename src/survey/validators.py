@@ -1,11 +1,32 @@
 """
 Валидаторы для полей опроса.
 Следует принципу Single Responsibility - каждый валидатор отвечает за одну задачу.
+
+Регулярные выражения компилируются один раз при импорте модуля, а функции-обертки
+используют готовые экземпляры валидаторов вместо создания нового на каждый вызов.
 """
 
 import re
 from abc import ABC, abstractmethod
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
+from functools import lru_cache
+
+# Скомпилированные шаблоны
+NON_DIGITS_RE = re.compile(r"\D")
+PHONE_RE = re.compile(r"^(7)\d{10}$")
+EMAIL_RE = re.compile(r"^[^@]+@[^@]+\.[^@]+$")
+GROUP_RE = re.compile(r"^[а-яА-Я]{1,5}\d{0,2}[сицСИЦ]?-([1-9]|1[0-6])[1-9]([абмтАБМТ]?[вВ]?)$")
+DATE_RE = re.compile(r"^(0?[1-9]|[12][0-9]|3[01])\.(0?[1-9]|1[0-2])\.(\d{4})$")
+
+ValidationResult = tuple[bool, str | None]
+
+# Допустимые годы рождения
+MIN_BIRTH_YEAR = 1980
+MAX_BIRTH_YEAR = 2009
+BIRTH_YEAR_ERROR = (
+    "Немного не верится, что ты родился в этом году. Но могу ошибаться, если так, введи, пожалуйста, 2000 год, "
+    "потом разберёмся."
+)
 
 
 class Validator(ABC):
@@ -40,15 +61,14 @@ class PhoneValidator(Validator):
 
     def validate(self, value: str) -> tuple[bool, str | None]:
         # Удаляем все символы кроме цифр
-        phone = re.sub(r"\D", "", str(value))
+        phone = NON_DIGITS_RE.sub("", str(value))
 
         # Заменяем 8 на 7 в начале
         if phone.startswith("8"):
             phone = "7" + phone[1:]
 
         # Проверяем формат
-        pattern = r"^(7)\d{10}$"
-        if not re.match(pattern, phone):
+        if not PHONE_RE.match(phone):
             return False, self.error_message
         return True, None
 
@@ -60,7 +80,7 @@ class EmailValidator(Validator):
         self.error_message = error_message
 
     def validate(self, value: str) -> tuple[bool, str | None]:
-        if not re.match(r"^[^@]+@[^@]+\.[^@]+$", value):
+        if not EMAIL_RE.match(value):
             return False, self.error_message
         return True, None
 
@@ -70,10 +90,10 @@ class GroupValidator(Validator):
 
     def __init__(self, error_message: str = "Неверный формат группы. Пожалуйста, введите корректную группу."):
         self.error_message = error_message
-        self.pattern = r"^[а-яА-Я]{1,5}\d{0,2}[сицСИЦ]?-([1-9]|1[0-6])[1-9]([абмтАБМТ]?[вВ]?)$"
+        self.pattern = GROUP_RE
 
     def validate(self, value: str) -> tuple[bool, str | None]:
-        if not re.match(self.pattern, value):
+        if not self.pattern.match(value):
             return False, self.error_message
         return True, None
 
@@ -85,17 +105,13 @@ class DateValidator(Validator):
         self.error_message = error_message
 
     def validate(self, value: str) -> tuple[bool, str | None]:
-        pattern = r"^(0?[1-9]|[12][0-9]|3[01])\.(0?[1-9]|1[0-2])\.(\d{4})$"
-        match = re.match(pattern, value)
+        match = DATE_RE.match(value)
         if not match:
             return False, self.error_message
 
         year = int(match.group(3))
-        if year < 1980 or year > 2009:
-            return (
-                False,
-                "Немного не верится, что ты родился в этом году. Но могу ошибаться, если так, введи, пожалуйста, 2000 год, потом разберёмся.",
-            )
+        if year < MIN_BIRTH_YEAR or year > MAX_BIRTH_YEAR:
+            return False, BIRTH_YEAR_ERROR
 
         return True, None
 
@@ -106,9 +122,10 @@ class OptionsValidator(Validator):
     def __init__(self, options: list[str], error_message: str = "Пожалуйста, выберите один из предложенных вариантов."):
         self.options = options
         self.error_message = error_message
+        self._allowed = frozenset(options)
 
     def validate(self, value: str) -> tuple[bool, str | None]:
-        if value not in self.options:
+        if value not in self._allowed:
             return False, self.error_message
         return True, None
 
@@ -159,31 +176,45 @@ class ValidatorFactory:
         return YesNoValidator()
 
 
+# Готовые экземпляры с сообщениями по умолчанию (валидаторы не хранят состояния)
+NON_EMPTY_VALIDATOR = NonEmptyValidator()
+PHONE_VALIDATOR = PhoneValidator()
+EMAIL_VALIDATOR = EmailValidator()
+DATE_VALIDATOR = DateValidator()
+YES_NO_VALIDATOR = YesNoValidator()
+GROUP_VALIDATOR = GroupValidator()
+
+
 # Функции-обертки для обратной совместимости
-def validate_non_empty(value: str) -> tuple[bool, str | None]:
-    return ValidatorFactory.create_non_empty().validate(value)
+def validate_non_empty(value: str) -> ValidationResult:
+    return NON_EMPTY_VALIDATOR.validate(value)
+
+
+def validate_phone(value: str) -> ValidationResult:
+    return PHONE_VALIDATOR.validate(value)
 
 
-def validate_phone(value: str) -> tuple[bool, str | None]:
-    return ValidatorFactory.create_phone().validate(value)
+def validate_email(value: str) -> ValidationResult:
+    return EMAIL_VALIDATOR.validate(value)
 
 
-def validate_email(value: str) -> tuple[bool, str | None]:
-    return ValidatorFactory.create_email().validate(value)
+def validate_date(value: str) -> ValidationResult:
+    return DATE_VALIDATOR.validate(value)
 
 
-def validate_date(value: str) -> tuple[bool, str | None]:
-    return ValidatorFactory.create_date().validate(value)
+def validate_yes_no(value: str) -> ValidationResult:
+    return YES_NO_VALIDATOR.validate(value)
 
 
-def validate_yes_no(value: str) -> tuple[bool, str | None]:
-    return ValidatorFactory.create_yes_no().validate(value)
+def validate_group(value: str) -> ValidationResult:
+    return GROUP_VALIDATOR.validate(value)
 
 
-def validate_group(value: str) -> tuple[bool, str | None]:
-    return ValidatorFactory.create_group().validate(value)
+def create_options_validator(options: Sequence[str]) -> Callable[[str], ValidationResult]:
+    return _options_validator(tuple(options))
 
 
-def create_options_validator(options: list[str]) -> Callable[[str], tuple[bool, str | None]]:
-    validator = ValidatorFactory.create_options(options)
-    return validator.validate
+@lru_cache(maxsize=64)
+def _options_validator(options: tuple[str, ...]) -> Callable[[str], ValidationResult]:
+    # Один валидатор на набор вариантов
+    return OptionsValidator(list(options)).validate
@@ -0,0 +1,109 @@
+"""
+Debouncing of rapid multi-select toggles.
+
+Every tap on a multi-select option used to write to the database and edit the
+keyboard. The coalescer keeps the selection of a (user, message) pair in memory
+and flushes it - one write and one keyboard edit - after a short quiet period.
+Other actions of the user (e.g. "done") flush first, so they always see the
+latest selection.
+"""
+
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+from .update_processor import KeyedLock
+
+logger = logging.getLogger(__name__)
+
+# Quiet period after the last tap before the selection is written
+TOGGLE_DEBOUNCE_SECONDS = int(os.getenv("TOGGLE_DEBOUNCE_MS", "400")) / 1000
+
+# (user id, message id)
+ToggleKey = tuple[int, Any]
+FlushCallback = Callable[[Any], Awaitable[None]]
+
+
+@dataclass
+class _PendingToggle:
+    value: Any
+    flush: FlushCallback
+    timer: asyncio.Task | None = None
+
+
+class ToggleCoalescer:
+    """Pending selections per (user, message) with a debounce timer each."""
+
+    def __init__(self, delay: float = TOGGLE_DEBOUNCE_SECONDS) -> None:
+        self.delay = delay
+        self._pending: dict[ToggleKey, _PendingToggle] = {}
+        # Values being flushed (until the write is done they are still the latest selection)
+        self._flushing: dict[ToggleKey, Any] = {}
+        # Flushes of one key never overlap, so keyboard edits are sent in order
+        self._flush_locks = KeyedLock()
+
+    def pending_value(self, key: ToggleKey) -> Any:
+        """Selection not yet written for key, or None."""
+        entry = self._pending.get(key)
+        return entry.value if entry else self._flushing.get(key)
+
+    def schedule(self, key: ToggleKey, value: Any, flush: FlushCallback) -> None:
+        """
+        Remember the new selection and restart the quiet period.
+
+        flush(value) is awaited once the key has been quiet for `delay` seconds;
+        the callback of the latest call wins.
+        """
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = _PendingToggle(value, flush)
+        else:
+            entry.value, entry.flush = value, flush
+            if entry.timer is not None:
+                entry.timer.cancel()
+        entry.timer = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: ToggleKey) -> None:
+        await asyncio.sleep(self.delay)
+        try:
+            await self.flush(key, from_timer=True)
+        except Exception as e:
+            logger.error(f"Failed to flush toggles of {key}: {e}", exc_info=True)
+
+    async def flush(self, key: ToggleKey, from_timer: bool = False) -> bool:
+        """Write the pending selection of key now. Returns False if nothing was pending."""
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return False
+        if entry.timer is not None and not from_timer:
+            entry.timer.cancel()
+        self._flushing[key] = entry.value
+        try:
+            await self._flush_locks.run(key, entry.flush(entry.value))
+        finally:
+            if self._flushing.get(key) is entry.value:
+                del self._flushing[key]
+        return True
+
+    async def flush_user(self, user_id: int) -> int:
+        """Flush all pending selections of a user. Returns the number of flushed keys."""
+        keys = [key for key in self._pending if key[0] == user_id]
+        for key in keys:
+            await self.flush(key)
+        # Wait for flushes started by timers, so the caller reads the written selection
+        for key in [key for key in self._flushing if key[0] == user_id]:
+            await self._flush_locks.run(key, asyncio.sleep(0))
+        return len(keys)
+
+    async def flush_all(self) -> int:
+        """Flush everything, e.g. on shutdown."""
+        keys = list(self._pending)
+        for key in keys:
+            await self.flush(key)
+        return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._pending)
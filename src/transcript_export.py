@@ -0,0 +1,143 @@
+"""
+Streaming export of conversation transcripts (text, HTML or JSON Lines).
+
+Records are read from message_history page by page and written to the output as they
+arrive, so the export of the whole log needs memory for one page only. The output is
+chronological: for one user it is their conversation with the bot, for all users it is
+the whole log with the user of every message.
+"""
+
+import html
+import json
+import logging
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import TextIO
+
+from .message_history import MessageHistory, MessageRecord, message_history
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = "exports"
+
+
+class TranscriptFormat(Enum):
+    TEXT = "text"
+    HTML = "html"
+    JSONL = "jsonl"
+
+    @property
+    def extension(self) -> str:
+        return {"text": "txt", "html": "html", "jsonl": "jsonl"}[self.value]
+
+
+def _content(record: MessageRecord) -> str:
+    """Text of a message; media messages are shown as [type] plus the caption."""
+    if record.text is not None:
+        return record.text
+    media = f"[{record.message_type or 'other'}]"
+    return f"{media} {record.caption}" if record.caption else media
+
+
+class _TextWriter:
+    def __init__(self, out: TextIO, telegram_id: int | None) -> None:
+        self.out = out
+        self.telegram_id = telegram_id
+
+    def header(self) -> None:
+        title = f"user {self.telegram_id}" if self.telegram_id is not None else "all users"
+        self.out.write(f"Transcript: {title}\n\n")
+
+    def record(self, record: MessageRecord) -> None:
+        arrow = "<-" if record.direction == "incoming" else "->"
+        user = f" {record.telegram_id}" if self.telegram_id is None else ""
+        self.out.write(f"[{record.created_at:%Y-%m-%d %H:%M:%S}]{user} {arrow} {_content(record)}\n")
+
+    def footer(self) -> None:
+        pass
+
+
+class _HtmlWriter(_TextWriter):
+    def header(self) -> None:
+        title = f"user {self.telegram_id}" if self.telegram_id is not None else "all users"
+        self.out.write(
+            '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+            f"<title>Transcript: {title}</title><style>"
+            "body{font-family:sans-serif;max-width:50em;margin:auto}"
+            ".msg{margin:.4em 0;padding:.4em .6em;border-radius:.4em;white-space:pre-wrap}"
+            ".incoming{background:#eef}.outgoing{background:#efe;margin-left:4em}"
+            ".meta{color:#888;font-size:.8em}"
+            f"</style></head><body>\n<h1>Transcript: {title}</h1>\n"
+        )
+
+    def record(self, record: MessageRecord) -> None:
+        user = f" · {record.telegram_id}" if self.telegram_id is None else ""
+        self.out.write(
+            f'<div class="msg {html.escape(record.direction)}">'
+            f'<div class="meta">{record.created_at:%Y-%m-%d %H:%M:%S}{user}</div>'
+            f"{html.escape(_content(record))}</div>\n"
+        )
+
+    def footer(self) -> None:
+        self.out.write("</body></html>\n")
+
+
+class _JsonlWriter(_TextWriter):
+    def header(self) -> None:
+        pass
+
+    def record(self, record: MessageRecord) -> None:
+        self.out.write(json.dumps(record.to_dict(), ensure_ascii=False))
+        self.out.write("\n")
+
+
+_WRITERS = {
+    TranscriptFormat.TEXT: _TextWriter,
+    TranscriptFormat.HTML: _HtmlWriter,
+    TranscriptFormat.JSONL: _JsonlWriter,
+}
+
+
+def write_transcript(
+    out: TextIO,
+    fmt: TranscriptFormat,
+    telegram_id: int | None = None,
+    history: MessageHistory | None = None,
+) -> int:
+    """
+    Write a transcript to a text stream.
+
+    Args:
+        out: Stream to write to
+        fmt: Output format
+        telegram_id: User whose conversation to export, or None for all users
+        history: Source of records. If None, uses the global message_history.
+
+    Returns:
+        Number of messages written
+    """
+    writer = _WRITERS[fmt](out, telegram_id)
+    writer.header()
+    count = 0
+    for record in (history or message_history).iter_records(telegram_id):
+        writer.record(record)
+        count += 1
+    writer.footer()
+    return count
+
+
+def export_transcript(fmt: TranscriptFormat, telegram_id: int | None = None, directory: str = EXPORT_DIR) -> str:
+    """
+    Export a transcript to a file. Blocking: call it from handlers via asyncio.to_thread.
+
+    Returns:
+        Path to the created file
+    """
+    Path(directory).mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_path = Path(directory) / f"messages_{telegram_id or 'all'}_{timestamp}.{fmt.extension}"
+    with open(file_path, "w", encoding="utf-8") as out:
+        count = write_transcript(out, fmt, telegram_id)
+    logger.info(f"Exported {count} messages to {file_path}")
+    return str(file_path)
@@ -0,0 +1,113 @@
+"""
+Concurrent update processing with per-user ordering.
+
+Updates of different users are processed concurrently, while updates of the same
+user run strictly one after another, in the order they were received. The per-user
+state machine (read state -> write answer -> transition) therefore never sees two
+taps of one user interleaved, but one slow user no longer delays everyone else.
+"""
+
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Hashable
+from typing import Any
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# Number of handlers running at the same time
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+# Number of accepted updates (running + waiting for their user's previous update)
+MAX_PENDING_UPDATES = 4096
+
+
+class KeyedLock:
+    """
+    asyncio locks created on demand per key and dropped when nobody holds or waits for them.
+
+    asyncio.Lock wakes waiters in FIFO order, so coroutines that reach acquire() in a
+    given order get the lock in the same order.
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[Hashable, tuple[asyncio.Lock, int]] = {}
+
+    def _acquire_ref(self, key: Hashable) -> asyncio.Lock:
+        lock, refs = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, refs + 1)
+        return lock
+
+    def _release_ref(self, key: Hashable) -> None:
+        lock, refs = self._locks[key]
+        if refs == 1:
+            del self._locks[key]
+        else:
+            self._locks[key] = (lock, refs - 1)
+
+    async def run(self, key: Hashable, coroutine: Awaitable[Any]) -> Any:
+        """Await coroutine while holding the lock of key."""
+        lock = self._acquire_ref(key)
+        try:
+            async with lock:
+                return await coroutine
+        finally:
+            self._release_ref(key)
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+def update_key(update: object) -> int | None:
+    """Serialization key of an update: the user, or the chat for updates without a user."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Update processor that runs updates of different users concurrently and updates
+    of one user sequentially.
+
+    BaseUpdateProcessor's semaphore (max_pending_updates) bounds the accepted updates.
+    An update first takes its user's lock and only then a worker slot, so updates
+    waiting behind the same user's previous one do not occupy slots of other users.
+    Updates without a user or chat are not serialized.
+    """
+
+    def __init__(
+        self, max_concurrent_updates: int = UPDATE_CONCURRENCY, max_pending_updates: int = MAX_PENDING_UPDATES
+    ):
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates must be a positive integer")
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self.worker_limit = max_concurrent_updates
+        self._workers = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks = KeyedLock()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = update_key(update)
+        if key is None:
+            async with self._workers:
+                await coroutine
+            return
+        await self._locks.run(key, self._run(coroutine))
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        async with self._workers:
+            await coroutine
+
+    async def initialize(self) -> None:
+        logger.info(f"Processing updates concurrently: {self.worker_limit} workers, ordered per user")
+
+    async def shutdown(self) -> None:
+        pass
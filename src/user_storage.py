@@ -4,18 +4,50 @@ Provides backward-compatible interface with the previous SQLite implementation.
 """
 
 import logging
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
 from typing import Any
 
-from sqlalchemy.exc import IntegrityError
+import pandas as pd
+from sqlalchemy import not_, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from src.messages import TRIP_POLL_YES
+from src.messages import OPTION_WILL_DRIVE_PENDING, TRIP_POLL_YES
 
+from .constants import REGISTERED, SKIPPED
 from .database import db
-from .models import get_user_model
+from .models import get_serializer, get_user_model
+from .persistence import drop_cached_user_data
+from .survey.bulk import normalize_series
+from .survey.multi_select import has_option, multi_select_fields
+from .survey.skip_conditions import is_sql_compatible
 
 logger = logging.getLogger(__name__)
 
 
+class UserNotFoundError(ValueError):
+    """Raised when a user row to be updated does not exist."""
+
+
+@dataclass
+class BulkUpsertError:
+    """Error for a single record rejected by bulk_upsert."""
+
+    index: int  # Position of the record in the input sequence
+    telegram_id: Any
+    error: str
+
+
+@dataclass
+class BulkUpsertResult:
+    """Outcome of bulk_upsert: number of written rows and per-row errors."""
+
+    upserted: int = 0
+    errors: list[BulkUpsertError] = field(default_factory=list)
+
+
 class UserStorage:
     """
     User storage class using SQLAlchemy ORM.
@@ -39,6 +71,7 @@ class UserStorage:
 
         # Get the User model
         self.User = get_user_model()
+        self.serializer = get_serializer(self.User)
 
         # Create tables
         self._create_table()
@@ -84,20 +117,45 @@ class UserStorage:
             value: New value for the field
 
         Raises:
-            ValueError: If user not found
+            UserNotFoundError: If user not found
         """
         with db.get_session() as session:
             user = session.query(self.User).filter_by(telegram_id=user_id).first()
 
             if not user:
                 logger.warning(f"No user found with ID: {user_id}")
-                raise ValueError(f"User {user_id} not found")
+                raise UserNotFoundError(f"User {user_id} not found")
 
             # Update the field
             setattr(user, field, value)
             session.commit()
             logger.debug(f"Updated user {user_id}: {field} = {value}")
 
+    def update_user_fields(self, user_id: int, values: dict[str, Any]) -> None:
+        """
+        Update several fields of a user with a single UPDATE statement.
+
+        Args:
+            user_id: Telegram user ID
+            values: Mapping of field name to new value
+
+        Raises:
+            UserNotFoundError: If user not found
+            ValueError: If a field does not exist
+        """
+        if not values:
+            return
+        unknown = [name for name in values if name not in self.User.__table__.columns]
+        if unknown:
+            raise ValueError(f"Unknown user fields: {', '.join(unknown)}")
+
+        with db.get_session() as session:
+            result = session.execute(update(self.User).where(self.User.telegram_id == user_id).values(**values))
+            if result.rowcount == 0:
+                logger.warning(f"No user found with ID: {user_id}")
+                raise UserNotFoundError(f"User {user_id} not found")
+        logger.debug(f"Updated user {user_id}: {values}")
+
     def update_state(self, user_id: int, state: str) -> None:
         """
         Update user's state.
@@ -118,15 +176,15 @@ class UserStorage:
         Returns:
             Dictionary with user data or None if not found
         """
-        with db.get_session() as session:
-            user = session.query(self.User).filter_by(telegram_id=user_id).first()
+        with db.get_session(readonly=True) as session:
+            row = session.execute(self.serializer.select().where(self.User.telegram_id == user_id)).first()
 
-            if not user:
+            if not row:
                 logger.debug(f"User {user_id} not found")
                 return None
 
             # Convert to dictionary for backward compatibility
-            return user.to_dict()
+            return self.serializer.serialize_row(row)
 
     def get_all_users(self) -> list[int]:
         """
@@ -135,7 +193,7 @@ class UserStorage:
         Returns:
             List of telegram_id values
         """
-        with db.get_session() as session:
+        with db.get_session(readonly=True) as session:
             users = session.query(self.User.telegram_id).order_by(self.User.created_at).all()
             return [user[0] for user in users]
 
@@ -146,7 +204,7 @@ class UserStorage:
         Returns:
             Number of users in database
         """
-        with db.get_session() as session:
+        with db.get_session(readonly=True) as session:
             count = session.query(self.User).count()
             return count
 
@@ -182,12 +240,215 @@ class UserStorage:
         Returns:
             List of user dictionaries
         """
-        with db.get_session() as session:
-            users = session.query(self.User).filter_by(state=state).order_by(self.User.created_at).all()
-            return [user.to_dict() for user in users]
+        with db.get_session(readonly=True) as session:
+            rows = session.execute(
+                self.serializer.select().where(self.User.state == state).order_by(self.User.created_at)
+            )
+            return self.serializer.serialize_rows(rows)
+
+    def bulk_upsert(
+        self,
+        records: Iterable[dict[str, Any]],
+        chunk_size: int = 500,
+        default_state: str = REGISTERED,
+    ) -> BulkUpsertResult:
+        """
+        Insert or update many users at once.
+
+        Values of survey fields go through the field's db_formatter, applied to each chunk
+        column by column with the vectorized formatters of src.survey.bulk. Rows are written with
+        INSERT ... ON CONFLICT(telegram_id) DO UPDATE as one executemany per chunk, and every
+        chunk is committed separately. On conflict only the columns present in the record
+        (plus updated_at) are overwritten. The cached registration state of written users
+        is invalidated (see persistence.drop_cached_user_data).
+
+        Args:
+            records: Dictionaries with "telegram_id" and any User columns
+            chunk_size: Number of records per executemany/commit
+            default_state: State for newly inserted users without an explicit "state"
+
+        Returns:
+            BulkUpsertResult with the number of written rows and per-row errors
+        """
+        from .settings import SURVEY_CONFIG
+
+        # Множественный выбор принимается маской, списком вариантов или текстом "вариант1, вариант2"
+        fields = [f for f in SURVEY_CONFIG.fields if f.db_formatter or (f.multi_select and f.options)]
+        valid_keys = set(self.serializer.column_names) - {"id"}
+        result = BulkUpsertResult()
+        chunk: list[tuple[int, dict[str, Any]]] = []
+
+        for index, record in enumerate(records):
+            try:
+                row = self._prepare_upsert_row(record, valid_keys)
+            except Exception as e:
+                result.errors.append(BulkUpsertError(index, record.get("telegram_id"), str(e)))
+                continue
+
+            chunk.append((index, row))
+            if len(chunk) >= chunk_size:
+                self._write_upsert_chunk(self._format_upsert_chunk(chunk, fields, result), default_state, result)
+                chunk = []
+
+        if chunk:
+            self._write_upsert_chunk(self._format_upsert_chunk(chunk, fields, result), default_state, result)
+
+        result.errors.sort(key=lambda error: error.index)
+        logger.info(f"Bulk upsert finished: {result.upserted} rows written, {len(result.errors)} errors")
+        return result
+
+    def _prepare_upsert_row(self, record: dict[str, Any], valid_keys: set[str]) -> dict[str, Any]:
+        """Validate the keys of one bulk_upsert record."""
+        if record.get("telegram_id") is None:
+            raise ValueError("telegram_id is required")
+
+        unknown = set(record) - valid_keys
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+        row = dict(record)
+        row["telegram_id"] = int(row["telegram_id"])
+        return row
+
+    def _format_upsert_chunk(
+        self, chunk: list[tuple[int, dict[str, Any]]], fields: list[Any], result: BulkUpsertResult
+    ) -> list[tuple[int, dict[str, Any]]]:
+        """Apply db formatters to a chunk, one vectorized pass per field; rows that fail are reported."""
+        failed: dict[int, str] = {}
+        for survey_field in fields:
+            positions = [
+                position for position, (_, row) in enumerate(chunk) if row.get(survey_field.field_name) is not None
+            ]
+            if not positions:
+                continue
+            values = pd.Series([chunk[p][1][survey_field.field_name] for p in positions], index=positions, dtype=object)
+            batch = normalize_series(survey_field, values, validate=False)
+            for position, value, error in zip(positions, batch.values, batch.errors, strict=True):
+                if error is not None:
+                    failed.setdefault(position, error)
+                else:
+                    chunk[position][1][survey_field.field_name] = value
+
+        for position, error in failed.items():
+            index, row = chunk[position]
+            result.errors.append(BulkUpsertError(index, row.get("telegram_id"), error))
+        return [item for position, item in enumerate(chunk) if position not in failed]
+
+    def _write_upsert_chunk(
+        self, chunk: list[tuple[int, dict[str, Any]]], default_state: str, result: BulkUpsertResult
+    ) -> None:
+        """Write one chunk; if the chunk fails, retry row by row to attribute the errors."""
+        try:
+            with db.get_session() as session:
+                self._execute_upsert(session, [row for _, row in chunk], default_state)
+            result.upserted += len(chunk)
+            return
+        except SQLAlchemyError as e:
+            logger.warning(f"Bulk upsert chunk of {len(chunk)} rows failed, retrying row by row: {e}")
+
+        for index, row in chunk:
+            try:
+                with db.get_session() as session:
+                    self._execute_upsert(session, [row], default_state)
+                result.upserted += 1
+            except SQLAlchemyError as e:
+                result.errors.append(BulkUpsertError(index, row.get("telegram_id"), str(getattr(e, "orig", None) or e)))
+
+    def _execute_upsert(self, session: Any, rows: list[dict[str, Any]], default_state: str) -> None:
+        """Run INSERT ... ON CONFLICT DO UPDATE as executemany, one statement per column set."""
+        now = datetime.now(UTC)
+        groups: dict[tuple[str, ...], list[dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        for keys, group in groups.items():
+            stmt = sqlite_insert(self.User.__table__)
+            update_columns = {key: stmt.excluded[key] for key in keys if key != "telegram_id"}
+            update_columns["updated_at"] = stmt.excluded.updated_at
+            stmt = stmt.on_conflict_do_update(index_elements=["telegram_id"], set_=update_columns)
+
+            params = [
+                {"state": default_state, "created_at": now, **row, "updated_at": row.get("updated_at", now)}
+                for row in group
+            ]
+            session.execute(stmt, params)
+        # The state may have changed behind the bot's cache (context.user_data)
+        drop_cached_user_data(session, [row["telegram_id"] for row in rows])
+
+    def get_users_with_option(self, field_name: str, option: str) -> list[int]:
+        """
+        Get users who picked an option of a multi-select field.
+
+        Args:
+            field_name: Multi-select survey field
+            option: Option text
+
+        Returns:
+            Telegram IDs of matching users
+
+        Raises:
+            ValueError: If the field is not a multi-select field or the option is unknown
+        """
+        from .settings import SURVEY_CONFIG
+
+        options = multi_select_fields(SURVEY_CONFIG.fields).get(field_name)
+        if options is None:
+            raise ValueError(f"Field {field_name} is not a multi-select field")
+        if option not in options:
+            raise ValueError(f"Unknown option {option!r} for field {field_name}")
+
+        column = getattr(self.User, field_name)
+        with db.get_session(readonly=True) as session:
+            rows = session.query(self.User.telegram_id).filter(has_option(column, options, option)).all()
+            return [row[0] for row in rows]
+
+    def get_users_to_ask(self, field_name: str, unanswered_only: bool = True) -> list[int]:
+        """
+        Get users who would be asked a survey field: its skip condition does not hold for them.
+
+        Skip conditions built from src.survey.skip_conditions run as one SQL query over the
+        indexed columns; any other skip_if callable is evaluated in Python over all users.
+
+        Args:
+            field_name: Survey field
+            unanswered_only: Only users without an answer (NULL or previously skipped),
+                e.g. for re-prompt campaigns
+
+        Returns:
+            Telegram IDs of matching users
+
+        Raises:
+            ValueError: If the field is not a survey field
+        """
+        from .settings import SURVEY_CONFIG
+
+        field_config = SURVEY_CONFIG.get_field_by_name(field_name)
+        if field_config is None:
+            raise ValueError(f"Unknown survey field: {field_name}")
+
+        column = getattr(self.User, field_name)
+        skip_if = field_config.skip_if
+        query = select(self.User.telegram_id)
+        if unanswered_only:
+            query = query.where(or_(column.is_(None), column == SKIPPED))
+
+        if skip_if is not None and not is_sql_compatible(skip_if):
+            logger.warning(f"Skip condition of {field_name} cannot be translated to SQL, scanning all users")
+            with db.get_session(readonly=True) as session:
+                rows = self.serializer.serialize_rows(session.execute(self.serializer.select()))
+            return [
+                row["telegram_id"]
+                for row in rows
+                if not (unanswered_only and row[field_name] not in (None, SKIPPED)) and not skip_if(row)
+            ]
+
+        if skip_if is not None:
+            query = query.where(not_(skip_if.to_sql(self.User)))
+        with db.get_session(readonly=True) as session:
+            return list(session.scalars(query))
 
     def get_amount_of_users(self) -> int:
-        with db.get_session() as session:
+        with db.get_session(readonly=True) as session:
             users = (
                 session.query(self.User.telegram_id)
                 .filter_by(trip_attendance=TRIP_POLL_YES)
@@ -198,22 +459,22 @@ class UserStorage:
             return len(users)
 
     def get_will_drive(self) -> list[int]:
-        with db.get_session() as session:
+        with db.get_session(readonly=True) as session:
             users = session.query(self.User.telegram_id).filter_by(will_drive="Обязательно! 🤩").all()
             return [user[0] for user in users]
 
     def get_previous_year(self) -> list[int]:
-        with db.get_session() as session:
-            users = session.query(self.User.telegram_id).filter_by(will_drive="Жду ответа по этому году ❗").all()
+        with db.get_session(readonly=True) as session:
+            users = session.query(self.User.telegram_id).filter_by(will_drive=OPTION_WILL_DRIVE_PENDING).all()
             return [user[0] for user in users]
 
     def get_did_not_finished(self) -> list[int]:
-        with db.get_session() as session:
+        with db.get_session(readonly=True) as session:
             users = session.query(self.User.telegram_id).filter_by(will_drive=None).all()
             return [user[0] for user in users]
 
     def get_dont_know(self) -> list[int]:
-        with db.get_session() as session:
+        with db.get_session(readonly=True) as session:
             users = session.query(self.User.telegram_id).filter_by(will_drive="Пока думаю 🤔")
             return [user[0] for user in users]
 
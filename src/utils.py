@@ -6,13 +6,44 @@ from pathlib import Path
 
 import pandas as pd
 
+from .database import read_snapshot
+from .survey.multi_select import format_mask, multi_select_fields
+
 logger = logging.getLogger(__name__)
 
 
+def render_multi_select_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Заменяет битовые маски полей с множественным выбором текстом выбранных вариантов.
+
+    Args:
+        df: Выгрузка таблицы users
+
+    Returns:
+        pd.DataFrame: Та же таблица с человекочитаемыми значениями
+    """
+    from .settings import SURVEY_CONFIG
+
+    for field_name, options in multi_select_fields(SURVEY_CONFIG.fields).items():
+        if field_name in df.columns:
+            # Масок немного (2^len(options)), поэтому форматируем каждую уникальную один раз
+            # (колонка с NULL читается pandas как float)
+            rendered = {
+                mask: format_mask(options, int(mask) if isinstance(mask, float) else mask)
+                for mask in df[field_name].dropna().unique()
+            }
+            df[field_name] = df[field_name].map(rendered)
+    return df
+
+
 def get_actual_table(db_path: str = "data/database.sqlite") -> str:
     """
     Экспортирует данные из базы данных в Excel файл.
 
+    Данные читаются из согласованного снимка (read-only соединение в одной
+    WAL-транзакции), поэтому выгрузка не блокирует запись регистраций.
+    Функция блокирующая - из обработчиков её нужно вызывать через asyncio.to_thread.
+
     Args:
         db_path: Путь к файлу базы данных SQLite
 
@@ -31,18 +62,12 @@ def get_actual_table(db_path: str = "data/database.sqlite") -> str:
             logger.error(error_msg)
             raise FileNotFoundError(error_msg)
 
-        # Подключаемся к БД
-        conn = sqlite3.connect(db_path)
-        logger.info(f"Подключение к БД: {db_path}")
-
-        try:
-            # Читаем данные
-            query = "SELECT * FROM users"
-            df = pd.read_sql(query, conn)
+        # Читаем данные из снимка БД
+        with read_snapshot(db_path) as conn:
+            logger.info(f"Открыт снимок БД: {db_path}")
+            df = pd.read_sql("SELECT * FROM users", conn)
             logger.info(f"Прочитано {len(df)} записей из БД")
-
-        finally:
-            conn.close()
+        df = render_multi_select_columns(df)
 
         # Создаём директорию для экспорта
         excel_dir = Path("excel")
@@ -70,3 +95,33 @@ def get_actual_table(db_path: str = "data/database.sqlite") -> str:
         error_msg = f"Ошибка при экспорте данных: {e}"
         logger.error(error_msg)
         raise Exception(error_msg) from e
+
+
+def get_archive_table(season: str | None = None, archive_path: str = "data/archive.sqlite") -> str:
+    """
+    Экспортирует пользователей из архива прошлых сезонов в Excel файл.
+
+    Args:
+        season: Сезон для выгрузки (None - все сезоны)
+        archive_path: Путь к файлу архива
+
+    Returns:
+        str: Путь к созданному Excel файлу
+
+    Raises:
+        FileNotFoundError: Если файл архива не найден
+    """
+    from .season_archive import SeasonArchiver
+
+    df = render_multi_select_columns(SeasonArchiver(archive_path=archive_path).read_users(season))
+    logger.info(f"Прочитано {len(df)} архивных записей (сезон: {season or 'все'})")
+
+    excel_dir = Path("excel")
+    excel_dir.mkdir(exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_path = excel_dir / f"archive_{season or 'all'}_{timestamp}.xlsx"
+
+    df.to_excel(file_path, index=False)
+    logger.info(f"✅ Архив экспортирован в {file_path}")
+    return str(file_path)
@@ -0,0 +1,185 @@
+"""
+Тесты пулов соединений и снимков чтения Database.
+"""
+
+import sqlite3
+import threading
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from src.database import POOL_MODE_QUEUE, POOL_MODE_STATIC, Database, WriterBusyError
+from src.models import get_user_model
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    database = Database(str(tmp_path / "db.sqlite"))
+    database.create_tables()
+    yield database
+    database.dispose()
+
+
+def _insert_user(database, telegram_id):
+    user_model = get_user_model()
+    now = datetime.now(UTC)
+    with database.get_session() as session:
+        session.add(user_model(telegram_id=telegram_id, state="name", created_at=now, updated_at=now))
+
+
+def test_memory_database_uses_static_pool():
+    database = Database(":memory:", pool_mode=POOL_MODE_QUEUE)
+    assert database.pool_mode == POOL_MODE_STATIC
+    assert isinstance(database.engine.pool, StaticPool)
+    assert database.read_engine is database.engine
+
+
+def test_file_database_uses_wal_and_single_writer(file_db):
+    assert file_db.pool_mode == POOL_MODE_QUEUE
+    assert isinstance(file_db.engine.pool, QueuePool)
+    assert file_db.engine.pool.size() == 1
+    assert file_db.read_engine is not file_db.engine
+
+    with file_db.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+
+
+def test_static_mode_for_file_database(tmp_path):
+    database = Database(str(tmp_path / "db.sqlite"), pool_mode=POOL_MODE_STATIC)
+    assert isinstance(database.engine.pool, StaticPool)
+    assert database.read_engine is database.engine
+
+
+def test_unknown_pool_mode(tmp_path):
+    with pytest.raises(ValueError):
+        Database(str(tmp_path / "db.sqlite"), pool_mode="nullpool")
+
+
+def test_readonly_session_rejects_writes(file_db):
+    with pytest.raises(OperationalError):
+        with file_db.get_session(readonly=True) as session:
+            session.execute(text("DELETE FROM users"))
+
+
+def test_readers_see_committed_writes(file_db):
+    _insert_user(file_db, 1)
+
+    user_model = get_user_model()
+    with file_db.get_session(readonly=True) as session:
+        assert session.execute(select(user_model.telegram_id)).scalars().all() == [1]
+
+
+def test_reader_is_not_blocked_by_open_write_transaction(file_db):
+    _insert_user(file_db, 1)
+    user_model = get_user_model()
+
+    with file_db.get_session() as writer:
+        writer.execute(text("UPDATE users SET name = 'pending' WHERE telegram_id = 1"))
+        # Writer transaction is open: WAL reader still sees the last committed snapshot
+        with file_db.get_session(readonly=True) as reader:
+            assert reader.execute(select(user_model.name)).scalar_one() is None
+
+    with file_db.get_session(readonly=True) as reader:
+        assert reader.execute(select(user_model.name)).scalar_one() == "pending"
+
+
+def test_concurrent_readers_in_threads(file_db):
+    for telegram_id in range(20):
+        _insert_user(file_db, telegram_id)
+
+    user_model = get_user_model()
+    errors = []
+
+    def read():
+        try:
+            for _ in range(20):
+                with file_db.get_session(readonly=True) as session:
+                    assert len(session.execute(select(user_model.id)).all()) == 20
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+def test_read_snapshot_is_consistent_and_does_not_block_writer(file_db):
+    from src.database import read_snapshot
+
+    _insert_user(file_db, 1)
+
+    with read_snapshot(file_db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+        # Writer commits while the snapshot is open
+        _insert_user(file_db, 2)
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM users")
+
+    with read_snapshot(file_db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 2
+
+
+def test_memory_database_snapshot():
+    database = Database(":memory:")
+    database.create_tables()
+    _insert_user(database, 1)
+
+    with database.read_snapshot() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+
+
+def test_get_actual_table_exports_snapshot(file_db, tmp_path, monkeypatch):
+    import pandas as pd
+
+    from src.utils import get_actual_table
+
+    _insert_user(file_db, 1)
+    _insert_user(file_db, 2)
+    monkeypatch.chdir(tmp_path)
+
+    file_path = get_actual_table(file_db.db_path)
+
+    assert sorted(pd.read_excel(tmp_path / file_path)["telegram_id"]) == [1, 2]
+
+
+def test_nested_write_session_fails_at_once(file_db):
+    with file_db.get_session() as session:
+        session.execute(text("SELECT 1"))
+        with pytest.raises(WriterBusyError, match="Nested write"):
+            with file_db.get_session() as nested:
+                nested.execute(text("SELECT 1"))
+
+
+@pytest.mark.parametrize("timeout", [0.1, 0])
+def test_busy_writer_times_out_with_clear_error(tmp_path, monkeypatch, timeout):
+    # An explicit timeout wins over the environment, zero included
+    monkeypatch.setenv("DB_WRITER_TIMEOUT", "30")
+    database = Database(str(tmp_path / "db.sqlite"), writer_timeout=timeout)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold_writer():
+        with database.engine.connect():
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold_writer)
+    thread.start()
+    try:
+        holding.wait(5)
+        with pytest.raises(WriterBusyError, match=f"busy for more than {timeout:g} s"):
+            with database.engine.connect():
+                pass
+    finally:
+        release.set()
+        thread.join()
+        database.dispose()
@@ -0,0 +1,169 @@
+"""
+Integration tests for deduplicated message bodies (message_contents).
+"""
+
+import sqlite3
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from src import message_search as search_module
+from src.database import Database, OutdatedSchemaError
+from src.message_contents import sweep_orphan_contents
+from src.message_history import MessageHistory
+from src.message_retention import MessagePartitions, MessageRetention
+from src.message_search import MessageSearch
+from src.models import Message, MessageContent, content_rows
+
+NOW = datetime(2025, 6, 15, 12, 0, tzinfo=UTC)
+BROADCAST = "Выезд в субботу в 9:00, не забудьте паспорт"
+
+
+@pytest.fixture(scope="function")
+def database(tmp_path):
+    """Create a temporary database with all tables."""
+    database = Database(str(tmp_path / "database.sqlite"))
+    database.create_tables()
+    yield database
+    database.dispose()
+
+
+@pytest.fixture
+def partitions(database, tmp_path):
+    return MessagePartitions(database, directory=str(tmp_path / "messages"))
+
+
+def add_messages(database: Database, records: list[dict]) -> None:
+    with database.get_session() as session:
+        session.execute(
+            insert(Message),
+            content_rows(
+                session,
+                [
+                    {
+                        "chat_id": record["telegram_id"],
+                        "message_id": i,
+                        "direction": "outgoing",
+                        "message_type": "text",
+                        "created_at": NOW,
+                        **record,
+                    }
+                    for i, record in enumerate(records)
+                ],
+            ),
+        )
+
+
+def content_count(database: Database) -> int:
+    with database.get_session(readonly=True) as session:
+        return session.scalar(select(func.count()).select_from(MessageContent))
+
+
+class TestMessageContents:
+    """Tests for content-addressed message bodies."""
+
+    def test_broadcast_stores_body_once(self, database):
+        add_messages(database, [{"telegram_id": user, "text": BROADCAST} for user in range(50)])
+        add_messages(database, [{"telegram_id": user, "text": BROADCAST} for user in range(50, 60)])
+
+        assert content_count(database) == 1
+        history = MessageHistory(database, MessagePartitions(database, directory="/nonexistent"))
+        assert {record.text for record in history.page(limit=100).records} == {BROADCAST}
+
+    def test_orm_messages_read_through(self, database):
+        with database.get_session() as session:
+            session.add(Message(telegram_id=1, chat_id=1, direction="incoming", message_type="text", text="привет"))
+            session.add(
+                Message(
+                    telegram_id=2,
+                    chat_id=2,
+                    direction="incoming",
+                    message_type="photo",
+                    caption="привет",
+                    file_id="AgACAgIAAxk",
+                )
+            )
+
+        with database.get_session(readonly=True) as session:
+            text_message, photo = session.query(Message).order_by(Message.id).all()
+            assert text_message.text == "привет"
+            assert text_message.text_ref == photo.caption_ref
+            assert photo.to_dict()["caption"] == "привет"
+            assert photo.to_dict()["file_id"] == "AgACAgIAAxk"
+            assert "caption_ref" in photo.to_dict()
+        assert content_count(database) == 2
+
+    def test_sweep_removes_only_orphans(self, database):
+        add_messages(database, [{"telegram_id": 1, "text": "останется"}, {"telegram_id": 2, "text": "удалится"}])
+        with database.get_session() as session:
+            session.query(Message).filter(Message.telegram_id == 2).delete()
+
+        with database.engine.connect() as conn:
+            assert sweep_orphan_contents(conn) == 1
+
+        with database.get_session(readonly=True) as session:
+            assert session.scalars(select(MessageContent.body)).all() == ["останется"]
+        search = MessageSearch(database, MessagePartitions(database, directory="/nonexistent"))
+        assert search.search("удалится").hits == []
+        assert [hit.telegram_id for hit in search.search("останется").hits] == [1]
+
+    def test_partition_remaps_references(self, database, partitions):
+        # The body is swept after the first move and stored again under a new id
+        add_messages(
+            database,
+            [
+                {"telegram_id": 1, "text": BROADCAST, "created_at": datetime(2025, 1, 10, tzinfo=UTC)},
+                {"telegram_id": 4, "text": "свежее", "created_at": NOW},
+            ],
+        )
+        MessageRetention(partitions, hot_days=30, retention_days=0).run(now=NOW)
+        add_messages(
+            database,
+            [
+                {"telegram_id": 2, "text": "другой текст", "created_at": datetime(2025, 1, 11, tzinfo=UTC)},
+                {"telegram_id": 3, "text": BROADCAST, "created_at": datetime(2025, 1, 12, tzinfo=UTC)},
+            ],
+        )
+
+        stats = MessageRetention(partitions, hot_days=30, retention_days=0).run(now=NOW)
+
+        assert stats.swept_contents == 2
+        assert content_count(database) == 1
+        conn = sqlite3.connect(partitions.path("2025-01"))
+        try:
+            rows = conn.execute("SELECT telegram_id, text FROM message_log ORDER BY telegram_id").fetchall()
+            bodies = conn.execute("SELECT COUNT(*) FROM message_contents").fetchone()[0]
+        finally:
+            conn.close()
+        assert rows == [(1, BROADCAST), (2, "другой текст"), (3, BROADCAST)]
+        assert bodies == 2
+
+    @pytest.mark.parametrize("lookup_limit", [search_module.LOOKUP_LIMIT, 1])
+    def test_search_finds_shared_body(self, database, monkeypatch, lookup_limit):
+        # Both strategies: lookup by reference and walking the messages newest first
+        monkeypatch.setattr(search_module, "LOOKUP_LIMIT", lookup_limit)
+        add_messages(database, [{"telegram_id": user, "text": BROADCAST} for user in range(5)])
+        add_messages(database, [{"telegram_id": 9, "text": None, "message_type": "photo", "caption": "паспорт"}])
+        search = MessageSearch(database, MessagePartitions(database, directory="/nonexistent"))
+
+        first = search.search("паспорт", limit=4)
+        second = search.search("паспорт", before=first.next_before, limit=4)
+
+        assert [hit.telegram_id for hit in first.hits + second.hits] == [9, 4, 3, 2, 1, 0]
+        assert second.next_before is None
+        assert first.hits[0].snippet == "«паспорт»"
+
+    def test_inline_bodies_refused_at_startup(self, tmp_path):
+        path = str(tmp_path / "old.sqlite")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE messages (id INTEGER PRIMARY KEY, telegram_id BIGINT NOT NULL, chat_id BIGINT NOT NULL, "
+            "direction VARCHAR(10) NOT NULL, text TEXT, caption TEXT, file_id VARCHAR(255), created_at DATETIME)"
+        )
+        conn.close()
+        database = Database(path)
+
+        with pytest.raises(OutdatedSchemaError, match="migrate_message_contents.py"):
+            database.create_tables()
+        database.dispose()
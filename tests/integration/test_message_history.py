@@ -0,0 +1,185 @@
+"""
+Integration tests for keyset-paginated message history and transcript export.
+"""
+
+import io
+import json
+import os
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from src.database import Database
+from src.message_history import MessageHistory, MessageRecord
+from src.message_retention import MessagePartitions, MessageRetention
+from src.models import Message, content_rows
+from src.transcript_export import TranscriptFormat, write_transcript
+
+NOW = datetime(2025, 6, 15, 12, 0, tzinfo=UTC)
+
+
+@pytest.fixture(scope="function")
+def database(tmp_path):
+    """Create a temporary database with all tables."""
+    database = Database(str(tmp_path / "database.sqlite"))
+    database.create_tables()
+    yield database
+    database.dispose()
+
+
+@pytest.fixture
+def partitions(database, tmp_path):
+    return MessagePartitions(database, directory=str(tmp_path / "messages"))
+
+
+@pytest.fixture
+def history(database, partitions):
+    return MessageHistory(database, partitions)
+
+
+def add_messages(database: Database, dates: list[datetime], telegram_id: int = 1, **columns) -> None:
+    with database.get_session() as session:
+        session.execute(
+            insert(Message),
+            content_rows(
+                session,
+                [
+                    {
+                        "telegram_id": telegram_id,
+                        "chat_id": telegram_id,
+                        "message_id": i,
+                        "direction": "incoming",
+                        "message_type": "text",
+                        "text": f"message {created_at:%Y-%m-%d} #{i}",
+                        "created_at": created_at,
+                        **columns,
+                    }
+                    for i, created_at in enumerate(dates)
+                ],
+            ),
+        )
+
+
+class TestMessageHistory:
+    """Tests for MessageHistory."""
+
+    def test_pages_follow_cursor(self, database, history):
+        # Equal timestamps are ordered by id, so no row is lost or repeated between pages
+        add_messages(database, [datetime(2025, 6, 1, tzinfo=UTC)] * 3 + [datetime(2025, 6, 2, tzinfo=UTC)] * 3)
+
+        pages = []
+        cursor = None
+        while True:
+            page = history.page(telegram_id=1, cursor=cursor, limit=4)
+            pages.append(page.records)
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+
+        records = [record for page in pages for record in page]
+        assert [len(page) for page in pages] == [4, 2]
+        assert [record.cursor for record in records] == sorted((r.cursor for r in records), reverse=True)
+        assert len({record.id for record in records}) == 6
+        assert all(isinstance(record, MessageRecord) for record in records)
+
+    def test_page_of_exact_size_is_last(self, database, history):
+        add_messages(database, [datetime(2025, 6, day, tzinfo=UTC) for day in range(1, 5)])
+
+        page = history.page(limit=4)
+
+        assert len(page.records) == 4
+        assert page.next_cursor is None
+
+    def test_filters(self, database, history):
+        add_messages(database, [datetime(2025, 6, 1, tzinfo=UTC)], telegram_id=1)
+        add_messages(database, [datetime(2025, 6, 2, tzinfo=UTC)], telegram_id=1, direction="outgoing")
+        add_messages(database, [datetime(2025, 6, 3, tzinfo=UTC)], telegram_id=2)
+
+        assert [r.created_at.day for r in history.page(telegram_id=1).records] == [2, 1]
+        assert [r.created_at.day for r in history.page(direction="outgoing").records] == [2]
+        assert [r.created_at.day for r in history.page(since=datetime(2025, 6, 2, tzinfo=UTC)).records] == [3, 2]
+
+    def test_pages_span_partitions(self, database, partitions, history):
+        add_messages(database, [datetime(2025, 1, 10, tzinfo=UTC), datetime(2025, 6, 1, tzinfo=UTC)])
+        add_messages(database, [datetime(2025, 2, 10, tzinfo=UTC)], telegram_id=2)
+        MessageRetention(partitions, hot_days=30, retention_days=0).run(now=NOW)
+
+        first = history.page(telegram_id=1, limit=1)
+        second = history.page(telegram_id=1, cursor=first.next_cursor, limit=1)
+
+        assert [record.created_at.month for record in first.records + second.records] == [6, 1]
+        assert second.records[0].text == "message 2025-01-10 #0"
+        assert second.next_cursor is None
+
+    def test_cursor_skips_partitions(self, database, partitions, history):
+        add_messages(database, [datetime(2025, 1, 10, tzinfo=UTC), datetime(2025, 2, 10, tzinfo=UTC)])
+        MessageRetention(partitions, hot_days=30, retention_days=0).run(now=NOW)
+
+        first = history.page(limit=1)
+        os.remove(partitions.path("2025-02"))  # Already read: must not be opened again
+
+        second = history.page(cursor=first.next_cursor, limit=1)
+
+        assert [record.created_at.month for record in first.records + second.records] == [2, 1]
+
+    def test_iter_records_oldest_first(self, database, partitions, history):
+        dates = [datetime(2025, 1, 1, tzinfo=UTC) + timedelta(days=7 * i) for i in range(25)]
+        add_messages(database, dates)
+        MessageRetention(partitions, hot_days=30, retention_days=0).run(now=NOW)
+
+        records = list(history.iter_records(batch_size=4))
+
+        assert [record.created_at for record in records] == [date.replace(tzinfo=None) for date in dates]
+
+
+class TestTranscriptExport:
+    """Tests for transcript export."""
+
+    @pytest.fixture
+    def conversation(self, database):
+        add_messages(database, [datetime(2025, 6, 1, 10, 0, tzinfo=UTC)], text="Привет <бот>")
+        add_messages(
+            database,
+            [datetime(2025, 6, 1, 10, 1, tzinfo=UTC)],
+            direction="outgoing",
+            text="Здравствуйте!",
+        )
+        add_messages(
+            database,
+            [datetime(2025, 6, 1, 10, 2, tzinfo=UTC)],
+            text=None,
+            message_type="photo",
+            caption="паспорт",
+        )
+        add_messages(database, [datetime(2025, 6, 1, 10, 3, tzinfo=UTC)], telegram_id=2, text="другой пользователь")
+
+    def test_text(self, history, conversation):
+        out = io.StringIO()
+
+        count = write_transcript(out, TranscriptFormat.TEXT, telegram_id=1, history=history)
+
+        assert count == 3
+        assert out.getvalue().splitlines()[2:] == [
+            "[2025-06-01 10:00:00] <- Привет <бот>",
+            "[2025-06-01 10:01:00] -> Здравствуйте!",
+            "[2025-06-01 10:02:00] <- [photo] паспорт",
+        ]
+
+    def test_html_is_escaped(self, history, conversation):
+        out = io.StringIO()
+
+        write_transcript(out, TranscriptFormat.HTML, telegram_id=1, history=history)
+
+        assert "Привет &lt;бот&gt;" in out.getvalue()
+        assert out.getvalue().rstrip().endswith("</body></html>")
+
+    def test_jsonl_all_users(self, history, conversation):
+        out = io.StringIO()
+
+        count = write_transcript(out, TranscriptFormat.JSONL, history=history)
+
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert count == len(lines) == 4
+        assert [line["telegram_id"] for line in lines] == [1, 1, 1, 2]
+        assert lines[0]["created_at"] == "2025-06-01T10:00:00"
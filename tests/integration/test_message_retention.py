@@ -0,0 +1,130 @@
+"""
+Integration tests for message log retention (monthly partitions and chunked pruning).
+"""
+
+import sqlite3
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import insert
+
+from src.database import Database
+from src.message_retention import MessagePartitions, MessageRetention
+from src.models import Message, content_rows
+
+NOW = datetime(2025, 6, 15, 12, 0, tzinfo=UTC)
+
+
+@pytest.fixture(scope="function")
+def database(tmp_path):
+    """Create a temporary database with all tables."""
+    database = Database(str(tmp_path / "database.sqlite"))
+    database.create_tables()
+    yield database
+    database.dispose()
+
+
+@pytest.fixture
+def partitions(database, tmp_path):
+    return MessagePartitions(database, directory=str(tmp_path / "messages"))
+
+
+def add_messages(database: Database, dates: list[datetime], telegram_id: int = 1) -> None:
+    with database.get_session() as session:
+        session.execute(
+            insert(Message),
+            content_rows(
+                session,
+                [
+                    {
+                        "telegram_id": telegram_id,
+                        "chat_id": telegram_id,
+                        "message_id": i,
+                        "direction": "incoming",
+                        "message_type": "text",
+                        "text": f"message {created_at:%Y-%m-%d} #{i}",
+                        "created_at": created_at,
+                    }
+                    for i, created_at in enumerate(dates)
+                ],
+            ),
+        )
+
+
+def hot_count(database: Database) -> int:
+    with database.get_session(readonly=True) as session:
+        return session.query(Message).count()
+
+
+def partition_count(path: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class TestMessageRetention:
+    """Tests for MessageRetention and MessagePartitions."""
+
+    def test_old_messages_move_to_month_partitions(self, database, partitions):
+        add_messages(
+            database,
+            [datetime(2025, 1, 10, tzinfo=UTC)] * 3
+            + [datetime(2025, 2, 20, tzinfo=UTC)] * 2
+            + [datetime(2025, 6, 1, tzinfo=UTC)] * 4,
+        )
+        retention = MessageRetention(partitions, hot_days=30, retention_days=0, batch_size=2)
+
+        stats = retention.run(now=NOW)
+
+        assert stats.moved == 5
+        assert hot_count(database) == 4
+        assert [partition.month for partition in partitions.list_partitions()] == ["2025-01", "2025-02"]
+        assert partition_count(partitions.path("2025-01")) == 3
+        assert partition_count(partitions.path("2025-02")) == 2
+
+    def test_run_is_idempotent(self, database, partitions):
+        add_messages(database, [datetime(2025, 1, 10, tzinfo=UTC)] * 3)
+        retention = MessageRetention(partitions, hot_days=30, retention_days=0)
+
+        retention.run(now=NOW)
+        stats = retention.run(now=NOW)
+
+        assert stats.moved == 0
+        assert partition_count(partitions.path("2025-01")) == 3
+
+    def test_expired_messages_are_deleted_in_batches(self, database, partitions):
+        add_messages(database, [datetime(2025, 1, 10, tzinfo=UTC)] * 7 + [datetime(2025, 6, 10, tzinfo=UTC)])
+        retention = MessageRetention(partitions, hot_days=0, retention_days=60, batch_size=3)
+
+        stats = retention.run(now=NOW)
+
+        assert stats.deleted == 7
+        assert hot_count(database) == 1
+        assert partitions.list_partitions() == []
+
+    def test_expired_partitions_are_dropped_whole(self, database, partitions):
+        add_messages(database, [datetime(2025, 1, 10, tzinfo=UTC), datetime(2025, 3, 31, tzinfo=UTC)])
+        MessageRetention(partitions, hot_days=30, retention_days=0).run(now=NOW)
+
+        # Cutoff 2025-03-17: January has fully expired, March has not
+        stats = MessageRetention(partitions, hot_days=30, retention_days=90).run(now=NOW)
+
+        assert stats.dropped_partitions == 1
+        assert [partition.month for partition in partitions.list_partitions()] == ["2025-03"]
+
+    def test_incremental_vacuum_shrinks_file(self, database, partitions):
+        add_messages(database, [datetime(2025, 1, 10, tzinfo=UTC)] * 2000)
+        with database.engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+            pages_before = conn.exec_driver_sql("PRAGMA page_count").scalar()
+
+        stats = MessageRetention(partitions, hot_days=30, retention_days=0, vacuum_pages=10).run(now=NOW)
+
+        with database.engine.connect() as conn:
+            pages_after = conn.exec_driver_sql("PRAGMA page_count").scalar()
+            free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        assert stats.vacuumed_pages > 0
+        assert free_pages == 0
+        assert pages_after < pages_before
@@ -0,0 +1,115 @@
+"""
+Integration tests for the message log schema (coded direction/message_type, indexes).
+"""
+
+import sqlite3
+
+import pytest
+from sqlalchemy import insert, text
+
+from migrate_message_contents import migrate_message_contents
+from migrate_message_schema import migrate_message_schema
+from src.database import Database, OutdatedSchemaError
+from src.models import MESSAGE_DIRECTIONS, MESSAGE_TYPES, Message
+
+# The messages table as it was before message_contents and the coded columns
+OLD_MESSAGES_SQL = (
+    "CREATE TABLE messages (id INTEGER PRIMARY KEY, telegram_id BIGINT NOT NULL, chat_id BIGINT NOT NULL, "
+    "message_id BIGINT, direction VARCHAR(10) NOT NULL, message_type VARCHAR(50), text TEXT, caption TEXT, "
+    "file_id VARCHAR(255), reply_to_message_id BIGINT, created_at DATETIME NOT NULL)"
+)
+
+
+def create_old_messages(path: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(OLD_MESSAGES_SQL)
+    conn.execute(
+        "INSERT INTO messages (telegram_id, chat_id, direction, message_type, text, created_at) "
+        "VALUES (1, 1, 'outgoing', 'text', 'привет', '2025-01-10 12:00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(scope="function")
+def database(tmp_path):
+    """Create a temporary database with all tables."""
+    database = Database(str(tmp_path / "database.sqlite"))
+    database.create_tables()
+    yield database
+    database.dispose()
+
+
+class TestMessageSchema:
+    """Tests for the write-optimized messages table."""
+
+    def test_direction_and_type_stored_as_codes(self, database):
+        with database.get_session() as session:
+            session.add(Message(telegram_id=1, chat_id=1, direction="outgoing", message_type="photo"))
+            session.execute(
+                insert(Message),
+                [{"telegram_id": 2, "chat_id": 2, "direction": "incoming", "message_type": None}],
+            )
+
+        with database.get_session(readonly=True) as session:
+            stored = session.execute(text("SELECT direction, message_type FROM messages ORDER BY telegram_id")).all()
+            decoded = session.execute(
+                text("SELECT direction, message_type FROM message_log ORDER BY telegram_id")
+            ).all()
+            message = session.query(Message).filter(Message.direction == "outgoing").one()
+            assert message.to_dict()["message_type"] == "photo"
+
+        assert stored == [(MESSAGE_DIRECTIONS.index("outgoing"), MESSAGE_TYPES.index("photo")), (0, None)]
+        assert decoded == [("outgoing", "photo"), ("incoming", None)]
+
+    def test_unknown_value_is_rejected(self, database):
+        with pytest.raises(Exception, match="Unknown value 'sideways'"):
+            with database.get_session() as session:
+                session.add(Message(telegram_id=1, chat_id=1, direction="sideways"))
+
+    def test_indexes_are_not_duplicated(self, database):
+        with database.engine.connect() as conn:
+            indexes = conn.exec_driver_sql("PRAGMA index_list(messages)").all()
+            columns = [
+                tuple(row[2] for row in conn.exec_driver_sql(f"PRAGMA index_info({index[1]})")) for index in indexes
+            ]
+
+        assert sorted(columns) == [("caption_ref",), ("created_at",), ("telegram_id", "created_at"), ("text_ref",)]
+
+
+class TestSchemaUpgrade:
+    """The bot refuses to start on an outdated message log until it is migrated."""
+
+    def test_old_database_is_refused_until_migrated(self, tmp_path):
+        path = str(tmp_path / "database.sqlite")
+        partitions_dir = str(tmp_path / "messages")
+        create_old_messages(path)
+
+        database = Database(path)
+        with pytest.raises(OutdatedSchemaError, match="migrate_message_contents.py"):
+            database.create_tables()
+        assert migrate_message_contents(path, partitions_dir)
+        with pytest.raises(OutdatedSchemaError, match="migrate_message_schema.py"):
+            database.create_tables()
+        assert migrate_message_schema(path, partitions_dir)
+
+        database.create_tables()
+        with database.get_session(readonly=True) as session:
+            rows = session.execute(text("SELECT direction, message_type, text FROM message_log")).all()
+        database.dispose()
+        assert rows == [("outgoing", "text", "привет")]
+
+    def test_old_partition_is_refused(self, tmp_path):
+        path = str(tmp_path / "database.sqlite")
+        (tmp_path / "messages").mkdir()
+        partition = str(tmp_path / "messages" / "messages-2025-01.sqlite")
+        create_old_messages(partition)
+        assert migrate_message_contents(partition, str(tmp_path / "none"))
+
+        database = Database(path)
+        with pytest.raises(OutdatedSchemaError, match=r"messages-2025-01\.sqlite \(migrate_message_schema\.py\)"):
+            database.create_tables()
+        assert migrate_message_schema(path, str(tmp_path / "messages"))
+
+        database.create_tables()
+        database.dispose()
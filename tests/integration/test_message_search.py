@@ -0,0 +1,144 @@
+"""
+Integration tests for full-text search over the message log.
+"""
+
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import delete, insert, update
+
+from src.database import Database
+from src.message_retention import MessagePartitions, MessageRetention
+from src.message_search import MessageSearch, ensure_fts_index, to_phrase
+from src.models import Message, content_rows, store_contents
+
+
+@pytest.fixture(scope="function")
+def database(tmp_path):
+    """Create a temporary database with all tables."""
+    database = Database(str(tmp_path / "database.sqlite"))
+    database.create_tables()
+    yield database
+    database.dispose()
+
+
+@pytest.fixture
+def partitions(database, tmp_path):
+    return MessagePartitions(database, directory=str(tmp_path / "messages"))
+
+
+@pytest.fixture
+def search(database, partitions):
+    return MessageSearch(database, partitions)
+
+
+def add_message(database: Database, text: str | None, telegram_id: int = 1, created_at=None, caption=None) -> None:
+    with database.get_session() as session:
+        session.execute(
+            insert(Message),
+            content_rows(
+                session,
+                [
+                    {
+                        "telegram_id": telegram_id,
+                        "chat_id": telegram_id,
+                        "direction": "incoming",
+                        "message_type": "text",
+                        "text": text,
+                        "caption": caption,
+                        "created_at": created_at or datetime(2025, 6, 1, tzinfo=UTC),
+                    }
+                ],
+            ),
+        )
+
+
+class TestMessageSearch:
+    """Tests for MessageSearch."""
+
+    def test_phrase_search_is_case_insensitive(self, database, search):
+        add_message(database, "Мой телефон +7 999 123-45-67")
+        add_message(database, "Телефон потерялся")
+        add_message(database, "Адрес отправил вчера")
+
+        page = search.search("мой ТЕЛЕФОН")
+
+        assert [hit.snippet for hit in page.hits] == ["«Мой телефон» +7 999 123-45-67"]
+        assert page.next_before is None
+
+    def test_search_finds_captions_and_numbers(self, database, search):
+        add_message(database, None, caption="скан паспорта")
+        add_message(database, "номер 999 123-45-67")
+
+        assert len(search.search("паспорта").hits) == 1
+        assert len(search.search("123 45").hits) == 1
+
+    def test_operators_are_searched_literally(self, database, search):
+        add_message(database, 'привет "OR" NOT мир')
+
+        assert to_phrase('a "b" c') == '"a ""b"" c"'
+        assert len(search.search("NOT мир").hits) == 1
+        assert len(search.search('"OR" NOT').hits) == 1
+        assert search.search("   ").hits == []
+
+    def test_user_and_date_filters(self, database, search):
+        add_message(database, "оплата прошла", telegram_id=1, created_at=datetime(2025, 5, 1, tzinfo=UTC))
+        add_message(database, "оплата прошла", telegram_id=1, created_at=datetime(2025, 6, 1, tzinfo=UTC))
+        add_message(database, "оплата прошла", telegram_id=2, created_at=datetime(2025, 6, 1, tzinfo=UTC))
+
+        assert len(search.search("оплата", telegram_id=1).hits) == 2
+        page = search.search("оплата", telegram_id=1, since=datetime(2025, 5, 15, tzinfo=UTC))
+        assert [hit.created_at.month for hit in page.hits] == [6]
+        page = search.search("оплата", until=datetime(2025, 5, 15, tzinfo=UTC))
+        assert [hit.created_at.month for hit in page.hits] == [5]
+
+    def test_keyset_pagination(self, database, search):
+        for i in range(5):
+            add_message(database, f"анкета номер {i}")
+
+        first = search.search("анкета", limit=2)
+        second = search.search("анкета", limit=2, before=first.next_before)
+        third = search.search("анкета", limit=2, before=second.next_before)
+
+        ids = [hit.id for page in (first, second, third) for hit in page.hits]
+        assert ids == sorted(ids, reverse=True)
+        assert len(set(ids)) == 5
+        assert third.next_before is None
+
+    def test_index_follows_updates_and_deletes(self, database, search):
+        add_message(database, "старый текст")
+        with database.get_session() as session:
+            (text_ref,) = store_contents(session, ["новый текст"]).values()
+            session.execute(update(Message).values(text_ref=text_ref))
+        assert search.search("старый").hits == []
+        assert len(search.search("новый").hits) == 1
+
+        with database.get_session() as session:
+            session.execute(delete(Message))
+        assert search.search("текст").hits == []
+
+    def test_existing_rows_are_indexed(self, database, search):
+        add_message(database, "сообщение до индекса")
+        with database.engine.connect() as conn:
+            conn.exec_driver_sql("DROP TABLE messages_fts")
+            conn.commit()
+
+            assert ensure_fts_index(conn) is True
+            assert ensure_fts_index(conn) is False
+
+        assert len(search.search("до индекса").hits) == 1
+
+    def test_search_spans_partitions(self, database, partitions, search):
+        add_message(database, "фото паспорта", created_at=datetime(2025, 1, 10, tzinfo=UTC))
+        add_message(database, "фото паспорта", created_at=datetime(2025, 2, 10, tzinfo=UTC))
+        add_message(database, "фото паспорта", created_at=datetime(2025, 6, 10, tzinfo=UTC))
+        MessageRetention(partitions, hot_days=30, retention_days=0).run(now=datetime(2025, 6, 15, tzinfo=UTC))
+
+        first = search.search("паспорта", limit=2)
+        second = search.search("паспорта", limit=2, before=first.next_before)
+
+        assert [hit.created_at.month for hit in first.hits] == [6, 2]
+        assert [hit.created_at.month for hit in second.hits] == [1]
+        assert second.next_before is None
+        page = search.search("паспорта", until=datetime(2025, 2, 1, tzinfo=UTC))
+        assert [hit.created_at.month for hit in page.hits] == [1]
@@ -145,3 +145,136 @@ class TestORMImplementation:
         """Test updating non-existent user raises ValueError."""
         with pytest.raises(ValueError, match="not found"):
             test_storage.update_user(999999999, "name", "Test")
+
+    def test_update_user_fields(self, test_storage):
+        """Test updating several fields with one statement."""
+        user_id = 123456789
+        test_storage.create_user(user_id)
+        before = test_storage.get_user(user_id)["updated_at"]
+
+        test_storage.update_user_fields(user_id, {"name": "Иван", "username": "ivan", "state": "group"})
+
+        user = test_storage.get_user(user_id)
+        assert (user["name"], user["username"], user["state"]) == ("Иван", "ivan", "group")
+        assert user["updated_at"] >= before
+
+    def test_update_user_fields_errors(self, test_storage):
+        """Test update_user_fields rejects unknown users and fields."""
+        with pytest.raises(ValueError, match="not found"):
+            test_storage.update_user_fields(999999999, {"name": "Test"})
+
+        test_storage.create_user(123456789)
+        with pytest.raises(ValueError, match="Unknown user fields"):
+            test_storage.update_user_fields(123456789, {"no_such_field": "x"})
+
+    def test_get_user_matches_to_dict(self, test_storage):
+        """Test that the row serializer produces the same dictionary as to_dict."""
+        from src import user_storage as user_storage_module
+
+        test_user_id = 123456789
+        test_storage.create_user(test_user_id, initial_state="name")
+        test_storage.update_user(test_user_id, "name", "Иван Иванов")
+
+        with user_storage_module.db.get_session() as session:
+            expected = session.query(test_storage.User).filter_by(telegram_id=test_user_id).one().to_dict()
+
+        user = test_storage.get_user(test_user_id)
+        assert user == expected
+        assert isinstance(user["created_at"], str)
+
+    def test_get_users_by_state_serializes_rows(self, test_storage):
+        """Test that users fetched by state are plain dictionaries with ISO timestamps."""
+        test_storage.create_user(111111111, initial_state="registered")
+
+        users = test_storage.get_users_by_state("registered")
+
+        assert len(users) == 1
+        assert set(users[0]) == {column.name for column in test_storage.User.__table__.columns}
+        assert isinstance(users[0]["updated_at"], str)
+
+    def test_bulk_upsert_inserts_and_formats(self, test_storage):
+        """Test that bulk_upsert inserts new users and applies db formatters."""
+        result = test_storage.bulk_upsert(
+            [
+                {"telegram_id": 111111111, "name": "  Иван  ", "phone": "8 (999) 123-45-67", "group": "рк6-51б"},
+                {"telegram_id": 222222222, "birth_date": "1.2.2003"},
+            ],
+            chunk_size=1,
+        )
+
+        assert result.upserted == 2
+        assert result.errors == []
+        first = test_storage.get_user(111111111)
+        assert first["state"] == "registered"
+        assert first["name"] == "Иван"
+        assert first["phone"] == "79991234567"
+        assert first["group"] == "РК6-51Б"
+        assert test_storage.get_user(222222222)["birth_date"] == "01.02.2003"
+
+    def test_bulk_upsert_updates_only_given_columns(self, test_storage):
+        """Test that on conflict only the columns present in the record are overwritten."""
+        test_storage.create_user(111111111, initial_state="phone")
+        test_storage.update_user(111111111, "name", "Иван")
+
+        result = test_storage.bulk_upsert([{"telegram_id": 111111111, "phone": "+79991234567"}])
+
+        assert result.upserted == 1
+        user = test_storage.get_user(111111111)
+        assert user["state"] == "phone"
+        assert user["name"] == "Иван"
+        assert user["phone"] == "79991234567"
+
+    def test_bulk_upsert_invalidates_cached_state(self, test_storage):
+        """Test that bulk_upsert drops the cached registration state of the written users."""
+        from src import user_storage
+        from src.persistence import SQLitePersistence
+
+        persistence = SQLitePersistence(user_storage.db)
+        persistence.write_batch({("user_data", str(user_id)): {"state": "name"} for user_id in (111111111, 222222222)})
+
+        test_storage.bulk_upsert([{"telegram_id": 111111111, "state": "registered"}])
+
+        assert persistence._load("user_data") == {"222222222": {"state": "name"}}
+        assert persistence._stale_users == {111111111}
+
+    def test_bulk_upsert_reports_row_errors(self, test_storage):
+        """Test that invalid records are reported without aborting the import."""
+        result = test_storage.bulk_upsert(
+            [
+                {"telegram_id": 111111111, "name": "Иван"},
+                {"name": "Без идентификатора"},
+                {"telegram_id": 333333333, "unknown_column": 1},
+                {"telegram_id": 444444444, "birth_date": "не дата"},
+                {"telegram_id": 555555555, "state": None},
+            ]
+        )
+
+        assert result.upserted == 1
+        assert [error.index for error in result.errors] == [1, 2, 3, 4]
+        assert result.errors[1].telegram_id == 333333333
+        assert "unknown_column" in result.errors[1].error
+        assert test_storage.get_users_count() == 1
+
+    @pytest.mark.parametrize("sql", [True, False])
+    def test_get_users_to_ask(self, test_storage, monkeypatch, sql):
+        """Test that users to ask a field are selected by its skip condition (in SQL or in Python)."""
+        from src.settings import SURVEY_CONFIG
+        from src.survey.skip_conditions import FieldValueSkipCondition
+
+        condition = FieldValueSkipCondition("group", ["РК6-51Б", None])
+        skip_if = condition if sql else (lambda user_data: condition(user_data))
+        monkeypatch.setattr(SURVEY_CONFIG.get_field_by_name("expectations"), "skip_if", skip_if)
+        test_storage.bulk_upsert(
+            [
+                {"telegram_id": 1, "group": "РК6-51Б"},
+                {"telegram_id": 2, "group": "ИУ7-11"},
+                {"telegram_id": 3, "group": "ИУ7-11", "expectations": "skipped"},
+                {"telegram_id": 4, "group": "ИУ7-11", "expectations": "Отдохнуть"},
+                {"telegram_id": 5},
+            ]
+        )
+
+        assert sorted(test_storage.get_users_to_ask("expectations")) == [2, 3]
+        assert sorted(test_storage.get_users_to_ask("expectations", unanswered_only=False)) == [2, 3, 4]
+        with pytest.raises(ValueError):
+            test_storage.get_users_to_ask("unknown")
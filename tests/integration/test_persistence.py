@@ -0,0 +1,117 @@
+"""
+Integration tests for the SQLite-backed PTB persistence.
+"""
+
+import asyncio
+
+import pytest
+
+from src.database import Database
+from src.persistence import SQLitePersistence, drop_cached_user_data, mark_user_data_stale
+from src.query_metrics import query_metrics
+
+
+@pytest.fixture(scope="function")
+def database(tmp_path):
+    """Create a temporary database with all tables."""
+    database = Database(str(tmp_path / "database.sqlite"))
+    database.create_tables()
+    yield database
+    database.dispose()
+
+
+class TestSQLitePersistence:
+    """Tests for SQLitePersistence."""
+
+    @pytest.mark.asyncio
+    async def test_data_survives_restart(self, database):
+        persistence = SQLitePersistence(database)
+        await persistence.update_user_data(1, {"state": "name"})
+        await persistence.update_user_data(2, {"state": "registered", "draft": [1, 2]})
+        await persistence.update_bot_data({"milestones": [150]})
+        await persistence.update_conversation("edit", (1, 1), "phone")
+
+        restarted = SQLitePersistence(database)
+
+        assert await restarted.get_user_data() == {1: {"state": "name"}, 2: {"state": "registered", "draft": [1, 2]}}
+        assert await restarted.get_bot_data() == {"milestones": [150]}
+        assert await restarted.get_conversations("edit") == {(1, 1): "phone"}
+        assert await restarted.get_conversations("other") == {}
+        assert await restarted.get_chat_data() == {}
+        assert await restarted.get_callback_data() is None
+
+    @pytest.mark.asyncio
+    async def test_update_overwrites_and_drop_deletes(self, database):
+        persistence = SQLitePersistence(database)
+        await persistence.update_user_data(1, {"state": "name"})
+        await persistence.update_user_data(1, {"state": "phone"})
+        await persistence.update_user_data(2, {"state": "name"})
+        await persistence.drop_user_data(2)
+        await persistence.update_conversation("edit", (1, 1), None)
+
+        assert await persistence.get_user_data() == {1: {"state": "phone"}}
+        assert await persistence.get_conversations("edit") == {}
+
+    @pytest.mark.asyncio
+    async def test_changes_of_one_run_are_written_in_one_statement(self, database):
+        persistence = SQLitePersistence(database)
+
+        with query_metrics.track("test_persistence") as scope:
+            # Application передаёт изменения одного прогона через asyncio.gather
+            await asyncio.gather(*(persistence.update_user_data(i, {"state": "name"}) for i in range(50)))
+
+        inserts = [sql for sql in scope.statements if sql.startswith("INSERT INTO bot_persistence")]
+        assert len(inserts) == 1
+        assert len(await persistence.get_user_data()) == 50
+
+    @pytest.mark.asyncio
+    async def test_not_serializable_entries_are_skipped(self, database):
+        persistence = SQLitePersistence(database)
+        await asyncio.gather(
+            persistence.update_user_data(1, {"state": "name"}),
+            persistence.update_user_data(2, {"handler": object()}),
+        )
+
+        assert await persistence.get_user_data() == {1: {"state": "name"}}
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_pending_entries(self, database):
+        persistence = SQLitePersistence(database)
+        persistence._dirty[("user_data", "7")] = {"state": "name"}
+
+        await persistence.flush()
+
+        assert await persistence.get_user_data() == {7: {"state": "name"}}
+
+    @pytest.mark.asyncio
+    async def test_invalidated_users_lose_cached_state(self, database):
+        persistence = SQLitePersistence(database)
+        await persistence.update_user_data(1, {"state": "phone"})
+        await persistence.update_user_data(2, {"state": "name"})
+        # Состояние 1 изменено в обход кэша (bulk_upsert или смена сезона)
+        with database.get_session() as session:
+            assert drop_cached_user_data(session, [1]) == 1
+        invalidated, current = {"state": "phone"}, {"state": "name"}
+
+        with query_metrics.track("test_refresh") as scope:
+            await persistence.refresh_user_data(1, invalidated)
+            await persistence.refresh_user_data(2, current)
+
+        assert scope.count == 0
+        assert invalidated == {}
+        assert current == {"state": "name"}
+        assert await persistence.get_user_data() == {2: {"state": "name"}}
+        # Следующее состояние пользователя снова берётся из кэша
+        invalidated["state"] = "group"
+        await persistence.refresh_user_data(1, invalidated)
+        assert invalidated == {"state": "group"}
+
+    @pytest.mark.asyncio
+    async def test_invalidation_discards_pending_write(self, database):
+        persistence = SQLitePersistence(database)
+        persistence._dirty[("user_data", "1")] = {"state": "phone"}
+
+        mark_user_data_stale([1])
+        await persistence.flush()
+
+        assert await persistence.get_user_data() == {}
@@ -1,5 +1,7 @@
+import asyncio
 import os
 import tempfile
+from datetime import UTC, datetime
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
@@ -58,7 +60,8 @@ def mock_chat():
 def mock_context():
     """Создает моковый CallbackContext."""
     context = AsyncMock(spec=CallbackContext)
-    context.bot.send_message = AsyncMock()  # Делаем send_message асинхронным
+    # Делаем send_message асинхронным; отправленное сообщение - обычный (не async) мок
+    context.bot.send_message = AsyncMock(return_value=MagicMock(spec=Message, message_id=1, text="ok", caption=None))
     return context
 
 
@@ -84,9 +87,59 @@ async def test_start_command(registration_flow, mock_user, mock_chat, mock_conte
     assert mock_context.bot.send_message.call_count == 2
 
 
+@pytest.mark.asyncio
+async def test_query_budget_per_step(registration_flow, mock_user, mock_chat, mock_context):
+    """Шаги регистрации не должны превышать бюджет запросов к БД"""
+    from src.query_metrics import query_metrics
+
+    mock_update = MagicMock(spec=Update)
+    mock_update.effective_user = mock_user
+    mock_update.callback_query = None
+
+    mock_update.message = create_mock_message(mock_chat, mock_user, text="/start")
+    with query_metrics.track("test_start") as scope:
+        await registration_flow.handle_command(mock_update, mock_context)
+    assert 0 < scope.count <= 10
+
+    mock_update.message = create_mock_message(mock_chat, mock_user, text="Иван")
+    with query_metrics.track("test_answer") as scope:
+        await registration_flow.handle_input(mock_update, mock_context)
+    assert 0 < scope.count <= 8
+
+
+@pytest.mark.asyncio
+async def test_auto_collect_chain_written_once(registration_flow, mock_user, mock_chat, mock_context):
+    """Цепочка автосбора username -> telegram_sername -> name записывается одним UPDATE"""
+    from src.query_metrics import query_metrics
+
+    user_id = mock_user.id
+    registration_flow.user_storage.create_user(user_id, initial_state="username")
+    mock_user = User(id=user_id, first_name="Иван", last_name="Петров", username="ivan", is_bot=False)
+
+    mock_update = MagicMock(spec=Update)
+    mock_update.effective_user = mock_user
+    mock_update.callback_query = None
+    mock_update.message = create_mock_message(mock_chat, mock_user, text="/start")
+
+    with query_metrics.track("test_chain") as scope:
+        await registration_flow.state_handler.transition_state(mock_update, mock_context, "username")
+
+    user_updates = [sql for sql in scope.statements if sql.startswith("UPDATE users")]
+    assert len(user_updates) == 1
+
+    user = registration_flow.user_storage.get_user(user_id)
+    assert user["state"] == "name"
+    assert user["username"] is not None
+    assert user["telegram_sername"] is not None
+
+
 @pytest.mark.asyncio
 async def test_registration_flow(registration_flow, mock_user, mock_chat, mock_context):
     """Тест полного процесса регистрации"""
+    from src.messages import OPTION_WILL_DRIVE_YES
+    from src.settings import SURVEY_CONFIG
+    from src.survey.callback_data import encode_select
+
     user_id = mock_user.id
     registration_flow.user_storage.create_user(user_id)
 
@@ -96,7 +149,7 @@ async def test_registration_flow(registration_flow, mock_user, mock_chat, mock_c
         "phone": "71234567890",
         "birth_date": "10.03.2002",
         "expectations": "The best",
-        "will_drive": "Да",
+        "will_drive": OPTION_WILL_DRIVE_YES,
         # "username": "testuser",
         # "email": "test@example.com",
         # "position": "Вожатый",
@@ -137,7 +190,7 @@ async def test_registration_flow(registration_flow, mock_user, mock_chat, mock_c
         ]:
             # Step 1: Select an option
             mock_update.callback_query = AsyncMock()
-            mock_update.callback_query.data = f"select|{value}"
+            mock_update.callback_query.data = encode_select(SURVEY_CONFIG.state_graph, field, value)
             mock_update.callback_query.from_user = mock_user
             mock_update.callback_query.message = create_mock_message(mock_chat, mock_user, text=value)
             await registration_flow.handle_inline_query(mock_update, mock_context)
@@ -284,3 +337,248 @@ async def test_phone_sharing(registration_flow, mock_user, mock_chat, mock_conte
 #     mock_context.bot.send_message.assert_called_with(
 #         chat_id=user_id, text="Неверный формат email. Пожалуйста, введите корректный email."
 #     )
+
+
+@pytest.mark.asyncio
+async def test_registered_summary_cached_until_data_changes(registration_flow, mock_user, mock_chat, mock_context):
+    """Сводка registered берется из кэша, пока данные пользователя не изменились"""
+    from src.query_metrics import query_metrics
+    from src.state_handler import registered_message_cache
+
+    user_id = mock_user.id
+    registration_flow.user_storage.create_user(user_id, initial_state="edit")
+    registration_flow.user_storage.update_user(user_id, "name", "Иван")
+
+    mock_update = MagicMock(spec=Update)
+    mock_update.effective_user = mock_user
+    mock_update.callback_query = None
+    mock_update.message = create_mock_message(mock_chat, mock_user, text="Отмена")
+
+    await registration_flow.state_handler.transition_state(mock_update, mock_context, "registered")
+    first = mock_context.bot.send_message.call_args.kwargs["text"]
+    assert "Иван" in first
+
+    hits = registered_message_cache.stats().hits
+    with query_metrics.track("test_registered") as scope:
+        await registration_flow.state_handler.transition_state(mock_update, mock_context, "registered")
+    assert mock_context.bot.send_message.call_args.kwargs["text"] == first
+    assert registered_message_cache.stats().hits == hits + 1
+    # Данные пользователя читаются один раз за переход (плюс проверка блокировки при отправке)
+    user_selects = [sql for sql in scope.statements if sql.startswith("SELECT") and "FROM users" in sql]
+    assert len(user_selects) <= 2
+
+    registration_flow.user_storage.update_user(user_id, "name", "Алексей")
+    await registration_flow.state_handler.transition_state(mock_update, mock_context, "registered")
+    assert "Алексей" in mock_context.bot.send_message.call_args.kwargs["text"]
+
+
+@pytest.mark.asyncio
+async def test_stale_callback_is_rejected(registration_flow, mock_user, mock_chat, mock_context):
+    """Кнопки старого формата и прежней версии опроса ничего не записывают"""
+    from src.messages import ERROR_STALE_KEYBOARD
+    from src.settings import SURVEY_CONFIG
+
+    user_id = mock_user.id
+    registration_flow.user_storage.create_user(user_id, initial_state="will_drive")
+    field_index = SURVEY_CONFIG.state_graph.field_index["will_drive"]
+
+    for data in ("select|Да", f"s|{field_index}|0|00000000"):
+        mock_update = MagicMock(spec=Update)
+        mock_update.effective_user = mock_user
+        mock_update.message = None
+        mock_update.callback_query = AsyncMock()
+        mock_update.callback_query.data = data
+        mock_update.callback_query.from_user = mock_user
+        mock_update.callback_query.message = create_mock_message(mock_chat, mock_user)
+
+        await registration_flow.handle_inline_query(mock_update, mock_context)
+
+        mock_update.callback_query.answer.assert_awaited_once_with(ERROR_STALE_KEYBOARD)
+        mock_update.callback_query.edit_message_reply_markup.assert_awaited_once_with(reply_markup=None)
+        user = registration_flow.user_storage.get_user(user_id)
+        assert user["will_drive"] is None
+        assert user["state"] == "will_drive"
+
+
+@pytest.mark.asyncio
+async def test_multi_select_toggles_are_coalesced(registration_flow, mock_user, mock_chat, mock_context, monkeypatch):
+    """Быстрые нажатия множественного выбора дают одну запись и одну правку клавиатуры, "Готово" сохраняет сразу"""
+    import dataclasses
+
+    from src.settings import SURVEY_CONFIG
+    from src.survey.callback_data import encode_select
+
+    graph = SURVEY_CONFIG.state_graph
+    node = dataclasses.replace(graph.node("will_drive"), multi_select=True)
+    monkeypatch.setattr(registration_flow.state_handler, "get_node", lambda state: node)
+    registration_flow.toggle_coalescer.delay = 0.05
+
+    user_id = mock_user.id
+    registration_flow.user_storage.create_user(user_id, initial_state="will_drive")
+    update_user = MagicMock(wraps=registration_flow.user_storage.update_user)
+    monkeypatch.setattr(registration_flow.user_storage, "update_user", update_user)
+
+    mock_update = MagicMock(spec=Update)
+    mock_update.effective_user = mock_user
+    mock_update.message = None
+    mock_update.callback_query = AsyncMock()
+    mock_update.callback_query.from_user = mock_user
+    mock_update.callback_query.message = create_mock_message(mock_chat, mock_user)
+
+    # 0 -> 0,1 -> 0,1,2 -> 0,2
+    for index in (0, 1, 2, 1):
+        mock_update.callback_query.data = encode_select(graph, "will_drive", node.options[index])
+        await registration_flow.handle_inline_query(mock_update, mock_context)
+    assert update_user.call_count == 0
+
+    await asyncio.sleep(0.1)
+    assert update_user.call_count == 1
+    assert mock_update.callback_query.edit_message_reply_markup.await_count == 1
+    assert int(registration_flow.user_storage.get_user(user_id)["will_drive"]) == 0b101
+
+    # Нажатие и сразу "Готово": выбор сохраняется до перехода к следующему вопросу
+    mock_update.callback_query.data = encode_select(graph, "will_drive", node.options[1])
+    await registration_flow.handle_inline_query(mock_update, mock_context)
+    mock_update.callback_query.data = "done"
+    await registration_flow.handle_inline_query(mock_update, mock_context)
+
+    user = registration_flow.user_storage.get_user(user_id)
+    assert int(user["will_drive"]) == 0b111
+    assert user["state"] == graph.next_state("will_drive")
+    assert len(registration_flow.toggle_coalescer) == 0
+
+
+@pytest.mark.asyncio
+async def test_skipped_multi_select_stored_as_null(registration_flow, mock_user, mock_chat, mock_context, monkeypatch):
+    """Пропущенный вопрос с множественным выбором записывается как NULL, а не отметкой пропуска"""
+    import dataclasses
+
+    graph = registration_flow.state_handler.graph
+    skipped = graph.next_state("name")
+    node = dataclasses.replace(graph.node(skipped), multi_select=True, skip_if=lambda user: True)
+    original_node = graph.node
+    monkeypatch.setattr(graph, "node", lambda state: node if state == skipped else original_node(state))
+
+    registration_flow.user_storage.create_user(mock_user.id, initial_state="name")
+    mock_context.user_data = {}
+    mock_update = MagicMock(spec=Update)
+    mock_update.effective_user = mock_user
+    mock_update.callback_query = None
+    mock_update.message = create_mock_message(mock_chat, mock_user, text="Иван")
+
+    await registration_flow.handle_input(mock_update, mock_context)
+
+    user = registration_flow.user_storage.get_user(mock_user.id)
+    assert user[skipped] is None
+    assert user["state"] not in ("name", skipped)
+
+
+@pytest.mark.asyncio
+async def test_input_routed_on_cached_state(registration_flow, mock_user, mock_chat, mock_context, monkeypatch):
+    """Состояние хранится в context.user_data, ввод маршрутизируется без чтения пользователя из БД"""
+    mock_context.user_data = {}
+    mock_update = MagicMock(spec=Update)
+    mock_update.effective_user = mock_user
+    mock_update.callback_query = None
+    mock_update.message = create_mock_message(mock_chat, mock_user, text="/start")
+
+    await registration_flow.handle_command(mock_update, mock_context)
+    assert mock_context.user_data["state"] == "name"
+
+    get_user = MagicMock(wraps=registration_flow.user_storage.get_user)
+    monkeypatch.setattr(registration_flow.user_storage, "get_user", get_user)
+    mock_update.message = create_mock_message(mock_chat, mock_user, text="Иван")
+    await registration_flow.handle_input(mock_update, mock_context)
+
+    # Чтение пользователя осталось только в transition_state
+    assert get_user.call_count == 1
+    user = registration_flow.user_storage.get_user(mock_user.id)
+    assert user["name"] == "Иван"
+    assert mock_context.user_data["state"] == user["state"] != "name"
+
+
+@pytest.mark.asyncio
+async def test_cached_state_of_deleted_user(registration_flow, mock_user, mock_chat, mock_context):
+    """Если пользователь удалён из БД, устаревшее состояние в памяти сбрасывается и регистрация начинается заново"""
+    mock_context.user_data = {"state": "group"}
+    mock_update = MagicMock(spec=Update)
+    mock_update.effective_user = mock_user
+    mock_update.callback_query = None
+    mock_update.message = create_mock_message(mock_chat, mock_user, text="РК6-81Б")
+
+    await registration_flow.handle_input(mock_update, mock_context)
+
+    user = registration_flow.user_storage.get_user(mock_user.id)
+    assert user is not None
+    assert user["group"] is None
+    assert mock_context.user_data["state"] == user["state"] == "name"
+
+
+@pytest.mark.asyncio
+async def test_input_in_removed_state(registration_flow, mock_user, mock_chat, mock_context):
+    """Пользователь в состоянии, которого больше нет в опросе, получает сообщение об ошибке"""
+    from src.messages import ERROR_SOMETHING_WRONG
+
+    registration_flow.user_storage.create_user(mock_user.id, initial_state="removed_field")
+    mock_context.user_data = {}
+    mock_update = MagicMock(spec=Update)
+    mock_update.effective_user = mock_user
+    mock_update.callback_query = None
+    mock_update.message = create_mock_message(mock_chat, mock_user, text="ответ")
+
+    await registration_flow.handle_input(mock_update, mock_context)
+    await registration_flow.process_data_input(mock_update, mock_context, "removed_field", "ответ")
+
+    sent = [call.kwargs["text"] for call in mock_context.bot.send_message.call_args_list]
+    assert sent == [ERROR_SOMETHING_WRONG, ERROR_SOMETHING_WRONG]
+    assert registration_flow.user_storage.get_user(mock_user.id)["state"] == "removed_field"
+
+
+@pytest.mark.asyncio
+async def test_registration_with_log_writer_in_queue_mode(registration_flow, monkeypatch):
+    """Регистрация нескольких пользователей параллельно с фоновой записью журнала: файловая БД, один писатель"""
+    import src.message_log_writer as message_log_writer_module
+    import src.user_storage as user_storage_module
+    from src.database import POOL_MODE_QUEUE
+    from src.message_log_writer import MessageLogWriter
+    from src.message_logger import message_logger
+    from src.models import Message as MessageRow
+
+    database = user_storage_module.db
+    assert database.pool_mode == POOL_MODE_QUEUE
+    monkeypatch.setattr(message_log_writer_module, "db", database)
+    writer = MessageLogWriter(batch_size=3, flush_interval=0.01)
+    monkeypatch.setattr(message_logger, "writer", writer)
+
+    async def register(user_id):
+        user = User(id=user_id, first_name="TestUser", is_bot=False)
+        chat = Chat(id=user_id, type="private")
+        context = AsyncMock(spec=CallbackContext)
+        context.user_data = {}
+        # Настоящее сообщение: журнал сохраняет его текст и file_id
+        context.bot.send_message = AsyncMock(
+            return_value=Message(message_id=1, date=datetime.now(UTC), chat=chat, text="ok")
+        )
+        update = MagicMock(spec=Update)
+        update.effective_user = user
+        update.callback_query = None
+        update.message = create_mock_message(chat, user, text="/start")
+        await registration_flow.handle_command(update, context)
+        update.message = create_mock_message(chat, user, text="Иван")
+        await registration_flow.handle_input(update, context)
+        return context.bot.send_message.call_count
+
+    writer.start()
+    try:
+        sent = await asyncio.gather(*(register(user_id) for user_id in range(1000, 1008)))
+    finally:
+        await writer.stop()
+
+    assert writer.stats.failed == 0
+    assert writer.stats.written == sum(sent)
+    with database.get_session(readonly=True) as session:
+        assert session.query(MessageRow).count() == sum(sent)
+    for user_id in range(1000, 1008):
+        user = registration_flow.user_storage.get_user(user_id)
+        assert user["name"] == "Иван"
+        assert user["state"] != "name"
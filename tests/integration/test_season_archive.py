@@ -0,0 +1,222 @@
+"""
+Integration tests for season rollover.
+"""
+
+import os
+import sqlite3
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from src.database import Database
+from src.message_retention import MessagePartitions, MessageRetention
+from src.messages import OPTION_WILL_DRIVE_PENDING, OPTION_WILL_DRIVE_YES
+from src.models import Message
+from src.season_archive import SeasonArchiver
+from src.user_storage import UserStorage
+
+
+@pytest.fixture(scope="function")
+def archive_env(tmp_path):
+    """Create temporary hot and archive databases."""
+    db_path = str(tmp_path / "database.sqlite")
+    archive_path = str(tmp_path / "archive.sqlite")
+
+    storage = UserStorage(db_path)
+    database = Database(db_path)
+    partitions = MessagePartitions(database, str(tmp_path / "messages"))
+    archiver = SeasonArchiver(database, archive_path=archive_path, partitions=partitions)
+
+    yield storage, database, archiver
+
+
+def fill_season(storage, database):
+    """Registered, blocked and unfinished users plus a few messages."""
+    storage.create_user(111111111, initial_state="registered")
+    storage.update_user(111111111, "name", "Иван")
+    storage.update_user(111111111, "expectations", "Костёр")
+    storage.update_user(111111111, "will_drive", OPTION_WILL_DRIVE_YES)
+
+    storage.create_user(222222222, initial_state="registered")
+    storage.update_user(222222222, "is_blocked", 1)
+
+    storage.create_user(333333333, initial_state="phone")
+
+    with database.get_session() as session:
+        for i in range(5):
+            session.add(
+                Message(
+                    telegram_id=111111111,
+                    chat_id=111111111,
+                    direction="incoming",
+                    message_type="text",
+                    text=f"msg {i}",
+                    created_at=datetime.now(UTC),
+                )
+            )
+
+
+class TestSeasonArchiver:
+    """Tests for SeasonArchiver."""
+
+    def test_rollover_moves_rows_and_carries_forward(self, archive_env):
+        storage, database, archiver = archive_env
+        fill_season(storage, database)
+
+        stats = archiver.rollover("2025", cutoff=datetime.now(UTC) + timedelta(seconds=1), batch_size=2)
+
+        assert stats.archived_users == 3
+        assert stats.carried_forward == 1
+        assert stats.removed_users == 2
+        assert stats.archived_messages == 5
+
+        # В рабочей таблице остаётся только компактная запись зарегистрированного пользователя
+        assert storage.get_all_users() == [111111111]
+        carried = storage.get_user(111111111)
+        assert carried["name"] == "Иван"
+        assert carried["state"] == "registered"
+        assert carried["expectations"] is None
+        assert carried["will_drive"] == OPTION_WILL_DRIVE_PENDING
+
+        with database.get_session() as session:
+            assert session.query(Message).count() == 0
+
+        # Архив доступен для выгрузок
+        archived = archiver.read_users("2025")
+        assert sorted(archived["telegram_id"]) == [111111111, 222222222, 333333333]
+        assert archived.loc[archived["telegram_id"] == 111111111, "will_drive"].item() == OPTION_WILL_DRIVE_YES
+        assert len(archiver.read_messages("2025")) == 5
+        assert archiver.list_seasons() == ["2025"]
+
+    def test_rollover_drops_persisted_state_of_removed_users(self, archive_env):
+        from src.persistence import SQLitePersistence
+
+        storage, database, archiver = archive_env
+        fill_season(storage, database)
+        persistence = SQLitePersistence(database)
+        persistence.write_batch({("user_data", str(user_id)): {"state": "x"} for user_id in (111111111, 333333333)})
+
+        stats = archiver.rollover("2025", cutoff=datetime.now(UTC) + timedelta(seconds=1))
+
+        assert stats.dropped_persistence == 1
+        assert persistence._load("user_data") == {"111111111": {"state": "x"}}
+        # Состояние удалённых пользователей в памяти бота тоже сбрасывается
+        assert persistence._stale_users == {222222222, 333333333}
+
+    def test_rollover_skips_rows_after_cutoff(self, archive_env):
+        storage, database, archiver = archive_env
+        fill_season(storage, database)
+
+        stats = archiver.rollover("2025", cutoff=datetime.now(UTC) - timedelta(days=1))
+
+        assert stats.archived_users == 0
+        assert stats.archived_messages == 0
+        assert storage.get_users_count() == 3
+
+    def test_rollover_same_season_twice_fails(self, archive_env):
+        storage, database, archiver = archive_env
+        fill_season(storage, database)
+        archiver.rollover("2025")
+
+        with pytest.raises(ValueError, match="already archived"):
+            archiver.rollover("2025")
+
+    def test_interrupted_rollover_resumes(self, archive_env, monkeypatch):
+        storage, database, archiver = archive_env
+        fill_season(storage, database)
+        cutoff = datetime.now(UTC) + timedelta(seconds=5)
+
+        # Пользователи уже в архиве, а перенос сообщений упал
+        def fail(*args, **kwargs):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(archiver, "_archive_messages", fail)
+        with pytest.raises(RuntimeError):
+            archiver.rollover("2025", cutoff=cutoff, batch_size=2)
+        assert archiver.list_seasons() == ["2025"]
+        assert archiver.completed_seasons() == []
+
+        monkeypatch.undo()
+        stats = archiver.rollover("2025", cutoff=cutoff, batch_size=2)
+
+        assert stats.archived_users == 0
+        assert stats.archived_messages == 5
+        assert sorted(archiver.read_users("2025")["telegram_id"]) == [111111111, 222222222, 333333333]
+        assert archiver.completed_seasons() == ["2025"]
+        with pytest.raises(ValueError, match="already archived"):
+            archiver.rollover("2025", cutoff=cutoff)
+
+    def test_dry_run_changes_nothing(self, archive_env):
+        storage, database, archiver = archive_env
+        fill_season(storage, database)
+
+        stats = archiver.rollover("2025", cutoff=datetime.now(UTC) + timedelta(seconds=1), dry_run=True)
+
+        assert stats.archived_users == 3
+        assert stats.carried_forward == 1
+        assert stats.archived_messages == 5
+        assert storage.get_users_count() == 3
+        assert archiver.list_seasons() == []
+
+    def test_users_editing_answers_are_carried_forward(self, archive_env):
+        storage, database, archiver = archive_env
+        fill_season(storage, database)
+        # Зарегистрированные пользователи, которые в момент смены сезона правят ответы
+        storage.create_user(444444444, initial_state="edit")
+        storage.create_user(555555555, initial_state="edit_name")
+        # Похожее, но не состояние редактирования
+        storage.create_user(666666666, initial_state="editor")
+        cutoff = datetime.now(UTC) + timedelta(seconds=1)
+
+        planned = archiver.rollover("2025", cutoff=cutoff, dry_run=True)
+        stats = archiver.rollover("2025", cutoff=cutoff)
+
+        assert planned.carried_forward == stats.carried_forward == 3
+        assert stats.removed_users == 3
+        assert sorted(storage.get_all_users()) == [111111111, 444444444, 555555555]
+        assert storage.get_user(555555555)["state"] == "edit_name"
+
+    def test_messages_in_partitions_are_archived(self, archive_env):
+        storage, database, archiver = archive_env
+        fill_season(storage, database)
+        with database.get_session() as session:
+            for created_at in (
+                datetime(2025, 3, 1, tzinfo=UTC),
+                datetime(2025, 3, 20, tzinfo=UTC),
+                datetime(2025, 5, 10, tzinfo=UTC),
+                datetime(2025, 5, 20, tzinfo=UTC),
+            ):
+                session.add(
+                    Message(
+                        telegram_id=333333333,
+                        chat_id=333333333,
+                        direction="outgoing",
+                        message_type="text",
+                        text=f"old {created_at:%m-%d}",
+                        created_at=created_at,
+                    )
+                )
+        # Старые сообщения уже перенесены в месячные файлы
+        retention = MessageRetention(archiver.partitions, hot_days=30, retention_days=0)
+        assert retention.run(now=datetime(2025, 7, 1, tzinfo=UTC)).moved == 4
+        march, may = archiver.partitions.list_partitions()
+        # Сезон заканчивается в середине мая: сообщения после cutoff остаются в партиции
+        cutoff = datetime(2025, 5, 15, tzinfo=UTC)
+
+        planned = archiver.rollover("2025", cutoff=cutoff, dry_run=True)
+        stats = archiver.rollover("2025", cutoff=cutoff, batch_size=1)
+
+        assert planned.archived_messages == stats.archived_messages == 3
+        archived = archiver.read_messages("2025")
+        assert sorted(archived["text"]) == ["old 03-01", "old 03-20", "old 05-10"]
+        assert set(archived["direction"]) == {"outgoing"}
+        # Опустевшая партиция удаляется, в остальных остаются только сообщения после cutoff
+        assert not os.path.exists(march.path)
+        conn = sqlite3.connect(may.path)
+        try:
+            assert conn.execute("SELECT text FROM message_log").fetchall() == [("old 05-20",)]
+            assert conn.execute("SELECT COUNT(*) FROM message_contents").fetchone()[0] == 1
+        finally:
+            conn.close()
+        with database.get_session() as session:
+            assert session.query(Message).count() == 5
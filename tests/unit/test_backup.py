@@ -0,0 +1,191 @@
+"""
+Тесты онлайн-бэкапов БД.
+"""
+
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.backup import BackupError, DatabaseBackup, RetentionPolicy
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    path = tmp_path / "database.sqlite"
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [(f"user {i}",) for i in range(500)])
+    conn.commit()
+    yield path
+    conn.close()
+
+
+@pytest.fixture
+def backup(source_db, tmp_path):
+    return DatabaseBackup(
+        str(source_db), backup_dir=str(tmp_path / "dumps"), compression="gzip", pages_per_step=1, step_sleep=0
+    )
+
+
+def test_create_backup_is_compressed_and_restorable(backup, tmp_path):
+    path = backup.create_backup(datetime(2025, 6, 1, 12, 0))
+
+    assert path.name == "dump_20250601_120000.sqlite.gz"
+    assert path.read_bytes()[:2] == b"\x1f\x8b"
+    # Временные файлы не остаются
+    assert [p.name for p in backup.backup_dir.iterdir()] == [path.name]
+
+    restored = tmp_path / "restored.sqlite"
+    backup.restore(path, str(restored))
+    conn = sqlite3.connect(restored)
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 500
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    conn.close()
+
+
+def _create_db(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY, text TEXT)")
+    conn.executemany("INSERT INTO messages (text) VALUES (?)", [(f"message {i}",) for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def _count_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def companion_files(tmp_path):
+    # Партиции журнала сообщений и архив сезонов лежат рядом с основной БД
+    files = {
+        "messages-2025-04": tmp_path / "messages" / "messages-2025-04.sqlite",
+        "messages-2025-05": tmp_path / "messages" / "messages-2025-05.sqlite",
+        "archive": tmp_path / "archive.sqlite",
+    }
+    for rows, path in enumerate(files.values(), start=10):
+        _create_db(path, rows)
+    # Посторонние файлы в каталоге партиций не копируются
+    (tmp_path / "messages" / "notes.sqlite").write_bytes(b"")
+    return files
+
+
+def test_partitions_and_archive_are_backed_up_and_restored(backup, companion_files, source_db):
+    path = backup.create_backup(datetime(2025, 6, 1, 12, 0))
+
+    assert sorted(p.name for p in backup.backup_dir.iterdir()) == [
+        "dump_20250601_120000.archive.sqlite.gz",
+        "dump_20250601_120000.messages-2025-04.sqlite.gz",
+        "dump_20250601_120000.messages-2025-05.sqlite.gz",
+        "dump_20250601_120000.sqlite.gz",
+    ]
+    # Сопутствующие файлы не считаются отдельными бэкапами
+    assert list(backup.list_backups().values()) == [path]
+    assert sorted(backup.companions(path)) == sorted(companion_files)
+
+    for companion in companion_files.values():
+        companion.unlink()
+    source_db.unlink()
+    restored = backup.restore_all(path)
+
+    assert sorted(restored) == sorted([source_db, *companion_files.values()])
+    assert [_count_rows(p) for p in companion_files.values()] == [10, 11, 12]
+
+
+def test_retention_removes_companion_files(backup, companion_files):
+    start = datetime(2025, 6, 1, 0, 0)
+    backup.retention = RetentionPolicy(hourly=1, daily=1, weekly=1)
+    for hours in range(3):
+        backup.create_backup(start + timedelta(hours=hours))
+
+    names = sorted(p.name for p in backup.backup_dir.iterdir())
+    assert all(name.startswith("dump_20250601_020000.") for name in names)
+    assert len(names) == 1 + len(companion_files)
+
+
+def test_backup_finishes_under_concurrent_writes(backup, source_db, tmp_path, monkeypatch, caplog):
+    writer = sqlite3.connect(source_db, timeout=0)
+    original_sleep = time.sleep
+
+    def write_between_steps(seconds):
+        # Каждая запись перезапускает постраничный бэкап; писатель не должен блокироваться
+        writer.execute("INSERT INTO users (name) VALUES ('concurrent')")
+        writer.commit()
+        original_sleep(seconds)
+
+    monkeypatch.setattr("src.backup.time.sleep", write_between_steps)
+    with caplog.at_level("INFO", logger="src.backup"):
+        path = backup.create_backup(datetime(2025, 6, 1, 12, 0))
+    writer.close()
+
+    assert "copying in one step" in caplog.text
+
+    restored = tmp_path / "restored.sqlite"
+    backup.restore(path, str(restored))
+    conn = sqlite3.connect(restored)
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] >= 500
+    conn.close()
+
+
+def test_integrity_failure_raises(tmp_path):
+    broken = tmp_path / "broken.sqlite"
+    broken.write_bytes(b"SQLite format 3\x00" + b"\xff" * 4096)
+
+    with pytest.raises((BackupError, sqlite3.DatabaseError)):
+        DatabaseBackup._check_integrity(str(broken))
+
+
+def test_missing_database(tmp_path):
+    backup = DatabaseBackup(str(tmp_path / "missing.sqlite"), backup_dir=str(tmp_path), compression="gzip")
+    with pytest.raises(FileNotFoundError):
+        backup.create_backup()
+
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError):
+        DatabaseBackup(str(tmp_path / "db.sqlite"), compression="bz2")
+
+
+def test_retention_keeps_hourly_daily_weekly():
+    policy = RetentionPolicy(hourly=3, daily=2, weekly=2)
+    now = datetime(2025, 6, 11, 12, 0)  # среда
+    timestamps = [now - timedelta(hours=h) for h in range(0, 24 * 14)]
+
+    keep = policy.select(timestamps)
+
+    expected = {
+        now,
+        now - timedelta(hours=1),
+        now - timedelta(hours=2),
+        # последний бэкап предыдущего дня
+        datetime(2025, 6, 10, 23, 0),
+        # последний бэкап предыдущей недели (воскресенье)
+        datetime(2025, 6, 8, 23, 0),
+    }
+    assert keep == expected
+
+
+def test_apply_retention_deletes_thinned_backups(backup):
+    start = datetime(2025, 6, 1, 0, 0)
+    backup.retention = RetentionPolicy(hourly=2, daily=1, weekly=1)
+    for hours in range(5):
+        backup.create_backup(start + timedelta(hours=hours))
+
+    names = sorted(p.name for p in backup.backup_dir.iterdir())
+    assert names == ["dump_20250601_030000.sqlite.gz", "dump_20250601_040000.sqlite.gz"]
+
+
+def test_backups_with_foreign_names_are_ignored(backup):
+    backup.backup_dir.mkdir()
+    (backup.backup_dir / "dump_20250101_000000.sqlite").write_bytes(b"legacy")
+    (backup.backup_dir / "notes.txt").write_text("keep me")
+
+    assert backup.list_backups() == {}
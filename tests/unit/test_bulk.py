@@ -0,0 +1,185 @@
+"""
+Тесты пакетной валидации и нормализации: результат должен совпадать со скалярными функциями.
+"""
+
+import pandas as pd
+import pytest
+
+from src.registration_config import SurveyField
+from src.survey.bulk import format_series, normalize_frame, normalize_series, validate_series
+from src.survey.formatters import (
+    format_date_db,
+    format_group_db,
+    format_phone_db,
+    format_text_db,
+    format_username_db,
+)
+from src.survey.validators import (
+    DateValidator,
+    create_options_validator,
+    validate_date,
+    validate_email,
+    validate_group,
+    validate_non_empty,
+    validate_phone,
+    validate_yes_no,
+)
+
+SAMPLES = [
+    "",
+    " ",
+    "\n",
+    "Иван",
+    "  Иван  ",
+    "89991234567",
+    "+7 (999) 123-45-67",
+    "8 (999) 123-45-67",
+    "7999123456",
+    "799912345678",
+    "+1 999 123 45 67",
+    "８９９９１２３４５６７",
+    "test@example.com",
+    "test@example",
+    "@.",
+    "1.1.2000",
+    "01.01.2000",
+    "31.12.1980",
+    "1.1.1979",
+    "1.1.2010",
+    "32.01.2000",
+    "1.13.2000",
+    "1.1.2000\n",
+    "1.1.२०००",
+    "1.2",
+    "1.2.3.4",
+    "..",
+    "рк6-81б",
+    "РК6-81Б",
+    "ИУ7-11",
+    "М9-01",
+    "ИУ7-171",
+    "СМ10и-51М",
+    "Да",
+    "Нет",
+    "да",
+    "ß",
+    79991234567,
+]
+
+VALIDATORS = [
+    validate_non_empty,
+    validate_phone,
+    validate_email,
+    validate_date,
+    validate_yes_no,
+    validate_group,
+    create_options_validator(["Да", "Нет", "Не знаю"]),
+    DateValidator("Своё сообщение").validate,
+]
+
+FORMATTERS = [format_text_db, format_phone_db, format_date_db, format_username_db, format_group_db]
+
+
+def scalar_format(formatter, value):
+    try:
+        return formatter(value), None
+    except Exception as e:
+        return None, str(e)
+
+
+@pytest.mark.parametrize("validator", VALIDATORS)
+def test_validate_series_matches_scalar(validator):
+    series = pd.Series(SAMPLES, dtype=object)
+
+    batch = validate_series(validator, series)
+
+    for index, value in series.items():
+        is_valid, error = validator(str(value))
+        assert batch.invalid[index] == (not is_valid), value
+        assert batch.errors[index] == error, value
+        assert batch.values[index] == (str(value) if is_valid else None), value
+
+
+@pytest.mark.parametrize("formatter", FORMATTERS)
+def test_format_series_matches_scalar(formatter):
+    series = pd.Series(SAMPLES, dtype=object)
+
+    batch = format_series(formatter, series)
+
+    for index, value in series.items():
+        expected, error = scalar_format(formatter, str(value))
+        assert batch.values[index] == expected, value
+        assert batch.errors[index] == error, value
+        assert batch.invalid[index] == (error is not None), value
+
+
+def test_unknown_validator_applied_row_by_row():
+    batch = validate_series(
+        lambda value: (value.isdigit(), None if value.isdigit() else "не число"), pd.Series(["1", "a"])
+    )
+
+    assert batch.invalid.tolist() == [False, True]
+    assert batch.errors.tolist() == [None, "не число"]
+
+
+def test_missing_values_are_skipped():
+    series = pd.Series(["89991234567", None, float("nan")], dtype=object)
+
+    batch = validate_series(validate_phone, series)
+
+    assert batch.invalid.tolist() == [False, False, False]
+    assert batch.values[1] is None and batch.values[2] is None
+
+
+def test_normalize_series_validates_then_formats():
+    field = SurveyField(field_name="phone", label="Телефон", validator=validate_phone, db_formatter=format_phone_db)
+    series = pd.Series(["8 (999) 123-45-67", "123", None], index=[10, 20, 30])
+
+    batch = normalize_series(field, series)
+
+    for index, value in series.items():
+        if pd.isna(value):
+            assert batch.values[index] is None and not batch.invalid[index]
+            continue
+        is_valid, error, db_value = field.pipeline(value)
+        assert batch.invalid[index] == (not is_valid)
+        assert batch.errors[index] == error
+        assert batch.values[index] == db_value
+
+
+def test_normalize_series_without_validation():
+    field = SurveyField(field_name="group", label="Группа", validator=validate_group, db_formatter=format_group_db)
+
+    batch = normalize_series(field, pd.Series(["рк6-81б", "не группа"]), validate=False)
+
+    assert batch.values.tolist() == ["РК6-81Б", "НЕ ГРУППА"]
+    assert not batch.invalid.any()
+
+
+def test_normalize_multi_select_to_masks():
+    field = SurveyField(field_name="roles", label="Роли", options=["A", "B, C", "D"], multi_select=True)
+
+    batch = normalize_series(field, pd.Series([5, "B, C, D", ["A", "D"], "X", None], dtype=object))
+
+    assert batch.values.tolist() == [5, 6, 5, None, None]
+    assert batch.invalid.tolist() == [False, False, False, True, False]
+    assert "X" in batch.errors[3]
+
+
+def test_normalize_frame():
+    fields = [
+        SurveyField(field_name="name", label="Имя", validator=validate_non_empty, db_formatter=format_text_db),
+        SurveyField(field_name="birth_date", label="Дата", validator=validate_date, db_formatter=format_date_db),
+        SurveyField(field_name="absent", label="Нет в таблице"),
+    ]
+    df = pd.DataFrame({"name": [" Иван ", " "], "birth_date": ["1.2.2003", "1.2.2003"], "other": [1, 2]})
+
+    batch = normalize_frame(df, fields)
+
+    assert list(batch.values.columns) == ["name", "birth_date"]
+    assert batch.values.to_dict("records") == [
+        {"name": "Иван", "birth_date": "01.02.2003"},
+        {"name": None, "birth_date": "01.02.2003"},
+    ]
+    assert batch.invalid_rows.tolist() == [False, True]
+    assert batch.errors["name"][1] == "Поле не может быть пустым."
@@ -0,0 +1,108 @@
+"""
+Тесты для LRU-кэша и кэширования клавиатур.
+"""
+
+import pytest
+
+from src.cache import LRUCache, cache_stats, get_cache
+
+
+class TestLRUCache:
+    """Тесты для LRUCache."""
+
+    def test_hits_and_misses(self):
+        cache = LRUCache("test", maxsize=2)
+
+        assert cache.get("a") is None
+        cache.put("a", 1)
+        assert cache.get("a") == 1
+
+        stats = cache.stats()
+        assert (stats.hits, stats.misses) == (1, 1)
+        assert stats.hit_rate == 0.5
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache("test", maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert len(cache) == 2
+        assert cache.stats().evictions == 1
+
+    def test_get_or_create_builds_once(self):
+        cache = LRUCache("test", maxsize=2)
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return object()
+
+        first = cache.get_or_create("key", factory)
+        assert cache.get_or_create("key", factory) is first
+        assert len(calls) == 1
+
+    def test_clear(self):
+        cache = LRUCache("test", maxsize=2)
+        cache.put("a", 1)
+        cache.get("a")
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.stats().hits == 0
+
+    def test_invalid_maxsize(self):
+        with pytest.raises(ValueError):
+            LRUCache("test", maxsize=0)
+
+    def test_registry(self):
+        cache = get_cache("test_registry", maxsize=4)
+
+        assert get_cache("test_registry") is cache
+        assert "test_registry" in [stats.name for stats in cache_stats()]
+
+
+class TestMarkupCache:
+    """Тесты кэширования клавиатур в StateHandler."""
+
+    @pytest.fixture
+    def state_handler(self):
+        from unittest.mock import MagicMock
+
+        from src.state_handler import StateHandler
+
+        return StateHandler(MagicMock())
+
+    def test_inline_keyboard_cached_by_selection(self, state_handler):
+        first_option, second_option = state_handler.graph.node("will_drive").options[:2]
+
+        first = state_handler.create_inline_keyboard("will_drive", [first_option, second_option])
+        # Порядок выбора не влияет на клавиатуру
+        assert state_handler.create_inline_keyboard("will_drive", [second_option, first_option]) is first
+        assert state_handler.create_inline_keyboard("will_drive", [first_option]) is not first
+
+    def test_reply_markup_cached_by_state_and_role(self, state_handler):
+        from src.constants import REGISTERED
+        from src.settings import ADMIN_IDS
+
+        config = state_handler.graph.node(REGISTERED).config
+        admin_id = next(iter(ADMIN_IDS))
+        user_id = admin_id + 1
+
+        user_markup = state_handler.get_reply_markup(config, user_id, REGISTERED, {})
+        assert state_handler.get_reply_markup(config, user_id + 1, REGISTERED, {}) is user_markup
+
+        admin_markup = state_handler.get_reply_markup(config, admin_id, REGISTERED, {})
+        assert admin_markup is not user_markup
+        assert len(admin_markup.keyboard) > len(user_markup.keyboard)
+
+    def test_options_markup_reflects_user_selection(self, state_handler):
+        node = state_handler.graph.node("will_drive")
+        option = node.options[0]
+
+        markup = state_handler.get_reply_markup(node.config, 1, "will_drive", {"will_drive": option})
+
+        assert markup.inline_keyboard[0][0].text == f"✅ {option}"
@@ -0,0 +1,71 @@
+"""
+Тесты для кодирования callback_data инлайн-кнопок.
+"""
+
+import pytest
+
+from src.registration_config import RegistrationSurveyConfig, SurveyField
+from src.survey import callback_data
+from src.survey.callback_data import CallbackAction, StaleCallbackError, decode, encode_select, encode_trip_poll
+
+TRIP_OPTIONS = ["Да, точно еду! ✅", "Нет, не смогу 😢"]
+
+
+@pytest.fixture
+def config():
+    return RegistrationSurveyConfig()
+
+
+class TestCallbackData:
+    """Тесты для encode/decode."""
+
+    def test_select_round_trip(self, config):
+        graph = config.state_graph
+        for index, option in enumerate(graph.node("will_drive").options):
+            data = encode_select(graph, "will_drive", option)
+
+            assert len(data.encode()) <= callback_data.MAX_CALLBACK_DATA_BYTES
+            assert decode(data, graph) == CallbackAction(callback_data.SELECT, "will_drive", option, index)
+
+    def test_trip_poll_round_trip(self, config):
+        data = encode_trip_poll(TRIP_OPTIONS, TRIP_OPTIONS[1])
+
+        assert decode(data, config.state_graph, TRIP_OPTIONS) == CallbackAction(
+            callback_data.TRIP_POLL, option=TRIP_OPTIONS[1], option_index=1
+        )
+
+    def test_plain_actions(self, config):
+        for action in (callback_data.DONE, callback_data.CANCEL, callback_data.CANCEL_EDIT):
+            assert decode(action, config.state_graph) == CallbackAction(action)
+
+    def test_encode_rejects_unknown_option(self, config):
+        with pytest.raises(ValueError):
+            encode_select(config.state_graph, "will_drive", "Нет такого варианта")
+        with pytest.raises(ValueError):
+            encode_select(config.state_graph, "name", "Иван")
+
+    def test_config_change_makes_keyboards_stale(self, config):
+        data = encode_select(config.state_graph, "will_drive", config.state_graph.node("will_drive").options[0])
+        version = config.state_graph.version
+
+        config.add_field(SurveyField(field_name="extra", label="Дополнительно", message="?", options=["A", "B"]))
+
+        assert config.state_graph.version != version
+        with pytest.raises(StaleCallbackError):
+            decode(data, config.state_graph)
+
+    def test_trip_poll_options_change_makes_keyboards_stale(self, config):
+        data = encode_trip_poll(TRIP_OPTIONS, TRIP_OPTIONS[0])
+
+        with pytest.raises(StaleCallbackError):
+            decode(data, config.state_graph, ["Еду", "Не еду"])
+
+    @pytest.mark.parametrize(
+        "data",
+        ["select|Да", "trip_poll|Да", "s|x|0|abc", "s|999|0|{version}", "s|0|0|{version}", "s|-1|0|{version}", "", "?"],
+    )
+    def test_malformed_or_legacy_data(self, config, data):
+        graph = config.state_graph
+        # Поле с индексом 0 (name) не имеет вариантов ответа
+        with pytest.raises(StaleCallbackError):
+            decode(data.format(version=graph.version), graph)
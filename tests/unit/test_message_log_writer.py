@@ -0,0 +1,206 @@
+"""
+Unit tests for the batched message log writer.
+"""
+
+import asyncio
+import threading
+import time
+from datetime import UTC, datetime
+
+import pytest
+
+import src.message_log_writer as message_log_writer_module
+from src.database import Database
+from src.message_log_writer import MessageLogWriter, OverflowPolicy
+from src.models import Message
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Temporary database used by the writer."""
+    database = Database(str(tmp_path / "database.sqlite"))
+    database.create_tables()
+    monkeypatch.setattr(message_log_writer_module, "db", database)
+    yield database
+    database.dispose()
+
+
+def make_record(message_id: int) -> dict:
+    return {
+        "telegram_id": 1,
+        "chat_id": 1,
+        "message_id": message_id,
+        "direction": "incoming",
+        "message_type": "text",
+        "text": f"message {message_id}",
+        "caption": None,
+        "file_id": None,
+        "reply_to_message_id": None,
+        "created_at": datetime.now(UTC),
+    }
+
+
+def stored_ids(database: Database) -> list[int]:
+    with database.get_session(readonly=True) as session:
+        return [row[0] for row in session.query(Message.message_id).order_by(Message.id).all()]
+
+
+class TestMessageLogWriter:
+    """Tests for MessageLogWriter."""
+
+    @pytest.mark.asyncio
+    async def test_writes_synchronously_when_not_running(self, database):
+        writer = MessageLogWriter()
+
+        assert await writer.submit(make_record(1)) is True
+
+        assert stored_ids(database) == [1]
+        assert writer.stats.sync_writes == 1
+
+    @pytest.mark.asyncio
+    async def test_full_batch_is_written_in_one_insert(self, database):
+        writer = MessageLogWriter(batch_size=5, flush_interval=60)
+        writer.start()
+        for message_id in range(10):
+            await writer.submit(make_record(message_id))
+        # Nothing is written by the handlers themselves
+        assert stored_ids(database) == []
+
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if writer.stats.written == 10:
+                break
+        await writer.stop()
+
+        assert stored_ids(database) == list(range(10))
+        assert writer.stats.batches == 2
+        assert writer.stats.sync_writes == 0
+
+    @pytest.mark.asyncio
+    async def test_partial_batch_is_written_after_interval(self, database):
+        writer = MessageLogWriter(batch_size=100, flush_interval=0.05)
+        writer.start()
+        await writer.submit(make_record(1))
+
+        await asyncio.sleep(0.2)
+
+        assert stored_ids(database) == [1]
+        await writer.stop()
+
+    @pytest.mark.asyncio
+    async def test_stop_drains_queue(self, database):
+        writer = MessageLogWriter(batch_size=100, flush_interval=60)
+        writer.start()
+        for message_id in range(3):
+            await writer.submit(make_record(message_id))
+
+        await writer.stop()
+
+        assert stored_ids(database) == [0, 1, 2]
+        assert not writer.running
+        assert writer.stats.queue_depth == 0
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_queued_records(self, database):
+        writer = MessageLogWriter(batch_size=100, flush_interval=60)
+        writer.start()
+        await writer.submit(make_record(1))
+
+        await writer.flush()
+
+        assert stored_ids(database) == [1]
+        await writer.stop()
+
+    @pytest.mark.parametrize(
+        ("policy", "expected_ids", "dropped", "sync_writes"),
+        [
+            (OverflowPolicy.WRITE_THROUGH, [0, 1, 2], 0, 0),
+            (OverflowPolicy.DROP_OLDEST, [1, 2], 1, 0),
+            (OverflowPolicy.DROP_NEWEST, [0, 1], 1, 0),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_overflow_policy(self, database, policy, expected_ids, dropped, sync_writes):
+        writer = MessageLogWriter(maxsize=2, batch_size=100, flush_interval=60, overflow_policy=policy)
+        writer.start()
+        for message_id in range(3):
+            await writer.submit(make_record(message_id))
+
+        await writer.stop()
+
+        assert stored_ids(database) == expected_ids
+        assert writer.stats.dropped == dropped
+        assert writer.stats.sync_writes == sync_writes
+        assert writer.stats.max_queue_depth == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_counted(self, database):
+        writer = MessageLogWriter(batch_size=100, flush_interval=60)
+        writer.start()
+        await writer.submit({"telegram_id": 1})  # Missing required columns
+
+        await writer.stop()
+
+        assert writer.stats.failed == 1
+        assert writer.stats.written == 0
+
+    @pytest.mark.asyncio
+    async def test_write_through_waits_for_room_in_queue(self, database):
+        writer = MessageLogWriter(
+            maxsize=1, batch_size=100, flush_interval=60, overflow_policy=OverflowPolicy.WRITE_THROUGH
+        )
+        writer.start()
+        await writer.submit(make_record(0))
+
+        # The handler waits until the flusher takes the queued record, nothing piles up in memory
+        pending = asyncio.create_task(writer.submit(make_record(1)))
+        await asyncio.sleep(0)
+        assert not pending.done()
+        assert await pending is True
+        await writer.stop()
+
+        assert stored_ids(database) == [0, 1]
+        assert writer.stats.max_queue_depth == 1
+        assert writer.stats.sync_writes == 0
+
+    @pytest.mark.asyncio
+    async def test_busy_writer_is_waited_for_on_stop(self, tmp_path, monkeypatch):
+        database = Database(str(tmp_path / "busy.sqlite"), writer_timeout=0.05)
+        database.create_tables()
+        monkeypatch.setattr(message_log_writer_module, "db", database)
+        monkeypatch.setattr(message_log_writer_module, "LOG_BUSY_RETRY_DELAY", 0.01)
+        holding = threading.Event()
+
+        def hold_writer():
+            with database.engine.connect():
+                holding.set()
+                time.sleep(0.3)
+
+        writer = MessageLogWriter(batch_size=100, flush_interval=60)
+        writer.start()
+        for message_id in range(3):
+            await writer.submit(make_record(message_id))
+        thread = threading.Thread(target=hold_writer)
+        thread.start()
+        holding.wait(5)
+
+        await writer.stop()
+        thread.join()
+
+        assert stored_ids(database) == [0, 1, 2]
+        assert writer.stats.failed == 0
+        database.dispose()
+
+    @pytest.mark.asyncio
+    async def test_bad_record_does_not_fail_batch(self, database):
+        writer = MessageLogWriter(batch_size=100, flush_interval=60)
+        writer.start()
+        await writer.submit(make_record(1))
+        await writer.submit({"telegram_id": 1})  # Missing required columns
+        await writer.submit(make_record(3))
+
+        await writer.stop()
+
+        assert stored_ids(database) == [1, 3]
+        assert writer.stats.failed == 1
+        assert writer.stats.written == 2
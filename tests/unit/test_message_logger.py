@@ -3,7 +3,7 @@ Unit tests for message logger functionality.
 """
 
 from datetime import UTC, datetime
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 
@@ -78,6 +78,41 @@ class TestMessageLogger:
         message_type = message_logger._get_message_type(mock_update.message)
         assert message_type == "contact"
 
+    @pytest.mark.asyncio
+    async def test_log_incoming_message_submits_record(self, mock_update):
+        """Incoming messages are handed to the writer as Message columns."""
+        writer = Mock()
+        writer.submit = AsyncMock(return_value=True)
+        mock_update.message.video_note = None
+        mock_update.message.animation = None
+
+        assert await MessageLogger(writer).log_incoming_message(mock_update) is True
+
+        record = writer.submit.call_args.args[0]
+        assert record["telegram_id"] == 12345
+        assert record["message_id"] == 67890
+        assert record["direction"] == "incoming"
+        assert record["message_type"] == "text"
+        assert record["text"] == "Test message"
+        assert record["file_id"] is None
+
+    @pytest.mark.asyncio
+    async def test_log_outgoing_message_submits_record(self, mock_sent_message):
+        """Outgoing messages are handed to the writer as Message columns."""
+        writer = Mock()
+        writer.submit = AsyncMock(return_value=True)
+
+        result = await MessageLogger(writer).log_outgoing_message(
+            telegram_id=12345, chat_id=12345, sent_message=mock_sent_message, reply_to_message_id=1
+        )
+
+        assert result is True
+        record = writer.submit.call_args.args[0]
+        assert record["direction"] == "outgoing"
+        assert record["message_id"] == 99999
+        assert record["text"] == "Bot response"
+        assert record["reply_to_message_id"] == 1
+
 
 class TestMessageModel:
     """Test cases for Message model."""
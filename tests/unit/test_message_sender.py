@@ -35,6 +35,7 @@ class TestMessageSender:
     def mock_message_logger(self):
         """Create a mock message logger."""
         with patch("src.message_sender.message_logger") as mock:
+            mock.log_outgoing_message = AsyncMock(return_value=True)
             yield mock
 
     @pytest.mark.asyncio
@@ -0,0 +1,119 @@
+"""
+Тесты для хранения множественного выбора битовой маской.
+"""
+
+import pandas as pd
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, insert, select
+
+from src.registration_config import RegistrationSurveyConfig, SurveyField
+from src.survey.multi_select import (
+    format_mask,
+    has_option,
+    parse_legacy,
+    selected_options,
+    to_mask,
+    toggle,
+)
+from src.survey.state_graph import StateNode
+
+OPTIONS = ["Вожатый", "Фото, видео", "Радист"]
+
+
+class TestMask:
+    """Тесты кодирования маски."""
+
+    def test_round_trip(self):
+        mask = to_mask(OPTIONS, ["Радист", "Вожатый"])
+
+        assert mask == 0b101
+        assert selected_options(OPTIONS, mask) == ["Вожатый", "Радист"]
+        assert format_mask(OPTIONS, mask) == "Вожатый, Радист"
+
+    def test_toggle(self):
+        mask = toggle(None, 1)
+        assert selected_options(OPTIONS, mask) == ["Фото, видео"]
+        assert toggle(mask, 1) == 0
+
+    def test_empty_values(self):
+        assert to_mask(OPTIONS, None) == 0
+        assert to_mask(OPTIONS, "") == 0
+        assert format_mask(OPTIONS, None) is None
+        assert format_mask(OPTIONS, 0) is None
+
+    def test_skipped_marker_is_empty_selection(self):
+        # Так пропущенные поля записывались до перехода на NULL
+        assert to_mask(OPTIONS, "skipped") == 0
+        assert selected_options(OPTIONS, "skipped") == []
+        assert format_mask(OPTIONS, "skipped") is None
+
+    def test_legacy_text_with_separator_inside_option(self):
+        assert parse_legacy(OPTIONS, "Фото, видео, Радист") == ["Фото, видео", "Радист"]
+        assert to_mask(OPTIONS, "Вожатый, Фото, видео") == 0b011
+        # Строка из цифр - маска, прочитанная из TEXT-колонки
+        assert to_mask(OPTIONS, "5") == 5
+
+    def test_unknown_option(self):
+        with pytest.raises(ValueError, match="Unknown option"):
+            to_mask(OPTIONS, "Повар")
+        with pytest.raises(ValueError, match="Unknown option"):
+            to_mask(OPTIONS, ["Повар"])
+
+    def test_has_option_sql(self):
+        engine = create_engine("sqlite://")
+        table = Table("users", MetaData(), Column("id", Integer), Column("roles", Integer))
+        table.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                insert(table),
+                [
+                    {"id": 1, "roles": 0b001},
+                    {"id": 2, "roles": 0b110},
+                    {"id": 3, "roles": None},
+                    {"id": 4, "roles": 0b011},
+                ],
+            )
+            picked = conn.execute(select(table.c.id).where(has_option(table.c.roles, OPTIONS, "Фото, видео"))).all()
+
+        assert sorted(row[0] for row in picked) == [2, 4]
+
+
+class TestMultiSelectField:
+    """Тесты поля с множественным выбором."""
+
+    @pytest.fixture
+    def field(self):
+        return SurveyField(field_name="roles", label="Роли", message="?", options=OPTIONS, multi_select=True)
+
+    def test_stored_as_integer(self, field):
+        assert field.db_type == "INTEGER"
+        assert SurveyField(field_name="x", label="x", options=OPTIONS).db_type == "TEXT"
+
+    def test_selected_options_of_node(self):
+        from src.state_handler import StateHandler
+
+        multi = StateNode(state="roles", config=None, field_name="roles", options=tuple(OPTIONS), multi_select=True)
+        single = StateNode(state="edit_role", config=None, field_name="role", options=tuple(OPTIONS))
+
+        assert StateHandler.get_selected_options(multi, {"roles": 0b110}) == ["Фото, видео", "Радист"]
+        assert StateHandler.get_selected_options(single, {"role": "Фото, видео"}) == ["Фото, видео"]
+        assert StateHandler.get_selected_options(single, {}) == []
+
+    def test_summary_renders_options(self, field):
+        config = RegistrationSurveyConfig()
+        config.add_field(field)
+
+        assert "Роли: `Вожатый, Радист`" in config._generate_registered_message({"roles": 0b101})
+
+    def test_export_renders_options(self, field, monkeypatch):
+        from src import settings
+        from src.utils import render_multi_select_columns
+
+        config = RegistrationSurveyConfig()
+        config.add_field(field)
+        monkeypatch.setattr(settings, "SURVEY_CONFIG", config)
+
+        df = render_multi_select_columns(pd.DataFrame({"telegram_id": [1, 2, 3], "roles": [1, 6, None]}))
+
+        assert df["roles"].tolist()[:2] == ["Вожатый", "Фото, видео, Радист"]
+        assert pd.isna(df["roles"].tolist()[2])
@@ -0,0 +1,49 @@
+"""
+Тесты для конвейера обработки ввода поля опроса.
+"""
+
+from unittest.mock import MagicMock
+
+from src.registration_config import SurveyField
+from src.survey.formatters import format_group_db, format_phone_db
+from src.survey.pipeline import compile_pipeline
+from src.survey.validators import validate_group, validate_phone
+
+
+def test_validate_and_format():
+    pipeline = compile_pipeline(validate_phone, format_phone_db)
+
+    assert pipeline("8 (999) 123-45-67") == (True, None, "79991234567")
+    is_valid, error, value = pipeline("123")
+    assert is_valid is False
+    assert error
+    assert value is None
+
+
+def test_formatter_is_not_called_for_invalid_input():
+    formatter = MagicMock(return_value="x")
+    pipeline = compile_pipeline(validate_group, formatter)
+
+    pipeline("Invalid")
+
+    formatter.assert_not_called()
+
+
+def test_partial_pipelines():
+    assert compile_pipeline(None, None)("abc") == (True, None, "abc")
+    assert compile_pipeline(None, format_group_db)(" рк6-81б ") == (True, None, "РК6-81Б")
+    assert compile_pipeline(validate_group, None)("РК6-81Б") == (True, None, "РК6-81Б")
+
+
+def test_survey_field_pipeline():
+    field = SurveyField(field_name="phone", label="Телефон", validator=validate_phone, db_formatter=format_phone_db)
+
+    assert field.pipeline("+7 999 123 45 67") == (True, None, "79991234567")
+
+
+def test_survey_field_pipeline_follows_replaced_validator():
+    field = SurveyField(field_name="phone", label="Телефон", validator=validate_phone, db_formatter=format_phone_db)
+
+    field.validator = lambda value: (False, "нет")
+
+    assert field.pipeline("+7 999 123 45 67") == (False, "нет", None)
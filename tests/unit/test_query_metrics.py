@@ -0,0 +1,113 @@
+"""
+Unit tests for SQL instrumentation.
+"""
+
+import logging
+
+import pytest
+from sqlalchemy import text
+
+from src.database import Database
+from src.query_metrics import QueryMetrics, normalize_sql
+
+
+@pytest.fixture
+def metrics():
+    """QueryMetrics attached to a fresh in-memory database."""
+    metrics = QueryMetrics(slow_query_ms=10_000)
+    database = Database(":memory:")
+    metrics.instrument(database.engine)
+    return metrics, database
+
+
+@pytest.mark.parametrize(
+    "statement, expected",
+    [
+        ("SELECT * FROM users WHERE id = 5", "SELECT * FROM users WHERE id = ?"),
+        ("SELECT * FROM users WHERE name = 'Иван'", "SELECT * FROM users WHERE name = ?"),
+        ("SELECT id\n  FROM users\n WHERE id IN (?, ?, ?)", "SELECT id FROM users WHERE id IN (?)"),
+        ('SELECT "users"."group" FROM users LIMIT 10 OFFSET 20', 'SELECT "users"."group" FROM users LIMIT ? OFFSET ?'),
+    ],
+)
+def test_normalize_sql(statement, expected):
+    assert normalize_sql(statement) == expected
+
+
+class TestQueryMetrics:
+    """Tests for QueryMetrics."""
+
+    def test_counts_queries_per_scope(self, metrics):
+        metrics, database = metrics
+
+        with metrics.track("handler", update_id=42) as scope:
+            with database.get_session() as session:
+                session.execute(text("SELECT 1"))
+                session.execute(text("SELECT 2"))
+
+        assert scope.count == 2
+        assert scope.statements == ["SELECT ?", "SELECT ?"]
+        snapshot = metrics.snapshot()
+        assert snapshot["handlers"]["handler"].updates == 1
+        assert snapshot["handlers"]["handler"].max_queries == 2
+        assert snapshot["statements"]["SELECT ?"].count == 2
+
+    def test_queries_outside_scope_are_not_attributed(self, metrics):
+        metrics, database = metrics
+
+        with metrics.track("handler") as scope:
+            pass
+        with database.get_session() as session:
+            session.execute(text("SELECT 1"))
+
+        assert scope.count == 0
+        assert metrics.snapshot()["total_queries"] == 1
+
+    def test_nested_scopes_both_count(self, metrics):
+        metrics, database = metrics
+
+        with metrics.track("outer") as outer:
+            with metrics.track("inner") as inner:
+                with database.get_session() as session:
+                    session.execute(text("SELECT 1"))
+
+        assert outer.count == 1
+        assert inner.count == 1
+
+    def test_slow_query_log(self, metrics, caplog):
+        metrics, database = metrics
+        metrics.slow_query_ms = 0
+
+        with caplog.at_level(logging.WARNING, logger="src.query_metrics.slow"):
+            with metrics.track("slow_handler", update_id=7):
+                with database.get_session() as session:
+                    session.execute(text("SELECT 'secret'"))
+
+        assert metrics.snapshot()["slow_queries"] == 1
+        assert "handler=slow_handler" in caplog.text
+        assert "update=7" in caplog.text
+        assert "secret" not in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_tracked_handler(self, metrics):
+        metrics, database = metrics
+
+        async def handler(update, context):
+            with database.get_session() as session:
+                session.execute(text("SELECT 1"))
+
+        class FakeUpdate:
+            update_id = 100
+
+        await metrics.tracked(handler, "start")(FakeUpdate(), None)
+
+        assert metrics.snapshot()["handlers"]["start"].queries == 1
+
+    def test_reset(self, metrics):
+        metrics, database = metrics
+        with database.get_session() as session:
+            session.execute(text("SELECT 1"))
+
+        metrics.reset()
+
+        assert metrics.snapshot()["total_queries"] == 0
+        assert metrics.snapshot()["statements"] == {}
@@ -2,12 +2,18 @@
 Тесты для условий пропуска вопросов.
 """
 
+import itertools
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, Text, create_engine, not_, select
+
 from src.survey.skip_conditions import (
     AnyFieldSkipCondition,
     FieldNotValueSkipCondition,
     FieldValueSkipCondition,
     MultipleFieldsSkipCondition,
     SkipConditionFactory,
+    is_sql_compatible,
     skip_if_bmstu_student,
     skip_if_finished_or_not_studying,
     skip_if_no_diploma,
@@ -206,3 +212,76 @@ class TestPredefinedConditions:
         # Не должен пропустить
         user_data = {"education_choice": "Другое учебное заведение"}
         assert skip_if_bmstu_student(user_data) is False
+
+
+VALUES = [None, "Да", "Нет", "Не знаю"]
+
+
+@pytest.fixture(scope="module")
+def users_table():
+    """Таблица со всеми сочетаниями значений двух полей, включая NULL."""
+    engine = create_engine("sqlite:///:memory:")
+    metadata = MetaData()
+    table = Table("users", metadata, Column("id", Integer, primary_key=True), Column("a", Text), Column("b", Text))
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(table.insert(), [{"a": a, "b": b} for a, b in itertools.product(VALUES, repeat=2)])
+    yield engine, table
+    engine.dispose()
+
+
+class TestSkipExpressionCompiler:
+    """Тесты компиляции дерева условий в Python и SQL."""
+
+    CONDITIONS = [
+        FieldValueSkipCondition("a", "Нет"),
+        FieldValueSkipCondition("a", ["Нет", "Не знаю"]),
+        FieldValueSkipCondition("a", [None, "Да"]),
+        FieldNotValueSkipCondition("a", "Да"),
+        ~FieldValueSkipCondition("a", "Нет"),
+        ~FieldNotValueSkipCondition("b", "Да"),
+        FieldValueSkipCondition("a", "Да") & FieldNotValueSkipCondition("b", "Нет"),
+        FieldValueSkipCondition("a", "Да") | FieldValueSkipCondition("b", ["Да", "Нет"]),
+        ~(FieldNotValueSkipCondition("a", "Нет") | ~FieldValueSkipCondition("b", "Не знаю")),
+        MultipleFieldsSkipCondition([]),
+        AnyFieldSkipCondition([]),
+    ]
+
+    @pytest.mark.parametrize("condition", CONDITIONS)
+    def test_sql_matches_python(self, users_table, condition):
+        engine, table = users_table
+        with engine.connect() as conn:
+            rows = [dict(row._mapping) for row in conn.execute(select(table))]
+            skipped_in_sql = set(conn.scalars(select(table.c.id).where(condition.to_sql(table.c))))
+            asked_in_sql = set(conn.scalars(select(table.c.id).where(not_(condition.to_sql(table.c)))))
+
+        skipped_in_python = {row["id"] for row in rows if condition(row)}
+        assert skipped_in_sql == skipped_in_python
+        # NOT условия - ровно дополнение: сравнения с NULL не дают "неизвестно"
+        assert asked_in_sql == {row["id"] for row in rows} - skipped_in_python
+
+    def test_missing_field_is_none(self):
+        assert FieldNotValueSkipCondition("a", "Да")({}) is True
+        assert FieldValueSkipCondition("a", [None])({}) is True
+
+    def test_fields_and_sql_compatibility(self):
+        condition = FieldValueSkipCondition("a", "Да") & ~FieldNotValueSkipCondition("b", "Нет")
+
+        assert condition.fields == {"a", "b"}
+        assert is_sql_compatible(condition)
+
+        class Custom:
+            def should_skip(self, user_data):
+                return True
+
+        mixed = AnyFieldSkipCondition([FieldValueSkipCondition("a", "Да"), Custom()])
+        assert mixed({"a": "Нет"}) is True
+        assert not is_sql_compatible(mixed)
+
+    def test_predefined_conditions_compile_to_sql(self, users_table):
+        _, table = users_table
+        model = type("Model", (), {"education_choice": table.c.a})
+
+        sql = str(skip_if_finished_or_not_studying.to_sql(model).compile(compile_kwargs={"literal_binds": True}))
+
+        assert "IN ('Закончил(а)', 'Не учусь')" in sql
@@ -0,0 +1,98 @@
+"""
+Тесты для скомпилированного графа состояний опроса.
+"""
+
+import pytest
+
+from src.constants import ADMIN_SEND_MESSAGE, EDIT, REGISTERED
+from src.registration_config import RegistrationSurveyConfig, SurveyField
+from src.survey.state_graph import SurveyStateGraph, edit_state
+
+
+@pytest.fixture
+def config():
+    return RegistrationSurveyConfig()
+
+
+class TestSurveyStateGraph:
+    """Тесты для SurveyStateGraph."""
+
+    def test_next_edges_follow_field_order(self, config):
+        graph = config.state_graph
+        names = [field.field_name for field in config.fields]
+
+        assert graph.first_state == names[0]
+        for current, following in zip(names, names[1:], strict=False):
+            assert graph.next_state(current) == following
+        assert graph.next_state(names[-1]) == REGISTERED
+
+    def test_edit_nodes_return_to_registered(self, config):
+        graph = config.state_graph
+        node = graph.node(edit_state("phone"))
+
+        assert node.is_edit
+        assert node.field_name == "phone"
+        assert node.config is config.get_field_by_name("phone")
+        assert node.next_state == REGISTERED
+        assert node.request_contact
+        assert graph.node("phone").edit_state == "edit_phone"
+
+    def test_field_properties_are_precomputed(self, config):
+        graph = config.state_graph
+
+        assert graph.node("username").auto_collect is not None
+        assert graph.node("will_drive").options == tuple(config.get_field_by_name("will_drive").options)
+        assert graph.node("name").options is None
+
+    def test_post_registration_and_admin_states(self, config):
+        graph = config.state_graph
+
+        assert graph.node(REGISTERED).field_name is None
+        assert not graph.node(EDIT).is_admin
+        assert graph.node(ADMIN_SEND_MESSAGE).is_admin
+        assert graph.next_state(REGISTERED) == REGISTERED
+
+    def test_unknown_state(self, config):
+        graph = config.state_graph
+
+        assert graph.node("unknown") is None
+        assert graph.node(None) is None
+        assert graph.next_state("unknown") == REGISTERED
+        assert graph.field_name("unknown") is None
+
+    def test_label_lookup(self, config):
+        graph = config.state_graph
+        field = config.get_field_by_name("name")
+
+        assert graph.get_field_by_label(field.label) is field
+        assert graph.get_field_by_label("Несуществующее поле") is None
+
+    def test_graph_is_immutable(self, config):
+        graph = config.state_graph
+
+        with pytest.raises(TypeError):
+            graph.nodes["name"] = None
+        with pytest.raises(AttributeError):
+            graph.node("name").next_state = "other"
+
+    def test_graph_is_compiled_once_and_rebuilt_on_change(self, config):
+        graph = config.state_graph
+        assert config.state_graph is graph
+        assert config.fields is config.fields
+
+        last = config.fields[-1].field_name
+        config.add_field(SurveyField(field_name="extra", label="Дополнительно", message="?"))
+
+        assert config.state_graph is not graph
+        assert config.state_graph.next_state(last) == "extra"
+        assert config.state_graph.next_state("extra") == REGISTERED
+
+        config.remove_field("extra")
+        assert config.state_graph.node("extra") is None
+        assert config.state_graph.next_state(last) == REGISTERED
+
+    def test_compile_from_config(self, config):
+        graph = SurveyStateGraph(config)
+
+        assert set(graph.steps) == set(config.get_field_names())
+        assert len(graph.nodes) == 2 * len(config.fields) + 3
@@ -0,0 +1,97 @@
+"""
+Тесты для объединения быстрых переключений множественного выбора.
+"""
+
+import asyncio
+
+from src.toggle_coalescer import ToggleCoalescer
+
+
+class Recorder:
+    def __init__(self):
+        self.values = []
+
+    async def __call__(self, value):
+        self.values.append(value)
+
+
+class TestToggleCoalescer:
+    """Тесты для ToggleCoalescer."""
+
+    async def test_burst_is_flushed_once_after_quiet_period(self):
+        coalescer = ToggleCoalescer(delay=0.02)
+        flush = Recorder()
+
+        for value in (1, 3, 7, 6, 4):
+            coalescer.schedule((1, 10), value, flush)
+            assert coalescer.pending_value((1, 10)) == value
+            await asyncio.sleep(0.005)
+
+        assert flush.values == []
+        await asyncio.sleep(0.05)
+
+        assert flush.values == [4]
+        assert coalescer.pending_value((1, 10)) is None
+        assert len(coalescer) == 0
+
+    async def test_flush_user_writes_immediately(self):
+        coalescer = ToggleCoalescer(delay=10)
+        flush = Recorder()
+        other = Recorder()
+        coalescer.schedule((1, 10), 5, flush)
+        coalescer.schedule((1, 11), 2, flush)
+        coalescer.schedule((2, 10), 9, other)
+
+        assert await coalescer.flush_user(1) == 2
+
+        assert sorted(flush.values) == [2, 5]
+        assert other.values == []
+        assert coalescer.pending_value((2, 10)) == 9
+        assert await coalescer.flush_user(1) == 0
+
+    async def test_flush_cancels_timer(self):
+        coalescer = ToggleCoalescer(delay=0.01)
+        flush = Recorder()
+        coalescer.schedule((1, 10), 5, flush)
+
+        assert await coalescer.flush((1, 10))
+        await asyncio.sleep(0.03)
+
+        assert flush.values == [5]
+
+    async def test_latest_callback_wins(self):
+        coalescer = ToggleCoalescer(delay=10)
+        first, second = Recorder(), Recorder()
+        coalescer.schedule((1, 10), 1, first)
+        coalescer.schedule((1, 10), 2, second)
+
+        assert await coalescer.flush_all() == 1
+        assert first.values == []
+        assert second.values == [2]
+
+    async def test_value_visible_while_flushing(self):
+        coalescer = ToggleCoalescer(delay=10)
+        release = asyncio.Event()
+
+        async def slow_flush(value):
+            await release.wait()
+
+        coalescer.schedule((1, 10), 5, slow_flush)
+        task = asyncio.create_task(coalescer.flush((1, 10)))
+        await asyncio.sleep(0)
+
+        assert coalescer.pending_value((1, 10)) == 5
+        release.set()
+        await task
+        assert coalescer.pending_value((1, 10)) is None
+
+    async def test_flush_errors_are_logged(self, caplog):
+        coalescer = ToggleCoalescer(delay=0)
+
+        async def failing(value):
+            raise RuntimeError("boom")
+
+        coalescer.schedule((1, 10), 5, failing)
+        await asyncio.sleep(0.01)
+
+        assert "Failed to flush toggles" in caplog.text
@@ -0,0 +1,143 @@
+"""
+Тесты для параллельной обработки апдейтов с порядком внутри пользователя.
+"""
+
+import asyncio
+
+import pytest
+from telegram import Chat, Message, Update, User
+
+from src.update_processor import KeyedLock, PerUserUpdateProcessor, update_key
+
+
+def make_update(update_id: int, user_id: int | None) -> Update:
+    if user_id is None:
+        return Update(update_id=update_id)
+    user = User(id=user_id, first_name="u", is_bot=False)
+    message = Message(message_id=update_id, date=None, chat=Chat(id=user_id, type="private"), from_user=user)
+    return Update(update_id=update_id, message=message)
+
+
+class TestPerUserUpdateProcessor:
+    """Тесты для PerUserUpdateProcessor."""
+
+    async def test_same_user_updates_keep_order(self):
+        processor = PerUserUpdateProcessor(8)
+        handled = []
+
+        async def handler(update_id: int, delay: float) -> None:
+            await asyncio.sleep(delay)
+            handled.append(update_id)
+
+        # Первый апдейт медленный - второй всё равно должен дождаться его
+        await asyncio.gather(
+            processor.process_update(make_update(1, 42), handler(1, 0.05)),
+            processor.process_update(make_update(2, 42), handler(2, 0)),
+            processor.process_update(make_update(3, 42), handler(3, 0.01)),
+        )
+
+        assert handled == [1, 2, 3]
+        assert len(processor._locks) == 0
+
+    async def test_different_users_run_concurrently(self):
+        processor = PerUserUpdateProcessor(8)
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow() -> None:
+            started.set()
+            await release.wait()
+
+        async def fast() -> None:
+            await started.wait()
+            release.set()
+
+        # Второй пользователь разблокирует первого - возможно только при параллельной обработке
+        await asyncio.wait_for(
+            asyncio.gather(
+                processor.process_update(make_update(1, 1), slow()),
+                processor.process_update(make_update(2, 2), fast()),
+            ),
+            timeout=1,
+        )
+
+    async def test_worker_limit(self):
+        processor = PerUserUpdateProcessor(2)
+        running = 0
+        peak = 0
+
+        async def handler() -> None:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(processor.process_update(make_update(i, i), handler()) for i in range(10)))
+
+        assert peak == 2
+
+    async def test_waiting_user_does_not_block_workers(self):
+        # Один слот занят первым апдейтом, второй слот свободен для другого пользователя,
+        # если второй апдейт первого пользователя ждёт без слота
+        processor = PerUserUpdateProcessor(2)
+        release = asyncio.Event()
+        handled = []
+
+        async def blocking() -> None:
+            await release.wait()
+            handled.append("first")
+
+        async def record(name: str) -> None:
+            handled.append(name)
+            release.set()
+
+        await asyncio.wait_for(
+            asyncio.gather(
+                processor.process_update(make_update(1, 1), blocking()),
+                processor.process_update(make_update(2, 1), record("second")),
+                processor.process_update(make_update(3, 2), record("other user")),
+            ),
+            timeout=1,
+        )
+        # Апдейт другого пользователя не ждёт в очереди за вторым апдейтом первого
+        assert handled == ["other user", "first", "second"]
+
+    async def test_errors_release_the_user(self):
+        processor = PerUserUpdateProcessor(2)
+
+        async def failing() -> None:
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await processor.process_update(make_update(1, 1), failing())
+
+        handled = []
+
+        async def ok() -> None:
+            handled.append(1)
+
+        await asyncio.wait_for(processor.process_update(make_update(2, 1), ok()), timeout=1)
+        assert handled == [1]
+
+    def test_invalid_limit(self):
+        with pytest.raises(ValueError):
+            PerUserUpdateProcessor(0)
+
+
+class TestHelpers:
+    """Тесты вспомогательных функций."""
+
+    def test_update_key(self):
+        assert update_key(make_update(1, 42)) == 42
+        assert update_key(make_update(1, None)) is None
+        assert update_key(object()) is None
+
+    async def test_keyed_lock_returns_result(self):
+        locks = KeyedLock()
+
+        async def value() -> int:
+            return 5
+
+        assert await locks.run("key", value()) == 5
+        assert len(locks) == 0
@@ -139,3 +139,9 @@ def test_create_options_validator():
 def test_validate_group(group, is_valid):
     valid, _ = validate_group(group)
     assert valid == is_valid
+
+
+def test_options_validator_is_shared_per_options():
+    """Для одного набора вариантов валидатор создаётся один раз."""
+    assert create_options_validator(["А", "Б"]) == create_options_validator(("А", "Б"))
+    assert create_options_validator(["А", "Б"]) != create_options_validator(["А", "В"])